@@ -8,6 +8,7 @@ from django.db.models import Q, Count, Avg, F
 from posts.models import Post, PostLike, PostComment
 from users.models import User, UserRelationship
 from geography.models import Quartier, Commune
+from search.services import SearchService
 import logging
 from datetime import datetime, timedelta
 import json
@@ -287,10 +288,11 @@ class CommuniConnectAI:
         # Posts basés sur les préférences de contenu
         if 'content_preferences' in behavior and 'preferred_keywords' in behavior['content_preferences']:
             keywords = behavior['content_preferences']['preferred_keywords']
-            keyword_posts = Post.objects.filter(
-                Q(content__icontains=keywords[0]) | 
-                Q(content__icontains=keywords[1]) if len(keywords) > 1 else Q(content__icontains=keywords[0])
-            ).exclude(author=user).order_by('-created_at')[:limit//2]
+            # Index plein texte : posts contenant l'un des deux premiers mots-clés
+            post_ids = []
+            for keyword in keywords[:2]:
+                post_ids.extend(SearchService.search_ids('post', keyword, limit=limit))
+            keyword_posts = Post.objects.filter(id__in=post_ids).exclude(author=user).order_by('-created_at')[:limit//2]
         else:
             keyword_posts = Post.objects.none()
         
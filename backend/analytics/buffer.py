@@ -0,0 +1,178 @@
+"""
+Tampon d'événements dans le cache, écrit en base par lots.
+
+Le tampon est un journal numéroté : une séquence incrémentée de façon
+atomique donne la position de chaque ligne, stockée sous ``<nom>_{position}`` ;
+un curseur indique la dernière position écrite en base (même principe que
+posts.counters). Une position réservée mais pas encore écrite arrête le
+vidage jusqu'au suivant.
+
+Le tampon est vidé par ``bulk_create`` sur la file ``analytics_queue`` :
+
+- dès que ``ANALYTICS_BUFFER_FLUSH_SIZE`` lignes sont en attente ;
+- au plus tard ``ANALYTICS_BUFFER_FLUSH_INTERVAL`` secondes après la première
+  ligne en attente.
+
+Le modèle écrit est un paramètre : ce module n'importe aucun modèle.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from notifications.jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+
+# File partagée des vidages et des analyses
+analytics_queue = JobQueue(
+    'analytics-ingestion',
+    eager_setting='ANALYTICS_QUEUE_EAGER',
+    workers_setting='ANALYTICS_QUEUE_WORKERS'
+)
+
+
+class EventBuffer:
+    """Tampon d'événements dans le cache, écrit en base par lots"""
+
+    FLUSH_BATCH_SIZE = 5000
+
+    def __init__(self, name, model, on_flush=None):
+        self.name = name
+        self.model = model
+        self.on_flush = on_flush
+        self.sequence_key = f'{name}_seq'
+        self.cursor_key = f'{name}_cursor'
+        self.gap_key = f'{name}_gap'
+        self.flush_marker_key = f'{name}_flush'
+        self.flush_queued_key = f'{name}_flush_queued'
+        self.lock_key = f'{name}_lock'
+
+    def get_cache(self):
+        return caches['default']
+
+    def get_event_key(self, position):
+        return f'{self.name}_{position}'
+
+    def get_flush_size(self):
+        return getattr(settings, 'ANALYTICS_BUFFER_FLUSH_SIZE', 500)
+
+    def get_flush_interval(self):
+        return getattr(settings, 'ANALYTICS_BUFFER_FLUSH_INTERVAL', 10)
+
+    def get_event_timeout(self):
+        return getattr(settings, 'CACHE_TIMEOUTS', {}).get('analytics_buffer', 86400)
+
+    def append(self, rows):
+        """Ajoute des lignes (champs du modèle) au tampon ; renvoie leur nombre"""
+        if not rows:
+            return 0
+
+        cache = self.get_cache()
+        cache.add(self.sequence_key, 0, None)
+        last = cache.incr(self.sequence_key, len(rows))
+        # Positions réservées d'un coup, écrites en une seule opération
+        cache.set_many(
+            {self.get_event_key(last - len(rows) + index + 1): row for index, row in enumerate(rows)},
+            self.get_event_timeout()
+        )
+        self.maybe_flush(last)
+        return len(rows)
+
+    def pending(self):
+        """Nombre d'événements en attente d'écriture"""
+        cache = self.get_cache()
+        return cache.get(self.sequence_key, 0) - cache.get(self.cursor_key, 0)
+
+    def maybe_flush(self, sequence=None):
+        """Planifie un vidage si le seuil de taille est atteint, sinon à la fin de l'intervalle"""
+        cache = self.get_cache()
+        if sequence is None:
+            sequence = cache.get(self.sequence_key, 0)
+        interval = self.get_flush_interval()
+
+        if sequence - cache.get(self.cursor_key, 0) >= self.get_flush_size():
+            if cache.add(self.flush_queued_key, 1, interval):
+                analytics_queue.enqueue(self.flush)
+        elif cache.add(self.flush_marker_key, 1, interval):
+            analytics_queue.enqueue_later(interval, self.flush)
+
+    def flush(self):
+        """Écrit en base les événements en attente par ``bulk_create`` ; renvoie leur nombre"""
+        cache = self.get_cache()
+        if not cache.add(self.lock_key, 1, 60):
+            return 0
+
+        written = 0
+        try:
+            while True:
+                rows = self._drain(cache)
+                if not rows:
+                    break
+                try:
+                    # Point de sauvegarde : un lot refusé n'invalide pas la transaction appelante
+                    with transaction.atomic():
+                        objects = self.model.objects.bulk_create(
+                            [self.model(**row) for row in rows], batch_size=500
+                        )
+                except Exception as e:
+                    logger.error(f"Erreur lors du vidage du tampon {self.name}: {str(e)}")
+                    objects = self._create_individually(rows)
+                    if not objects:
+                        # Base indisponible : les lignes attendront le prochain vidage
+                        self.append(rows)
+                        break
+
+                written += len(objects)
+                if self.on_flush:
+                    analytics_queue.enqueue(self.on_flush, objects)
+                if len(rows) < self.FLUSH_BATCH_SIZE:
+                    break
+        finally:
+            cache.delete_many([self.lock_key, self.flush_queued_key])
+
+        if written:
+            logger.info(f"Tampon {self.name} vidé: {written} événements écrits")
+        return written
+
+    def _create_individually(self, rows):
+        """Écrit les lignes une à une en écartant celles qui sont refusées (utilisateur supprimé...)"""
+        objects = []
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    objects.append(self.model.objects.create(**row))
+            except Exception as e:
+                logger.warning(f"Événement du tampon {self.name} écarté: {str(e)}")
+        return objects
+
+    def _drain(self, cache):
+        """Lit et supprime les lignes du journal non encore écrites"""
+        sequence = cache.get(self.sequence_key, 0)
+        cursor = cache.get(self.cursor_key, 0)
+        if sequence <= cursor:
+            return []
+
+        last = min(sequence, cursor + self.FLUSH_BATCH_SIZE)
+        positions = range(cursor + 1, last + 1)
+        found = cache.get_many([self.get_event_key(position) for position in positions])
+
+        rows = []
+        for position in positions:
+            key = self.get_event_key(position)
+            if key in found:
+                rows.append(found[key])
+                continue
+            # Position réservée mais pas encore écrite (ajout en cours) : on
+            # s'arrête avant, sauf si elle manquait déjà au vidage précédent
+            if cache.get(self.gap_key) == position:
+                logger.warning(f"Événement {position} du tampon {self.name} perdu")
+                continue
+            cache.set(self.gap_key, position, None)
+            analytics_queue.enqueue_later(self.get_flush_interval(), self.flush)
+            last = position - 1
+            break
+
+        cache.delete_many([self.get_event_key(position) for position in range(cursor + 1, last + 1)])
+        cache.set(self.cursor_key, last, None)
+        return rows
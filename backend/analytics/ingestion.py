@@ -0,0 +1,92 @@
+"""
+Ingestion tamponnée des événements d'analytics.
+
+Les clients envoient leurs événements par lots (``track_event``). Chaque
+événement est validé puis ajouté à un tampon dans le cache (analytics.buffer),
+sans écriture en base pendant la requête. Le tampon est vidé par
+``bulk_create`` sur la file ``analytics_queue`` quand il atteint
+``ANALYTICS_BUFFER_FLUSH_SIZE`` événements, ou au plus tard
+``ANALYTICS_BUFFER_FLUSH_INTERVAL`` secondes après le premier.
+
+Après chaque vidage, le rappel ``on_flush`` reçoit les lignes écrites
+(micro-lot) et s'exécute à son tour sur la file : les analyses coûteuses
+(segments, anomalies) portent sur un lot, pas sur chaque événement.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .buffer import EventBuffer
+from .models import EventTracking
+
+logger = logging.getLogger(__name__)
+
+
+# Horodatages client acceptés (au-delà, l'heure de réception est utilisée)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MAX_EVENT_AGE = timedelta(days=1)
+
+
+class EventIngestionService:
+    """Validation et mise en tampon des événements envoyés par les clients"""
+
+    EVENT_TYPES = {event_type for event_type, _ in EventTracking.EVENT_TYPES}
+
+    @staticmethod
+    def get_max_batch_size():
+        return getattr(settings, 'ANALYTICS_MAX_BATCH_EVENTS', 200)
+
+    @staticmethod
+    def normalize(user, event, ip_address=None, user_agent=''):
+        """Champs ``EventTracking`` d'un événement client ; lève ValueError s'il est invalide"""
+        if not isinstance(event, dict):
+            raise ValueError("Événement invalide")
+        event_type = event.get('event_type')
+        if event_type not in EventIngestionService.EVENT_TYPES:
+            raise ValueError(f"Type d'événement inconnu: {event_type}")
+        event_data = event.get('event_data', {})
+        if not isinstance(event_data, dict):
+            raise ValueError("event_data doit être un objet")
+
+        now = timezone.now()
+        timestamp = parse_datetime(str(event.get('timestamp') or '')) if event.get('timestamp') else None
+        if timestamp is None or timezone.is_naive(timestamp) or not (
+            now - MAX_EVENT_AGE <= timestamp <= now + MAX_CLOCK_SKEW
+        ):
+            timestamp = now
+
+        response_time = event.get('response_time')
+        return {
+            'user_id': user.id,
+            'event_type': event_type,
+            'event_data': event_data,
+            'timestamp': timestamp,
+            'session_id': str(event.get('session_id') or '')[:100],
+            'ip_address': ip_address,
+            'user_agent': user_agent or '',
+            'location_id': getattr(user, 'quartier_id', None),
+            'response_time': float(response_time) if isinstance(response_time, (int, float)) else None,
+            'error_code': str(event.get('error_code') or '')[:10],
+        }
+
+    @staticmethod
+    def ingest(user, events, ip_address=None, user_agent=''):
+        """
+        Met en tampon un lot d'événements. Renvoie le nombre d'événements
+        acceptés et la liste des refus ``{'index', 'error'}``.
+        """
+        rows = []
+        rejected = []
+        for index, event in enumerate(events):
+            try:
+                rows.append(EventIngestionService.normalize(user, event, ip_address, user_agent))
+            except (TypeError, ValueError) as e:
+                rejected.append({'index': index, 'error': str(e)})
+
+        accepted = event_buffer.append(rows)
+        return accepted, rejected
+
+
+# Tampon des événements suivis par track_event
+event_buffer = EventBuffer('analytics_events', EventTracking)
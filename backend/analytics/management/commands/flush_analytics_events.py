@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from analytics.ingestion import event_buffer
+from analytics.services import behavior_buffer
+
+
+class Command(BaseCommand):
+    help = "Écrit en base les événements et comportements d'analytics en attente dans le cache"
+
+    def handle(self, *args, **options):
+        events = event_buffer.flush()
+        behaviors = behavior_buffer.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'{events} événements et {behaviors} comportements écrits')
+        )
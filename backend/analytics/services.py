@@ -9,6 +9,7 @@ from .models import (
     ContentRecommendation, TrendAnalysis, AnomalyDetection, SentimentAnalysis,
     BusinessIntelligence, MLModelPerformance, DataPipeline
 )
+from .ingestion import EventBuffer
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
@@ -62,69 +63,87 @@ class PredictiveAnalyticsService:
             logger.error(f"Erreur chargement modèles: {e}")
     
     def collect_user_behavior(self, user, behavior_type, **kwargs):
-        """Collecte le comportement utilisateur"""
+        """
+        Collecte le comportement utilisateur.
+
+        Le comportement est ajouté au tampon ``behavior_buffer`` (écrit en base
+        par lots) ; l'analyse porte ensuite sur chaque lot écrit
+        (``analyze_batch``). Renvoie le comportement, non encore enregistré.
+        """
         try:
-            behavior = UserBehavior.objects.create(
-                user=user,
-                behavior_type=behavior_type,
-                session_id=kwargs.get('session_id', ''),
-                device_type=kwargs.get('device_type', ''),
-                location=kwargs.get('location', ''),
-                language=kwargs.get('language', 'fr'),
-                target_id=kwargs.get('target_id', ''),
-                target_type=kwargs.get('target_type', ''),
-                metadata=kwargs.get('metadata', {}),
-                response_time=kwargs.get('response_time'),
-                success=kwargs.get('success', True),
-                error_message=kwargs.get('error_message', '')
-            )
-            
-            # Déclencher l'analyse en temps réel
-            self._trigger_realtime_analysis(behavior)
-            
-            return behavior
+            row = {
+                'user_id': user.id,
+                'behavior_type': behavior_type,
+                'session_id': kwargs.get('session_id', ''),
+                'device_type': kwargs.get('device_type', ''),
+                'location': kwargs.get('location', ''),
+                'language': kwargs.get('language', 'fr'),
+                'target_id': kwargs.get('target_id', ''),
+                'target_type': kwargs.get('target_type', ''),
+                'metadata': kwargs.get('metadata', {}),
+                'response_time': kwargs.get('response_time'),
+                'success': kwargs.get('success', True),
+                'error_message': kwargs.get('error_message', ''),
+                'timestamp': timezone.now(),
+            }
+            behavior_buffer.append([row])
+            return UserBehavior(**row)
             
         except Exception as e:
             logger.error(f"Erreur collecte comportement: {e}")
             return None
     
-    def _trigger_realtime_analysis(self, behavior):
-        """Déclenche l'analyse en temps réel"""
+    def analyze_batch(self, behaviors):
+        """
+        Analyse un micro-lot de comportements écrits par le tampon : patterns,
+        segments et anomalies sont calculés une fois par lot (par utilisateur
+        ou par type de comportement), pas une fois par comportement.
+        """
+        if not behaviors:
+            return
         try:
-            # Analyser le comportement pour détecter des patterns
-            self._analyze_behavior_pattern(behavior)
+            user_ids = {behavior.user_id for behavior in behaviors}
+            users = User.objects.in_bulk(user_ids)
             
-            # Mettre à jour les segments utilisateur
-            self._update_user_segments(behavior.user)
+            # Analyser le comportement pour détecter des patterns
+            self._analyze_behavior_patterns(users)
+            
+            # Mettre à jour les segments utilisateur (un calcul par utilisateur,
+            # une mise à jour des métriques par segment)
+            segments = {}
+            for user in users.values():
+                user_segment = self._update_user_segments(user, update_metrics=False)
+                if user_segment:
+                    segments[user_segment.id] = user_segment
+            for user_segment in segments.values():
+                self._update_segment_metrics(user_segment)
             
             # Vérifier les anomalies
-            self._detect_anomalies(behavior)
+            self._detect_anomalies(behaviors, users)
             
         except Exception as e:
-            logger.error(f"Erreur analyse temps réel: {e}")
+            logger.error(f"Erreur analyse du lot de comportements: {e}")
     
-    def _analyze_behavior_pattern(self, behavior):
-        """Analyse les patterns de comportement"""
+    def _analyze_behavior_patterns(self, users):
+        """Analyse les patterns de comportement des utilisateurs d'un lot"""
         try:
-            # Récupérer l'historique récent de l'utilisateur
-            recent_behaviors = UserBehavior.objects.filter(
-                user=behavior.user,
+            # Historique récent des utilisateurs du lot, agrégé en une requête
+            behavior_counts = UserBehavior.objects.filter(
+                user_id__in=list(users),
                 timestamp__gte=timezone.now() - timedelta(days=7)
-            ).order_by('timestamp')
-            
-            if recent_behaviors.count() < 5:
-                return
+            ).values('user_id', 'behavior_type').annotate(count=Count('id'))
             
-            # Analyser les patterns
-            behavior_counts = recent_behaviors.values('behavior_type').annotate(
-                count=Count('id')
-            )
+            totals = {}
+            for behavior_count in behavior_counts:
+                totals[behavior_count['user_id']] = totals.get(behavior_count['user_id'], 0) + behavior_count['count']
             
             # Détecter les patterns anormaux
             for behavior_count in behavior_counts:
+                if totals[behavior_count['user_id']] < 5:
+                    continue
                 if behavior_count['count'] > 100:  # Seuil d'anomalie
                     self._create_anomaly_detection(
-                        behavior.user,
+                        users[behavior_count['user_id']],
                         'user_behavior',
                         f"Comportement excessif: {behavior_count['behavior_type']}",
                         behavior_count['count']
@@ -133,8 +152,8 @@ class PredictiveAnalyticsService:
         except Exception as e:
             logger.error(f"Erreur analyse patterns: {e}")
     
-    def _update_user_segments(self, user):
-        """Met à jour les segments utilisateur"""
+    def _update_user_segments(self, user, update_metrics=True):
+        """Met à jour les segments utilisateur ; renvoie le segment de l'utilisateur"""
         try:
             # Calculer les métriques utilisateur
             engagement_score = self._calculate_engagement_score(user)
@@ -159,10 +178,13 @@ class PredictiveAnalyticsService:
             )
             
             # Mettre à jour les métriques du segment
-            self._update_segment_metrics(user_segment)
+            if update_metrics:
+                self._update_segment_metrics(user_segment)
+            return user_segment
             
         except Exception as e:
             logger.error(f"Erreur mise à jour segments: {e}")
+            return None
     
     def _calculate_engagement_score(self, user):
         """Calcule le score d'engagement utilisateur"""
@@ -362,33 +384,38 @@ class PredictiveAnalyticsService:
         except Exception as e:
             logger.error(f"Erreur mise à jour métriques segment: {e}")
     
-    def _detect_anomalies(self, behavior):
-        """Détecte les anomalies de comportement"""
+    def _detect_anomalies(self, behaviors, users):
+        """Détecte les temps de réponse anormaux d'un lot de comportements"""
         try:
-            # Récupérer les comportements similaires
-            similar_behaviors = UserBehavior.objects.filter(
-                behavior_type=behavior.behavior_type,
-                timestamp__gte=timezone.now() - timedelta(hours=1)
-            )
-            
-            if similar_behaviors.count() < 10:
-                return
-            
-            # Calculer les statistiques
-            response_times = [b.response_time for b in similar_behaviors if b.response_time]
-            if not response_times:
+            behavior_types = {behavior.behavior_type for behavior in behaviors if behavior.response_time}
+            if not behavior_types:
                 return
             
-            mean_response_time = np.mean(response_times)
-            std_response_time = np.std(response_times)
+            # Statistiques de la dernière heure, une fois par type de comportement
+            stats = {}
+            for behavior_type in behavior_types:
+                response_times = list(UserBehavior.objects.filter(
+                    behavior_type=behavior_type,
+                    timestamp__gte=timezone.now() - timedelta(hours=1),
+                    response_time__isnull=False
+                ).values_list('response_time', flat=True))
+                if len(response_times) < 10:
+                    continue
+                std_response_time = np.std(response_times)
+                if not std_response_time:
+                    continue
+                stats[behavior_type] = (np.mean(response_times), std_response_time)
             
             # Détecter les anomalies
-            if behavior.response_time:
+            for behavior in behaviors:
+                if not behavior.response_time or behavior.behavior_type not in stats:
+                    continue
+                mean_response_time, std_response_time = stats[behavior.behavior_type]
                 z_score = abs(behavior.response_time - mean_response_time) / std_response_time
                 
                 if z_score > 3:  # Anomalie statistique
                     self._create_anomaly_detection(
-                        behavior.user,
+                        users[behavior.user_id],
                         'user_behavior',
                         f"Temps de réponse anormal: {behavior.response_time}ms",
                         behavior.response_time,
@@ -958,4 +985,7 @@ class PredictiveAnalyticsService:
             logger.error(f"Erreur entraînement modèle sentiment: {e}")
 
 # Instance globale
-predictive_analytics = PredictiveAnalyticsService() 
\ No newline at end of file
+predictive_analytics = PredictiveAnalyticsService()
+
+# Comportements mis en tampon, analysés par micro-lots après chaque écriture
+behavior_buffer = EventBuffer('analytics_behaviors', UserBehavior, on_flush=predictive_analytics.analyze_batch) 
\ No newline at end of file
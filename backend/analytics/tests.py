@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from unittest import mock
+
+from .buffer import EventBuffer
+from search.models import SearchDocument
+
+
+def document(index):
+    return {'content_type': 'post', 'object_id': str(index), 'title_terms': f'terme{index}'}
+
+
+@override_settings(ANALYTICS_BUFFER_FLUSH_SIZE=3, ANALYTICS_BUFFER_FLUSH_INTERVAL=10)
+class EventBufferTest(TestCase):
+    """Tests pour le tampon écrit par lots (le modèle est un paramètre : SearchDocument ici)"""
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = EventBuffer('test_buffer', SearchDocument)
+        patcher = mock.patch('analytics.buffer.analytics_queue')
+        self.queue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def written(self):
+        return sorted(SearchDocument.objects.values_list('object_id', flat=True), key=int)
+
+    def test_interval_flush_scheduled_once(self):
+        """Sous le seuil, un seul vidage est planifié à la fin de l'intervalle"""
+        self.buffer.append([document(1)])
+        self.buffer.append([document(2)])
+
+        self.queue.enqueue_later.assert_called_once_with(10, self.buffer.flush)
+        self.queue.enqueue.assert_not_called()
+        self.assertEqual(SearchDocument.objects.count(), 0)
+        self.assertEqual(self.buffer.pending(), 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.written(), ['1', '2'])
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_size_flush_enqueued_at_threshold(self):
+        """Le seuil de taille déclenche un vidage immédiat, une seule fois par intervalle"""
+        self.buffer.append([document(1), document(2)])
+        self.queue.enqueue.assert_not_called()
+
+        self.buffer.append([document(3)])
+        self.buffer.append([document(4)])
+        self.queue.enqueue.assert_called_once_with(self.buffer.flush)
+
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(self.written(), ['1', '2', '3', '4'])
+
+        # Le vidage libère le seuil pour le lot suivant
+        self.buffer.append([document(index) for index in range(5, 8)])
+        self.assertEqual(self.queue.enqueue.call_count, 2)
+
+    def test_flush_waits_for_reserved_position(self):
+        """Une position réservée mais pas encore écrite arrête le vidage jusqu'au suivant"""
+        self.buffer.append([document(1)])
+        # Ajout concurrent : position 2 réservée, ligne pas encore écrite
+        cache.incr(self.buffer.sequence_key)
+        self.buffer.append([document(3)])
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.written(), ['1'])
+        self.assertEqual(self.buffer.pending(), 2)
+        self.queue.enqueue_later.assert_called_with(10, self.buffer.flush)
+
+        cache.set(self.buffer.get_event_key(2), document(2))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.written(), ['1', '2', '3'])
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_flush_skips_position_missing_twice(self):
+        """Une position toujours absente au vidage suivant est écartée"""
+        cache.add(self.buffer.sequence_key, 0, None)
+        cache.incr(self.buffer.sequence_key)
+        self.buffer.append([document(2)])
+
+        self.assertEqual(self.buffer.flush(), 0)
+        with self.assertLogs('analytics.buffer', level='WARNING'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.written(), ['2'])
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_rows_reappended_when_database_unavailable(self):
+        """Si aucune ligne ne peut être écrite, elles restent dans le tampon"""
+        self.buffer.append([document(1), document(2)])
+
+        with mock.patch.object(SearchDocument.objects, 'bulk_create', side_effect=Exception('base indisponible')), \
+                mock.patch.object(SearchDocument.objects, 'create', side_effect=Exception('base indisponible')), \
+                self.assertLogs('analytics.buffer', level='ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(SearchDocument.objects.count(), 0)
+        self.assertEqual(self.buffer.pending(), 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.written(), ['1', '2'])
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_rejected_rows_dropped(self):
+        """Une ligne refusée par la base est écartée, les autres sont écrites"""
+        SearchDocument.objects.create(**document(2))
+        on_flush = mock.Mock()
+        self.buffer.on_flush = on_flush
+        self.buffer.append([document(1), document(2), document(3)])
+
+        with self.assertLogs('analytics.buffer', level='WARNING'):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual(self.written(), ['1', '2', '3'])
+        self.assertEqual(self.buffer.pending(), 0)
+        objects = self.queue.enqueue.call_args.args[1]
+        self.assertEqual(self.queue.enqueue.call_args.args[0], on_flush)
+        self.assertEqual([obj.object_id for obj in objects], ['1', '3'])
@@ -11,6 +11,7 @@ from .models import (
     PredictiveAnalytics, PerformanceMetrics, BusinessMetrics
 )
 from .services import analytics_service
+from .ingestion import EventIngestionService
 from posts.models import Post, PostLike, PostComment
 from users.models import User
 from geography.models import Quartier
@@ -314,38 +315,51 @@ def get_predictions(request):
 @permission_classes([IsAuthenticated])
 def track_event(request):
     """
-    Endpoint pour tracker un événement utilisateur
+    Endpoint pour tracker des événements utilisateur.
+    
+    Accepte un événement seul ou un lot ``{"events": [...]}`` ; les événements
+    sont mis en tampon et écrits en base par lots (analytics.ingestion).
     """
     try:
         user = request.user
-        event_type = request.data.get('event_type')
-        event_data = request.data.get('event_data', {})
-        session_id = request.data.get('session_id')
+        events = request.data.get('events')
+        if events is None:
+            events = [request.data]
         
-        if not event_type:
+        if not isinstance(events, list) or not events:
             return Response(
-                {'error': 'Type d\'événement requis'},
+                {'error': 'Au moins un événement requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Tracking de l'événement
-        event = analytics_service.track_event(user, event_type, event_data, session_id)
+        max_batch_size = EventIngestionService.get_max_batch_size()
+        if len(events) > max_batch_size:
+            return Response(
+                {'error': f'Lot trop volumineux (max {max_batch_size} événements)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        if not event:
+        # Mise en tampon des événements, sans écriture en base
+        accepted, rejected = EventIngestionService.ingest(
+            user,
+            events,
+            ip_address=request.META.get('REMOTE_ADDR'),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+        
+        if not accepted:
             return Response(
-                {'error': 'Erreur lors du tracking de l\'événement'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Aucun événement valide', 'rejected': rejected},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
         response_data = {
-            'event_id': event.id,
-            'event_type': event.event_type,
-            'timestamp': event.timestamp.isoformat(),
-            'session_id': event.session_id,
-            'message': 'Événement tracké avec succès',
+            'accepted': accepted,
+            'rejected': rejected,
+            'message': 'Événements reçus',
         }
         
-        return Response(response_data, status=status.HTTP_201_CREATED)
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Erreur tracking événement: {e}")
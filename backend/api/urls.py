@@ -23,6 +23,12 @@ urlpatterns = [
     # API géographique
     path('geography/', include('geography.urls')),
     
+    # Recherche plein texte
+    path('search/', include('search.urls')),
+    
+    # Monitoring des performances (administrateurs)
+    path('monitoring/', include('monitoring.urls')),
+    
     # Refresh token JWT
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ] 
\ No newline at end of file
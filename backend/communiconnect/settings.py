@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
 
@@ -36,6 +37,9 @@ INSTALLED_APPS = [
     'posts',
     'notifications',
     'help_requests',  # Demandes d'aide communautaire
+    'search',  # Recherche plein texte
+    'gamification',  # Scores et classement des alertes
+    'performance',  # Statistiques du cache intelligent (CacheHitRate)
 ]
 
 MIDDLEWARE = [
@@ -216,11 +220,12 @@ else:
     # Fallback vers stockage local pour le développement
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
-# Configuration pour les fichiers uploadés
+# Configuration pour les fichiers uploadés : écriture sur disque par blocs,
+# empreinte SHA-256 et type réel calculés pendant la réception (posts.uploads)
 FILE_UPLOAD_HANDLERS = [
-    'django.core.files.uploadhandler.MemoryFileUploadHandler',
-    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    'posts.uploads.StreamingUploadHandler',
 ]
+CDN_UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024  # Morceaux des vidéos envoyées à Cloudinary
 
 # Optimisations de performance avancées
 GZIP_CONTENT_TYPES = [
@@ -251,8 +256,20 @@ CACHE_TIMEOUTS = {
     'user_profile': 600,     # 10 minutes
     'media_list': 1800,      # 30 minutes
     'analytics': 3600,       # 1 heure
+    'commune_feed': 3600,    # 1 heure (mis à jour de façon incrémentale)
+    'engagement_counter': 86400,  # 24 heures (deltas en attente de vidage)
+    'analytics_buffer': 86400,  # 24 heures (événements en attente d'écriture)
 }
 
+# Nombre maximum d'IDs de posts conservés en cache par fil de commune
+FEED_MAX_LENGTH = 1000
+
+# Intervalle (secondes) entre deux vidages en base des compteurs d'engagement
+ENGAGEMENT_COUNTER_FLUSH_INTERVAL = 30
+
+# Intervalle (secondes) entre deux vidages en base des agrégats d'engagement (voir posts.rollups)
+ENGAGEMENT_ROLLUP_FLUSH_INTERVAL = 30
+
 # Configuration de la pagination
 PAGINATION_PAGE_SIZE = 20
 PAGINATION_MAX_PAGE_SIZE = 100
@@ -263,6 +280,9 @@ MEDIA_OPTIMIZATION = {
     'max_width': 1920,
     'max_height': 1080,
     'thumbnail_sizes': [150, 300, 600],
+    'rendition_widths': [150, 300, 600, 1080, 1920],  # Déclinaisons des images (srcset)
+    'rendition_formats': ['jpeg', 'webp'],
+    'hls_segment_duration': 4,  # secondes, qualités vidéo 240p/360p/720p (voir posts.transcoding)
     'video_compression': True,
     'auto_webp': True,
 }
@@ -322,9 +342,9 @@ REST_FRAMEWORK = {
     
     # Rate limiting pour la sécurité
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'users.ratelimit.AnonRateLimitThrottle',
+        'users.ratelimit.UserRateLimitThrottle',
+        'users.ratelimit.ScopedRateLimitThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -335,6 +355,19 @@ REST_FRAMEWORK = {
     },
 }
 
+# Limitation de débit par scope (fenêtre glissante, voir users.ratelimit).
+# Les scopes absents sont lus dans DEFAULT_THROTTLE_RATES.
+RATE_LIMITS = {
+    'global': '100/minute',
+}
+
+# Scope appliqué par SecurityMiddleware selon le préfixe de la route
+RATE_LIMIT_ROUTE_SCOPES = {
+    '/api/users/login/': 'auth',
+    '/api/users/register/': 'auth',
+    '/api/posts/media/upload/': 'media',
+}
+
 # JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -442,6 +475,85 @@ GUINEA_IP_RANGES = [
     # Add specific IP ranges for Guinea if available
 ]
 
+# Géolocalisation IP locale (base MaxMind chargée en mémoire, aucun appel réseau)
+GEOIP_DATABASE_PATH = config('GEOIP_DATABASE_PATH', default=str(BASE_DIR.parent / 'GeoLite2-Country.mmdb'))
+GEOIP_CACHE_SIZE = 10000  # Adresses IP récemment résolues gardées en mémoire
+GEOIP_ALLOW_UNKNOWN = True  # Autoriser les IP non localisables (réseaux privés, base absente)
+GEO_VERIFICATION_INTERVAL = 3600  # Au plus une vérification enregistrée par utilisateur et par heure
+
+# Diffusion des alertes en arrière-plan (voir notifications.jobs et notifications.push_backends)
+NOTIFICATION_QUEUE_WORKERS = 2
+NOTIFICATION_QUEUE_EAGER = False  # True : tâches exécutées dans la requête (tests, scripts)
+NOTIFICATION_FANOUT_BATCH_SIZE = 1000
+PUSH_NOTIFICATION_BACKEND = config('PUSH_NOTIFICATION_BACKEND', default='notifications.push_backends.LocalPushBackend')
+PUSH_MAX_RETRIES = 3
+PUSH_RETRY_BACKOFF = 0.5  # secondes, doublé à chaque tentative
+PUSH_MULTICAST_BATCH_SIZE = 500  # Tokens par envoi multicast (maximum FCM)
+
+# Traitement des médias en arrière-plan (voir posts.media_pipeline et posts.media_backends)
+MEDIA_PIPELINE_WORKERS = 2
+MEDIA_PIPELINE_EAGER = False  # True : étapes exécutées dans la requête (tests, scripts)
+MEDIA_PIPELINE_MAX_RETRIES = 3
+MEDIA_PIPELINE_RETRY_BACKOFF = 5  # secondes, doublé à chaque reprise
+MEDIA_PIPELINE_STAGE_TIMEOUT = 600  # secondes, au-delà (reprises comprises) un traitement est relancé par resume_media_pipeline
+MEDIA_MAX_VIDEO_DURATION = 60  # secondes
+LIVE_RECORDING_MAX_DURATION = 3600  # secondes, enregistrements de live
+# False : les médias traités sans backend de modération (statut ``unmoderated``) sont publiables
+MEDIA_REQUIRE_MODERATION = config('MEDIA_REQUIRE_MODERATION', default=False, cast=bool)
+MEDIA_PHASH_MAX_DISTANCE = 3  # Bits d'écart tolérés entre deux images considérées identiques (3 au plus)
+MEDIA_MODERATION_BACKEND = config(
+    'MEDIA_MODERATION_BACKEND',
+    default='posts.media_backends.VisionModerationBackend' if GOOGLE_CLOUD_VISION_API_KEY
+    else 'posts.media_backends.LocalModerationBackend'
+)
+MEDIA_CDN_BACKEND = config(
+    'MEDIA_CDN_BACKEND',
+    default='posts.media_backends.CloudinaryCDNBackend' if CLOUDINARY_STORAGE['CLOUD_NAME']
+    else 'posts.media_backends.LocalCDNBackend'
+)
+
+# Envoi des enregistrements de live par morceaux (voir posts.live_uploads)
+LIVE_UPLOAD_DIR = config('LIVE_UPLOAD_DIR', default=os.path.join(tempfile.gettempdir(), 'communiconnect_live_uploads'))  # Partagé entre les processus, hors du dépôt
+LIVE_UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB par morceau
+LIVE_UPLOAD_MAX_SIZE = 100 * 1024 * 1024  # 100MB par enregistrement
+LIVE_UPLOAD_SESSION_TTL = 24 * 60 * 60  # secondes d'inactivité avant abandon
+
+# Recherche plein texte (voir search.services et search.backends)
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='auto')  # auto, sqlite (FTS5), postgres (tsvector) ou python
+SEARCH_MAX_MATCHES = 1000  # Résultats au plus pour filtrer une liste (alertes, demandes d'aide...)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+TYPEAHEAD_DEFAULT_RESULTS = 10  # Complétions renvoyées par défaut (/api/search/autocomplete/)
+TYPEAHEAD_MAX_RESULTS = 25
+
+# Ingestion des événements d'analytics par lots (voir analytics.ingestion)
+ANALYTICS_QUEUE_WORKERS = 1
+ANALYTICS_QUEUE_EAGER = False  # True : vidages et analyses exécutés dans la requête (tests, scripts)
+ANALYTICS_BUFFER_FLUSH_SIZE = 500  # Événements en attente déclenchant un vidage immédiat
+ANALYTICS_BUFFER_FLUSH_INTERVAL = 10  # secondes, délai maximal avant vidage
+ANALYTICS_MAX_BATCH_EVENTS = 200  # Événements par requête track_event
+
+# Profilage des requêtes (voir monitoring.profiling et users.middleware.PerformanceMiddleware)
+REQUEST_PROFILING_ENABLED = True
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=DEBUG, cast=bool)  # Durées exposées au navigateur
+PROFILING_DUPLICATE_QUERY_THRESHOLD = 5  # Exécutions d'une même requête SQL signalées comme N+1
+PROFILING_MAX_ROUTES = 500  # Routes suivies au plus par processus
+
+# Registre de métriques agrégé entre workers (voir monitoring.metrics, /api/monitoring/prometheus/)
+METRICS_PUBLISH_INTERVAL = 15  # secondes entre deux publications de l'instantané d'un worker
+METRICS_WORKER_TTL = 300  # secondes sans publication avant qu'un worker ne soit oublié
+METRICS_SCRAPE_TOKEN = config('METRICS_SCRAPE_TOKEN', default='')  # En-tête Authorization: Metrics <jeton> du collecteur Prometheus
+
+# Séries temporelles des métriques (voir monitoring.timeseries, /api/monitoring/history/)
+TIMESERIES_DIR = config('TIMESERIES_DIR', default=os.path.join(tempfile.gettempdir(), 'communiconnect', 'timeseries'))  # Partagé entre les processus, hors du dépôt
+TIMESERIES_TIERS = ((60, 24 * 60), (300, 7 * 24 * 12), (3600, 90 * 24))  # (secondes par case, cases) : 24 h, 7 jours, 90 jours
+TIMESERIES_SAMPLE_INTERVAL = 60  # secondes entre deux échantillons des métriques d'un worker
+# Les tests écrivent leurs séries dans un répertoire temporaire propre à chaque lancement
+TEST_RUNNER = 'communiconnect.test_runner.IsolatedFilesTestRunner'
+
+# Statistiques du cache intelligent (voir performance.cache_stats)
+CACHE_STATS_FLUSH_INTERVAL = 60  # secondes entre deux écritures groupées dans CacheHitRate
+
 # Configuration des logs
 LOGGING = {
     'version': 1,
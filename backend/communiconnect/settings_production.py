@@ -188,9 +188,9 @@ REST_FRAMEWORK = {
     
     # Rate limiting strict pour la production
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'users.ratelimit.AnonRateLimitThrottle',
+        'users.ratelimit.UserRateLimitThrottle',
+        'users.ratelimit.ScopedRateLimitThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '50/hour',
@@ -105,6 +105,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.StaticFilesStorage'
 # Configuration des médias (sans Pillow)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+FILE_UPLOAD_HANDLERS = ['posts.uploads.StreamingUploadHandler']  # Fichiers reçus sur disque, par blocs
 
 # Configuration du cache pour Render (limitations gratuites)
 CACHES = {
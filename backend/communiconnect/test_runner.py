@@ -0,0 +1,31 @@
+"""
+Lanceur des tests.
+
+Le middleware de performance échantillonne les métriques à chaque requête :
+pendant les tests, les séries temporelles (``TIMESERIES_DIR``) et les envois
+de live (``LIVE_UPLOAD_DIR``) sont écrits dans un répertoire temporaire propre
+au lancement, supprimé à la fin.
+"""
+import os
+import shutil
+import tempfile
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedFilesTestRunner(DiscoverRunner):
+    """DiscoverRunner dont les fichiers d'exécution ne survivent pas aux tests"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.files_dir = tempfile.mkdtemp(prefix='communiconnect-tests-')
+        self.files_override = override_settings(
+            TIMESERIES_DIR=os.path.join(self.files_dir, 'timeseries'),
+            LIVE_UPLOAD_DIR=os.path.join(self.files_dir, 'live_uploads')
+        )
+        self.files_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.files_override.disable()
+        shutil.rmtree(self.files_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
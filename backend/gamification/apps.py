@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class GamificationConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'gamification'
+    verbose_name = 'Gamification des alertes'
+
+    def ready(self):
+        import gamification.signals
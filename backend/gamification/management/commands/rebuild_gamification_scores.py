@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from gamification.scoring import ScoringEngine
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs, réalisations et scores de gamification à partir des alertes et offres d'aide"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Lignes écrites par lot")
+
+    def handle(self, *args, **options):
+        count = ScoringEngine.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} utilisateurs recalculés')
+        )
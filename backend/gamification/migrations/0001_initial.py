@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.IntegerField(choices=[(1, 'Débutant'), (2, 'Actif'), (3, 'Fiable'), (4, 'Expert'), (5, 'Maître'), (6, 'Légende')], default=1)),
+                ('points', models.IntegerField(default=0)),
+                ('experience', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('alerts_count', models.IntegerField(default=0)),
+                ('confirmed_alerts', models.IntegerField(default=0)),
+                ('false_alarms', models.IntegerField(default=0)),
+                ('resolved_alerts', models.IntegerField(default=0)),
+                ('urgent_alerts', models.IntegerField(default=0)),
+                ('urgent_confirmed_alerts', models.IntegerField(default=0)),
+                ('reliability_total', models.FloatField(default=0.0)),
+                ('neighborhood_alerts', models.JSONField(blank=True, default=dict)),
+                ('last_alert_at', models.DateTimeField(blank=True, null=True)),
+                ('help_offers_count', models.IntegerField(default=0)),
+                ('emergency_help_count', models.IntegerField(default=0)),
+                ('achievements', models.JSONField(blank=True, default=list)),
+                ('achievement_points', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alert_level', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Niveau d'Utilisateur",
+                'verbose_name_plural': "Niveaux d'Utilisateurs",
+                'indexes': [models.Index(fields=['-points'], name='gamification_points_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('achievement_type', models.CharField(choices=[('first_alert', 'Première Alerte'), ('reliable_user', 'Utilisateur Fiable'), ('helpful_user', 'Utilisateur Serviable'), ('urgent_responder', "Répondeur d'Urgence"), ('community_guardian', 'Gardien de la Communauté'), ('verified_expert', 'Expert Vérifié'), ('quick_responder', 'Répondeur Rapide'), ('neighborhood_watch', 'Veilleur de Quartier'), ('emergency_hero', "Héros d'Urgence"), ('community_leader', 'Leader Communautaire')], max_length=20)),
+                ('earned_at', models.DateTimeField(auto_now_add=True)),
+                ('points_earned', models.IntegerField(default=0)),
+                ('description', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_achievements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Réalisation d'Alerte",
+                'verbose_name_plural': "Réalisations d'Alertes",
+                'ordering': ['-earned_at'],
+                'unique_together': {('user', 'achievement_type')},
+            },
+        ),
+    ]
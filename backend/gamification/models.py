@@ -0,0 +1,93 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class AlertAchievement(models.Model):
+    """Réalisations pour les alertes communautaires"""
+
+    ACHIEVEMENT_TYPES = [
+        ('first_alert', 'Première Alerte'),
+        ('reliable_user', 'Utilisateur Fiable'),
+        ('helpful_user', 'Utilisateur Serviable'),
+        ('urgent_responder', 'Répondeur d\'Urgence'),
+        ('community_guardian', 'Gardien de la Communauté'),
+        ('verified_expert', 'Expert Vérifié'),
+        ('quick_responder', 'Répondeur Rapide'),
+        ('neighborhood_watch', 'Veilleur de Quartier'),
+        ('emergency_hero', 'Héros d\'Urgence'),
+        ('community_leader', 'Leader Communautaire'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_achievements')
+    achievement_type = models.CharField(max_length=20, choices=ACHIEVEMENT_TYPES)
+    earned_at = models.DateTimeField(auto_now_add=True)
+    points_earned = models.IntegerField(default=0)
+    description = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ['user', 'achievement_type']
+        ordering = ['-earned_at']
+        verbose_name = "Réalisation d'Alerte"
+        verbose_name_plural = "Réalisations d'Alertes"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_achievement_type_display()}"
+
+
+class UserLevel(models.Model):
+    """
+    Niveau, score et compteurs d'un utilisateur, tenus à jour à chaque
+    événement (gamification.scoring) : le score se lit sans agrégat et le
+    classement parcourt l'index sur ``points``
+    """
+
+    LEVELS = [
+        (1, 'Débutant'),
+        (2, 'Actif'),
+        (3, 'Fiable'),
+        (4, 'Expert'),
+        (5, 'Maître'),
+        (6, 'Légende'),
+    ]
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='alert_level')
+    level = models.IntegerField(choices=LEVELS, default=1)
+    points = models.IntegerField(default=0)
+    experience = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    # Compteurs des alertes écrites
+    alerts_count = models.IntegerField(default=0)
+    confirmed_alerts = models.IntegerField(default=0)
+    false_alarms = models.IntegerField(default=0)
+    resolved_alerts = models.IntegerField(default=0)
+    urgent_alerts = models.IntegerField(default=0)
+    urgent_confirmed_alerts = models.IntegerField(default=0)
+    reliability_total = models.FloatField(default=0.0)  # Somme des scores de fiabilité
+    neighborhood_alerts = models.JSONField(default=dict, blank=True)  # {quartier: nombre d'alertes}
+    last_alert_at = models.DateTimeField(null=True, blank=True)
+
+    # Compteurs des offres d'aide
+    help_offers_count = models.IntegerField(default=0)
+    emergency_help_count = models.IntegerField(default=0)
+
+    # Réalisations obtenues (types) et leurs points
+    achievements = models.JSONField(default=list, blank=True)
+    achievement_points = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-points'], name='gamification_points_idx'),
+        ]
+        verbose_name = "Niveau d'Utilisateur"
+        verbose_name_plural = "Niveaux d'Utilisateurs"
+
+    def __str__(self):
+        return f"{self.user.username} - Niveau {self.level} ({self.points} points)"
+
+    @property
+    def reliability_score(self):
+        """Fiabilité moyenne des alertes écrites"""
+        return self.reliability_total / self.alerts_count if self.alerts_count else 0.0
@@ -0,0 +1,389 @@
+"""
+Calcul incrémental des scores, réalisations et niveaux des alertes.
+
+Chaque alerte apporte à son auteur une contribution fixe (une alerte, son
+statut, sa catégorie, son quartier, sa fiabilité) ; chaque offre d'aide une
+contribution à l'aidant. À la création, à la modification ou à la suppression,
+``ScoringEngine`` applique la différence entre l'ancienne et la nouvelle
+contribution aux compteurs de ``UserLevel``, puis en déduit réalisations,
+score et niveau sans relire les alertes.
+
+Le score est stocké dans la colonne indexée ``UserLevel.points`` : le
+classement lit les ``limit`` premières lignes de l'index. ``rebuild``
+recalcule tous les compteurs (commande rebuild_gamification_scores).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from notifications.models import CommunityAlert, HelpOffer
+from .models import AlertAchievement, UserLevel
+
+logger = logging.getLogger(__name__)
+
+
+URGENT_CATEGORIES = ('fire', 'medical', 'security', 'gas_leak')
+QUICK_RESPONSE_SECONDS = 300
+
+ACHIEVEMENT_CONFIGS = {
+    'first_alert': {
+        'points': 50,
+        'description': 'Vous avez créé votre première alerte !'
+    },
+    'reliable_user': {
+        'points': 100,
+        'description': '80% de vos alertes ont été confirmées'
+    },
+    'helpful_user': {
+        'points': 75,
+        'description': 'Vous avez offert de l\'aide 5 fois'
+    },
+    'urgent_responder': {
+        'points': 150,
+        'description': 'Vous avez répondu à 3 alertes urgentes'
+    },
+    'community_guardian': {
+        'points': 200,
+        'description': 'Vous avez créé 20 alertes confirmées'
+    },
+    'verified_expert': {
+        'points': 300,
+        'description': 'Vous êtes un expert vérifié avec 95% de fiabilité'
+    },
+    'quick_responder': {
+        'points': 125,
+        'description': 'Vous avez répondu à une alerte en moins de 5 minutes'
+    },
+    'neighborhood_watch': {
+        'points': 175,
+        'description': 'Vous surveillez activement votre quartier'
+    },
+    'emergency_hero': {
+        'points': 250,
+        'description': 'Vous avez aidé lors de 10 situations d\'urgence'
+    },
+    'community_leader': {
+        'points': 500,
+        'description': 'Vous êtes un leader reconnu de la communauté'
+    }
+}
+
+# Conditions d'obtention, évaluées sur les compteurs (``quick_responder`` est
+# attribuée par l'offre d'aide elle-même, ``community_leader`` sur le score)
+ACHIEVEMENT_RULES = {
+    'first_alert': lambda level: level.alerts_count >= 1,
+    'reliable_user': lambda level: level.alerts_count >= 10 and level.confirmed_alerts >= 8,
+    'helpful_user': lambda level: level.help_offers_count >= 5,
+    'urgent_responder': lambda level: level.urgent_confirmed_alerts >= 3,
+    'community_guardian': lambda level: level.confirmed_alerts >= 20,
+    'verified_expert': lambda level: (
+        level.alerts_count >= 50 and level.confirmed_alerts >= 47 and level.false_alarms <= 2
+    ),
+    'neighborhood_watch': lambda level: (
+        sum(1 for count in level.neighborhood_alerts.values() if count >= 5) >= 3
+    ),
+    'emergency_hero': lambda level: level.emergency_help_count >= 10,
+}
+LEADER_SCORE = 1000
+
+# (score minimum, niveau), du plus haut au plus bas
+LEVEL_THRESHOLDS = ((1000, 6), (500, 5), (250, 4), (100, 3), (50, 2))
+
+ALERT_COUNTERS = (
+    'alerts_count', 'confirmed_alerts', 'false_alarms', 'resolved_alerts',
+    'urgent_alerts', 'urgent_confirmed_alerts', 'reliability_total',
+)
+# Champs de CommunityAlert dont dépend la contribution d'une alerte
+ALERT_FIELDS = ('author_id', 'status', 'category', 'neighborhood', 'reliability_score')
+
+
+class ScoringEngine:
+    """Mise à jour des compteurs, réalisations et scores à partir des événements"""
+
+    @staticmethod
+    def alert_state(alert):
+        """Valeurs de ``ALERT_FIELDS`` d'une alerte"""
+        return tuple(getattr(alert, field) for field in ALERT_FIELDS)
+
+    @staticmethod
+    def alert_contribution(state):
+        """Compteurs qu'une alerte dans l'état ``state`` ajoute à son auteur"""
+        author_id, status, category, neighborhood, reliability_score = state
+        urgent = category in URGENT_CATEGORIES
+        counters = {
+            'alerts_count': 1,
+            'confirmed_alerts': int(status == 'confirmed'),
+            'false_alarms': int(status == 'false_alarm'),
+            'resolved_alerts': int(status == 'resolved'),
+            'urgent_alerts': int(urgent),
+            'urgent_confirmed_alerts': int(urgent and status == 'confirmed'),
+            'reliability_total': float(reliability_score),
+        }
+        return counters, ({neighborhood: 1} if neighborhood else {})
+
+    @staticmethod
+    def compute_score(level):
+        """Points des réalisations, bonus de fiabilité, d'aide et de confirmation, malus des fausses alertes"""
+        score = level.achievement_points
+        if level.alerts_count:
+            score += int(level.reliability_score * 0.5)
+        score += level.help_offers_count * 10
+        score += level.confirmed_alerts * 5
+        return max(0, score - level.false_alarms * 20)
+
+    @staticmethod
+    def level_for(score):
+        for minimum, level in LEVEL_THRESHOLDS:
+            if score >= minimum:
+                return level
+        return 1
+
+    @staticmethod
+    def update_score(level, quick_response=False):
+        """
+        Attribue les réalisations désormais remplies et recalcule score et
+        niveau de ``level`` (en mémoire) ; renvoie les types obtenus
+        """
+        earned = [
+            achievement_type for achievement_type, rule in ACHIEVEMENT_RULES.items()
+            if achievement_type not in level.achievements and rule(level)
+        ]
+        if quick_response and 'quick_responder' not in level.achievements:
+            earned.append('quick_responder')
+        ScoringEngine._grant(level, earned)
+
+        level.points = ScoringEngine.compute_score(level)
+        if level.points >= LEADER_SCORE and 'community_leader' not in level.achievements:
+            ScoringEngine._grant(level, ['community_leader'])
+            earned.append('community_leader')
+            level.points = ScoringEngine.compute_score(level)
+        level.level = ScoringEngine.level_for(level.points)
+        return earned
+
+    @staticmethod
+    def _grant(level, achievement_types):
+        for achievement_type in achievement_types:
+            level.achievements = level.achievements + [achievement_type]
+            level.achievement_points += ACHIEVEMENT_CONFIGS[achievement_type]['points']
+
+    @staticmethod
+    def _create_achievements(user_id, achievement_types):
+        achievements = AlertAchievement.objects.bulk_create([
+            AlertAchievement(
+                user_id=user_id,
+                achievement_type=achievement_type,
+                points_earned=ACHIEVEMENT_CONFIGS[achievement_type]['points'],
+                description=ACHIEVEMENT_CONFIGS[achievement_type]['description']
+            )
+            for achievement_type in achievement_types
+        ], ignore_conflicts=True)
+        for achievement_type in achievement_types:
+            logger.info(f"Réalisation '{achievement_type}' attribuée à l'utilisateur {user_id}")
+        return achievements
+
+    @staticmethod
+    def apply(user_id, counters=None, neighborhoods=None, active_at=None, quick_response=False, create=True):
+        """
+        Ajoute des écarts aux compteurs d'un utilisateur et met à jour ses
+        réalisations, son score et son niveau. Sans ``create``, un utilisateur
+        sans ligne est ignoré (suppression en cascade d'un compte).
+        Renvoie les réalisations obtenues.
+        """
+        with transaction.atomic():
+            if create:
+                level, _ = UserLevel.objects.select_for_update().get_or_create(user_id=user_id)
+            else:
+                level = UserLevel.objects.select_for_update().filter(user_id=user_id).first()
+                if level is None:
+                    return []
+
+            for field, delta in (counters or {}).items():
+                setattr(level, field, getattr(level, field) + delta)
+            if level.alerts_count <= 0:
+                level.reliability_total = 0.0
+            if neighborhoods:
+                counts = dict(level.neighborhood_alerts)
+                for name, delta in neighborhoods.items():
+                    counts[name] = counts.get(name, 0) + delta
+                    if counts[name] <= 0:
+                        del counts[name]
+                level.neighborhood_alerts = counts
+            if active_at and (level.last_alert_at is None or active_at > level.last_alert_at):
+                level.last_alert_at = active_at
+
+            earned = ScoringEngine.update_score(level, quick_response)
+            level.save()
+            return ScoringEngine._create_achievements(user_id, earned) if earned else []
+
+    @staticmethod
+    def alert_saved(alert, created, previous_state=None):
+        """Applique la différence de contribution d'une alerte créée ou modifiée"""
+        state = ScoringEngine.alert_state(alert)
+        if not created and state == previous_state:
+            return
+
+        counters = defaultdict(lambda: defaultdict(float))
+        neighborhoods = defaultdict(lambda: defaultdict(int))
+        for sign, current in ((-1, previous_state), (1, state)):
+            if current is None:
+                continue
+            alert_counters, alert_neighborhoods = ScoringEngine.alert_contribution(current)
+            for field, value in alert_counters.items():
+                counters[current[0]][field] += sign * value
+            for name, value in alert_neighborhoods.items():
+                neighborhoods[current[0]][name] += sign * value
+
+        for user_id in counters:
+            ScoringEngine.apply(
+                user_id,
+                counters={
+                    field: value if field == 'reliability_total' else int(value)
+                    for field, value in counters[user_id].items() if value
+                },
+                neighborhoods={name: value for name, value in neighborhoods[user_id].items() if value},
+                active_at=alert.created_at if created else None
+            )
+
+        # Alerte devenue (ou plus) urgente : les aides déjà offertes changent de nature
+        was_urgent = previous_state is not None and previous_state[2] in URGENT_CATEGORIES
+        if not created and was_urgent != (alert.category in URGENT_CATEGORIES):
+            delta = -1 if was_urgent else 1
+            for helper_id in HelpOffer.objects.filter(alert=alert).values_list('helper_id', flat=True):
+                ScoringEngine.apply(helper_id, counters={'emergency_help_count': delta})
+
+    @staticmethod
+    def alert_deleted(alert):
+        counters, neighborhoods = ScoringEngine.alert_contribution(ScoringEngine.alert_state(alert))
+        ScoringEngine.apply(
+            alert.author_id,
+            counters={field: -value for field, value in counters.items()},
+            neighborhoods={name: -value for name, value in neighborhoods.items()},
+            create=False
+        )
+
+    @staticmethod
+    def help_offer_created(offer):
+        alert = offer.alert
+        quick_response = (
+            offer.created_at is not None and alert.created_at is not None
+            and (offer.created_at - alert.created_at).total_seconds() < QUICK_RESPONSE_SECONDS
+        )
+        ScoringEngine.apply(
+            offer.helper_id,
+            counters={
+                'help_offers_count': 1,
+                'emergency_help_count': int(alert.category in URGENT_CATEGORIES),
+            },
+            quick_response=quick_response
+        )
+
+    @staticmethod
+    def help_offer_deleted(offer):
+        # L'alerte peut être en cours de suppression (cascade) : lecture sans objet lié
+        category = CommunityAlert.objects.filter(pk=offer.alert_id).values_list('category', flat=True).first()
+        ScoringEngine.apply(
+            offer.helper_id,
+            counters={
+                'help_offers_count': -1,
+                'emergency_help_count': -int(category in URGENT_CATEGORIES),
+            },
+            create=False
+        )
+
+    @staticmethod
+    def refresh(user_id):
+        """Réévalue réalisations et score d'un utilisateur sans changer ses compteurs"""
+        return ScoringEngine.apply(user_id)
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """Recalcule les compteurs de tous les utilisateurs à partir des alertes et offres d'aide"""
+        levels = {}
+
+        def get_level(user_id):
+            level = levels.get(user_id)
+            if level is None:
+                level = levels[user_id] = UserLevel(user_id=user_id)
+            for field in ALERT_COUNTERS + ('help_offers_count', 'emergency_help_count', 'achievement_points'):
+                setattr(level, field, 0)
+            level.reliability_total = 0.0
+            level.neighborhood_alerts = {}
+            level.last_alert_at = None
+            level.achievements = []
+            return level
+
+        existing = {level.user_id: level for level in UserLevel.objects.all()}
+        for user_id, level in existing.items():
+            levels[user_id] = level
+            get_level(user_id)
+
+        confirmed = Q(status='confirmed')
+        urgent = Q(category__in=URGENT_CATEGORIES)
+        alerts = CommunityAlert.objects.order_by().values('author_id').annotate(
+            total=Count('id'),
+            confirmed=Count('id', filter=confirmed),
+            false_alarms=Count('id', filter=Q(status='false_alarm')),
+            resolved=Count('id', filter=Q(status='resolved')),
+            urgent=Count('id', filter=urgent),
+            urgent_confirmed=Count('id', filter=urgent & confirmed),
+            reliability=Sum('reliability_score'),
+            last=Max('created_at'),
+        )
+        for row in alerts:
+            level = levels.get(row['author_id']) or get_level(row['author_id'])
+            level.alerts_count = row['total']
+            level.confirmed_alerts = row['confirmed']
+            level.false_alarms = row['false_alarms']
+            level.resolved_alerts = row['resolved']
+            level.urgent_alerts = row['urgent']
+            level.urgent_confirmed_alerts = row['urgent_confirmed']
+            level.reliability_total = row['reliability'] or 0.0
+            level.last_alert_at = row['last']
+
+        neighborhoods = CommunityAlert.objects.exclude(neighborhood='').order_by().values(
+            'author_id', 'neighborhood'
+        ).annotate(total=Count('id'))
+        for row in neighborhoods:
+            levels[row['author_id']].neighborhood_alerts[row['neighborhood']] = row['total']
+
+        offers = HelpOffer.objects.order_by().values('helper_id').annotate(
+            total=Count('id'),
+            emergency=Count('id', filter=Q(alert__category__in=URGENT_CATEGORIES)),
+        )
+        for row in offers:
+            level = levels.get(row['helper_id']) or get_level(row['helper_id'])
+            level.help_offers_count = row['total']
+            level.emergency_help_count = row['emergency']
+
+        quick_responders = set(HelpOffer.objects.filter(
+            created_at__lt=F('alert__created_at') + timedelta(seconds=QUICK_RESPONSE_SECONDS)
+        ).values_list('helper_id', flat=True).distinct())
+
+        # Les réalisations déjà obtenues sont conservées
+        for user_id, achievement_type in AlertAchievement.objects.values_list('user_id', 'achievement_type'):
+            level = levels.get(user_id) or get_level(user_id)
+            if achievement_type in ACHIEVEMENT_CONFIGS and achievement_type not in level.achievements:
+                ScoringEngine._grant(level, [achievement_type])
+
+        fields = [
+            'level', 'points', 'achievements', 'achievement_points', 'neighborhood_alerts', 'last_alert_at',
+            'help_offers_count', 'emergency_help_count',
+        ] + list(ALERT_COUNTERS)
+        with transaction.atomic():
+            new_achievements = []
+            for user_id, level in levels.items():
+                for achievement_type in ScoringEngine.update_score(level, user_id in quick_responders):
+                    new_achievements.append((user_id, achievement_type))
+            UserLevel.objects.bulk_update(
+                [level for level in levels.values() if level.pk], fields, batch_size=batch_size
+            )
+            UserLevel.objects.bulk_create(
+                [level for level in levels.values() if not level.pk], batch_size=batch_size
+            )
+            by_user = defaultdict(list)
+            for user_id, achievement_type in new_achievements:
+                by_user[user_id].append(achievement_type)
+            for user_id, achievement_types in by_user.items():
+                ScoringEngine._create_achievements(user_id, achievement_types)
+        return len(levels)
@@ -0,0 +1,62 @@
+import logging
+from django.db.models.signals import post_delete, post_save, pre_save
+from notifications.models import CommunityAlert, HelpOffer
+from .scoring import ALERT_FIELDS, ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+# Champs enregistrés dont dépend le score (update_fields)
+TRACKED_ALERT_FIELDS = {'author', 'author_id', 'status', 'category', 'neighborhood', 'reliability_score'}
+
+
+def _is_tracked(update_fields):
+    return not update_fields or bool(TRACKED_ALERT_FIELDS & set(update_fields))
+
+
+def remember_alert_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mémorise l'état enregistré de l'alerte pour calculer l'écart de contribution"""
+    if raw or instance.pk is None or not _is_tracked(update_fields):
+        return
+    instance._gamification_state = CommunityAlert.objects.filter(pk=instance.pk).values_list(
+        *ALERT_FIELDS
+    ).first()
+
+
+def alert_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    previous_state = instance.__dict__.pop('_gamification_state', None)
+    if raw or not _is_tracked(update_fields):
+        return
+    try:
+        ScoringEngine.alert_saved(instance, created or previous_state is None, previous_state)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour du score (alerte {instance.pk}): {e}")
+
+
+def alert_deleted(sender, instance, **kwargs):
+    try:
+        ScoringEngine.alert_deleted(instance)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour du score (suppression alerte {instance.pk}): {e}")
+
+
+def help_offer_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    try:
+        ScoringEngine.help_offer_created(instance)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour du score (offre d'aide {instance.pk}): {e}")
+
+
+def help_offer_deleted(sender, instance, **kwargs):
+    try:
+        ScoringEngine.help_offer_deleted(instance)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour du score (suppression offre d'aide {instance.pk}): {e}")
+
+
+pre_save.connect(remember_alert_state, sender=CommunityAlert, dispatch_uid='gamification_alert_state')
+post_save.connect(alert_saved, sender=CommunityAlert, dispatch_uid='gamification_alert_saved')
+post_delete.connect(alert_deleted, sender=CommunityAlert, dispatch_uid='gamification_alert_deleted')
+post_save.connect(help_offer_saved, sender=HelpOffer, dispatch_uid='gamification_help_offer_saved')
+post_delete.connect(help_offer_deleted, sender=HelpOffer, dispatch_uid='gamification_help_offer_deleted')
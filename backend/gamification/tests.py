@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+import io
+
+from .alert_gamification import gamification_service
+from .models import AlertAchievement, UserLevel
+from .scoring import ScoringEngine
+from notifications.models import CommunityAlert, HelpOffer
+
+User = get_user_model()
+
+
+class ScoringEngineTest(TestCase):
+    """Tests pour le calcul incrémental des scores et du classement"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='auteur', email='auteur@test.com', password='pass123')
+        self.helper = User.objects.create_user(username='aidant', email='aidant@test.com', password='pass123')
+
+    def create_alert(self, **kwargs):
+        values = {'title': 'Incendie', 'description': 'Feu au marché', 'category': 'fire', 'author': self.author}
+        values.update(kwargs)
+        return CommunityAlert.objects.create(**values)
+
+    def snapshot(self, user):
+        level = UserLevel.objects.get(user=user)
+        fields = [
+            'points', 'level', 'alerts_count', 'confirmed_alerts', 'false_alarms', 'urgent_confirmed_alerts',
+            'help_offers_count', 'emergency_help_count', 'neighborhood_alerts', 'achievement_points',
+        ]
+        return {field: getattr(level, field) for field in fields} | {
+            'reliability_total': round(level.reliability_total, 6),
+            'achievements': sorted(level.achievements),
+        }
+
+    def test_alert_events_update_counters_and_score(self):
+        """Création et changement de statut mettent à jour compteurs, réalisations et score"""
+        alert = self.create_alert(neighborhood='Kaloum')
+        level = UserLevel.objects.get(user=self.author)
+        self.assertEqual(level.alerts_count, 1)
+        self.assertEqual(level.achievements, ['first_alert'])
+        # 50 (première alerte) + 100 * 0.5 (fiabilité)
+        self.assertEqual(level.points, 100)
+        self.assertEqual(level.level, 3)
+        self.assertTrue(AlertAchievement.objects.filter(user=self.author, achievement_type='first_alert').exists())
+
+        alert.status = 'confirmed'
+        alert.save()
+        level.refresh_from_db()
+        self.assertEqual((level.confirmed_alerts, level.urgent_confirmed_alerts), (1, 1))
+        self.assertEqual(level.points, 105)
+
+        alert.status = 'false_alarm'
+        alert.reliability_score = 40.0
+        alert.save()
+        level.refresh_from_db()
+        self.assertEqual((level.confirmed_alerts, level.false_alarms), (0, 1))
+        self.assertEqual(level.points, 50 + 20 - 20)
+
+        alert.delete()
+        level.refresh_from_db()
+        self.assertEqual((level.alerts_count, level.false_alarms, level.neighborhood_alerts), (0, 0, {}))
+        self.assertEqual(level.points, 50)
+
+    def test_help_offers_and_achievements(self):
+        """Les offres d'aide comptent pour l'aidant, réponse rapide comprise"""
+        alerts = [self.create_alert(title=f'Alerte {index}') for index in range(5)]
+        for alert in alerts:
+            HelpOffer.objects.create(alert=alert, helper=self.helper, offer_type='physical_help', description='Aide')
+
+        level = UserLevel.objects.get(user=self.helper)
+        self.assertEqual((level.help_offers_count, level.emergency_help_count), (5, 5))
+        self.assertEqual(sorted(level.achievements), ['helpful_user', 'quick_responder'])
+        self.assertEqual(level.points, 75 + 125 + 50)
+
+        HelpOffer.objects.filter(alert=alerts[0]).delete()
+        alerts[1].delete()
+        level.refresh_from_db()
+        self.assertEqual((level.help_offers_count, level.emergency_help_count), (3, 3))
+        # Les réalisations obtenues restent acquises
+        self.assertEqual(level.points, 75 + 125 + 30)
+
+    def test_leaderboard_reads_indexed_scores(self):
+        """Le classement lit les scores stockés, en un nombre fixe de requêtes"""
+        for index in range(3):
+            self.create_alert(title=f'Alerte {index}', status='confirmed')
+        self.create_alert(author=self.helper, status='false_alarm')
+
+        with self.assertNumQueries(1):
+            leaderboard = gamification_service.get_leaderboard(limit=5)
+        self.assertEqual([entry['username'] for entry in leaderboard], ['auteur', 'aidant'])
+        self.assertEqual(leaderboard[0]['score'], gamification_service.calculate_user_score(self.author))
+        self.assertEqual(leaderboard[0]['alerts_count'], 3)
+        self.assertEqual(len(gamification_service.get_leaderboard(limit=1)), 1)
+
+    def test_rebuild_matches_incremental_counters(self):
+        """La reconstruction retrouve les compteurs tenus incrémentalement"""
+        alert = self.create_alert(neighborhood='Dixinn', status='confirmed')
+        self.create_alert(category='noise', neighborhood='Dixinn')
+        HelpOffer.objects.create(alert=alert, helper=self.helper, offer_type='transport', description='Voiture')
+        expected = {user.pk: self.snapshot(user) for user in (self.author, self.helper)}
+
+        UserLevel.objects.update(points=0, alerts_count=0, help_offers_count=0, reliability_total=0.0)
+        output = io.StringIO()
+        call_command('rebuild_gamification_scores', stdout=output)
+
+        self.assertIn('2 utilisateurs', output.getvalue())
+        self.assertEqual({user.pk: self.snapshot(user) for user in (self.author, self.helper)}, expected)
+        self.assertEqual(AlertAchievement.objects.filter(user=self.helper).count(), 1)
@@ -0,0 +1,348 @@
+"""
+Index géographique sans GDAL pour les recherches de proximité.
+
+Chaque ligne géolocalisée porte un geohash (colonne ``geohash`` indexée). Une
+recherche dans un rayon se déroule en trois temps :
+
+1. couverture du cercle par un petit nombre de cellules geohash, à la
+   précision la plus fine qui reste sous ``MAX_COVER_CELLS`` ; la boîte
+   englobante tient compte du rétrécissement des longitudes avec la latitude ;
+2. une seule requête SQL ne lisant que (pk, latitude, longitude) des lignes
+   dont le geohash commence par l'une de ces cellules (filtres par plage,
+   servis par l'index B-tree quel que soit le moteur) et situées dans la
+   boîte englobante ;
+3. distances de Haversine calculées d'un bloc avec NumPy (boucle Python en
+   repli), filtrage par rayon puis sélection des k plus proches par
+   ``argpartition`` ; seuls les objets retenus sont chargés.
+
+Une recherche d'objets sans limite (``nearby``) calcule et filtre la distance
+dans la même requête SQL : seuls les objets du cercle sont chargés.
+
+Le geohash est recalculé par ``save()`` et par ``GeohashQuerySet``
+(``bulk_create``, ``bulk_update``, ``update``). Les lignes écrites autrement
+(SQL brut, import direct) se rattrapent avec la commande
+``rebuild_geohashes``.
+"""
+import heapq
+import logging
+import math
+from operator import itemgetter
+from django.db import models, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.debug("NumPy non installé. Les distances seront calculées en Python pur.")
+
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # Cellules d'environ 5 m de côté
+MAX_COVER_CELLS = 32
+
+# Caractère suivant 'z' : borne supérieure exclusive d'un préfixe geohash
+_PREFIX_END = '{'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode un point en geohash de la précision demandée"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude = float(latitude)
+    longitude = float(longitude)
+
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def geohash_for(latitude, longitude):
+    """Geohash d'une ligne, vide si ses coordonnées sont incomplètes"""
+    if latitude is None or longitude is None:
+        return ''
+    return encode_geohash(latitude, longitude)
+
+
+def cell_size(precision):
+    """Dimensions (degrés de latitude, degrés de longitude) d'une cellule"""
+    bits = 5 * precision
+    return 180.0 / (1 << (bits // 2)), 360.0 / (1 << ((bits + 1) // 2))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Boîte (lat_min, lat_max, lon_min, lon_max) contenant le cercle.
+    L'écart de longitude est élargi selon la latitude (1° de longitude ne
+    fait que 111 km × cos(latitude)).
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    angular = radius_km / EARTH_RADIUS_KM
+    delta_lat = math.degrees(angular)
+
+    ratio = math.sin(angular) / max(math.cos(math.radians(latitude)), 1e-12)
+    if ratio >= 1 or latitude + delta_lat >= 90 or latitude - delta_lat <= -90:
+        delta_lon = 180.0
+    else:
+        delta_lon = math.degrees(math.asin(ratio))
+
+    return (
+        max(-90.0, latitude - delta_lat),
+        min(90.0, latitude + delta_lat),
+        longitude - delta_lon,
+        longitude + delta_lon,
+    )
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=MAX_COVER_CELLS, max_precision=GEOHASH_PRECISION):
+    """Cellules geohash couvrant le cercle, à la précision la plus fine possible"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    for precision in range(max_precision, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / lat_step) + 1
+        cols = math.ceil((max_lon - min_lon) / lon_step) + 1
+        if rows * cols <= max_cells:
+            break
+
+    # Points d'échantillonnage espacés d'au plus une cellule : chaque cellule
+    # qui touche la boîte en contient au moins un
+    cells = set()
+    for row in range(rows + 1):
+        lat = min(min_lat + row * lat_step, max_lat)
+        for col in range(cols + 1):
+            lon = min(min_lon + col * lon_step, max_lon)
+            cells.add(encode_geohash(lat, (lon + 180.0) % 360.0 - 180.0, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance en km entre deux points (formule de Haversine)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """Distance de Haversine en km calculée par la base (fonctions SQL de Django, tous moteurs)"""
+    lat1 = math.radians(float(latitude))
+    lon1 = math.radians(float(longitude))
+    lat2 = Radians(Cast(lat_field, FloatField()))
+    lon2 = Radians(Cast(lon_field, FloatField()))
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2)
+        + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lon2 - Value(lon1)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def haversine_many(latitude, longitude, latitudes, longitudes):
+    """Distances en km d'un point à une série de points, calculées d'un bloc"""
+    if not NUMPY_AVAILABLE:
+        return [haversine_km(latitude, longitude, lat, lon) for lat, lon in zip(latitudes, longitudes)]
+
+    lat = math.radians(float(latitude))
+    lon = math.radians(float(longitude))
+    lats = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lons = np.radians(np.asarray(longitudes, dtype=np.float64))
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def rank_by_distance(candidates, latitude, longitude, radius_km, limit=None):
+    """
+    Filtre des candidats (pk, latitude, longitude) par rayon et les trie par
+    distance. Retourne au plus ``limit`` couples (pk, distance_km).
+    """
+    if not candidates or (limit is not None and limit <= 0):
+        return []
+
+    pks, latitudes, longitudes = zip(*candidates)
+    distances = haversine_many(latitude, longitude, latitudes, longitudes)
+
+    if not NUMPY_AVAILABLE:
+        matches = [(pk, distance) for pk, distance in zip(pks, distances) if distance <= radius_km]
+        if limit is not None:
+            return heapq.nsmallest(limit, matches, key=itemgetter(1))
+        return sorted(matches, key=itemgetter(1))
+
+    inside = np.flatnonzero(distances <= radius_km)
+    if limit is not None and len(inside) > limit:
+        # Sélection partielle en O(n) avant le tri des seuls k retenus
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    order = inside[np.argsort(distances[inside], kind='stable')]
+    return [(pks[i], float(distances[i])) for i in order]
+
+
+class GeoIndexService:
+    """Recherches de proximité sur les modèles portant un geohash"""
+
+    @staticmethod
+    def cell_filter(latitude, longitude, radius_km, field='geohash'):
+        """Filtre Q restreignant un queryset aux cellules couvrant le cercle"""
+        query = Q()
+        for cell in covering_cells(latitude, longitude, radius_km):
+            query |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + _PREFIX_END})
+        return query
+
+    @staticmethod
+    def box_filter(latitude, longitude, radius_km, lat_field='latitude', lon_field='longitude'):
+        """
+        Filtre Q sur la boîte englobante exacte, qui écarte les coins des
+        cellules couvrantes. Les longitudes ne sont pas filtrées si la boîte
+        traverse l'antiméridien.
+        """
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        query = Q(**{f'{lat_field}__gte': min_lat, f'{lat_field}__lte': max_lat})
+        if min_lon >= -180.0 and max_lon <= 180.0:
+            query &= Q(**{f'{lon_field}__gte': min_lon, f'{lon_field}__lte': max_lon})
+        return query
+
+    @staticmethod
+    def within(queryset, latitude, longitude, radius_km,
+               lat_field='latitude', lon_field='longitude', geohash_field='geohash'):
+        """Queryset restreint aux cellules couvrantes et à la boîte englobante"""
+        return queryset.filter(
+            GeoIndexService.cell_filter(latitude, longitude, radius_km, geohash_field),
+            GeoIndexService.box_filter(latitude, longitude, radius_km, lat_field, lon_field)
+        )
+
+    @staticmethod
+    def nearest(queryset, latitude, longitude, radius_km, limit=None,
+                lat_field='latitude', lon_field='longitude', geohash_field='geohash'):
+        """Couples (pk, distance_km) des lignes dans le rayon, des plus proches aux plus lointaines"""
+        candidates = list(
+            GeoIndexService.within(
+                queryset, latitude, longitude, radius_km, lat_field, lon_field, geohash_field
+            ).values_list('pk', lat_field, lon_field)
+        )
+        return rank_by_distance(candidates, latitude, longitude, radius_km, limit)
+
+    @staticmethod
+    def nearby(queryset, latitude, longitude, radius_km, limit=None,
+               lat_field='latitude', lon_field='longitude', geohash_field='geohash'):
+        """
+        Objets dans le rayon triés par distance, chacun annoté d'un attribut
+        ``distance_km``.
+
+        Avec ``limit``, seuls (pk, latitude, longitude) des candidats sont lus
+        puis les k objets retenus sont chargés. Sans limite, la distance est
+        calculée et filtrée par la base : une seule requête ne charge que les
+        objets du cercle, sans les coins de la boîte englobante.
+        """
+        if limit is None:
+            return list(
+                GeoIndexService.within(
+                    queryset, latitude, longitude, radius_km, lat_field, lon_field, geohash_field
+                ).annotate(
+                    distance_km=distance_expression(latitude, longitude, lat_field, lon_field)
+                ).filter(distance_km__lte=radius_km).order_by('distance_km')
+            )
+
+        ranked = GeoIndexService.nearest(
+            queryset.order_by(), latitude, longitude, radius_km, limit,
+            lat_field=lat_field, lon_field=lon_field, geohash_field=geohash_field
+        )
+        objects = queryset.order_by().in_bulk([pk for pk, _ in ranked])
+        ranked = [(objects[pk], distance) for pk, distance in ranked]
+
+        results = []
+        for obj, distance in ranked:
+            obj.distance_km = distance
+            results.append(obj)
+        return results
+
+    @staticmethod
+    def refresh_geohashes(queryset, batch_size=2000):
+        """Recalcule le geohash des lignes du queryset ; renvoie le nombre de lignes corrigées"""
+        model = queryset.model
+        stale = []
+        refreshed = 0
+        for obj in queryset.only('pk', 'latitude', 'longitude', 'geohash').iterator(chunk_size=batch_size):
+            geohash = geohash_for(obj.latitude, obj.longitude)
+            if obj.geohash != geohash:
+                obj.geohash = geohash
+                stale.append(obj)
+            if len(stale) >= batch_size:
+                model._base_manager.bulk_update(stale, ['geohash'])
+                refreshed += len(stale)
+                stale = []
+        if stale:
+            model._base_manager.bulk_update(stale, ['geohash'])
+            refreshed += len(stale)
+        return refreshed
+
+
+COORDINATE_FIELDS = {'latitude', 'longitude'}
+
+
+class GeohashQuerySet(models.QuerySet):
+    """
+    Queryset des modèles géolocalisés : les écritures en masse, qui ne passent
+    pas par ``save()``, recalculent aussi le geohash
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.geohash = geohash_for(obj.latitude, obj.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields and COORDINATE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['geohash']
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if COORDINATE_FIELDS & set(fields):
+            objs = list(objs)
+            for obj in objs:
+                obj.geohash = geohash_for(obj.latitude, obj.longitude)
+            fields = [field for field in fields if field != 'geohash'] + ['geohash']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if not COORDINATE_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+
+        # Coordonnées constantes : le geohash s'écrit dans la même requête
+        values = [kwargs.get(field) for field in ('latitude', 'longitude')]
+        if COORDINATE_FIELDS <= set(kwargs) and not any(hasattr(value, 'resolve_expression') for value in values):
+            return super().update(geohash=geohash_for(*values), **kwargs)
+
+        # Sinon (une seule coordonnée, expression F...) : recalcul des lignes modifiées
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            for start in range(0, len(pks), 2000):
+                GeoIndexService.refresh_geohashes(self.model._base_manager.filter(pk__in=pks[start:start + 2000]))
+        return updated
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from geography.geoindex import GeoIndexService
+from notifications.models import CommunityAlert
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Recalcule le geohash des alertes et des profils écrits sans passer par l'ORM (SQL brut, import direct)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Lignes écrites par lot")
+
+    def handle(self, *args, **options):
+        for model in (CommunityAlert, UserProfile):
+            count = GeoIndexService.refresh_geohashes(model.objects.all(), batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'{model._meta.verbose_name_plural}: {count} geohash recalculés')
+            )
@@ -15,6 +15,7 @@ from .serializers import (
     HelpRequestCategorySerializer
 )
 from .permissions import IsOwnerOrReadOnly
+from search.services import SearchService
 
 
 class HelpRequestViewSet(viewsets.ModelViewSet):
@@ -25,9 +26,9 @@ class HelpRequestViewSet(viewsets.ModelViewSet):
     
     queryset = HelpRequest.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Le paramètre ``search`` passe par l'index plein texte (voir get_queryset)
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['request_type', 'need_type', 'status', 'is_urgent', 'city', 'neighborhood', 'duration_type', 'proximity_zone']
-    search_fields = ['title', 'description', 'address', 'neighborhood', 'city']
     ordering_fields = ['created_at', 'updated_at', 'responses_count', 'views_count']
     ordering = ['-created_at']
     
@@ -119,15 +120,9 @@ class HelpRequestViewSet(viewsets.ModelViewSet):
         if date_to:
             queryset = queryset.filter(created_at__date__lte=date_to)
         
-        # Recherche textuelle
+        # Recherche textuelle (index plein texte)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(address__icontains=search) |
-                Q(neighborhood__icontains=search) |
-                Q(city__icontains=search)
-            )
+            queryset = SearchService.filter_queryset(queryset, 'help_request', search)
         
         # Exclure les demandes expirées par défaut
         if not self.request.query_params.get('include_expired'):
@@ -0,0 +1,360 @@
+"""
+Registre de métriques (compteurs, jauges, histogrammes) agrégé entre workers.
+
+Écritures : chaque thread accumule dans son propre fragment (``threading.local``),
+sans verrou ; les fragments ne sont additionnés qu'à la lecture. Les jauges,
+rarement écrites, gardent une seule valeur par série.
+
+Agrégation multi-processus : chaque worker publie périodiquement
+(``maybe_publish``, appelé en fin de requête) son instantané cumulé dans le
+cache partagé, sous un emplacement obtenu par ``incr`` (``metrics_worker_{n}``)
+qui expire avec le worker. L'index ``metrics_workers`` associe à chaque
+emplacement publié son échéance (``METRICS_WORKER_TTL``) : ``collect(all_workers=True)``
+ne lit que les emplacements encore vivants, quel que soit le nombre de workers
+passés depuis le démarrage, et fusionne leurs instantanés avec l'instantané
+local. ``render_prometheus`` produit le format texte d'exposition Prometheus (0.0.4).
+
+L'index est réécrit à chaque publication sans verrou : une entrée perdue lors
+d'une écriture concurrente est rétablie à la publication suivante du worker.
+
+L'agrégation suppose un cache partagé entre processus (Redis en production) ;
+avec un cache local, seul le worker interrogé est visible.
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def get_metrics_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Metric:
+    """Métrique à fragments par thread ; ``labels`` sont les valeurs des étiquettes"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), mode='sum'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.mode = mode
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: étiquettes attendues {self.labelnames}, reçu {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self):
+        """Valeurs par série, fragments des threads terminés repliés au passage"""
+        with self._lock:
+            alive = []
+            merged = dict(self._retired)
+            for thread, shard in self._shards:
+                for key, value in list(shard.items()):
+                    merged[key] = self._merge_value(merged.get(key), value)
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    for key, value in list(shard.items()):
+                        self._retired[key] = self._merge_value(self._retired.get(key), value)
+            self._shards = alive
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+
+    def describe(self):
+        return {'type': self.kind, 'help': self.documentation, 'labels': self.labelnames, 'mode': self.mode}
+
+    @staticmethod
+    def _merge_value(current, value):
+        return value if current is None else current + value
+
+
+class Counter(Metric):
+    """Valeur croissante (requêtes, erreurs...)"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Valeur instantanée, une seule par série (pas de fragments) ; ``mode``
+    indique comment combiner les workers : ``sum``, ``max`` ou ``min``.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), mode='max'):
+        super().__init__(name, documentation, labelnames, mode)
+        self._values = {}
+
+    def set(self, value, labels=()):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_max(self, value, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            if value > self._values.get(key, -math.inf):
+                self._values[key] = value
+
+    def set_min(self, value, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            if value < self._values.get(key, math.inf):
+                self._values[key] = value
+
+    def samples(self):
+        return dict(self._values)
+
+    def reset(self):
+        self._values = {}
+
+
+class Histogram(Metric):
+    """Répartition dans des classes fixes ; valeur d'une série : ``[comptes, somme, nombre]``"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        key = self._key(labels)
+        series = shard.get(key)
+        if series is None:
+            # Dernière classe : au-delà de la plus grande borne (+Inf)
+            series = shard[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def describe(self):
+        return {**super().describe(), 'buckets': self.buckets}
+
+    @staticmethod
+    def _merge_value(current, value):
+        if current is None:
+            return [list(value[0]), value[1], value[2]]
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]]
+
+
+def histogram_percentile(buckets, series, fraction):
+    """Borne supérieure de la classe contenant le percentile (``math.inf`` au-delà)"""
+    counts, _, count = series
+    if not count:
+        return 0.0
+    rank = max(1, math.ceil(fraction * count))
+    seen = 0
+    for position, bucket_count in enumerate(counts):
+        seen += bucket_count
+        if seen >= rank:
+            return buckets[position] if position < len(buckets) else math.inf
+    return math.inf
+
+
+def merge_snapshots(snapshots):
+    """Fusionne les instantanés de plusieurs workers selon le type (et le mode) de chaque métrique"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'samples': {}})
+            for key, value in metric['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = Histogram._merge_value(None, value) if metric['type'] == 'histogram' else value
+                elif metric['type'] == 'histogram':
+                    target['samples'][key] = Histogram._merge_value(current, value)
+                elif metric['type'] == 'gauge' and metric['mode'] == 'max':
+                    target['samples'][key] = max(current, value)
+                elif metric['type'] == 'gauge' and metric['mode'] == 'min':
+                    target['samples'][key] = min(current, value)
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+class MetricsRegistry:
+    """Métriques d'un processus et leur publication pour l'agrégation entre workers"""
+
+    SEQUENCE_KEY = 'metrics_worker_seq'
+    WORKERS_KEY = 'metrics_workers'
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.slot = None
+        self.pid = None
+        self.published_at = 0.0
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Métrique {name} déjà déclarée comme {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), mode='max'):
+        return self._register(Gauge, name, documentation, labelnames, mode=mode)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """Instantané local : ``{nom: {type, help, labels, mode, [buckets], samples}}``"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: {**metric.describe(), 'samples': metric.samples()} for metric in metrics}
+
+    def reset(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    @staticmethod
+    def get_cache():
+        return caches['default']
+
+    @staticmethod
+    def get_worker_key(slot):
+        return f"metrics_worker_{slot}"
+
+    def publish(self):
+        """Écrit l'instantané de ce worker dans le cache partagé"""
+        cache = self.get_cache()
+        if self.slot is None or self.pid != os.getpid():
+            # Emplacement propre à chaque processus (réattribué après un fork)
+            cache.add(self.SEQUENCE_KEY, 0, None)
+            self.slot = cache.incr(self.SEQUENCE_KEY)
+            self.pid = os.getpid()
+        now = time.time()
+        ttl = get_metrics_setting('METRICS_WORKER_TTL', 300)
+        cache.set(
+            self.get_worker_key(self.slot),
+            {'pid': self.pid, 'published_at': now, 'metrics': self.snapshot()},
+            ttl
+        )
+        # Index des emplacements vivants : les échéances dépassées en sont retirées
+        workers = self.get_live_workers(cache, now)
+        workers[self.slot] = now + ttl
+        cache.set(self.WORKERS_KEY, workers, ttl)
+        self.published_at = time.monotonic()
+
+    def get_live_workers(self, cache, now):
+        """``{emplacement: échéance}`` des workers ayant publié depuis moins de ``METRICS_WORKER_TTL``"""
+        workers = cache.get(self.WORKERS_KEY) or {}
+        return {slot: expires_at for slot, expires_at in workers.items() if expires_at > now}
+
+    def maybe_publish(self):
+        """Publie si l'intervalle est écoulé ; les erreurs de cache n'atteignent pas la requête"""
+        if time.monotonic() - self.published_at < get_metrics_setting('METRICS_PUBLISH_INTERVAL', 15):
+            return False
+        try:
+            self.publish()
+        except Exception as e:
+            self.published_at = time.monotonic()
+            logger.error(f"Erreur lors de la publication des métriques: {str(e)}")
+            return False
+        return True
+
+    def collect(self, all_workers=False):
+        """Métriques de ce worker, ou de tous les workers encore vivants"""
+        local = self.snapshot()
+        if not all_workers:
+            return local
+
+        cache = self.get_cache()
+        keys = [
+            self.get_worker_key(slot) for slot in self.get_live_workers(cache, time.time())
+            if slot != self.slot
+        ]
+        others = [published['metrics'] for published in cache.get_many(keys).values()]
+        return merge_snapshots([local] + others)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    """Format texte d'exposition Prometheus d'un instantané (éventuellement fusionné)"""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key in sorted(metric['samples']):
+            value = metric['samples'][key]
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric['buckets']) + [math.inf], counts):
+                cumulative += bucket_count
+                labels = _format_labels(metric['labels'], key, [('le', _format_value(bound))])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+# Registre global du processus
+registry = MetricsRegistry()
@@ -1,139 +1,227 @@
 import time
 import logging
-import psutil
 import threading
 from django.core.cache import cache
 from django.conf import settings
 from django.db import connection
 from collections import defaultdict, deque
 import json
+from .metrics import registry
+from .timeseries import timeseries
 
 logger = logging.getLogger(__name__)
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
 class PerformanceMonitor:
-    """Moniteur de performance en temps réel"""
+    """
+    Moniteur de performance en temps réel : façade sur le registre de
+    métriques (monitoring.metrics), agrégé entre les workers
+    """
     
-    def __init__(self):
-        self.metrics = {
-            'request_times': deque(maxlen=1000),
-            'db_queries': deque(maxlen=1000),
-            'cache_hits': 0,
-            'cache_misses': 0,
-            'errors': deque(maxlen=100),
-            'memory_usage': deque(maxlen=100),
-            'cpu_usage': deque(maxlen=100)
-        }
-        self.lock = threading.Lock()
+    def __init__(self, metrics_registry=None):
+        self.registry = metrics_registry or registry
+        self.requests = self.registry.counter(
+            'http_requests_total', 'Requêtes HTTP traitées', ('method', 'status')
+        )
+        self.request_duration = self.registry.histogram(
+            'http_request_duration_seconds', 'Durée des requêtes HTTP (secondes)'
+        )
+        self.request_duration_max = self.registry.gauge(
+            'http_request_duration_max_seconds', 'Requête HTTP la plus lente (secondes)', mode='max'
+        )
+        self.request_duration_min = self.registry.gauge(
+            'http_request_duration_min_seconds', 'Requête HTTP la plus rapide (secondes)', mode='min'
+        )
+        self.db_queries = self.registry.counter('db_queries_total', 'Requêtes SQL exécutées')
+        self.db_query_time = self.registry.counter('db_query_seconds_total', 'Temps passé en requêtes SQL (secondes)')
+        self.n_plus_one = self.registry.counter('db_n_plus_one_total', 'Requêtes HTTP avec une requête SQL répétée (N+1)')
+        self.cache_requests = self.registry.counter('cache_requests_total', 'Lectures du cache', ('result',))
+        self.errors = self.registry.counter('errors_total', 'Erreurs enregistrées', ('type',))
+        self.memory_usage = self.registry.gauge('system_memory_percent', 'Mémoire utilisée (%)', mode='max')
+        self.cpu_usage = self.registry.gauge('system_cpu_percent', 'CPU utilisé (%)', mode='max')
+        # Derniers événements de ce worker (append atomique, sans verrou)
+        self.recent_errors = deque(maxlen=100)
+        self.recent_n_plus_one = deque(maxlen=100)
+        # Derniers totaux échantillonnés pour les séries temporelles
+        self.sampled_totals = None
+        self.sampled_at = time.monotonic()
+        self.sample_lock = threading.Lock()
         self.start_monitoring()
     
     def record_request(self, path, method, duration, status_code):
         """Enregistre une requête"""
-        with self.lock:
-            self.metrics['request_times'].append({
-                'path': path,
-                'method': method,
-                'duration': duration,
-                'status_code': status_code,
-                'timestamp': time.time()
-            })
+        self.requests.inc(labels=(method, status_code))
+        self.request_duration.observe(duration)
+        self.request_duration_max.set_max(duration)
+        self.request_duration_min.set_min(duration)
     
     def record_db_query(self, query, duration):
         """Enregistre une requête de base de données"""
-        with self.lock:
-            self.metrics['db_queries'].append({
-                'query': query[:100],  # Limiter la taille
-                'duration': duration,
-                'timestamp': time.time()
-            })
+        self.record_db_queries(1, duration)
+    
+    def record_db_queries(self, count, duration):
+        """Enregistre ``count`` requêtes de base de données d'une durée totale ``duration``"""
+        self.db_queries.inc(count)
+        self.db_query_time.inc(duration)
+    
+    def record_n_plus_one(self, path, query, count):
+        """Enregistre une requête répétée dans une même requête HTTP (N+1 probable)"""
+        self.n_plus_one.inc()
+        self.recent_n_plus_one.append({
+            'path': path,
+            'query': query[:200],
+            'count': count,
+            'timestamp': time.time()
+        })
     
-    def record_cache_hit(self):
-        """Enregistre un cache hit"""
-        with self.lock:
-            self.metrics['cache_hits'] += 1
+    def record_cache_hit(self, count=1):
+        """Enregistre un ou plusieurs cache hits"""
+        self.cache_requests.inc(count, labels=('hit',))
     
-    def record_cache_miss(self):
-        """Enregistre un cache miss"""
-        with self.lock:
-            self.metrics['cache_misses'] += 1
+    def record_cache_miss(self, count=1):
+        """Enregistre un ou plusieurs cache miss"""
+        self.cache_requests.inc(count, labels=('miss',))
     
     def record_error(self, error_type, error_message, path):
         """Enregistre une erreur"""
-        with self.lock:
-            self.metrics['errors'].append({
-                'type': error_type,
-                'message': error_message,
-                'path': path,
-                'timestamp': time.time()
-            })
+        self.errors.inc(labels=(error_type,))
+        self.recent_errors.append({
+            'type': error_type,
+            'message': error_message,
+            'path': path,
+            'timestamp': time.time()
+        })
     
     def get_performance_stats(self):
-        """Récupère les statistiques de performance"""
-        with self.lock:
-            # Statistiques des requêtes
-            request_times = list(self.metrics['request_times'])
-            if request_times:
-                durations = [r['duration'] for r in request_times]
-                avg_response_time = sum(durations) / len(durations)
-                max_response_time = max(durations)
-                min_response_time = min(durations)
-            else:
-                avg_response_time = max_response_time = min_response_time = 0
-            
-            # Statistiques de cache
-            total_cache_requests = self.metrics['cache_hits'] + self.metrics['cache_misses']
-            cache_hit_rate = (self.metrics['cache_hits'] / total_cache_requests * 100) if total_cache_requests > 0 else 0
-            
-            # Statistiques de base de données
-            db_queries = list(self.metrics['db_queries'])
-            if db_queries:
-                db_durations = [q['duration'] for q in db_queries]
-                avg_db_time = sum(db_durations) / len(db_durations)
-                total_db_queries = len(db_queries)
-            else:
-                avg_db_time = total_db_queries = 0
-            
-            # Utilisation système
-            memory_usage = psutil.virtual_memory().percent
-            cpu_usage = psutil.cpu_percent()
-            
-            return {
-                'response_times': {
-                    'average': round(avg_response_time, 3),
-                    'maximum': round(max_response_time, 3),
-                    'minimum': round(min_response_time, 3),
-                    'total_requests': len(request_times)
-                },
-                'cache': {
-                    'hits': self.metrics['cache_hits'],
-                    'misses': self.metrics['cache_misses'],
-                    'hit_rate': round(cache_hit_rate, 2)
-                },
-                'database': {
-                    'total_queries': total_db_queries,
-                    'average_query_time': round(avg_db_time, 3)
-                },
-                'system': {
-                    'memory_usage': memory_usage,
-                    'cpu_usage': cpu_usage
-                },
-                'errors': {
-                    'total': len(self.metrics['errors']),
-                    'recent': list(self.metrics['errors'])[-10:]  # 10 dernières erreurs
-                }
+        """Récupère les statistiques de performance (tous les workers)"""
+        metrics = self.registry.collect(all_workers=True)
+        
+        def samples(name):
+            return metrics.get(name, {}).get('samples', {})
+        
+        # Statistiques des requêtes
+        total_requests = sum(samples('http_requests_total').values())
+        _, total_duration, observed = samples('http_request_duration_seconds').get((), ([], 0.0, 0))
+        avg_response_time = total_duration / observed if observed else 0
+        max_response_time = samples('http_request_duration_max_seconds').get((), 0)
+        min_response_time = samples('http_request_duration_min_seconds').get((), 0)
+        
+        # Statistiques de cache
+        cache_requests = samples('cache_requests_total')
+        cache_hits = cache_requests.get(('hit',), 0)
+        cache_misses = cache_requests.get(('miss',), 0)
+        total_cache_requests = cache_hits + cache_misses
+        cache_hit_rate = (cache_hits / total_cache_requests * 100) if total_cache_requests > 0 else 0
+        
+        # Statistiques de base de données
+        total_db_queries = samples('db_queries_total').get((), 0)
+        db_time = samples('db_query_seconds_total').get((), 0)
+        avg_db_time = db_time / total_db_queries if total_db_queries else 0
+        
+        # Utilisation système
+        memory_usage = psutil.virtual_memory().percent if PSUTIL_AVAILABLE else 0
+        cpu_usage = psutil.cpu_percent() if PSUTIL_AVAILABLE else 0
+        
+        return {
+            'response_times': {
+                'average': round(avg_response_time, 3),
+                'maximum': round(max_response_time, 3),
+                'minimum': round(min_response_time, 3),
+                'total_requests': total_requests
+            },
+            'cache': {
+                'hits': cache_hits,
+                'misses': cache_misses,
+                'hit_rate': round(cache_hit_rate, 2)
+            },
+            'database': {
+                'total_queries': total_db_queries,
+                'average_query_time': round(avg_db_time, 3),
+                'n_plus_one_requests': samples('db_n_plus_one_total').get((), 0),
+                'n_plus_one': list(self.recent_n_plus_one)[-10:]  # 10 derniers N+1 détectés (ce worker)
+            },
+            'system': {
+                'memory_usage': memory_usage,
+                'cpu_usage': cpu_usage
+            },
+            'errors': {
+                'total': sum(samples('errors_total').values()),
+                'recent': list(self.recent_errors)[-10:]  # 10 dernières erreurs (ce worker)
             }
+        }
+    
+    def _local_totals(self):
+        """Totaux cumulés de ce worker, base des écarts échantillonnés"""
+        metrics = self.registry.collect()
+        
+        def samples(name):
+            return metrics.get(name, {}).get('samples', {})
+        
+        requests = samples('http_requests_total')
+        cache_requests = samples('cache_requests_total')
+        return {
+            'requests': sum(requests.values()),
+            'errors': sum(count for (_, status), count in requests.items() if status.startswith('5')),
+            'duration': samples('http_request_duration_seconds').get((), ([], 0.0, 0))[1],
+            'db_queries': samples('db_queries_total').get((), 0),
+            'cache_hits': cache_requests.get(('hit',), 0),
+            'cache_misses': cache_requests.get(('miss',), 0),
+        }
+    
+    def sample_timeseries(self):
+        """Ajoute aux séries temporelles les mesures de ce worker depuis le dernier échantillon"""
+        totals = self._local_totals()
+        previous = self.sampled_totals or {name: 0 for name in totals}
+        self.sampled_totals = totals
+        delta = {name: totals[name] - previous.get(name, 0) for name in totals}
+        
+        values = {'requests': delta['requests']}
+        if delta['requests'] > 0:
+            values['response_time'] = delta['duration'] / delta['requests'] * 1000  # ms
+            values['error_rate'] = delta['errors'] / delta['requests'] * 100
+            values['db_queries_per_request'] = delta['db_queries'] / delta['requests']
+        cache_reads = delta['cache_hits'] + delta['cache_misses']
+        if cache_reads > 0:
+            values['cache_hit_rate'] = delta['cache_hits'] / cache_reads * 100
+        if PSUTIL_AVAILABLE:
+            values['cpu_usage'] = psutil.cpu_percent()
+            values['memory_usage'] = psutil.virtual_memory().percent
+        
+        timeseries.record_many(values)
+        return values
+    
+    def maybe_sample(self):
+        """Échantillonne si l'intervalle est écoulé (appelé en fin de requête)"""
+        interval = getattr(settings, 'TIMESERIES_SAMPLE_INTERVAL', 60)
+        if time.monotonic() - self.sampled_at < interval or not self.sample_lock.acquire(blocking=False):
+            return None
+        try:
+            self.sampled_at = time.monotonic()
+            return self.sample_timeseries()
+        except Exception as e:
+            logger.error(f"Erreur échantillonnage des séries temporelles: {str(e)}")
+            return None
+        finally:
+            self.sample_lock.release()
     
     def start_monitoring(self):
         """Démarre le monitoring en arrière-plan"""
+        if not PSUTIL_AVAILABLE:
+            logger.info("psutil non disponible, monitoring système désactivé")
+            return
+
         def monitor_system():
             while True:
                 try:
                     # Enregistrer l'utilisation système
-                    memory = psutil.virtual_memory().percent
-                    cpu = psutil.cpu_percent()
-                    
-                    with self.lock:
-                        self.metrics['memory_usage'].append(memory)
-                        self.metrics['cpu_usage'].append(cpu)
+                    self.memory_usage.set(psutil.virtual_memory().percent)
+                    self.cpu_usage.set(psutil.cpu_percent())
                     
                     time.sleep(60)  # Mise à jour toutes les minutes
                     
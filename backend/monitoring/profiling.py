@@ -0,0 +1,213 @@
+"""
+Profilage par requête : requêtes SQL, appels au cache et latence par route.
+
+``PerformanceMiddleware`` (users.middleware) ouvre un ``RequestProfile`` pour
+chaque requête HTTP :
+
+* un ``connection.execute_wrapper`` compte et chronomètre les requêtes SQL et
+  regroupe leur texte paramétré : la même requête répétée N fois (boucle sur
+  une relation non préchargée) est signalée comme N+1 ;
+* les backends de cache sont enveloppés une fois par thread (``instrument_cache``)
+  pour compter hits et misses et mesurer le temps passé ;
+* la durée totale alimente un histogramme par route (``route_stats``, dans le
+  registre de monitoring.metrics) dont on tire p50, p95 et p99 sans conserver
+  les mesures.
+
+Le profil est exposé dans l'en-tête ``Server-Timing`` et transmis au
+``PerformanceMonitor`` de monitoring.performance.
+"""
+import contextvars
+import logging
+import math
+import time
+from django.conf import settings
+from .metrics import histogram_percentile, registry
+
+logger = logging.getLogger(__name__)
+
+
+# Bornes supérieures des classes de l'histogramme (ms) : progression géométrique
+# de 1 ms à ~60 s, soit une erreur relative de 25 % au plus sur les percentiles
+LATENCY_BUCKETS_MS = tuple(round(1.25 ** exponent, 2) for exponent in range(50))
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+_MISSING = object()
+
+
+def get_profiling_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestProfile:
+    """Mesures d'une requête HTTP en cours"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self.query_count = 0
+        self.query_time = 0.0
+        self.queries = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper`` : chronomètre chaque requête SQL"""
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started_at
+            self.query_count += 1
+            self.query_time += duration
+            count, total = self.queries.get(sql, (0, 0.0))
+            self.queries[sql] = (count + 1, total + duration)
+
+    def record_cache(self, hits, misses, duration):
+        self.cache_hits += hits
+        self.cache_misses += misses
+        self.cache_time += duration
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def duplicated_queries(self, threshold=None):
+        """Requêtes exécutées au moins ``threshold`` fois : ``[(sql, nombre, durée)]``"""
+        threshold = threshold or get_profiling_setting('PROFILING_DUPLICATE_QUERY_THRESHOLD', 5)
+        duplicates = [
+            (sql, count, total) for sql, (count, total) in self.queries.items() if count >= threshold
+        ]
+        return sorted(duplicates, key=lambda duplicate: duplicate[1], reverse=True)
+
+    def server_timing(self):
+        """Valeur de l'en-tête ``Server-Timing`` (durées en ms)"""
+        return ', '.join([
+            f'db;desc="{self.query_count} requetes";dur={self.query_time * 1000:.2f}',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} miss";dur={self.cache_time * 1000:.2f}',
+            f'app;dur={self.duration * 1000:.2f}',
+        ])
+
+
+def get_current_profile():
+    return _current_profile.get()
+
+
+def activate_profile(profile):
+    """Rattache ``profile`` au contexte courant ; renvoie le jeton pour ``deactivate_profile``"""
+    return _current_profile.set(profile)
+
+
+def deactivate_profile(token):
+    _current_profile.reset(token)
+
+
+def instrument_cache(backend):
+    """
+    Enveloppe ``get`` et ``get_many`` d'une instance de cache pour compter
+    hits et misses de la requête en cours (sans effet hors requête profilée).
+    Les instances étant propres à chaque thread, l'opération est répétée
+    sans risque : une instance déjà enveloppée est laissée telle quelle.
+    """
+    if getattr(backend, '_profiling_instrumented', False):
+        return backend
+
+    original_get = backend.get
+    original_get_many = backend.get_many
+
+    def get(key, default=None, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_get(key, default, *args, **kwargs)
+        started_at = time.perf_counter()
+        value = original_get(key, _MISSING, *args, **kwargs)
+        hit = value is not _MISSING
+        profile.record_cache(int(hit), int(not hit), time.perf_counter() - started_at)
+        return value if hit else default
+
+    def get_many(keys, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_get_many(keys, *args, **kwargs)
+        keys = list(keys)
+        started_at = time.perf_counter()
+        # Certains backends (locmem) appellent get() pour chaque clé : pas de double compte
+        token = _current_profile.set(None)
+        try:
+            values = original_get_many(keys, *args, **kwargs)
+        finally:
+            _current_profile.reset(token)
+        profile.record_cache(len(values), len(keys) - len(values), time.perf_counter() - started_at)
+        return values
+
+    backend.get = get
+    backend.get_many = get_many
+    backend._profiling_instrumented = True
+    return backend
+
+
+class RouteStats:
+    """Latence par route (motif d'URL), tenue dans le registre de métriques"""
+
+    def __init__(self, metrics_registry=None):
+        self.registry = metrics_registry or registry
+        self.duration = self.registry.histogram(
+            'http_route_duration_seconds', 'Durée des requêtes HTTP par route (secondes)', ('route',),
+            buckets=[bound / 1000 for bound in LATENCY_BUCKETS_MS]
+        )
+        self.db_queries = self.registry.counter('http_route_db_queries_total', 'Requêtes SQL par route', ('route',))
+        self.n_plus_one = self.registry.counter(
+            'http_route_n_plus_one_total', 'Requêtes HTTP avec une requête SQL répétée (N+1) par route', ('route',)
+        )
+        self.routes = set()
+
+    def observe(self, route, profile, n_plus_one=False):
+        if route not in self.routes:
+            if len(self.routes) >= get_profiling_setting('PROFILING_MAX_ROUTES', 500):
+                route = 'other'
+            self.routes.add(route)
+        labels = (route,)
+        self.duration.observe(profile.duration, labels=labels)
+        self.db_queries.inc(profile.query_count, labels=labels)
+        if n_plus_one:
+            self.n_plus_one.inc(labels=labels)
+
+    def summary(self, limit=None, all_workers=True):
+        """Routes les plus lentes (p95) d'abord, tous workers confondus"""
+        metrics = self.registry.collect(all_workers=all_workers)
+        buckets = metrics[self.duration.name]['buckets']
+        db_queries = metrics[self.db_queries.name]['samples']
+        n_plus_one = metrics[self.n_plus_one.name]['samples']
+
+        routes = {}
+        for key, series in metrics[self.duration.name]['samples'].items():
+            _, total, count = series
+
+            def percentile(fraction):
+                bound = histogram_percentile(buckets, series, fraction)
+                return round(bound * 1000, 2) if bound != math.inf else None
+
+            routes[key[0]] = {
+                'count': count,
+                'average_ms': round(total / count * 1000, 2) if count else 0.0,
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'p99_ms': percentile(0.99),
+                'average_db_queries': round(db_queries.get(key, 0) / count, 2) if count else 0.0,
+                'n_plus_one_requests': n_plus_one.get(key, 0),
+            }
+        # p95 au-delà de la dernière classe (> 1 min, None) : en tête
+        ordered = sorted(
+            routes.items(),
+            key=lambda item: math.inf if item[1]['p95_ms'] is None else item[1]['p95_ms'],
+            reverse=True
+        )
+        return dict(ordered[:limit] if limit else ordered)
+
+    def reset(self):
+        for metric in (self.duration, self.db_queries, self.n_plus_one):
+            metric.reset()
+        self.routes = set()
+
+
+route_stats = RouteStats()
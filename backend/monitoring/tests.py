@@ -0,0 +1,182 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from .metrics import MetricsRegistry, merge_snapshots, registry, render_prometheus
+from .timeseries import ROW, TimeSeriesStore
+
+User = get_user_model()
+
+
+class MetricsRegistryTest(TestCase):
+    """Tests pour le registre de métriques et son agrégation entre workers"""
+
+    def setUp(self):
+        cache.clear()
+        self.registry = MetricsRegistry()
+
+    def test_per_thread_shards_are_summed(self):
+        """Les fragments des threads, y compris terminés, sont additionnés à la lecture"""
+        counter = self.registry.counter('jobs_total', 'Tâches', ('queue',))
+        histogram = self.registry.histogram('job_seconds', 'Durée', buckets=(0.1, 1.0))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(labels=('alerts',))
+            histogram.observe(0.5)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(2, labels=('alerts',))
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['jobs_total']['samples'], {('alerts',): 4002})
+        self.assertEqual(snapshot['job_seconds']['samples'][()], [[0, 4, 0], 2.0, 4])
+        # Les threads terminés sont repliés une seule fois
+        self.assertEqual(self.registry.snapshot()['jobs_total']['samples'], {('alerts',): 4002})
+
+    def test_workers_merged_through_cache(self):
+        """Chaque worker publie son instantané ; la lecture les fusionne selon le type"""
+        workers = [MetricsRegistry() for _ in range(3)]
+        for index, worker in enumerate(workers):
+            worker.counter('requests_total', 'Requêtes').inc(10)
+            worker.gauge('memory_percent', 'Mémoire', mode='max').set(40 + index)
+            worker.histogram('latency_seconds', 'Latence', buckets=(1.0,)).observe(index)
+        for worker in workers[1:]:
+            worker.publish()
+
+        merged = workers[0].collect(all_workers=True)
+        self.assertEqual(merged['requests_total']['samples'][()], 30)
+        self.assertEqual(merged['memory_percent']['samples'][()], 42)
+        self.assertEqual(merged['latency_seconds']['samples'][()], [[2, 1], 3.0, 3])
+        self.assertEqual(workers[0].collect()['requests_total']['samples'][()], 10)
+
+    @override_settings(METRICS_WORKER_TTL=60)
+    def test_collect_reads_only_live_workers(self):
+        """Seuls les emplacements publiés depuis moins de METRICS_WORKER_TTL sont lus"""
+        cache.set(MetricsRegistry.SEQUENCE_KEY, 1000, None)
+        workers = [MetricsRegistry() for _ in range(3)]
+        for worker in workers:
+            worker.counter('requests_total', 'Requêtes').inc(10)
+        with mock.patch('monitoring.metrics.time.time', return_value=1000.0):
+            workers[1].publish()
+        with mock.patch('monitoring.metrics.time.time', return_value=1050.0):
+            workers[2].publish()
+
+        # time.time est aussi l'horloge des expirations du cache local
+        with mock.patch('monitoring.metrics.time.time', return_value=1070.0):
+            self.assertEqual(set(cache.get(MetricsRegistry.WORKERS_KEY)), {workers[1].slot, workers[2].slot})
+            with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+                merged = workers[0].collect(all_workers=True)
+            get_many.assert_called_once_with([MetricsRegistry.get_worker_key(workers[2].slot)])
+            self.assertEqual(merged['requests_total']['samples'][()], 20)
+
+            # Le worker expiré disparaît de l'index à la publication suivante
+            workers[0].publish()
+            self.assertEqual(set(cache.get(MetricsRegistry.WORKERS_KEY)), {workers[0].slot, workers[2].slot})
+
+    def test_prometheus_exposition(self):
+        """Format texte : HELP/TYPE, étiquettes échappées, classes cumulées"""
+        self.registry.counter('http_requests_total', 'Requêtes HTTP', ('path',)).inc(labels=('/a"b',))
+        self.registry.histogram('duration_seconds', 'Durée', buckets=(0.1, 1.0)).observe(0.5)
+        text = render_prometheus(merge_snapshots([self.registry.snapshot()]))
+
+        self.assertIn('# TYPE http_requests_total counter', text)
+        self.assertIn('http_requests_total{path="/a\\"b"} 1', text)
+        self.assertIn('duration_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('duration_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('duration_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('duration_seconds_count 1', text)
+
+    @override_settings(METRICS_SCRAPE_TOKEN='secret')
+    def test_prometheus_endpoint_requires_token_or_admin(self):
+        """Le collecteur s'authentifie par jeton, les autres doivent être administrateurs"""
+        registry.counter('http_requests_total', 'Requêtes HTTP traitées', ('method', 'status'))
+        client = APIClient()
+        response = client.get(reverse('monitoring:prometheus'))
+        self.assertIn(response.status_code, (401, 403))
+
+        response = client.get(reverse('monitoring:prometheus'), HTTP_AUTHORIZATION='Metrics secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE http_requests_total counter', response.content.decode())
+
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        client.force_authenticate(user=admin)
+        self.assertEqual(client.get(reverse('monitoring:prometheus')).status_code, 200)
+
+
+@override_settings(TIMESERIES_TIERS=((60, 10), (300, 4), (3600, 2)))
+class TimeSeriesStoreTest(TestCase):
+    """Tests pour les tampons circulaires sous-échantillonnés"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = self.settings(TIMESERIES_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.store = TimeSeriesStore()
+        self.base = 1_800_000_000  # Aligné sur l'heure
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_downsampling_keeps_min_max_avg(self):
+        """Chaque mesure alimente la minute, les 5 minutes et l'heure"""
+        for minute, value in enumerate([10, 20, 30, 40, 50, 60]):
+            self.store.record('cpu_usage', value, self.base + minute * 60 + 5)
+
+        minutes = self.store.query('cpu_usage', self.base, self.base + 600, resolution=60)
+        self.assertEqual([point['avg'] for point in minutes], [10, 20, 30, 40, 50, 60])
+
+        five_minutes = self.store.query('cpu_usage', self.base, self.base + 600, resolution=300)
+        self.assertEqual(len(five_minutes), 2)
+        self.assertEqual(
+            (five_minutes[0]['count'], five_minutes[0]['min'], five_minutes[0]['max'], five_minutes[0]['avg']),
+            (5, 10, 50, 30)
+        )
+        self.assertEqual(self.store.summarize('cpu_usage', self.base, self.base + 600, resolution=3600)['avg'], 35)
+
+    def test_ring_overwrites_oldest_and_keeps_fixed_size(self):
+        """La rétention est la taille du tampon : les cases anciennes sont réutilisées"""
+        self.store.record('requests', 1, self.base)
+        self.store.record('requests', 2, self.base + 10 * 60)  # Même case, 10 minutes plus tard
+        self.store.record('requests', 99, self.base)  # Plus ancienne que la case : ignorée à la minute
+
+        minutes = self.store.query('requests', self.base, self.base + 3600, resolution=60)
+        self.assertEqual([(point['timestamp'], point['sum']) for point in minutes], [(self.base + 600, 2)])
+        self.assertEqual(self.store.query('requests', self.base, self.base + 3600, resolution=3600)[0]['sum'], 102)
+
+        path = os.path.join(self.store.get_directory(), 'requests.tsdb')
+        self.assertEqual(os.path.getsize(path), 16 * ROW.size)
+        self.assertEqual(self.store.metrics(), ['requests'])
+
+    def test_history_endpoint(self):
+        """L'historique renvoie les séries de la période à la résolution adaptée"""
+        from .timeseries import timeseries
+        timeseries.record('response_time', 120.0)
+
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        response = client.get(reverse('monitoring:history'), {'hours': 0.1, 'metric': 'response_time'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resolution'], 60)
+        self.assertEqual(response.data['series']['response_time'][-1]['avg'], 120.0)
+        self.assertEqual(response.data['summary']['response_time']['max'], 120.0)
+
+        response = client.get(reverse('monitoring:history'), {'resolution': 7})
+        self.assertEqual(response.status_code, 400)
+        timeseries.close()
@@ -0,0 +1,259 @@
+"""
+Séries temporelles compactes des métriques de performance.
+
+Chaque métrique est un fichier de taille fixe (``TIMESERIES_DIR/<métrique>.tsdb``)
+projeté en mémoire (``numpy.memmap`` si NumPy est installé, ``mmap`` sinon :
+même format) et partagé par tous les processus. Il contient un tampon
+circulaire par résolution (``TIMESERIES_TIERS``, par défaut 1 min sur 24 h,
+5 min sur 7 jours et 1 h sur 90 jours) dont chaque case agrège les mesures de
+son intervalle : ``[début, nombre, somme, min, max]``.
+
+Une mesure met à jour la case courante des trois résolutions : le
+sous-échantillonnage 1m -> 5m -> 1h se fait à l'écriture, avec min/max/moyenne
+exacts. La rétention découle de la taille des tampons : une case est
+réutilisée quand son intervalle revient, ce qui efface la mesure la plus
+ancienne. La taille des fichiers ne change jamais.
+"""
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.debug("NumPy non installé. Les séries temporelles utiliseront mmap en Python pur.")
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou de processus seulement
+    fcntl = None
+
+
+# (résolution en secondes, nombre de cases)
+DEFAULT_TIERS = ((60, 24 * 60), (300, 7 * 24 * 12), (3600, 90 * 24))
+FIELDS = ('start', 'count', 'sum', 'min', 'max')
+ROW = struct.Struct('<5d')
+METRIC_NAME_PATTERN = re.compile(r'^[a-z0-9_]{1,64}$')
+FILE_SUFFIX = '.tsdb'
+
+
+def get_timeseries_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def merge_slot(row, start, value):
+    """Case mise à jour par ``value`` (une case d'un autre intervalle est remplacée)"""
+    if row[0] != start or not row[1]:
+        return (start, 1.0, value, value, value)
+    return (start, row[1] + 1, row[2] + value, min(row[3], value), max(row[4], value))
+
+
+class RingFile:
+    """Fichier de ``rows`` cases de cinq doubles, projeté en mémoire"""
+
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+        size = rows * ROW.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        current_size = os.fstat(self.fd).st_size
+        if current_size != size:
+            if current_size:
+                logger.warning(f"Série {path} redimensionnée ({current_size} -> {size} octets), historique effacé")
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, size)
+
+        if NUMPY_AVAILABLE:
+            self.array = np.memmap(path, dtype='<f8', mode='r+', shape=(rows, len(FIELDS)))
+            self.buffer = None
+        else:
+            self.array = None
+            self.buffer = mmap.mmap(self.fd, size)
+
+    def get(self, row):
+        if self.array is not None:
+            return tuple(self.array[row].tolist())
+        return ROW.unpack_from(self.buffer, row * ROW.size)
+
+    def put(self, row, values):
+        if self.array is not None:
+            self.array[row] = values
+        else:
+            ROW.pack_into(self.buffer, row * ROW.size, *values)
+
+    def read(self, offset, count):
+        """Cases ``offset`` à ``offset + count`` : liste de tuples"""
+        if self.array is not None:
+            return [tuple(values) for values in self.array[offset:offset + count].tolist()]
+        return [ROW.unpack_from(self.buffer, (offset + index) * ROW.size) for index in range(count)]
+
+    def lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            del self.array
+        else:
+            self.buffer.close()
+        os.close(self.fd)
+
+
+class TimeSeriesStore:
+    """Écriture et lecture des séries ; les fichiers sont ouverts à la première utilisation"""
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_tiers():
+        return tuple(tuple(tier) for tier in get_timeseries_setting('TIMESERIES_TIERS', DEFAULT_TIERS))
+
+    @staticmethod
+    def get_directory():
+        return get_timeseries_setting('TIMESERIES_DIR', os.path.join(tempfile.gettempdir(), 'communiconnect', 'timeseries'))
+
+    def _open(self, metric):
+        if not METRIC_NAME_PATTERN.match(metric):
+            raise ValueError(f"Nom de métrique invalide: {metric}")
+        directory = self.get_directory()
+        tiers = self.get_tiers()
+        key = (directory, tiers, metric)
+        ring = self.files.get(key)
+        if ring is None:
+            os.makedirs(directory, exist_ok=True)
+            ring = self.files[key] = RingFile(
+                os.path.join(directory, f"{metric}{FILE_SUFFIX}"), sum(capacity for _, capacity in tiers)
+            )
+        return ring, tiers
+
+    def record(self, metric, value, timestamp=None):
+        """Ajoute une mesure à toutes les résolutions"""
+        self.record_many({metric: value}, timestamp)
+
+    def record_many(self, values, timestamp=None):
+        """Ajoute une mesure par métrique ``{métrique: valeur}`` au même instant"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            for metric, value in values.items():
+                if value is None or not math.isfinite(value):
+                    continue
+                ring, tiers = self._open(metric)
+                ring.lock()
+                try:
+                    offset = 0
+                    for resolution, capacity in tiers:
+                        start = float(timestamp - timestamp % resolution)
+                        row = offset + int(start // resolution) % capacity
+                        current = ring.get(row)
+                        # Case déjà réutilisée par un intervalle plus récent : mesure trop ancienne
+                        if current[1] and current[0] > start:
+                            offset += capacity
+                            continue
+                        ring.put(row, merge_slot(current, start, float(value)))
+                        offset += capacity
+                finally:
+                    ring.unlock()
+
+    def choose_resolution(self, start, now=None):
+        """Résolution la plus fine dont la rétention couvre ``start``"""
+        now = time.time() if now is None else now
+        tiers = self.get_tiers()
+        for resolution, capacity in tiers:
+            if now - start <= resolution * capacity:
+                return resolution
+        return tiers[-1][0]
+
+    def query(self, metric, start=None, end=None, resolution=None):
+        """
+        Points de ``metric`` entre ``start`` et ``end`` (timestamps Unix, par
+        défaut la dernière heure), par ordre chronologique :
+        ``[{timestamp, count, sum, min, max, avg}]``
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        tiers = self.get_tiers()
+        resolution = resolution or self.choose_resolution(start, end)
+        if resolution not in dict(tiers):
+            raise ValueError(f"Résolution inconnue: {resolution}")
+        if not os.path.exists(os.path.join(self.get_directory(), f"{metric}{FILE_SUFFIX}")):
+            return []
+
+        with self.lock:
+            ring, tiers = self._open(metric)
+            offset = 0
+            for tier_resolution, capacity in tiers:
+                if tier_resolution == resolution:
+                    break
+                offset += capacity
+            rows = ring.read(offset, capacity)
+
+        aligned_start = start - start % resolution
+        points = [
+            {
+                'timestamp': row[0],
+                'count': int(row[1]),
+                'sum': row[2],
+                'min': row[3],
+                'max': row[4],
+                'avg': row[2] / row[1],
+            }
+            for row in rows if row[1] and aligned_start <= row[0] <= end
+        ]
+        return sorted(points, key=lambda point: point['timestamp'])
+
+    def summarize(self, metric, start=None, end=None, resolution=None):
+        """Agrégat d'une période : ``{count, sum, min, max, avg}`` (None sans mesure)"""
+        points = self.query(metric, start, end, resolution)
+        if not points:
+            return None
+        count = sum(point['count'] for point in points)
+        total = sum(point['sum'] for point in points)
+        return {
+            'count': count,
+            'sum': total,
+            'min': min(point['min'] for point in points),
+            'max': max(point['max'] for point in points),
+            'avg': total / count,
+        }
+
+    def latest(self, metric, max_age=None):
+        """Dernière case à la résolution la plus fine (None si plus ancienne que ``max_age``)"""
+        resolution = self.get_tiers()[0][0]
+        now = time.time()
+        points = self.query(metric, now - (max_age or resolution * 5), now, resolution)
+        return points[-1] if points else None
+
+    def metrics(self):
+        """Métriques enregistrées"""
+        directory = self.get_directory()
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(FILE_SUFFIX)] for name in os.listdir(directory) if name.endswith(FILE_SUFFIX))
+
+    def close(self):
+        with self.lock:
+            for ring in self.files.values():
+                ring.close()
+            self.files = {}
+
+
+# Séries partagées du processus
+timeseries = TimeSeriesStore()
@@ -0,0 +1,16 @@
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('dashboard/', views.performance_dashboard, name='dashboard'),
+    path('metrics/', views.performance_metrics, name='metrics'),
+    path('prometheus/', views.prometheus_metrics, name='prometheus'),
+    path('alerts/', views.performance_alerts, name='alerts'),
+    path('alerts/thresholds/', views.update_alert_thresholds, name='alert-thresholds'),
+    path('health/', views.system_health, name='health'),
+    path('history/', views.performance_history, name='history'),
+    path('cache/', views.cache_info, name='cache-info'),
+    path('cache/clear/', views.clear_cache, name='cache-clear'),
+]
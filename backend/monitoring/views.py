@@ -5,6 +5,13 @@ from rest_framework.permissions import IsAdminUser
 from django.http import JsonResponse
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+from .metrics import registry, render_prometheus
+from .profiling import route_stats
+from .timeseries import timeseries
 from .performance import (
     performance_monitor, 
     alert_manager, 
@@ -12,6 +19,8 @@ from .performance import (
     CacheMonitor
 )
 import json
+import time
+from datetime import datetime, timezone as dt_timezone
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
@@ -65,6 +74,18 @@ def performance_metrics(request):
             'cache_performance': perf_stats['cache']
         })
     
+    elif metric_type == 'routes':
+        # Latence par route (p50/p95/p99) mesurée par PerformanceMiddleware
+        try:
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+            if limit is not None and limit < 1:
+                raise ValueError(limit)
+        except ValueError:
+            return Response({'error': 'Paramètres invalides'}, status=400)
+        return Response({
+            'routes': route_stats.summary(limit)
+        })
+    
     elif metric_type == 'database':
         db_stats = DatabaseMonitor.get_db_stats()
         perf_stats = performance_monitor.get_performance_stats()
@@ -82,7 +103,8 @@ def performance_metrics(request):
         return Response({
             'performance': performance_stats,
             'database': db_stats,
-            'cache': cache_stats
+            'cache': cache_stats,
+            'routes': route_stats.summary()
         })
 
 
@@ -180,19 +202,44 @@ def system_health(request):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def performance_history(request):
-    """Historique des performances"""
+    """
+    Historique des performances (séries temporelles, voir monitoring.timeseries).
+
+    Paramètres : ``hours`` (24 par défaut), ``metric`` (métriques séparées par
+    des virgules, toutes par défaut) et ``resolution`` (secondes ; par défaut
+    la plus fine couvrant la période).
+    """
     
-    # Récupérer l'historique selon les paramètres
-    hours = int(request.GET.get('hours', 24))
+    try:
+        hours = float(request.GET.get('hours', 24))
+        resolution = int(request.GET['resolution']) if request.GET.get('resolution') else None
+    except ValueError:
+        return Response({'error': 'Paramètres invalides'}, status=400)
     
-    # Pour l'instant, on retourne les données récentes
-    # En production, on utiliserait une base de données pour l'historique
-    performance_stats = performance_monitor.get_performance_stats()
+    metrics = [
+        metric.strip() for metric in request.GET.get('metric', '').split(',') if metric.strip()
+    ] or timeseries.metrics()
+    end = time.time()
+    start = end - hours * 3600
+    resolution = resolution or timeseries.choose_resolution(start, end)
+    
+    try:
+        series = {metric: timeseries.query(metric, start, end, resolution) for metric in metrics}
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    
+    for points in series.values():
+        for point in points:
+            point['timestamp'] = datetime.fromtimestamp(point['timestamp'], tz=dt_timezone.utc).isoformat()
     
     return Response({
-        'period': f'{hours}h',
-        'current_stats': performance_stats,
-        'note': 'L\'historique complet nécessite une base de données de métriques'
+        'period': f'{hours:g}h',
+        'resolution': resolution,
+        'resolutions': [tier_resolution for tier_resolution, _ in timeseries.get_tiers()],
+        'series': series,
+        'summary': {
+            metric: timeseries.summarize(metric, start, end, resolution) for metric in metrics
+        }
     })
 
 
@@ -259,4 +306,30 @@ def cache_info(request):
             'backend': 'Unknown',
             'error': str(e),
             'status': 'error'
-        }) 
\ No newline at end of file
+        }) 
+
+
+class MetricsScrapePermission(BasePermission):
+    """
+    Administrateur, ou collecteur présentant ``Authorization: Metrics <jeton>``
+    (``METRICS_SCRAPE_TOKEN`` ; schéma distinct de ``Bearer``, réservé aux JWT)
+    """
+    
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_SCRAPE_TOKEN', '')
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and constant_time_compare(authorization, f'Metrics {token}'):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+@api_view(['GET'])
+@permission_classes([MetricsScrapePermission])
+def prometheus_metrics(request):
+    """Métriques de tous les workers au format texte Prometheus"""
+    
+    # Publier d'abord ce worker pour que les autres lectures le voient à jour
+    registry.maybe_publish()
+    metrics = registry.collect(all_workers=request.GET.get('scope') != 'worker')
+    
+    return HttpResponse(render_prometheus(metrics), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,96 @@
+"""
+File de tâches en arrière-plan pour les notifications.
+
+Les tâches sont exécutées par un petit pool de threads démarré à la première
+mise en file (donc après le fork des workers gunicorn). La requête qui crée
+une alerte se contente d'enfiler la diffusion et répond immédiatement.
+
+Avec ``NOTIFICATION_QUEUE_EAGER = True`` les tâches s'exécutent sur place,
+ce qui est utile pour les tests et les commandes de gestion. Les tâches en
+attente sont perdues à l'arrêt du processus.
+
+D'autres applications peuvent créer leur propre file en indiquant les
+réglages à lire (voir posts.media_pipeline).
+"""
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """File de tâches en mémoire servie par des threads"""
+
+    def __init__(self, name, eager_setting='NOTIFICATION_QUEUE_EAGER',
+                 workers_setting='NOTIFICATION_QUEUE_WORKERS'):
+        self.name = name
+        self.eager_setting = eager_setting
+        self.workers_setting = workers_setting
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def is_eager(self):
+        return getattr(settings, self.eager_setting, False)
+
+    def enqueue(self, func, *args, **kwargs):
+        """Enfile une tâche (ou l'exécute immédiatement en mode synchrone)"""
+        if self.is_eager():
+            return self._run(func, args, kwargs)
+        self._ensure_workers()
+        self._queue.put((func, args, kwargs))
+
+    def enqueue_later(self, delay, func, *args, **kwargs):
+        """Enfile une tâche après ``delay`` secondes (sans attente en mode synchrone)"""
+        if self.is_eager():
+            return self._run(func, args, kwargs)
+        timer = threading.Timer(delay, self.enqueue, args=(func, *args), kwargs=kwargs)
+        timer.daemon = True
+        timer.start()
+
+    def enqueue_on_commit(self, func, *args, **kwargs):
+        """Enfile la tâche après la validation de la transaction en cours"""
+        transaction.on_commit(lambda: self.enqueue(func, *args, **kwargs))
+
+    def join(self):
+        """Attend la fin de toutes les tâches en file"""
+        self._queue.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(getattr(settings, self.workers_setting, 2)):
+                worker = threading.Thread(
+                    target=self._work, name=f"{self.name}-{index}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                self._run(func, args, kwargs)
+            finally:
+                # Les connexions ouvertes par le thread ne sont pas gérées par le cycle de requête
+                connections.close_all()
+                self._queue.task_done()
+
+    def _run(self, func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Erreur tâche {self.name} ({func.__name__}): {e}")
+
+
+# File partagée des diffusions d'alertes
+alert_queue = JobQueue('alert-fanout')
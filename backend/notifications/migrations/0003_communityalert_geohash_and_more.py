@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+from geography.geoindex import encode_geohash
+
+
+def fill_alert_geohashes(apps, schema_editor):
+    CommunityAlert = apps.get_model('notifications', 'CommunityAlert')
+    alerts = CommunityAlert.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    batch = []
+    for alert in alerts.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        alert.geohash = encode_geohash(alert.latitude, alert.longitude)
+        batch.append(alert)
+        if len(batch) >= 2000:
+            CommunityAlert.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        CommunityAlert.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_alertreport_communityalert_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communityalert',
+            name='geohash',
+            field=models.CharField(blank=True, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='communityalert',
+            index=models.Index(fields=['geohash'], name='notificatio_geohash_11dd45_idx'),
+        ),
+        migrations.RunPython(fill_alert_geohashes, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from datetime import timedelta
 import uuid
+from geography.geoindex import GeohashQuerySet, encode_geohash
 
 User = get_user_model()
 
@@ -146,6 +147,7 @@ class CommunityAlert(models.Model):
     neighborhood = models.CharField(max_length=100, blank=True)
     city = models.CharField(max_length=100, blank=True)
     postal_code = models.CharField(max_length=10, blank=True)
+    geohash = models.CharField(max_length=12, blank=True)  # Index de proximité (voir geography.geoindex)
     
     # Auteur de l'alerte
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='authored_alerts')
@@ -190,12 +192,16 @@ class CommunityAlert(models.Model):
     # Données supplémentaires
     extra_data = models.JSONField(default=dict, blank=True)
     
+    # Les écritures en masse recalculent aussi le geohash
+    objects = GeohashQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'category']),
             models.Index(fields=['created_at']),
             models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['geohash']),
             models.Index(fields=['neighborhood', 'city']),
             models.Index(fields=['reliability_score']),
         ]
@@ -205,6 +211,17 @@ class CommunityAlert(models.Model):
     def __str__(self):
         return f"{self.get_category_display()} - {self.title} ({self.get_status_display()})"
     
+    def save(self, *args, **kwargs):
+        # Tenir le geohash à jour avec les coordonnées
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
     @property
     def time_ago(self):
         """Retourne le temps écoulé depuis la création"""
@@ -0,0 +1,261 @@
+"""
+Backends d'envoi des notifications push et répartiteur par multicast.
+
+Le backend est choisi par ``PUSH_NOTIFICATION_BACKEND`` (chemin pointé) :
+
+- ``LocalPushBackend`` : remplaçant local de FCM (défaut sans identifiants
+  Firebase), journalise les messages et les abandonne ;
+- ``FirebasePushBackend`` : envoi réel via Firebase Admin SDK
+  (``send_each_for_multicast``). Le module ``messaging`` peut être remplacé
+  par un faux pour les tests.
+
+``PushDispatcher`` regroupe les messages au contenu identique et les envoie
+par lots de ``PUSH_MULTICAST_BATCH_SIZE`` tokens (500 au plus pour FCM). Les
+tokens en échec transitoire (quota, indisponibilité) sont renvoyés en tours
+successifs avec un délai exponentiel ; les tokens refusés par FCM sont
+effacés des profils. Les compteurs cumulés du processus sont disponibles
+via ``PushDispatcher.get_metrics()``.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+PushMessage = namedtuple('PushMessage', ['token', 'title', 'body', 'data', 'priority'])
+PushResult = namedtuple('PushResult', ['sent', 'invalid', 'failed', 'attempts', 'batches', 'elapsed'])
+
+FCM_MAX_MULTICAST_TOKENS = 500
+
+# Codes d'erreur FCM (firebase_admin.exceptions) : token à oublier / échec transitoire
+INVALID_TOKEN_CODES = {'NOT_FOUND', 'INVALID_ARGUMENT', 'PERMISSION_DENIED'}
+RETRYABLE_CODES = {'RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED', 'UNKNOWN'}
+
+
+class PushSendError(Exception):
+    """Échec d'envoi d'un message push"""
+
+    def __init__(self, message, retryable=False, invalid_token=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.invalid_token = invalid_token
+
+
+class PushBackend:
+    """
+    Interface des backends : ``send_multicast`` envoie un même contenu à une
+    liste de tokens et renvoie, pour chaque token, None en cas de succès ou
+    une ``PushSendError``.
+    """
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def send_multicast(self, message, tokens):
+        errors = []
+        for token in tokens:
+            try:
+                self.send(message._replace(token=token))
+                errors.append(None)
+            except PushSendError as e:
+                errors.append(e)
+        return errors
+
+
+class LocalPushBackend(PushBackend):
+    """Remplaçant local de FCM : les messages sont journalisés puis abandonnés"""
+
+    def send(self, message):
+        logger.debug(f"Notification push locale (non envoyée): {message.title} -> {message.token[:12]}")
+        return f"local-{uuid.uuid4().hex}"
+
+
+class FirebasePushBackend(PushBackend):
+    """Envoi via Firebase Cloud Messaging"""
+
+    def __init__(self, messaging=None):
+        if messaging is None:
+            import firebase_admin
+            from firebase_admin import credentials, messaging
+
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(credentials.Certificate(settings.FIREBASE_CREDENTIALS))
+        self.messaging = messaging
+
+    def build_multicast(self, message, tokens):
+        messaging = self.messaging
+        return messaging.MulticastMessage(
+            tokens=list(tokens),
+            notification=messaging.Notification(title=message.title, body=message.body),
+            data={key: str(value) for key, value in (message.data or {}).items()},
+            android=messaging.AndroidConfig(priority=message.priority),
+        )
+
+    def send(self, message):
+        error = self.send_multicast(message, [message.token])[0]
+        if error is not None:
+            raise error
+
+    def send_multicast(self, message, tokens):
+        try:
+            response = self.messaging.send_each_for_multicast(self.build_multicast(message, tokens))
+        except Exception as e:
+            # Échec de tout le lot (réseau, authentification)
+            error = self.to_push_error(e, batch_failure=True)
+            return [error] * len(tokens)
+
+        return [
+            None if item.success else self.to_push_error(item.exception)
+            for item in response.responses
+        ]
+
+    @staticmethod
+    def to_push_error(exception, batch_failure=False):
+        """
+        Sans code FCM (délai dépassé, connexion coupée, erreur 5xx du
+        transport), l'échec est transitoire. Un refus de tout le lot ne
+        désigne aucun token en particulier : aucun n'est déclaré invalide.
+        """
+        code = getattr(exception, 'code', None)
+        return PushSendError(
+            str(exception),
+            retryable=code is None or code in RETRYABLE_CODES,
+            invalid_token=code in INVALID_TOKEN_CODES and not batch_failure,
+        )
+
+
+_backends = {}
+
+
+def get_push_backend():
+    """Instance partagée du backend configuré"""
+    path = getattr(settings, 'PUSH_NOTIFICATION_BACKEND', 'notifications.push_backends.LocalPushBackend')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+class PushDispatcher:
+    """Envoie des messages push par multicast, avec reprise et délai exponentiel"""
+
+    METRIC_NAMES = ('messages', 'sent', 'invalid', 'failed', 'batches', 'retries', 'elapsed')
+
+    _metrics = dict.fromkeys(METRIC_NAMES, 0)
+    _metrics_lock = threading.Lock()
+
+    def __init__(self, backend=None, max_retries=None, backoff=None, batch_size=None,
+                 sleep=time.sleep, prune_invalid=True):
+        self.backend = backend or get_push_backend()
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'PUSH_MAX_RETRIES', 3)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'PUSH_RETRY_BACKOFF', 0.5)
+        self.batch_size = min(
+            batch_size or getattr(settings, 'PUSH_MULTICAST_BATCH_SIZE', FCM_MAX_MULTICAST_TOKENS),
+            FCM_MAX_MULTICAST_TOKENS
+        )
+        self.sleep = sleep
+        self.prune_invalid = prune_invalid
+
+    @staticmethod
+    def group_by_payload(messages):
+        """Regroupe les tokens des messages au contenu identique"""
+        groups = OrderedDict()
+        for message in messages:
+            key = (message.title, message.body, tuple(sorted((message.data or {}).items())), message.priority)
+            if key not in groups:
+                groups[key] = (message, [])
+            groups[key][1].append(message.token)
+        return list(groups.values())
+
+    def send(self, messages):
+        """Envoie les messages ; renvoie les tokens envoyés, invalides et en échec"""
+        start_time = time.time()
+        sent, invalid, failed = [], [], []
+        pending = self.group_by_payload(messages)
+        attempts = 0
+        batches = 0
+
+        while pending:
+            attempts += 1
+            retry = []
+            for message, tokens in pending:
+                retry_tokens = []
+                for start in range(0, len(tokens), self.batch_size):
+                    batch = tokens[start:start + self.batch_size]
+                    batches += 1
+                    for token, error in zip(batch, self.backend.send_multicast(message, batch)):
+                        if error is None:
+                            sent.append(token)
+                        elif error.invalid_token:
+                            invalid.append(token)
+                        elif error.retryable:
+                            retry_tokens.append(token)
+                        else:
+                            logger.warning(f"Notification push rejetée: {error}")
+                            failed.append(token)
+                if retry_tokens:
+                    retry.append((message, retry_tokens))
+
+            retry_count = sum(len(tokens) for _, tokens in retry)
+            if retry and attempts <= self.max_retries:
+                delay = self.backoff * (2 ** (attempts - 1))
+                logger.info(f"{retry_count} notifications push à renvoyer dans {delay:.1f}s")
+                self.sleep(delay)
+                self._record(retries=retry_count)
+                pending = retry
+            else:
+                for _, tokens in retry:
+                    failed.extend(tokens)
+                pending = []
+
+        if invalid and self.prune_invalid:
+            self.prune_invalid_tokens(invalid)
+
+        elapsed = time.time() - start_time
+        self._record(
+            messages=len(messages), sent=len(sent), invalid=len(invalid),
+            failed=len(failed), batches=batches, elapsed=elapsed
+        )
+        if messages:
+            logger.info(
+                f"Push: {len(sent)}/{len(messages)} envoyés en {batches} lots, "
+                f"{len(invalid)} tokens invalides, {len(failed)} échecs ({elapsed:.2f}s)"
+            )
+        return PushResult(sent, invalid, failed, attempts, batches, elapsed)
+
+    @staticmethod
+    def prune_invalid_tokens(tokens):
+        """Efface des profils les tokens refusés par FCM"""
+        from users.models import UserProfile
+
+        tokens = list(tokens)
+        pruned = 0
+        for start in range(0, len(tokens), FCM_MAX_MULTICAST_TOKENS):
+            pruned += UserProfile.objects.filter(
+                fcm_token__in=tokens[start:start + FCM_MAX_MULTICAST_TOKENS]
+            ).update(fcm_token='')
+        logger.info(f"{pruned} tokens FCM invalides supprimés")
+        return pruned
+
+    @classmethod
+    def _record(cls, **values):
+        with cls._metrics_lock:
+            for name, value in values.items():
+                cls._metrics[name] += value
+
+    @classmethod
+    def get_metrics(cls):
+        """Compteurs cumulés du processus et débit moyen (messages envoyés par seconde)"""
+        with cls._metrics_lock:
+            metrics = dict(cls._metrics)
+        metrics['throughput'] = metrics['sent'] / metrics['elapsed'] if metrics['elapsed'] else 0.0
+        return metrics
+
+    @classmethod
+    def reset_metrics(cls):
+        with cls._metrics_lock:
+            cls._metrics = dict.fromkeys(cls.METRIC_NAMES, 0)
@@ -220,6 +220,7 @@ class NearbyAlertsSerializer(serializers.Serializer):
     latitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     radius_km = serializers.FloatField(default=5.0, min_value=0.1, max_value=50.0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500)  # k plus proches
     category_filter = serializers.CharField(required=False, allow_blank=True)
     urgent_only = serializers.BooleanField(default=False)
     
@@ -9,7 +9,6 @@ from django.utils import timezone
 from django.db.models import Q, Count, Avg, F
 from datetime import datetime, timedelta
 import logging
-import math
 from typing import List, Dict, Optional
 from .models import (
     Notification, 
@@ -18,6 +17,10 @@ from .models import (
     AlertNotification,
     User
 )
+from geography.geoindex import GeoIndexService, haversine_km
+from users.models import UserProfile
+from .jobs import alert_queue
+from .push_backends import PushDispatcher, PushMessage
 
 User = get_user_model()
 
@@ -245,58 +248,136 @@ class AlertNotificationService:
     """Service spécialisé pour les notifications d'alertes communautaires"""
     
     @staticmethod
-    def notify_nearby_users(alert: CommunityAlert, radius_km: float = 5.0):
-        """Notifier les utilisateurs à proximité d'une alerte"""
+    def schedule_fan_out(alert: CommunityAlert):
+        """Planifier la diffusion d'une alerte en arrière-plan, après validation de la transaction"""
+        alert_queue.enqueue_on_commit(AlertNotificationService.fan_out_alert, alert.id)
+    
+    @staticmethod
+    def fan_out_alert(alert_id: int) -> Dict:
+        """Tâche de diffusion d'une alerte : notifications in-app et push à proximité"""
+        alert = CommunityAlert.objects.filter(id=alert_id).first()
+        if alert is None:
+            logger.warning(f"Alerte {alert_id} introuvable pour la diffusion")
+            return {}
+        
+        # Rayon plus large pour les alertes urgentes
+        radius_km = 10.0 if alert.is_urgent else 5.0
+        stats = AlertNotificationService.notify_nearby_users(alert, radius_km=radius_km)
+        
+        if alert.is_urgent:
+            AlertNotificationService.notify_authorities(alert)
+        return stats
+    
+    @staticmethod
+    def notify_nearby_users(alert: CommunityAlert, radius_km: float = 5.0, push: bool = True) -> Dict:
+        """
+        Notifier les utilisateurs à proximité d'une alerte
+        Traitement par lots : préférences lues en une requête, notifications
+        créées par bulk_create et push envoyés par le répartiteur
+        """
+        stats = {'recipients': 0, 'notifications': 0, 'push_sent': 0, 'push_failed': 0}
         if not alert.latitude or not alert.longitude:
             logger.warning(f"Alerte {alert.alert_id} sans coordonnées géographiques")
-            return
+            return stats
         
         try:
-            # Trouver les utilisateurs dans le rayon spécifié
-            nearby_users = AlertNotificationService.get_nearby_users(
-                alert.latitude, 
-                alert.longitude, 
-                radius_km
+            # (user_id, distance) des utilisateurs dans le rayon, sans charger les objets
+            nearby = GeoIndexService.nearest(
+                User.objects.filter(profile__geohash__gt='').exclude(id=alert.author_id),
+                alert.latitude, alert.longitude, radius_km,
+                lat_field='profile__latitude',
+                lon_field='profile__longitude',
+                geohash_field='profile__geohash'
             )
+            stats['recipients'] = len(nearby)
             
-            # Filtrer les utilisateurs qui veulent recevoir des alertes
-            users_to_notify = [
-                user for user in nearby_users 
-                if user.notification_preferences.community_alert_notifications
-            ]
-            
-            # Créer les notifications
-            notifications = []
-            for user in users_to_notify:
-                if user.id == alert.author.id:  # Ne pas notifier l'auteur
-                    continue
-                
-                distance = AlertNotificationService.calculate_distance(
-                    alert.latitude, alert.longitude,
-                    user.profile.latitude, user.profile.longitude
+            batch_size = getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 1000)
+            for start in range(0, len(nearby), batch_size):
+                chunk_stats = AlertNotificationService._fan_out_chunk(
+                    alert, nearby[start:start + batch_size], push
                 )
-                
-                notification = AlertNotification(
-                    alert=alert,
-                    recipient=user,
-                    notification_type='nearby_alert',
-                    title=f"🚨 Alerte à proximité: {alert.get_category_display()}",
-                    message=f"{alert.title} - {alert.neighborhood or alert.city} ({distance:.1f} km)",
-                    extra_data={
-                        'distance_km': distance,
-                        'category': alert.category,
-                        'is_urgent': alert.is_urgent
-                    }
-                )
-                notifications.append(notification)
+                for key, value in chunk_stats.items():
+                    stats[key] += value
             
-            # Créer en lot pour optimiser les performances
-            if notifications:
-                AlertNotification.objects.bulk_create(notifications)
-                logger.info(f"Notifications d'alerte envoyées à {len(notifications)} utilisateurs")
+            logger.info(
+                f"Alerte {alert.alert_id} diffusée: {stats['notifications']} notifications, "
+                f"{stats['push_sent']} push envoyés, {stats['push_failed']} en échec"
+            )
             
         except Exception as e:
             logger.error(f"Erreur notification utilisateurs à proximité: {e}")
+        return stats
+    
+    @staticmethod
+    def _fan_out_chunk(alert: CommunityAlert, chunk, push: bool) -> Dict:
+        """Diffuser une alerte à un lot de (user_id, distance)"""
+        user_ids = [user_id for user_id, _ in chunk]
+        
+        # Sans préférences enregistrées, les valeurs par défaut du modèle s'appliquent
+        disabled = set(
+            NotificationPreference.objects.filter(
+                user_id__in=user_ids, community_alert_notifications=False
+            ).values_list('user_id', flat=True)
+        )
+        recipients = [(user_id, distance) for user_id, distance in chunk if user_id not in disabled]
+        
+        title = f"🚨 Alerte à proximité: {alert.get_category_display()}"
+        place = alert.neighborhood or alert.city
+        notifications = [
+            AlertNotification(
+                alert=alert,
+                recipient_id=user_id,
+                notification_type='nearby_alert',
+                title=title,
+                message=f"{alert.title} - {place} ({distance:.1f} km)",
+                extra_data={
+                    'distance_km': distance,
+                    'category': alert.category,
+                    'is_urgent': alert.is_urgent
+                }
+            )
+            for user_id, distance in recipients
+        ]
+        AlertNotification.objects.bulk_create(notifications, batch_size=500)
+        
+        stats = {'notifications': len(notifications), 'push_sent': 0, 'push_failed': 0}
+        if push and recipients:
+            sent_ids, result = AlertNotificationService.push_to_users(
+                alert, [user_id for user_id, _ in recipients], title, f"{alert.title} - {place}",
+                priority='high' if alert.is_urgent else 'normal'
+            )
+            AlertNotification.objects.filter(
+                alert=alert, notification_type='nearby_alert', recipient_id__in=sent_ids
+            ).update(is_sent=True, sent_at=timezone.now())
+            stats['push_sent'] = len(result.sent)
+            stats['push_failed'] = len(result.failed)
+        return stats
+    
+    @staticmethod
+    def push_to_users(alert: CommunityAlert, user_ids: List[int], title: str, body: str,
+                      priority: str = 'normal', dispatcher: Optional[PushDispatcher] = None):
+        """
+        Envoyer un push d'alerte aux utilisateurs ayant un token FCM et les push activés
+        Retourne les ids des utilisateurs atteints et le résultat du répartiteur
+        """
+        tokens = dict(
+            UserProfile.objects.filter(user_id__in=user_ids)
+            .exclude(fcm_token='')
+            .exclude(user__notification_preferences__push_notifications=False)
+            .values_list('user_id', 'fcm_token')
+        )
+        data = {
+            'alert_id': str(alert.alert_id),
+            'category': alert.category,
+            'type': 'nearby_alert',
+            'urgent': 'true' if alert.is_urgent else 'false'
+        }
+        messages = [PushMessage(token, title, body, data, priority) for token in tokens.values()]
+        result = (dispatcher or PushDispatcher()).send(messages)
+        
+        sent_tokens = set(result.sent)
+        sent_ids = [user_id for user_id, token in tokens.items() if token in sent_tokens]
+        return sent_ids, result
     
     @staticmethod
     def notify_alert_status_change(alert: CommunityAlert, old_status: str):
@@ -367,42 +448,17 @@ class AlertNotificationService:
             logger.error(f"Erreur notification offre d'aide: {e}")
     
     @staticmethod
-    def get_nearby_users(lat: float, lon: float, radius_km: float) -> List[User]:
-        """Récupérer les utilisateurs dans un rayon donné"""
+    def get_nearby_users(lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[User]:
+        """Récupérer les utilisateurs dans un rayon donné, triés par distance (index geohash du profil)"""
         try:
-            # Approximation: 1 degré ≈ 111 km
-            radius_degrees = radius_km / 111.0
-            
-            nearby_users = User.objects.filter(
-                profile__latitude__isnull=False,
-                profile__longitude__isnull=False,
-                profile__latitude__range=(
-                    lat - radius_degrees,
-                    lat + radius_degrees
-                ),
-                profile__longitude__range=(
-                    lon - radius_degrees,
-                    lon + radius_degrees
-                )
+            return GeoIndexService.nearby(
+                User.objects.filter(profile__geohash__gt='').select_related('profile'),
+                lat, lon, radius_km, limit,
+                lat_field='profile__latitude',
+                lon_field='profile__longitude',
+                geohash_field='profile__geohash'
             )
             
-            # Calculer les distances exactes et filtrer
-            users_with_distance = []
-            for user in nearby_users:
-                distance = AlertNotificationService.calculate_distance(
-                    lat, lon,
-                    user.profile.latitude, user.profile.longitude
-                )
-                
-                if distance <= radius_km:
-                    user.distance_km = distance
-                    users_with_distance.append(user)
-            
-            # Trier par distance
-            users_with_distance.sort(key=lambda x: x.distance_km)
-            
-            return users_with_distance
-            
         except Exception as e:
             logger.error(f"Erreur récupération utilisateurs à proximité: {e}")
             return []
@@ -410,16 +466,7 @@ class AlertNotificationService:
     @staticmethod
     def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculer la distance entre deux points géographiques (formule de Haversine)"""
-        R = 6371  # Rayon de la Terre en km
-        
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
     
     @staticmethod
     def send_urgent_alert_notifications(alert: CommunityAlert):
@@ -677,25 +724,13 @@ class PushNotificationService:
             title = f"🚨 Alerte {alert.get_category_display()}"
             message = f"{alert.title} - {alert.neighborhood or alert.city}"
             
-            # Données supplémentaires
-            data = {
-                'alert_id': str(alert.alert_id),
-                'category': alert.category,
-                'latitude': str(alert.latitude) if alert.latitude else '',
-                'longitude': str(alert.longitude) if alert.longitude else '',
-                'type': 'urgent_alert'
-            }
-            
-            # Envoyer aux utilisateurs à proximité
-            success_count = 0
-            for user in nearby_users:
-                if PushNotificationService.send_push_notification(
-                    user, title, message, data, priority='high'
-                ):
-                    success_count += 1
+            # Tokens lus en une requête, envoi avec reprise par le répartiteur
+            sent_ids, result = AlertNotificationService.push_to_users(
+                alert, [user.id for user in nearby_users], title, message, priority='high'
+            )
             
-            logger.info(f"Notifications urgentes envoyées: {success_count}/{len(nearby_users)}")
-            return success_count > 0
+            logger.info(f"Notifications urgentes envoyées: {len(sent_ids)}/{len(nearby_users)}")
+            return len(sent_ids) > 0
             
         except Exception as e:
             logger.error(f"Erreur notification alerte urgente: {e}")
@@ -742,52 +777,17 @@ class PushNotificationService:
     @staticmethod
     def _get_nearby_users(alert, radius_km=5.0):
         """Récupérer les utilisateurs à proximité d'une alerte"""
-        try:
-            if not alert.latitude or not alert.longitude:
-                return []
-            
-            # Calculer la boîte de recherche
-            lat_delta = radius_km / 111.0  # 1 degré ≈ 111 km
-            lon_delta = radius_km / (111.0 * math.cos(math.radians(alert.latitude)))
-            
-            # Filtrer les utilisateurs dans la zone
-            nearby_users = User.objects.filter(
-                latitude__range=(alert.latitude - lat_delta, alert.latitude + lat_delta),
-                longitude__range=(alert.longitude - lon_delta, alert.longitude + lon_delta),
-                fcm_token__isnull=False
-            ).exclude(fcm_token='')
-            
-            # Filtrer par distance exacte
-            filtered_users = []
-            for user in nearby_users:
-                distance = PushNotificationService._calculate_distance(
-                    alert.latitude, alert.longitude,
-                    user.latitude, user.longitude
-                )
-                if distance <= radius_km:
-                    filtered_users.append(user)
-            
-            return filtered_users
-            
-        except Exception as e:
-            logger.error(f"Erreur récupération utilisateurs proximité: {e}")
+        if not alert.latitude or not alert.longitude:
             return []
+        
+        return AlertNotificationService.get_nearby_users(alert.latitude, alert.longitude, radius_km)
     
     @staticmethod
     def _calculate_distance(lat1, lon1, lat2, lon2):
         """Calculer la distance entre deux points (formule de Haversine)"""
         try:
-            R = 6371  # Rayon de la Terre en km
-            
-            lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            
-            return R * c
-        except:
+            return haversine_km(lat1, lon1, lat2, lon2)
+        except (TypeError, ValueError):
             return float('inf')
     
     @staticmethod
@@ -0,0 +1,473 @@
+import io
+import random
+import threading
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from geography.geoindex import (
+    NUMPY_AVAILABLE, GeoIndexService, covering_cells, encode_geohash, haversine_km, rank_by_distance
+)
+from users.models import UserProfile
+from .jobs import JobQueue
+from .models import AlertNotification, CommunityAlert, NotificationPreference
+from .push_backends import (
+    FirebasePushBackend, PushBackend, PushDispatcher, PushMessage, PushSendError
+)
+from .push_service import PushNotificationService
+from .services import AlertNotificationService
+
+User = get_user_model()
+
+# Centre de Conakry
+CENTER = (9.5370, -13.6785)
+
+
+class GeoIndexTest(TestCase):
+    """Tests pour l'index geohash des alertes et des profils"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='geo_author', email='geo_author@example.com', password='testpass123'
+        )
+
+    def create_alert(self, latitude, longitude, **kwargs):
+        return CommunityAlert.objects.create(
+            title=kwargs.pop('title', 'Alerte'),
+            description='Description',
+            category=kwargs.pop('category', 'fire'),
+            latitude=round(latitude, 6),
+            longitude=round(longitude, 6),
+            author=self.author,
+            **kwargs
+        )
+
+    def test_geohash_follows_coordinates(self):
+        """Le geohash est recalculé à chaque enregistrement des coordonnées"""
+        alert = self.create_alert(*CENTER)
+        self.assertEqual(alert.geohash, encode_geohash(*CENTER))
+
+        alert.latitude, alert.longitude = 10.0, -12.0
+        alert.save(update_fields=['latitude', 'longitude'])
+        alert.refresh_from_db()
+        self.assertEqual(alert.geohash, encode_geohash(10.0, -12.0))
+
+    def test_geohash_follows_bulk_writes(self):
+        """Les écritures en masse recalculent aussi le geohash"""
+        CommunityAlert.objects.bulk_create([
+            CommunityAlert(title='Alerte', description='Description', category='fire',
+                           latitude=CENTER[0], longitude=CENTER[1], author=self.author),
+            CommunityAlert(title='Sans position', description='Description', category='fire', author=self.author),
+        ])
+        alert = CommunityAlert.objects.get(title='Alerte')
+        self.assertEqual(alert.geohash, encode_geohash(*CENTER))
+        self.assertEqual(CommunityAlert.objects.get(title='Sans position').geohash, '')
+
+        CommunityAlert.objects.filter(pk=alert.pk).update(latitude=10.0, longitude=-12.0)
+        alert.refresh_from_db()
+        self.assertEqual(alert.geohash, encode_geohash(10.0, -12.0))
+
+        CommunityAlert.objects.filter(pk=alert.pk).update(latitude=F('latitude') + 1)
+        alert.refresh_from_db()
+        self.assertEqual(alert.geohash, encode_geohash(11.0, -12.0))
+
+        alert.longitude = -13.0
+        CommunityAlert.objects.bulk_update([alert], ['longitude'])
+        alert.refresh_from_db()
+        self.assertEqual(alert.geohash, encode_geohash(11.0, -13.0))
+
+    def test_rebuild_geohashes_command(self):
+        """La commande rattrape les geohash des lignes écrites hors de l'ORM"""
+        alert = self.create_alert(*CENTER)
+        CommunityAlert.objects.filter(pk=alert.pk).update(geohash='')
+        output = io.StringIO()
+        call_command('rebuild_geohashes', stdout=output)
+
+        alert.refresh_from_db()
+        self.assertEqual(alert.geohash, encode_geohash(*CENTER))
+        self.assertIn('1 geohash recalculés', output.getvalue())
+
+    def test_matches_brute_force(self):
+        """Les cellules couvrantes ne perdent aucun point du rayon"""
+        rng = random.Random(42)
+        alerts = [
+            self.create_alert(CENTER[0] + rng.uniform(-0.2, 0.2), CENTER[1] + rng.uniform(-0.2, 0.2))
+            for _ in range(300)
+        ]
+
+        for radius_km in (0.5, 2.0, 5.0, 15.0):
+            expected = sorted(
+                alert.id for alert in alerts
+                if haversine_km(CENTER[0], CENTER[1], alert.latitude, alert.longitude) <= radius_km
+            )
+            found = GeoIndexService.nearest(CommunityAlert.objects.all(), CENTER[0], CENTER[1], radius_km)
+            self.assertEqual(sorted(pk for pk, _ in found), expected)
+
+            distances = [distance for _, distance in found]
+            self.assertEqual(distances, sorted(distances))
+            self.assertLessEqual(len(covering_cells(CENTER[0], CENTER[1], radius_km)), 32)
+
+    def rank_candidates(self):
+        """Candidats (pk, latitude, longitude) et leur classement attendu par force brute"""
+        rng = random.Random(3)
+        candidates = [
+            (pk, CENTER[0] + rng.uniform(-0.1, 0.1), CENTER[1] + rng.uniform(-0.1, 0.1))
+            for pk in range(2000)
+        ]
+        expected = sorted(
+            (pk for pk, lat, lon in candidates if haversine_km(CENTER[0], CENTER[1], lat, lon) <= 5.0),
+            key=lambda pk: haversine_km(CENTER[0], CENTER[1], candidates[pk][1], candidates[pk][2])
+        )
+        return candidates, expected
+
+    def test_rank_by_distance_python_fallback(self):
+        """Sans NumPy, le classement par boucle Python filtre le rayon et trie par distance"""
+        candidates, expected = self.rank_candidates()
+        with mock.patch('geography.geoindex.NUMPY_AVAILABLE', False):
+            ranked = rank_by_distance(candidates, CENTER[0], CENTER[1], 5.0)
+            nearest = rank_by_distance(candidates, CENTER[0], CENTER[1], 5.0, limit=10)
+
+        self.assertEqual([pk for pk, _ in ranked], expected)
+        self.assertEqual(nearest, ranked[:10])
+
+    @skipUnless(NUMPY_AVAILABLE, "NumPy non installé")
+    def test_rank_by_distance_numpy_matches_fallback(self):
+        """Le classement vectorisé (argpartition) donne le même ordre que la boucle Python"""
+        candidates, expected = self.rank_candidates()
+        with mock.patch('geography.geoindex.NUMPY_AVAILABLE', False):
+            fallback = rank_by_distance(candidates, CENTER[0], CENTER[1], 5.0, limit=10)
+        ranked = rank_by_distance(candidates, CENTER[0], CENTER[1], 5.0)
+        nearest = rank_by_distance(candidates, CENTER[0], CENTER[1], 5.0, limit=10)
+
+        self.assertEqual([pk for pk, _ in ranked], expected)
+        self.assertEqual([pk for pk, _ in nearest], [pk for pk, _ in fallback])
+        for (_, distance), (_, fallback_distance) in zip(nearest, fallback):
+            self.assertAlmostEqual(distance, fallback_distance, places=9)
+
+    def test_nearby_alerts_view(self):
+        """La vue renvoie les k alertes les plus proches dans le rayon"""
+        near = self.create_alert(CENTER[0] + 0.01, CENTER[1], title='Proche')
+        nearest = self.create_alert(CENTER[0], CENTER[1] + 0.001, title='Très proche')
+        self.create_alert(CENTER[0] + 0.03, CENTER[1], title='Moins proche')
+        self.create_alert(CENTER[0] + 0.5, CENTER[1], title='Hors rayon')
+
+        client = APIClient()
+        client.force_authenticate(user=self.author)
+        response = client.post('/api/notifications/alerts/nearby/', {
+            'latitude': CENTER[0], 'longitude': CENTER[1], 'radius_km': 5.0, 'limit': 2
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [alert['alert_id'] for alert in response.data['alerts']],
+            [str(nearest.alert_id), str(near.alert_id)]
+        )
+
+    def test_nearby_users_from_profile(self):
+        """Les utilisateurs sont trouvés via la localisation de leur profil"""
+        for index, offset in enumerate([0.02, 0.005, 0.3]):
+            user = User.objects.create_user(
+                username=f'voisin{index}', email=f'voisin{index}@example.com', password='testpass123'
+            )
+            UserProfile.objects.create(user=user, latitude=round(CENTER[0] + offset, 6), longitude=CENTER[1])
+        User.objects.create_user(username='sans_position', email='sans@example.com', password='testpass123')
+
+        users = AlertNotificationService.get_nearby_users(CENTER[0], CENTER[1], 5.0)
+
+        self.assertEqual([user.username for user in users], ['voisin1', 'voisin0'])
+        self.assertLess(users[0].distance_km, users[1].distance_km)
+
+
+class FlakyPushBackend(PushBackend):
+    """Backend de test : échecs transitoires puis succès, tokens invalides"""
+
+    def __init__(self, transient_failures=0, invalid_tokens=()):
+        self.transient_failures = transient_failures
+        self.invalid_tokens = set(invalid_tokens)
+        self.sent = []
+
+    def send(self, message):
+        if message.token in self.invalid_tokens:
+            raise PushSendError('Token non enregistré', invalid_token=True)
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise PushSendError('Service indisponible', retryable=True)
+        self.sent.append(message)
+        return 'ok'
+
+
+class RecordingPushBackend(PushBackend):
+    """Backend de test : conserve les messages envoyés (vidé par setUp)"""
+
+    outbox = []
+
+    def send(self, message):
+        RecordingPushBackend.outbox.append(message)
+        return 'ok'
+
+
+class PushDispatcherTest(TestCase):
+    """Tests pour le répartiteur de notifications push"""
+
+    def make_messages(self, *tokens):
+        return [PushMessage(token, 'Titre', 'Corps', {}, 'high') for token in tokens]
+
+    def test_retry_with_backoff(self):
+        """Les échecs transitoires sont renvoyés avec un délai croissant"""
+        delays = []
+        backend = FlakyPushBackend(transient_failures=3)
+        dispatcher = PushDispatcher(backend, max_retries=3, backoff=0.5, sleep=delays.append)
+
+        result = dispatcher.send(self.make_messages('a', 'b'))
+
+        # Tour 1 : deux échecs ; tour 2 : un échec ; tour 3 : succès
+        self.assertEqual(sorted(result.sent), ['a', 'b'])
+        self.assertEqual(result.failed, [])
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(delays, [0.5, 1.0])
+
+    def test_invalid_and_exhausted(self):
+        """Les tokens invalides sont signalés ; les reprises sont bornées"""
+        backend = FlakyPushBackend(transient_failures=100, invalid_tokens={'mort'})
+        dispatcher = PushDispatcher(backend, max_retries=2, backoff=0, sleep=lambda delay: None)
+
+        result = dispatcher.send(self.make_messages('mort', 'vivant'))
+
+        self.assertEqual(result.invalid, ['mort'])
+        self.assertEqual(result.failed, ['vivant'])
+        self.assertEqual(result.attempts, 3)
+
+
+class JobQueueTest(TestCase):
+    """Tests pour la file de tâches en arrière-plan"""
+
+    @override_settings(NOTIFICATION_QUEUE_EAGER=False, NOTIFICATION_QUEUE_WORKERS=1)
+    def test_jobs_run_in_background(self):
+        """Les tâches s'exécutent hors du thread appelant ; une erreur n'arrête pas le worker"""
+        job_queue = JobQueue('test')
+        threads = []
+
+        def failing():
+            raise RuntimeError('échec')
+
+        job_queue.enqueue(failing)
+        job_queue.enqueue(lambda: threads.append(threading.current_thread()))
+        job_queue.join()
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+
+@override_settings(
+    NOTIFICATION_QUEUE_EAGER=True,
+    PUSH_NOTIFICATION_BACKEND='notifications.tests.RecordingPushBackend',
+    PUSH_RETRY_BACKOFF=0,
+)
+class AlertFanOutTest(TestCase):
+    """Tests pour la diffusion des alertes aux utilisateurs à proximité"""
+
+    def setUp(self):
+        RecordingPushBackend.outbox.clear()
+        self.author = User.objects.create_user(
+            username='fanout_author', email='fanout_author@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.author)
+
+    def create_neighbours(self, count, prefix='voisin'):
+        users = []
+        for index in range(count):
+            user = User.objects.create_user(
+                username=f'{prefix}{index}', email=f'{prefix}{index}@example.com', password='testpass123'
+            )
+            UserProfile.objects.create(
+                user=user,
+                latitude=round(CENTER[0] + 0.001 * (index % 20), 6),
+                longitude=CENTER[1],
+                fcm_token=f'token-{prefix}{index}'
+            )
+            users.append(user)
+        return users
+
+    def create_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/alerts/', {
+                'title': 'Incendie au marché',
+                'description': 'Fumée visible',
+                'category': 'fire',
+                'latitude': CENTER[0],
+                'longitude': CENTER[1],
+                'city': 'Conakry',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return CommunityAlert.objects.get(title='Incendie au marché')
+
+    @override_settings(NOTIFICATION_QUEUE_EAGER=False)
+    def test_creation_only_enqueues(self):
+        """La création de l'alerte ne fait que mettre la diffusion en file"""
+        self.create_neighbours(3)
+        with mock.patch('notifications.services.alert_queue.enqueue') as enqueue:
+            alert = self.create_alert()
+
+        enqueue.assert_called_once_with(AlertNotificationService.fan_out_alert, alert.id)
+        self.assertFalse(AlertNotification.objects.exists())
+
+    def test_fan_out_respects_preferences(self):
+        """Notifications et push respectent les préférences ; les push envoyés sont marqués"""
+        muted, no_push, regular = self.create_neighbours(3)
+        NotificationPreference.objects.create(user=muted, community_alert_notifications=False)
+        NotificationPreference.objects.create(user=no_push, push_notifications=False)
+
+        alert = self.create_alert()
+
+        notifications = AlertNotification.objects.filter(alert=alert)
+        self.assertEqual(
+            set(notifications.values_list('recipient__username', flat=True)),
+            {no_push.username, regular.username}
+        )
+        self.assertEqual(list(notifications.filter(is_sent=True).values_list('recipient', flat=True)), [regular.id])
+        self.assertEqual([message.token for message in RecordingPushBackend.outbox], ['token-voisin2'])
+
+    def test_query_count_independent_of_recipients(self):
+        """Le nombre de requêtes de la diffusion ne dépend pas du nombre de destinataires"""
+        def fan_out_queries():
+            alert = CommunityAlert.objects.create(
+                title='Alerte', description='Description', category='fire',
+                latitude=CENTER[0], longitude=CENTER[1], author=self.author
+            )
+            with CaptureQueriesContext(connection) as context:
+                stats = AlertNotificationService.fan_out_alert(alert.id)
+            return stats, len(context.captured_queries)
+
+        self.create_neighbours(5, prefix='a')
+        small_stats, small_queries = fan_out_queries()
+        self.create_neighbours(40, prefix='b')
+        large_stats, large_queries = fan_out_queries()
+
+        self.assertEqual((small_stats['notifications'], large_stats['notifications']), (5, 45))
+        self.assertEqual(large_stats['push_sent'], 45)
+        self.assertEqual(small_queries, large_queries)
+
+
+class FakeMessaging:
+    """Faux module firebase_admin.messaging pour FirebasePushBackend"""
+
+    class FirebaseError(Exception):
+        def __init__(self, code):
+            super().__init__(code)
+            self.code = code
+
+    def __init__(self, errors=None, batch_errors=()):
+        # token -> liste de codes d'erreur successifs
+        self.errors = {token: list(codes) for token, codes in (errors or {}).items()}
+        # Exceptions levées pour tout un lot (réseau, authentification), une par appel
+        self.batch_errors = list(batch_errors)
+        self.calls = []
+
+    def Notification(self, **kwargs):
+        return kwargs
+
+    def AndroidConfig(self, **kwargs):
+        return kwargs
+
+    def MulticastMessage(self, **kwargs):
+        return kwargs
+
+    def send_each_for_multicast(self, message):
+        self.calls.append(message)
+        if self.batch_errors:
+            raise self.batch_errors.pop(0)
+        responses = []
+        for token in message['tokens']:
+            codes = self.errors.get(token)
+            exception = self.FirebaseError(codes.pop(0)) if codes else None
+            responses.append(mock.Mock(success=exception is None, exception=exception))
+        return mock.Mock(responses=responses)
+
+
+class MulticastDispatcherTest(TestCase):
+    """Tests pour l'envoi multicast par lots de 500 tokens"""
+
+    def setUp(self):
+        PushDispatcher.reset_metrics()
+
+    def test_grouped_into_500_token_batches(self):
+        """Les messages identiques partagent des lots d'au plus 500 tokens"""
+        messaging = FakeMessaging()
+        dispatcher = PushDispatcher(FirebasePushBackend(messaging=messaging), sleep=lambda delay: None)
+        messages = [PushMessage(f't{i}', 'Incendie', 'Marché', {'alert_id': '1'}, 'high') for i in range(1203)]
+        messages += [PushMessage(f'u{i}', 'Inondation', 'Port', {'alert_id': '2'}, 'normal') for i in range(3)]
+
+        result = dispatcher.send(messages)
+
+        self.assertEqual(len(result.sent), 1206)
+        self.assertEqual([len(call['tokens']) for call in messaging.calls], [500, 500, 203, 3])
+        self.assertEqual(result.batches, 4)
+
+        metrics = PushDispatcher.get_metrics()
+        self.assertEqual((metrics['messages'], metrics['sent'], metrics['batches']), (1206, 1206, 4))
+        self.assertGreater(metrics['throughput'], 0)
+
+    def test_invalid_tokens_pruned_and_transient_retried(self):
+        """Les tokens refusés sont effacés des profils ; les échecs transitoires sont renvoyés"""
+        user = User.objects.create_user(username='perime', email='perime@example.com', password='testpass123')
+        profile = UserProfile.objects.create(user=user, fcm_token='perime')
+        messaging = FakeMessaging({'perime': ['NOT_FOUND'], 'instable': ['UNAVAILABLE']})
+        dispatcher = PushDispatcher(FirebasePushBackend(messaging=messaging), sleep=lambda delay: None)
+
+        result = dispatcher.send([
+            PushMessage(token, 'Titre', 'Corps', {}, 'high') for token in ('perime', 'instable', 'ok')
+        ])
+
+        self.assertEqual(sorted(result.sent), ['instable', 'ok'])
+        self.assertEqual(result.invalid, ['perime'])
+        self.assertEqual(messaging.calls[1]['tokens'], ['instable'])
+        profile.refresh_from_db()
+        self.assertEqual(profile.fcm_token, '')
+
+    def test_transport_failures_retried(self):
+        """Un échec de tout le lot sans code FCM (délai, connexion) est renvoyé ; un refus ne l'est pas"""
+        messaging = FakeMessaging(batch_errors=[TimeoutError('délai dépassé'), ConnectionResetError('coupure')])
+        dispatcher = PushDispatcher(FirebasePushBackend(messaging=messaging), sleep=lambda delay: None)
+
+        result = dispatcher.send([PushMessage(token, 'Titre', 'Corps', {}, 'high') for token in ('a', 'b')])
+
+        self.assertEqual(sorted(result.sent), ['a', 'b'])
+        self.assertEqual((result.attempts, len(messaging.calls)), (3, 3))
+
+        messaging = FakeMessaging(batch_errors=[FakeMessaging.FirebaseError('PERMISSION_DENIED')])
+        dispatcher = PushDispatcher(FirebasePushBackend(messaging=messaging), sleep=lambda delay: None)
+        result = dispatcher.send([PushMessage('c', 'Titre', 'Corps', {}, 'high')])
+
+        # Refus d'authentification : ni renvoi, ni token déclaré invalide
+        self.assertEqual((result.failed, result.invalid, result.attempts), (['c'], [], 1))
+
+    @override_settings(PUSH_NOTIFICATION_BACKEND='notifications.push_backends.LocalPushBackend')
+    def test_bulk_notifications_marked_in_one_update(self):
+        """send_bulk_notifications lit les tokens en une requête et marque les envois en une mise à jour"""
+        author = User.objects.create_user(username='auteur', email='auteur@example.com', password='testpass123')
+        alert = CommunityAlert.objects.create(
+            title='Alerte', description='Description', category='fire',
+            latitude=CENTER[0], longitude=CENTER[1], author=author
+        )
+        notifications = []
+        for index in range(30):
+            user = User.objects.create_user(
+                username=f'dest{index}', email=f'dest{index}@example.com', password='testpass123'
+            )
+            UserProfile.objects.create(user=user, fcm_token=f'token{index}' if index % 3 else '')
+            notifications.append(AlertNotification.objects.create(
+                alert=alert, recipient=user, notification_type='nearby_alert', title='Alerte', message='Message'
+            ))
+
+        with self.assertNumQueries(3):
+            result = PushNotificationService().send_bulk_notifications(notifications)
+
+        self.assertEqual((result['success'], result['total'], result['batches']), (20, 20, 1))
+        self.assertEqual(AlertNotification.objects.filter(is_sent=True).count(), 20)
@@ -18,8 +18,9 @@ from django_filters.rest_framework import DjangoFilterBackend
 import json
 import logging
 from datetime import datetime, timedelta
-import math
 from rest_framework.exceptions import ValidationError
+from geography.geoindex import GeoIndexService, haversine_km
+from search.services import SearchService
 
 from .models import (
     Notification, 
@@ -45,7 +46,7 @@ from .serializers import (
     NearbyAlertsSerializer,
     AlertSearchSerializer
 )
-from .services import NotificationService
+from .services import NotificationService, AlertNotificationService
 
 logger = logging.getLogger(__name__)
 
@@ -258,7 +259,7 @@ class NearbyAlertsView(APIView):
             queryset = CommunityAlert.objects.filter(
                 latitude__isnull=False,
                 longitude__isnull=False
-            )
+            ).select_related('author')
             
             # Filtres
             if data.get('category_filter'):
@@ -268,37 +269,15 @@ class NearbyAlertsView(APIView):
                 urgent_categories = ['fire', 'medical', 'gas_leak', 'security']
                 queryset = queryset.filter(category__in=urgent_categories)
             
-            # Calculer la distance et filtrer par rayon
-            radius_degrees = data['radius_km'] / 111.0  # Approximation: 1 degré ≈ 111 km
-            
-            queryset = queryset.filter(
-                latitude__range=(
-                    data['latitude'] - radius_degrees,
-                    data['latitude'] + radius_degrees
-                ),
-                longitude__range=(
-                    data['longitude'] - radius_degrees,
-                    data['longitude'] + radius_degrees
-                )
+            # Cellules geohash couvrant le rayon, puis distances exactes et tri
+            alerts_with_distance = GeoIndexService.nearby(
+                queryset,
+                data['latitude'],
+                data['longitude'],
+                data['radius_km'],
+                limit=data.get('limit')
             )
             
-            # Calculer les distances exactes
-            alerts_with_distance = []
-            for alert in queryset:
-                # alert_point = Point(alert.longitude, alert.latitude)
-                # distance_km = user_point.distance(alert_point) * 111.0
-                distance_km = calculate_distance(
-                    data['latitude'], data['longitude'],
-                    alert.latitude, alert.longitude
-                )
-                
-                if distance_km <= data['radius_km']:
-                    alert.distance_km = distance_km
-                    alerts_with_distance.append(alert)
-            
-            # Trier par distance
-            alerts_with_distance.sort(key=lambda x: x.distance_km)
-            
             # Sérialiser
             serializer = CommunityAlertListSerializer(alerts_with_distance, many=True)
             
@@ -326,16 +305,9 @@ class AlertSearchView(APIView):
             
             queryset = CommunityAlert.objects.all()
             
-            # Recherche textuelle
+            # Recherche textuelle (index plein texte, classée par pertinence)
             if data.get('query'):
-                query = data['query']
-                queryset = queryset.filter(
-                    Q(title__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(address__icontains=query) |
-                    Q(neighborhood__icontains=query) |
-                    Q(city__icontains=query)
-                )
+                queryset = SearchService.filter_queryset(queryset, 'alert', data['query']).order_by('search_rank')
             
             # Filtres
             if data.get('category'):
@@ -740,23 +712,12 @@ def comprehensive_analytics_report(request):
 # ============================================================================
 
 def send_nearby_notifications(alert):
-    """Envoyer des notifications aux utilisateurs à proximité"""
+    """Envoyer des notifications aux utilisateurs à proximité (en arrière-plan)"""
     if not alert.latitude or not alert.longitude:
         return
     
-    # Pour l'instant, on va simplement logger l'alerte créée
-    # La fonctionnalité de notification géolocalisée sera implémentée plus tard
-    logger.info(f"Alerte créée avec succès: {alert.alert_id} - {alert.title}")
-    logger.info(f"Position: {alert.latitude}, {alert.longitude}")
-    logger.info(f"Catégorie: {alert.category}")
-    
-    # TODO: Implémenter la logique de notification géolocalisée
-    # - Trouver les utilisateurs dans un rayon de 5km
-    # - Créer des notifications pour ces utilisateurs
-    # - Envoyer les notifications
-    
-    # Pour l'instant, on ne fait rien de plus
-    pass
+    # La diffusion est exécutée par la file de tâches : la création répond immédiatement
+    AlertNotificationService.schedule_fan_out(alert)
 
 
 def send_status_update_notifications(alert, old_status):
@@ -783,13 +744,4 @@ def send_status_update_notifications(alert, old_status):
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculer la distance entre deux points géographiques (formule de Haversine)"""
-    R = 6371  # Rayon de la Terre en km
-    
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c 
\ No newline at end of file
+    return haversine_km(lat1, lon1, lat2, lon2) 
\ No newline at end of file
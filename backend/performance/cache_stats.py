@@ -0,0 +1,191 @@
+"""
+Statistiques du cache intelligent (``CacheOptimizationService``) tenues en mémoire.
+
+Chaque lecture incrémente des compteurs par stratégie dans le registre de
+métriques (monitoring.metrics : fragments par thread, sans verrou ni SQL).
+Périodiquement, ``CacheStatistics.maybe_flush`` écrit les écarts depuis le
+dernier vidage dans ``CacheHitRate`` en une seule requête
+``INSERT ... ON CONFLICT DO UPDATE`` (une ligne par jour, niveau et stratégie,
+cible de la contrainte ``unique_cache_hit_rate_per_day``). Les compteurs restent
+par ailleurs exposés par le registre de métriques (Prometheus).
+
+Les valeurs compressées par ``smart_cache_set`` sont enveloppées dans
+``CompressedValue`` pour que ``smart_cache_get`` sache les décompresser sans
+confondre une valeur ``bytes`` ordinaire avec une valeur compressée.
+"""
+import gzip
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedValue:
+    """Valeur texte compressée par gzip, telle que stockée dans le cache"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __getstate__(self):
+        return self.data
+
+    def __setstate__(self, data):
+        self.data = data
+
+
+def compress_value(value, min_size=1024):
+    """Compresse les textes de plus de ``min_size`` octets"""
+    if isinstance(value, str) and len(value) > min_size:
+        return CompressedValue(gzip.compress(value.encode('utf-8')))
+    return value
+
+
+def decompress_value(value):
+    """Inverse de ``compress_value`` ; les autres valeurs sont renvoyées telles quelles"""
+    if isinstance(value, CompressedValue):
+        return gzip.decompress(value.data).decode('utf-8')
+    return value
+
+
+class CacheStatistics:
+    """Compteurs de hits/misses par stratégie et leur vidage groupé dans ``CacheHitRate``"""
+
+    CACHE_LEVEL = 'l2'
+
+    def __init__(self, metrics_registry=None):
+        self.registry = metrics_registry or registry
+        self.requests = self.registry.counter(
+            'smart_cache_requests_total', 'Lectures du cache intelligent', ('strategy', 'result')
+        )
+        self.response_time = self.registry.counter(
+            'smart_cache_response_ms_total', 'Temps cumulé des lectures du cache intelligent (ms)', ('strategy',)
+        )
+        self.flushed = {}
+        self.flushed_at = time.monotonic()
+        self.flush_lock = threading.Lock()
+
+    def record(self, strategy_id, is_hit, duration_ms):
+        """Compte une lecture (aucune requête SQL)"""
+        self.requests.inc(labels=(strategy_id, 'hit' if is_hit else 'miss'))
+        self.response_time.inc(duration_ms, labels=(strategy_id,))
+
+    def pending(self):
+        """Écarts depuis le dernier vidage : ``{strategy_id: [hits, misses, temps_ms]}``"""
+        current = {}
+        for (strategy_id, result), count in self.requests.samples().items():
+            current.setdefault(strategy_id, [0, 0, 0.0])[0 if result == 'hit' else 1] = count
+        for (strategy_id,), total in self.response_time.samples().items():
+            current.setdefault(strategy_id, [0, 0, 0.0])[2] = total
+
+        deltas = {}
+        for strategy_id, values in current.items():
+            previous = self.flushed.get(strategy_id, [0, 0, 0.0])
+            if values[0] + values[1] < previous[0] + previous[1]:
+                # Compteurs remis à zéro depuis le dernier vidage
+                previous = [0, 0, 0.0]
+            delta = [value - before for value, before in zip(values, previous)]
+            if delta[0] or delta[1]:
+                deltas[strategy_id] = delta
+        return current, deltas
+
+    def maybe_flush(self):
+        """Vide si l'intervalle est écoulé ; un seul thread vide à la fois"""
+        interval = getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 60)
+        if time.monotonic() - self.flushed_at < interval:
+            return 0
+        return self.flush(blocking=False)
+
+    def flush(self, blocking=True):
+        """Écrit les écarts en une requête ; renvoie le nombre de lignes écrites"""
+        if not self.flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            self.flushed_at = time.monotonic()
+            current, deltas = self.pending()
+            if not deltas:
+                return 0
+            try:
+                self._upsert(timezone.localdate(), deltas)
+            except Exception as e:
+                # Écarts conservés pour le prochain vidage
+                logger.error(f"Erreur vidage statistiques cache: {e}")
+                return 0
+            self.flushed = current
+            return len(deltas)
+        finally:
+            self.flush_lock.release()
+
+    def _upsert(self, day, deltas):
+        from .models import CacheHitRate
+
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return self._update_rows(CacheHitRate, day, deltas)
+
+        quote = connection.ops.quote_name
+        table = quote(CacheHitRate._meta.db_table)
+        columns = ', '.join(quote(column) for column in (
+            'timestamp', 'day', 'cache_level', 'cache_strategy_id', 'hits', 'misses',
+            'hit_rate', 'avg_response_time', 'total_requests'
+        ))
+        now = CacheHitRate._meta.get_field('timestamp').get_db_prep_value(timezone.now(), connection)
+        day = CacheHitRate._meta.get_field('day').get_db_prep_value(day, connection)
+        rows = []
+        params = []
+        for strategy_id, (hits, misses, duration_ms) in deltas.items():
+            total = hits + misses
+            rows.append('(%s, %s, %s, %s, %s, %s, %s, %s, %s)')
+            params.extend([
+                now, day, self.CACHE_LEVEL, int(strategy_id), hits, misses,
+                hits / total * 100, duration_ms / total, total
+            ])
+
+        # Cumul sur la ligne du jour : taux et temps moyen recalculés sur les totaux
+        sql = f"""
+            INSERT INTO {table} ({columns})
+            VALUES {', '.join(rows)}
+            ON CONFLICT ({quote('day')}, {quote('cache_level')}, {quote('cache_strategy_id')}) DO UPDATE SET
+                hits = {table}.hits + excluded.hits,
+                misses = {table}.misses + excluded.misses,
+                total_requests = {table}.total_requests + excluded.total_requests,
+                hit_rate = 100.0 * ({table}.hits + excluded.hits)
+                    / ({table}.total_requests + excluded.total_requests),
+                avg_response_time = ({table}.avg_response_time * {table}.total_requests
+                    + excluded.avg_response_time * excluded.total_requests)
+                    / ({table}.total_requests + excluded.total_requests)
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _update_rows(self, model, day, deltas):
+        """Repli sans ``ON CONFLICT`` : une mise à jour F() par stratégie"""
+        with transaction.atomic():
+            for strategy_id, (hits, misses, duration_ms) in deltas.items():
+                total = hits + misses
+                row, created = model.objects.select_for_update().get_or_create(
+                    day=day, cache_level=self.CACHE_LEVEL, cache_strategy_id=int(strategy_id),
+                    defaults={
+                        'hits': hits, 'misses': misses, 'total_requests': total,
+                        'hit_rate': hits / total * 100, 'avg_response_time': duration_ms / total,
+                    }
+                )
+                if created:
+                    continue
+                new_total = row.total_requests + total
+                model.objects.filter(pk=row.pk).update(
+                    hits=F('hits') + hits,
+                    misses=F('misses') + misses,
+                    total_requests=F('total_requests') + total,
+                    hit_rate=(row.hits + hits) / new_total * 100,
+                    avg_response_time=(row.avg_response_time * row.total_requests + duration_ms) / new_total,
+                )
+
+
+cache_statistics = CacheStatistics()
@@ -0,0 +1,290 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutoScaling',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('scaling_type', models.CharField(choices=[('horizontal', 'Horizontal'), ('vertical', 'Vertical'), ('hybrid', 'Hybride')], max_length=20)),
+                ('trigger_type', models.CharField(choices=[('cpu_usage', 'Utilisation CPU'), ('memory_usage', 'Utilisation Mémoire'), ('response_time', 'Temps de Réponse'), ('request_count', 'Nombre de Requêtes'), ('error_rate', "Taux d'Erreur")], max_length=20)),
+                ('min_instances', models.IntegerField(default=1)),
+                ('max_instances', models.IntegerField(default=10)),
+                ('scale_up_threshold', models.FloatField(default=80.0)),
+                ('scale_down_threshold', models.FloatField(default=20.0)),
+                ('cooldown_period', models.IntegerField(default=300)),
+                ('is_enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Auto Scaling',
+                'verbose_name_plural': 'Auto Scaling',
+            },
+        ),
+        migrations.CreateModel(
+            name='CacheStrategy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('cache_type', models.CharField(choices=[('redis', 'Redis'), ('memcached', 'Memcached'), ('database', 'Base de Données'), ('cdn', 'CDN'), ('browser', 'Navigateur')], max_length=20)),
+                ('strategy_type', models.CharField(choices=[('lru', 'LRU (Least Recently Used)'), ('lfu', 'LFU (Least Frequently Used)'), ('ttl', 'TTL (Time To Live)'), ('adaptive', 'Adaptatif'), ('predictive', 'Prédictif')], max_length=20)),
+                ('ttl_seconds', models.IntegerField(default=3600)),
+                ('max_size_mb', models.IntegerField(default=100)),
+                ('compression_enabled', models.BooleanField(default=True)),
+                ('encryption_enabled', models.BooleanField(default=False)),
+                ('rules', models.JSONField(default=dict)),
+                ('conditions', models.JSONField(default=dict)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stratégie de Cache',
+                'verbose_name_plural': 'Stratégies de Cache',
+            },
+        ),
+        migrations.CreateModel(
+            name='CDNOptimization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('provider', models.CharField(choices=[('cloudflare', 'Cloudflare'), ('aws_cloudfront', 'AWS CloudFront'), ('google_cdn', 'Google CDN'), ('azure_cdn', 'Azure CDN'), ('custom', 'Personnalisé')], max_length=30)),
+                ('is_enabled', models.BooleanField(default=True)),
+                ('cache_ttl', models.IntegerField(default=3600)),
+                ('compression_enabled', models.BooleanField(default=True)),
+                ('ssl_enabled', models.BooleanField(default=True)),
+                ('rules', models.JSONField(default=dict)),
+                ('edge_locations', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Optimisation CDN',
+                'verbose_name_plural': 'Optimisations CDN',
+            },
+        ),
+        migrations.CreateModel(
+            name='DatabaseConnectionPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('pool_type', models.CharField(choices=[('read', 'Lecture'), ('write', 'Écriture'), ('mixed', 'Mixte')], max_length=20)),
+                ('max_connections', models.IntegerField(default=20)),
+                ('min_connections', models.IntegerField(default=5)),
+                ('current_connections', models.IntegerField(default=0)),
+                ('available_connections', models.IntegerField(default=0)),
+                ('avg_connection_time', models.FloatField(default=0.0)),
+                ('max_connection_time', models.FloatField(default=0.0)),
+                ('connection_errors', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Pool de Connexions Base de Données',
+                'verbose_name_plural': 'Pools de Connexions Base de Données',
+            },
+        ),
+        migrations.CreateModel(
+            name='LoadBalancer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('lb_type', models.CharField(choices=[('round_robin', 'Round Robin'), ('least_connections', 'Moins de Connexions'), ('ip_hash', 'Hash IP'), ('weighted', 'Pondéré'), ('adaptive', 'Adaptatif')], max_length=30)),
+                ('is_active', models.BooleanField(default=True)),
+                ('health_check_enabled', models.BooleanField(default=True)),
+                ('health_check_interval', models.IntegerField(default=30)),
+                ('servers', models.JSONField(default=list)),
+                ('weights', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Load Balancer',
+                'verbose_name_plural': 'Load Balancers',
+            },
+        ),
+        migrations.CreateModel(
+            name='NetworkOptimization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('optimization_type', models.CharField(choices=[('compression', 'Compression'), ('minification', 'Minification'), ('bundling', 'Bundling'), ('lazy_loading', 'Chargement Lazy'), ('prefetching', 'Préchargement'), ('cdn_routing', 'Routage CDN')], max_length=30)),
+                ('is_enabled', models.BooleanField(default=True)),
+                ('configuration', models.JSONField(default=dict)),
+                ('bandwidth_saved', models.BigIntegerField(default=0)),
+                ('load_time_improvement', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Optimisation Réseau',
+                'verbose_name_plural': 'Optimisations Réseau',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResourceMonitoring',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('resource_type', models.CharField(choices=[('cpu', 'CPU'), ('memory', 'Mémoire'), ('disk', 'Disque'), ('network', 'Réseau'), ('database', 'Base de Données'), ('cache', 'Cache')], max_length=20)),
+                ('usage_percentage', models.FloatField()),
+                ('total_capacity', models.BigIntegerField()),
+                ('used_capacity', models.BigIntegerField()),
+                ('available_capacity', models.BigIntegerField()),
+                ('details', models.JSONField(default=dict)),
+                ('server_id', models.CharField(max_length=100)),
+                ('environment', models.CharField(default='production', max_length=20)),
+            ],
+            options={
+                'verbose_name': 'Monitoring des Ressources',
+                'verbose_name_plural': 'Monitoring des Ressources',
+                'indexes': [models.Index(fields=['timestamp', 'resource_type'], name='performance_timesta_c2dc5e_idx'), models.Index(fields=['resource_type', 'usage_percentage'], name='performance_resourc_75cb8a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QueryOptimization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query_hash', models.CharField(max_length=64, unique=True)),
+                ('query_type', models.CharField(choices=[('select', 'SELECT'), ('insert', 'INSERT'), ('update', 'UPDATE'), ('delete', 'DELETE'), ('complex', 'Complexe')], max_length=20)),
+                ('query_text', models.TextField()),
+                ('execution_count', models.IntegerField(default=0)),
+                ('avg_execution_time', models.FloatField(default=0.0)),
+                ('max_execution_time', models.FloatField(default=0.0)),
+                ('total_execution_time', models.FloatField(default=0.0)),
+                ('optimizations', models.JSONField(default=list)),
+                ('is_optimized', models.BooleanField(default=False)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Optimisation de Requête',
+                'verbose_name_plural': 'Optimisations de Requêtes',
+                'indexes': [models.Index(fields=['avg_execution_time', 'execution_count'], name='performance_avg_exe_726837_idx'), models.Index(fields=['is_optimized', 'query_type'], name='performance_is_opti_4909a1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DatabaseOptimization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('optimization_type', models.CharField(choices=[('indexing', 'Indexation'), ('query_optimization', 'Optimisation de Requêtes'), ('connection_pooling', 'Pool de Connexions'), ('partitioning', 'Partitionnement'), ('sharding', 'Sharding'), ('replication', 'Réplication')], max_length=30)),
+                ('is_enabled', models.BooleanField(default=True)),
+                ('configuration', models.JSONField(default=dict)),
+                ('improvement_percentage', models.FloatField(default=0.0)),
+                ('execution_time_ms', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('applied_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Optimisation Base de Données',
+                'verbose_name_plural': 'Optimisations Base de Données',
+            },
+        ),
+        migrations.CreateModel(
+            name='PerformanceReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('report_type', models.CharField(choices=[('daily', 'Quotidien'), ('weekly', 'Hebdomadaire'), ('monthly', 'Mensuel'), ('custom', 'Personnalisé')], max_length=20)),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField()),
+                ('avg_response_time', models.FloatField()),
+                ('total_requests', models.BigIntegerField()),
+                ('error_rate', models.FloatField()),
+                ('throughput', models.FloatField()),
+                ('summary', models.JSONField(default=dict)),
+                ('recommendations', models.JSONField(default=list)),
+                ('generated_at', models.DateTimeField(auto_now_add=True)),
+                ('generated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Rapport de Performance',
+                'verbose_name_plural': 'Rapports de Performance',
+                'indexes': [models.Index(fields=['start_date', 'end_date'], name='performance_start_d_60bb0a_idx'), models.Index(fields=['report_type', 'generated_at'], name='performance_report__db29a9_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PerformanceMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('metric_type', models.CharField(choices=[('response_time', 'Temps de Réponse'), ('throughput', 'Débit'), ('error_rate', "Taux d'Erreur"), ('cpu_usage', 'Utilisation CPU'), ('memory_usage', 'Utilisation Mémoire'), ('disk_usage', 'Utilisation Disque'), ('network_usage', 'Utilisation Réseau'), ('database_queries', 'Requêtes Base de Données'), ('cache_hit_rate', 'Taux de Cache'), ('user_sessions', 'Sessions Utilisateurs')], max_length=30)),
+                ('value', models.FloatField()),
+                ('unit', models.CharField(max_length=20)),
+                ('endpoint', models.CharField(blank=True, max_length=200)),
+                ('region', models.CharField(blank=True, max_length=50)),
+                ('server_id', models.CharField(blank=True, max_length=100)),
+                ('environment', models.CharField(default='production', max_length=20)),
+                ('user_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Métrique de Performance',
+                'verbose_name_plural': 'Métriques de Performance',
+                'indexes': [models.Index(fields=['timestamp', 'metric_type'], name='performance_timesta_f22b2e_idx'), models.Index(fields=['metric_type', 'value'], name='performance_metric__3cc476_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PerformanceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('alert_type', models.CharField(choices=[('critical', 'Critique'), ('warning', 'Avertissement'), ('info', 'Information')], max_length=20)),
+                ('severity', models.CharField(choices=[('low', 'Faible'), ('medium', 'Moyen'), ('high', 'Élevé'), ('critical', 'Critique')], max_length=20)),
+                ('description', models.TextField()),
+                ('metric_type', models.CharField(max_length=30)),
+                ('threshold_value', models.FloatField()),
+                ('current_value', models.FloatField()),
+                ('is_resolved', models.BooleanField(default=False)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Alerte de Performance',
+                'verbose_name_plural': 'Alertes de Performance',
+                'indexes': [models.Index(fields=['is_resolved', 'severity'], name='performance_is_reso_b258f4_idx'), models.Index(fields=['created_at', 'alert_type'], name='performance_created_132b99_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CacheHitRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('day', models.DateField(default=django.utils.timezone.localdate)),
+                ('cache_level', models.CharField(choices=[('l1', 'L1 (CPU)'), ('l2', 'L2 (RAM)'), ('l3', 'L3 (Redis)'), ('l4', 'L4 (CDN)'), ('l5', 'L5 (Browser)')], max_length=10)),
+                ('hits', models.BigIntegerField(default=0)),
+                ('misses', models.BigIntegerField(default=0)),
+                ('hit_rate', models.FloatField()),
+                ('avg_response_time', models.FloatField()),
+                ('total_requests', models.BigIntegerField()),
+                ('cache_strategy', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='performance.cachestrategy')),
+            ],
+            options={
+                'verbose_name': 'Taux de Réussite Cache',
+                'verbose_name_plural': 'Taux de Réussite Cache',
+                'indexes': [models.Index(fields=['timestamp', 'cache_level'], name='performance_timesta_9be05b_idx'), models.Index(fields=['cache_level', 'hit_rate'], name='performance_cache_l_7af9ef_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cachehitrate',
+            constraint=models.UniqueConstraint(fields=('day', 'cache_level', 'cache_strategy'), name='unique_cache_hit_rate_per_day'),
+        ),
+    ]
@@ -5,7 +5,6 @@ from django.core.cache import cache
 from datetime import datetime, timedelta
 import uuid
 import json
-import psutil
 import threading
 import time
 from typing import Dict, List, Optional
@@ -415,6 +414,8 @@ class CacheHitRate(models.Model):
     ]
     
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Jour cumulé par CacheStatistics (une ligne par jour, niveau et stratégie)
+    day = models.DateField(default=timezone.localdate)
     cache_level = models.CharField(max_length=10, choices=CACHE_LEVELS)
     
     # Métriques
@@ -436,6 +437,12 @@ class CacheHitRate(models.Model):
             models.Index(fields=['timestamp', 'cache_level']),
             models.Index(fields=['cache_level', 'hit_rate']),
         ]
+        constraints = [
+            # Cible de l'upsert de CacheStatistics (les lignes sans stratégie restent libres)
+            models.UniqueConstraint(
+                fields=['day', 'cache_level', 'cache_strategy'], name='unique_cache_hit_rate_per_day'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.cache_level} - {self.hit_rate:.2f}% - {self.timestamp}"
@@ -3,13 +3,15 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from .models import (
     PerformanceMetrics, CacheStrategy, DatabaseOptimization, LoadBalancer,
     AutoScaling, CDNOptimization, QueryOptimization, PerformanceAlert,
     ResourceMonitoring, PerformanceReport, CacheHitRate, DatabaseConnectionPool,
     NetworkOptimization
 )
+from .cache_stats import cache_statistics, compress_value, decompress_value
+from monitoring.timeseries import timeseries
 import psutil
 import threading
 import time
@@ -70,58 +72,24 @@ class PerformanceMonitoringService:
                 time.sleep(60)  # Attendre 1 minute en cas d'erreur
     
     def _collect_system_metrics(self):
-        """Collecte les métriques système"""
+        """
+        Collecte les métriques système dans les séries temporelles
+        (monitoring.timeseries : tampons circulaires sous-échantillonnés,
+        taille fixe) au lieu d'une ligne en base par mesure
+        """
         try:
-            # CPU
             cpu_percent = psutil.cpu_percent(interval=1)
-            PerformanceMetrics.objects.create(
-                metric_type='cpu_usage',
-                value=cpu_percent,
-                unit='%'
-            )
-            
-            # Mémoire
             memory = psutil.virtual_memory()
-            PerformanceMetrics.objects.create(
-                metric_type='memory_usage',
-                value=memory.percent,
-                unit='%'
-            )
-            
-            # Disque
             disk = psutil.disk_usage('/')
-            PerformanceMetrics.objects.create(
-                metric_type='disk_usage',
-                value=(disk.used / disk.total) * 100,
-                unit='%'
-            )
-            
-            # Réseau
             network = psutil.net_io_counters()
-            PerformanceMetrics.objects.create(
-                metric_type='network_usage',
-                value=network.bytes_sent + network.bytes_recv,
-                unit='bytes'
-            )
             
-            # Monitoring des ressources
-            ResourceMonitoring.objects.create(
-                resource_type='cpu',
-                usage_percentage=cpu_percent,
-                total_capacity=psutil.cpu_count(),
-                used_capacity=int(cpu_percent * psutil.cpu_count() / 100),
-                available_capacity=psutil.cpu_count() - int(cpu_percent * psutil.cpu_count() / 100),
-                server_id=settings.SERVER_ID if hasattr(settings, 'SERVER_ID') else 'default'
-            )
-            
-            ResourceMonitoring.objects.create(
-                resource_type='memory',
-                usage_percentage=memory.percent,
-                total_capacity=memory.total,
-                used_capacity=memory.used,
-                available_capacity=memory.available,
-                server_id=settings.SERVER_ID if hasattr(settings, 'SERVER_ID') else 'default'
-            )
+            timeseries.record_many({
+                'cpu_usage': cpu_percent,
+                'memory_usage': memory.percent,
+                'memory_used_bytes': memory.used,
+                'disk_usage': (disk.used / disk.total) * 100,
+                'network_usage': network.bytes_sent + network.bytes_recv,
+            })
             
         except Exception as e:
             logger.error(f"Erreur collecte métriques: {e}")
@@ -129,30 +97,28 @@ class PerformanceMonitoringService:
     def _check_performance_alerts(self):
         """Vérifie les alertes de performance"""
         try:
-            # Récupérer les dernières métriques
-            recent_metrics = PerformanceMetrics.objects.filter(
-                timestamp__gte=timezone.now() - timedelta(minutes=5)
-            )
-            
-            for metric in recent_metrics:
-                threshold = self.alert_thresholds.get(metric.metric_type)
-                if threshold and metric.value > threshold:
-                    # Créer une alerte
-                    alert, created = PerformanceAlert.objects.get_or_create(
-                        metric_type=metric.metric_type,
-                        is_resolved=False,
-                        defaults={
-                            'title': f"Seuil dépassé: {metric.metric_type}",
-                            'alert_type': 'warning',
-                            'severity': 'high',
-                            'description': f"La métrique {metric.metric_type} a dépassé le seuil de {threshold}{metric.unit}",
-                            'threshold_value': threshold,
-                            'current_value': metric.value
-                        }
-                    )
-                    
-                    if created:
-                        logger.warning(f"Alerte performance créée: {alert.title}")
+            # Dernières mesures (5 minutes) des métriques surveillées
+            for metric_type, threshold in self.alert_thresholds.items():
+                latest = timeseries.latest(metric_type, max_age=300)
+                if latest is None or latest['max'] <= threshold:
+                    continue
+                
+                # Créer une alerte
+                alert, created = PerformanceAlert.objects.get_or_create(
+                    metric_type=metric_type,
+                    is_resolved=False,
+                    defaults={
+                        'title': f"Seuil dépassé: {metric_type}",
+                        'alert_type': 'warning',
+                        'severity': 'high',
+                        'description': f"La métrique {metric_type} a dépassé le seuil de {threshold}",
+                        'threshold_value': threshold,
+                        'current_value': latest['max']
+                    }
+                )
+                
+                if created:
+                    logger.warning(f"Alerte performance créée: {alert.title}")
                         
         except Exception as e:
             logger.error(f"Erreur vérification alertes: {e}")
@@ -214,16 +180,15 @@ class CacheOptimizationService:
                 return None
             
             # Récupérer du cache
+            start_time = time.perf_counter()
             cached_value = cache.get(key)
+            self._update_cache_hit_metrics(
+                strategy, cached_value is not None, (time.perf_counter() - start_time) * 1000
+            )
             
             if cached_value is not None:
-                # Mettre à jour les métriques de hit
-                self._update_cache_hit_metrics(strategy, True)
-                return cached_value
-            else:
-                # Mettre à jour les métriques de miss
-                self._update_cache_hit_metrics(strategy, False)
-                return None
+                return self._decompress_value(cached_value)
+            return None
                 
         except Exception as e:
             logger.error(f"Erreur cache get: {e}")
@@ -253,45 +218,36 @@ class CacheOptimizationService:
             logger.error(f"Erreur cache set: {e}")
             return False
     
-    def _update_cache_hit_metrics(self, strategy: CacheStrategy, is_hit: bool):
-        """Met à jour les métriques de cache"""
+    def _update_cache_hit_metrics(self, strategy: CacheStrategy, is_hit: bool, duration_ms: float = 0.0):
+        """
+        Met à jour les métriques de cache : compteurs en mémoire, vidés
+        périodiquement dans CacheHitRate en une seule requête (voir cache_stats)
+        """
         try:
-            cache_hit_rate, created = CacheHitRate.objects.get_or_create(
-                cache_level='l2',  # Redis
-                timestamp__date=timezone.now().date(),
-                defaults={
-                    'hits': 1 if is_hit else 0,
-                    'misses': 0 if is_hit else 1,
-                    'hit_rate': 100.0 if is_hit else 0.0,
-                    'avg_response_time': 5.0,
-                    'total_requests': 1
-                }
-            )
-            
-            if not created:
-                if is_hit:
-                    cache_hit_rate.hits += 1
-                else:
-                    cache_hit_rate.misses += 1
-                
-                total_requests = cache_hit_rate.hits + cache_hit_rate.misses
-                cache_hit_rate.hit_rate = (cache_hit_rate.hits / total_requests) * 100
-                cache_hit_rate.total_requests = total_requests
-                cache_hit_rate.save()
-                
+            cache_statistics.record(strategy.pk, is_hit, duration_ms)
+            cache_statistics.maybe_flush()
         except Exception as e:
             logger.error(f"Erreur mise à jour métriques cache: {e}")
     
+    def flush_cache_metrics(self) -> int:
+        """Écrit immédiatement les métriques de cache en attente"""
+        return cache_statistics.flush()
+    
     def _compress_value(self, value):
         """Compresse une valeur pour le cache"""
         try:
-            if isinstance(value, str) and len(value) > 1024:  # 1KB
-                import gzip
-                return gzip.compress(value.encode('utf-8'))
-            return value
+            return compress_value(value)
         except Exception as e:
             logger.error(f"Erreur compression: {e}")
             return value
+    
+    def _decompress_value(self, value):
+        """Décompresse une valeur lue du cache (inverse de _compress_value)"""
+        try:
+            return decompress_value(value)
+        except Exception as e:
+            logger.error(f"Erreur décompression: {e}")
+            return None
 
 class DatabaseOptimizationService:
     """Service d'optimisation de base de données"""
@@ -479,13 +435,11 @@ class AutoScalingService:
     def _get_current_metric(self, metric_type: str) -> float:
         """Récupère la métrique actuelle"""
         try:
-            # Récupérer la dernière métrique
-            latest_metric = PerformanceMetrics.objects.filter(
-                metric_type=metric_type
-            ).order_by('-timestamp').first()
+            # Récupérer la dernière mesure
+            latest_metric = timeseries.latest(metric_type)
             
             if latest_metric:
-                return latest_metric.value
+                return latest_metric['avg']
             else:
                 # Valeur par défaut
                 return 50.0
@@ -581,27 +535,18 @@ class PerformanceReportService:
             start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
             
-            # Récupérer les métriques
-            metrics = PerformanceMetrics.objects.filter(
-                timestamp__range=(start_date, end_date)
-            )
+            # Agrégats horaires des séries temporelles (retenues 90 jours)
+            start, end = start_date.timestamp(), end_date.timestamp()
+            metrics = {
+                metric_type: timeseries.query(metric_type, start, end, resolution=3600)
+                for metric_type in timeseries.metrics()
+            }
             
             # Calculer les moyennes
-            avg_response_time = metrics.filter(
-                metric_type='response_time'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
-            
-            total_requests = metrics.filter(
-                metric_type='throughput'
-            ).aggregate(sum=Sum('value'))['sum'] or 0
-            
-            error_rate = metrics.filter(
-                metric_type='error_rate'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
-            
-            throughput = metrics.filter(
-                metric_type='throughput'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
+            avg_response_time = self._average(metrics, 'response_time')
+            total_requests = int(sum(point['sum'] for point in metrics.get('requests', [])))
+            error_rate = self._average(metrics, 'error_rate')
+            throughput = total_requests / (end - start)  # requêtes par seconde
             
             # Créer le rapport
             report = PerformanceReport.objects.create(
@@ -614,7 +559,7 @@ class PerformanceReportService:
                 error_rate=error_rate,
                 throughput=throughput,
                 summary={
-                    'total_metrics': metrics.count(),
+                    'total_metrics': sum(point['count'] for points in metrics.values() for point in points),
                     'peak_hour': self._get_peak_hour(metrics),
                     'slowest_endpoint': self._get_slowest_endpoint(metrics)
                 },
@@ -630,8 +575,12 @@ class PerformanceReportService:
     def _get_peak_hour(self, metrics) -> str:
         """Récupère l'heure de pointe"""
         try:
-            # Logique pour déterminer l'heure de pointe
-            return "14:00"
+            # Heure comptant le plus de requêtes
+            points = metrics.get('requests', [])
+            if not points:
+                return "N/A"
+            peak = max(points, key=lambda point: point['sum'])
+            return timezone.localtime(datetime.fromtimestamp(peak['timestamp'], tz=dt_timezone.utc)).strftime('%H:00')
         except Exception as e:
             logger.error(f"Erreur heure de pointe: {e}")
             return "N/A"
@@ -645,31 +594,31 @@ class PerformanceReportService:
             logger.error(f"Erreur endpoint le plus lent: {e}")
             return "N/A"
     
+    def _average(self, metrics, metric_type) -> float:
+        """Moyenne d'une série sur la période du rapport"""
+        points = metrics.get(metric_type, [])
+        count = sum(point['count'] for point in points)
+        return sum(point['sum'] for point in points) / count if count else 0.0
+    
     def _generate_recommendations(self, metrics) -> List[str]:
         """Génère des recommandations basées sur les métriques"""
         try:
             recommendations = []
             
             # Vérifier le temps de réponse
-            avg_response_time = metrics.filter(
-                metric_type='response_time'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
+            avg_response_time = self._average(metrics, 'response_time')
             
             if avg_response_time > 1000:  # 1 seconde
                 recommendations.append("Optimiser les requêtes de base de données")
             
             # Vérifier le taux d'erreur
-            error_rate = metrics.filter(
-                metric_type='error_rate'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
+            error_rate = self._average(metrics, 'error_rate')
             
             if error_rate > 5.0:  # 5%
                 recommendations.append("Investigation des erreurs requise")
             
             # Vérifier l'utilisation CPU
-            cpu_usage = metrics.filter(
-                metric_type='cpu_usage'
-            ).aggregate(avg=Avg('value'))['avg'] or 0.0
+            cpu_usage = self._average(metrics, 'cpu_usage')
             
             if cpu_usage > 80.0:  # 80%
                 recommendations.append("Considérer l'auto-scaling")
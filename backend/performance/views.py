@@ -16,7 +16,9 @@ from .services import (
     performance_monitor, cache_optimizer, db_optimizer, 
     auto_scaler, cdn_optimizer, report_service
 )
+from monitoring.timeseries import timeseries
 import logging
+import time
 from datetime import datetime, timedelta
 import psutil
 
@@ -104,24 +106,11 @@ def get_system_resources(request):
     Endpoint pour récupérer les ressources système
     """
     try:
-        # Récupérer les dernières métriques de ressources
-        recent_resources = ResourceMonitoring.objects.filter(
-            timestamp__gte=timezone.now() - timedelta(hours=1)
-        ).order_by('-timestamp')
-        
-        resources_data = {}
-        for resource in recent_resources:
-            if resource.resource_type not in resources_data:
-                resources_data[resource.resource_type] = []
-            
-            resources_data[resource.resource_type].append({
-                'timestamp': resource.timestamp.isoformat(),
-                'usage_percentage': resource.usage_percentage,
-                'total_capacity': resource.total_capacity,
-                'used_capacity': resource.used_capacity,
-                'available_capacity': resource.available_capacity,
-                'details': resource.details
-            })
+        # Dernière heure des séries temporelles (une case par minute)
+        resources_data = {
+            metric_type: timeseries.query(metric_type, time.time() - 3600)
+            for metric_type in ('cpu_usage', 'memory_usage', 'disk_usage', 'network_usage')
+        }
         
         # Métriques système en temps réel
         real_time_metrics = {
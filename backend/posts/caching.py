@@ -0,0 +1,166 @@
+"""
+Cache à étiquettes (tags) pour les posts, likes, commentaires et partages.
+
+Chaque entrée est stockée avec les générations courantes de ses tags, par
+exemple ``post:12``, ``commune:3`` ou ``user:7``. Invalider un tag revient à
+incrémenter sa génération (une seule opération atomique, quel que soit le
+nombre d'entrées concernées) : les entrées qui portaient l'ancienne
+génération sont ignorées à la lecture puis expirent d'elles-mêmes.
+
+Une génération absente du cache (éviction, redémarrage) est recréée avec une
+valeur fraîche, de sorte qu'une entrée ancienne ne redevient jamais valide.
+"""
+import logging
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class TaggedCacheService:
+    """Service de cache invalidable par tags"""
+
+    CACHE_ALIAS = 'posts'
+
+    @staticmethod
+    def get_cache():
+        # Certains déploiements (Render) ne déclarent que le cache par défaut
+        if TaggedCacheService.CACHE_ALIAS in settings.CACHES:
+            return caches[TaggedCacheService.CACHE_ALIAS]
+        return caches['default']
+
+    @staticmethod
+    def get_timeout(name, default):
+        return getattr(settings, 'CACHE_TIMEOUTS', {}).get(name, default)
+
+    # Tags
+
+    @staticmethod
+    def post_tag(post_id):
+        return f"post:{post_id}"
+
+    @staticmethod
+    def commune_tag(commune_id):
+        return f"commune:{commune_id}"
+
+    @staticmethod
+    def user_tag(user_id):
+        return f"user:{user_id}"
+
+    @staticmethod
+    def get_post_detail_tags(post):
+        """Tags du détail d'un post : le post et son auteur (pas la commune, dont
+        chaque nouveau post invaliderait le détail de tous les autres)"""
+        return [
+            TaggedCacheService.post_tag(post.id),
+            TaggedCacheService.user_tag(post.author_id),
+        ]
+
+    @staticmethod
+    def get_post_tags(post):
+        """Tags d'un post pour les listes et l'invalidation : le post, son auteur et sa commune"""
+        tags = TaggedCacheService.get_post_detail_tags(post)
+        try:
+            tags.append(TaggedCacheService.commune_tag(post.quartier.commune_id))
+        except Exception:
+            pass
+        return tags
+
+    @staticmethod
+    def get_tag_key(tag):
+        return f"cache_tag_{tag}"
+
+    # Lecture / écriture
+
+    @staticmethod
+    def get(key, default=None):
+        """Retourne la valeur si aucun de ses tags n'a été invalidé depuis l'écriture"""
+        cache = TaggedCacheService.get_cache()
+        entry = cache.get(key)
+        if entry is None:
+            return default
+
+        current = TaggedCacheService._get_generations(cache, entry['tags'].keys())
+        if current != entry['tags']:
+            cache.delete(key)
+            return default
+        return entry['value']
+
+    @staticmethod
+    def set(key, value, tags, timeout=None):
+        """Stocke une valeur avec la génération courante de chacun de ses tags"""
+        cache = TaggedCacheService.get_cache()
+        entry = {
+            'value': value,
+            'tags': TaggedCacheService._get_generations(cache, tags),
+        }
+        cache.set(key, entry, timeout)
+
+    @staticmethod
+    def get_or_set(key, tags, compute, timeout=None):
+        """Retourne la valeur en cache ou la calcule et la stocke"""
+        value = TaggedCacheService.get(key)
+        if value is None:
+            # Lire les générations avant le calcul : une invalidation concurrente
+            # rendra l'entrée immédiatement obsolète
+            cache = TaggedCacheService.get_cache()
+            generations = TaggedCacheService._get_generations(cache, tags)
+            value = compute()
+            cache.set(key, {'value': value, 'tags': generations}, timeout)
+        return value
+
+    @staticmethod
+    def delete(key):
+        TaggedCacheService.get_cache().delete(key)
+
+    # Invalidation
+
+    @staticmethod
+    def invalidate(*tags):
+        """Invalide en O(1) toutes les entrées portant l'un des tags"""
+        cache = TaggedCacheService.get_cache()
+        for tag in tags:
+            tag_key = TaggedCacheService.get_tag_key(tag)
+            cache.add(tag_key, TaggedCacheService._fresh_generation(), None)
+            try:
+                cache.incr(tag_key)
+            except ValueError:
+                cache.set(tag_key, TaggedCacheService._fresh_generation(), None)
+        logger.debug(f"Tags de cache invalidés: {', '.join(tags)}")
+
+    @staticmethod
+    def invalidate_on_commit(*tags):
+        """
+        Invalide les tags immédiatement puis de nouveau après la validation de
+        la transaction, pour écarter une entrée recalculée entre-temps à partir
+        de données non encore validées.
+        """
+        TaggedCacheService.invalidate(*tags)
+        transaction.on_commit(lambda: TaggedCacheService.invalidate(*tags))
+
+    @staticmethod
+    def invalidate_post(post):
+        """Invalide les entrées liées à un post, à son auteur et à sa commune"""
+        TaggedCacheService.invalidate(*TaggedCacheService.get_post_tags(post))
+
+    @staticmethod
+    def _fresh_generation():
+        return time.time_ns()
+
+    @staticmethod
+    def _get_generations(cache, tags):
+        """Lit en une requête les générations des tags, en créant celles qui manquent"""
+        tags = list(tags)
+        keys = {TaggedCacheService.get_tag_key(tag): tag for tag in tags}
+        found = cache.get_many(list(keys))
+
+        generations = {}
+        for key, tag in keys.items():
+            if key in found:
+                generations[tag] = found[key]
+            else:
+                cache.add(key, TaggedCacheService._fresh_generation(), None)
+                generations[tag] = cache.get(key)
+        return generations
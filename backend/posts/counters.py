@@ -0,0 +1,207 @@
+"""
+Compteurs d'engagement des posts (likes, vues, partages) sans contention.
+
+Les incréments ne touchent pas la ligne ``posts_post`` : ils sont accumulés
+dans le cache avec des ``incr`` atomiques, puis appliqués périodiquement en
+base par des ``UPDATE ... SET field = field + delta`` regroupés par delta.
+La valeur exposée aux clients est la valeur en base plus le delta en attente.
+
+Chaque post ayant des deltas en attente est inscrit une seule fois par
+période dans un journal (``post_counters_log_{n}``) que le vidage parcourt,
+ce qui évite tout parcours de la table. Une position réservée (``incr``)
+mais pas encore écrite arrête le parcours jusqu'au vidage suivant.
+"""
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class EngagementCounterService:
+    """Service de gestion des compteurs d'engagement tamponnés"""
+
+    CACHE_ALIAS = 'posts'
+    FIELDS = ('likes_count', 'views_count', 'shares_count')
+    LOG_SEQUENCE_KEY = 'post_counters_log_seq'
+    LOG_CURSOR_KEY = 'post_counters_log_cursor'
+    LOG_GAP_KEY = 'post_counters_log_gap'
+    FLUSH_MARKER_KEY = 'post_counters_flush'
+    FLUSH_BATCH_SIZE = 5000
+
+    @staticmethod
+    def get_cache():
+        # Certains déploiements (Render) ne déclarent que le cache par défaut
+        if EngagementCounterService.CACHE_ALIAS in settings.CACHES:
+            return caches[EngagementCounterService.CACHE_ALIAS]
+        return caches['default']
+
+    @staticmethod
+    def get_delta_key(post_id, field):
+        return f"post_counter_{post_id}_{field}"
+
+    @staticmethod
+    def get_dirty_key(post_id):
+        return f"post_counter_dirty_{post_id}"
+
+    @staticmethod
+    def get_log_key(position):
+        return f"post_counters_log_{position}"
+
+    @staticmethod
+    def get_flush_interval():
+        return getattr(settings, 'ENGAGEMENT_COUNTER_FLUSH_INTERVAL', 30)
+
+    @staticmethod
+    def get_delta_timeout():
+        return getattr(settings, 'CACHE_TIMEOUTS', {}).get('engagement_counter', 86400)
+
+    @staticmethod
+    def increment(post_id, field, delta=1):
+        """Incrémente de façon atomique le delta en attente d'un compteur"""
+        if field not in EngagementCounterService.FIELDS:
+            raise ValueError(f"Compteur inconnu: {field}")
+
+        cache = EngagementCounterService.get_cache()
+        delta_key = EngagementCounterService.get_delta_key(post_id, field)
+        cache.add(delta_key, 0, EngagementCounterService.get_delta_timeout())
+        try:
+            cache.incr(delta_key, delta)
+        except ValueError:
+            # Clé expirée entre add et incr
+            cache.set(delta_key, delta, EngagementCounterService.get_delta_timeout())
+
+        EngagementCounterService._mark_dirty(cache, post_id)
+        EngagementCounterService.maybe_flush()
+
+    @staticmethod
+    def get_pending(post_ids):
+        """Retourne les deltas en attente {post_id: {field: delta}} en une lecture de cache"""
+        keys = {
+            EngagementCounterService.get_delta_key(post_id, field): (post_id, field)
+            for post_id in post_ids
+            for field in EngagementCounterService.FIELDS
+        }
+        pending = defaultdict(dict)
+        for key, value in EngagementCounterService.get_cache().get_many(list(keys)).items():
+            if value:
+                post_id, field = keys[key]
+                pending[post_id][field] = value
+        return pending
+
+    @staticmethod
+    def apply_pending(posts):
+        """Ajoute aux instances les deltas en attente (valeur en base + delta)"""
+        pending = EngagementCounterService.get_pending([post.id for post in posts])
+        for post in posts:
+            for field, delta in pending.get(post.id, {}).items():
+                setattr(post, field, max(0, getattr(post, field) + delta))
+        return posts
+
+    @staticmethod
+    def maybe_flush():
+        """Vide les compteurs au plus une fois par intervalle"""
+        cache = EngagementCounterService.get_cache()
+        if cache.add(EngagementCounterService.FLUSH_MARKER_KEY, 1, EngagementCounterService.get_flush_interval()):
+            EngagementCounterService.flush()
+
+    @staticmethod
+    def flush():
+        """Applique en base les deltas en attente, regroupés en UPDATE par (champ, delta)"""
+        cache = EngagementCounterService.get_cache()
+        lock_key = f"{EngagementCounterService.LOG_CURSOR_KEY}_lock"
+        if not cache.add(lock_key, 1, 60):
+            return 0
+
+        try:
+            post_ids = EngagementCounterService._drain_log(cache)
+            if not post_ids:
+                return 0
+
+            # Désinscrire avant la lecture : un incrément concurrent réinscrit le post
+            cache.delete_many([EngagementCounterService.get_dirty_key(post_id) for post_id in post_ids])
+
+            groups = defaultdict(list)
+            for post_id, fields in EngagementCounterService.get_pending(post_ids).items():
+                for field, delta in fields.items():
+                    # Retirer du cache exactement ce qui est appliqué en base
+                    try:
+                        cache.decr(EngagementCounterService.get_delta_key(post_id, field), delta)
+                    except ValueError:
+                        continue
+                    groups[(field, delta)].append(post_id)
+
+            try:
+                with transaction.atomic():
+                    for (field, delta), ids in groups.items():
+                        Post.objects.filter(pk__in=ids).update(**{field: Greatest(F(field) + delta, 0)})
+            except Exception as e:
+                logger.error(f"Erreur lors du vidage des compteurs d'engagement: {str(e)}")
+                # Remettre les deltas en attente pour le prochain vidage
+                for (field, delta), ids in groups.items():
+                    for post_id in ids:
+                        EngagementCounterService.increment(post_id, field, delta)
+                return 0
+
+            # Les vues n'ont pas d'autre trace : les reporter dans les agrégats
+            # horaires, appliqués à leur propre vidage
+            from .rollups import EngagementRollupService
+            EngagementRollupService.record_many([
+                (post_id, field, delta, None, None)
+                for (field, delta), ids in groups.items() if field == 'views_count'
+                for post_id in ids
+            ], flush=False)
+
+            logger.info(f"Compteurs d'engagement vidés: {len(post_ids)} posts, {len(groups)} mises à jour")
+            return len(post_ids)
+        finally:
+            cache.delete(lock_key)
+
+    @staticmethod
+    def _mark_dirty(cache, post_id):
+        # Une seule inscription au journal par post et par période ; le marqueur
+        # expire pour qu'une inscription perdue soit refaite au prochain incrément
+        marker_timeout = EngagementCounterService.get_flush_interval() * 10
+        if not cache.add(EngagementCounterService.get_dirty_key(post_id), 1, marker_timeout):
+            return
+
+        cache.add(EngagementCounterService.LOG_SEQUENCE_KEY, 0, None)
+        position = cache.incr(EngagementCounterService.LOG_SEQUENCE_KEY)
+        cache.set(EngagementCounterService.get_log_key(position), post_id, EngagementCounterService.get_delta_timeout())
+
+    @staticmethod
+    def _drain_log(cache):
+        """Lit et supprime les entrées du journal non encore traitées"""
+        sequence = cache.get(EngagementCounterService.LOG_SEQUENCE_KEY, 0)
+        cursor = cache.get(EngagementCounterService.LOG_CURSOR_KEY, 0)
+        if sequence <= cursor:
+            return []
+
+        # Borner le travail d'un vidage ; le reste sera traité au suivant
+        last = min(sequence, cursor + EngagementCounterService.FLUSH_BATCH_SIZE)
+        positions = range(cursor + 1, last + 1)
+        found = cache.get_many([EngagementCounterService.get_log_key(position) for position in positions])
+
+        post_ids = set()
+        for position in positions:
+            key = EngagementCounterService.get_log_key(position)
+            if key in found:
+                post_ids.add(found[key])
+                continue
+            # Position réservée mais pas encore écrite (inscription en cours) :
+            # on s'arrête avant, sauf si elle manquait déjà au vidage précédent
+            if cache.get(EngagementCounterService.LOG_GAP_KEY) == position:
+                logger.warning(f"Inscription {position} du journal des compteurs perdue")
+                continue
+            cache.set(EngagementCounterService.LOG_GAP_KEY, position, None)
+            last = position - 1
+            break
+
+        cache.delete_many([EngagementCounterService.get_log_key(position) for position in range(cursor + 1, last + 1)])
+        cache.set(EngagementCounterService.LOG_CURSOR_KEY, last, None)
+        return list(post_ids)
@@ -0,0 +1,242 @@
+"""
+Dédoublonnage des médias par empreinte du contenu.
+
+Chaque média reçoit à l'envoi une empreinte SHA-256, calculée pendant la
+réception (voir posts.uploads). Les images reçoivent aussi une empreinte
+perceptuelle (dHash 64 bits), qui résiste au recompressage et au
+redimensionnement des images transférées de messagerie en messagerie.
+
+Un envoi identique (même SHA-256) ou visuellement identique (empreintes
+perceptuelles à au plus ``MEDIA_PHASH_MAX_DISTANCE`` bits d'écart) à un
+média déjà traité réutilise son fichier, ses déclinaisons (ou son flux HLS
+et sa miniature), son URL CDN et son résultat de modération : pas de
+nouveau fichier, pas d'envoi CDN, pas d'appel de modération. Seuls les médias au traitement terminé (approuvés
+ou rejetés) servent de référence.
+
+Les images proches sont cherchées grâce aux index sur les quatre quarts de
+l'empreinte (voir ``Media.Meta.indexes``) : deux empreintes à moins de
+4 bits d'écart ont au moins un quart identique.
+"""
+import logging
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Substr
+from PIL import Image
+from .media_backends import get_cdn_backend
+from .models import Media
+from .renditions import load_image
+from .transcoding import VideoTranscodingService
+from .uploads import content_digest
+
+logger = logging.getLogger(__name__)
+
+
+PHASH_BANDS = 4
+FINAL_STATUSES = ('approved', 'unmoderated', 'rejected')
+# Champs repris de l'original par un doublon
+REUSED_FIELDS = [
+    'file', 'file_size', 'width', 'height', 'duration', 'renditions', 'hls_playlist', 'thumbnail',
+    'cdn_url', 'cdn_public_id',
+    'moderation_score', 'is_appropriate', 'moderation_details', 'approval_status', 'duplicate_of'
+]
+
+
+def perceptual_hash(source):
+    """Empreinte dHash 64 bits d'une image (16 caractères hexadécimaux)"""
+    img = load_image(source, 256, 256).convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            index = row * 9 + column
+            bits = (bits << 1) | (pixels[index] > pixels[index + 1])
+    return f"{bits:016x}"
+
+
+def hamming_distance(first, second):
+    """Nombre de bits différents entre deux empreintes perceptuelles"""
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def is_distinctive(phash):
+    """Les images presque unies ont des empreintes sans valeur (presque tous les bits égaux)"""
+    ones = bin(int(phash, 16)).count('1')
+    return 8 <= ones <= 56
+
+
+class MediaDeduplicationService:
+    """Recherche des doublons et réutilisation des médias déjà traités"""
+
+    @staticmethod
+    def fingerprint(file, media_type):
+        """Empreintes SHA-256 et perceptuelle (images uniquement) d'un fichier"""
+        content_hash = content_digest(file)
+        phash = ''
+        if media_type == 'image':
+            try:
+                phash = perceptual_hash(file)
+            except OSError as e:
+                logger.warning(f"Empreinte perceptuelle impossible pour {file.name}: {e}")
+            file.seek(0)
+        return content_hash, phash
+
+    @staticmethod
+    def find_original(content_hash, phash, media_type, exclude_id=None):
+        """Média traité identique ou visuellement identique (None si aucun)"""
+        candidates = Media.objects.filter(media_type=media_type, approval_status__in=FINAL_STATUSES)
+        if exclude_id:
+            candidates = candidates.exclude(id=exclude_id)
+
+        match = None
+        if content_hash:
+            match = candidates.filter(content_hash=content_hash).order_by('id').first()
+
+        if match is None and phash and is_distinctive(phash):
+            max_distance = getattr(settings, 'MEDIA_PHASH_MAX_DISTANCE', 3)
+            bands = {
+                f'phash_band_{index}': Substr('perceptual_hash', 4 * index + 1, 4)
+                for index in range(PHASH_BANDS)
+            }
+            condition = Q()
+            for index, name in enumerate(bands):
+                condition |= Q(**{name: phash[4 * index:4 * index + 4]})
+
+            distances = []
+            for media_id, other in candidates.annotate(**bands).filter(condition).values_list('id', 'perceptual_hash'):
+                distance = hamming_distance(phash, other)
+                if distance <= max_distance:
+                    distances.append((distance, media_id))
+            if distances:
+                match = Media.objects.get(id=min(distances)[1])
+
+        if match is not None and match.duplicate_of_id:
+            # Toujours rattacher à l'original, pas à un autre doublon
+            return match.duplicate_of
+        return match
+
+    @staticmethod
+    def reused_fields(original):
+        """Valeurs reprises de l'original par un nouveau doublon"""
+        details = {key: value for key, value in original.moderation_details.items() if key != 'pipeline'}
+        details['pipeline'] = {'status': original.approval_status, 'duplicate_of': original.id}
+        return {
+            'file': original.file.name,
+            'file_size': original.file_size,
+            'width': original.width,
+            'height': original.height,
+            'duration': original.duration,
+            'renditions': list(original.renditions),
+            'hls_playlist': original.hls_playlist,
+            'thumbnail': original.thumbnail,
+            'cdn_url': original.cdn_url,
+            'cdn_public_id': original.cdn_public_id,
+            'moderation_score': original.moderation_score,
+            'is_appropriate': original.is_appropriate,
+            'moderation_details': details,
+            'approval_status': original.approval_status,
+            'duplicate_of': original,
+        }
+
+    @staticmethod
+    def backfill_hashes(batch_size=500):
+        """Calcule les empreintes des médias qui n'en ont pas ; renvoie leur nombre"""
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Media.objects.filter(content_hash='', id__gt=last_id)
+                .exclude(file='')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                return updated
+            last_id = batch[-1].id
+
+            hashed = []
+            for media in batch:
+                try:
+                    with media.file.open('rb') as media_file:
+                        media.content_hash, media.perceptual_hash = MediaDeduplicationService.fingerprint(
+                            media_file, media.media_type
+                        )
+                except OSError as e:
+                    logger.warning(f"Fichier du média {media.id} illisible: {e}")
+                    continue
+                hashed.append(media)
+
+            Media.objects.bulk_update(hashed, ['content_hash', 'perceptual_hash'])
+            updated += len(hashed)
+
+    @staticmethod
+    def collapse(dry_run=False):
+        """
+        Rattache les doublons existants au plus ancien original et libère
+        leurs fichiers, déclinaisons et ressources CDN.
+        """
+        stats = {'collapsed': 0, 'files_deleted': 0, 'cdn_deleted': 0}
+        media_ids = (
+            Media.objects.filter(duplicate_of__isnull=True, media_type__in=('image', 'video'))
+            .exclude(content_hash='')
+            .exclude(approval_status__in=('pending', 'processing'))
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+        for media_id in list(media_ids):
+            media = Media.objects.filter(id=media_id, duplicate_of__isnull=True).first()
+            if media is None:
+                continue
+            original = MediaDeduplicationService.find_original(
+                media.content_hash, media.perceptual_hash, media.media_type, exclude_id=media.id
+            )
+            # Le plus ancien reste l'original
+            if original is None or original.id > media.id:
+                continue
+
+            stats['collapsed'] += 1
+            if dry_run:
+                continue
+
+            released_names = MediaDeduplicationService._stored_names(media)
+            released_public_id = media.cdn_public_id
+
+            for field, value in MediaDeduplicationService.reused_fields(original).items():
+                setattr(media, field, value)
+            media.save(update_fields=REUSED_FIELDS + ['updated_at'])
+            Media.objects.filter(duplicate_of=media).update(duplicate_of=original)
+
+            deleted_files, deleted_cdn = MediaDeduplicationService._release(
+                media, released_names, released_public_id
+            )
+            stats['files_deleted'] += deleted_files
+            stats['cdn_deleted'] += deleted_cdn
+            logger.info(f"Média {media.id} rattaché à l'original {original.id}")
+
+        return stats
+
+    @staticmethod
+    def _release(media, names, public_id):
+        """Supprime les fichiers et la ressource CDN qu'aucun média n'utilise plus"""
+        storage = media.file.storage
+        in_use = set()
+        others = Media.objects.filter(Q(file__in=names) | Q(hls_playlist__in=names))
+        for other in others.only('file', 'renditions', 'hls_playlist', 'thumbnail'):
+            in_use.update(MediaDeduplicationService._stored_names(other))
+
+        deleted_files = 0
+        for name in names:
+            if name and name not in in_use and storage.exists(name):
+                storage.delete(name)
+                deleted_files += 1
+
+        deleted_cdn = 0
+        if public_id and not Media.objects.filter(cdn_public_id=public_id).exists():
+            get_cdn_backend().delete(public_id)
+            deleted_cdn = 1
+        return deleted_files, deleted_cdn
+
+    @staticmethod
+    def _stored_names(media):
+        """Fichier, déclinaisons, flux HLS et miniature stockés d'un média"""
+        names = [media.file.name] + [rendition['name'] for rendition in media.renditions]
+        return names + VideoTranscodingService.stream_files(media)
@@ -0,0 +1,166 @@
+"""
+Fil d'actualité précalculé par commune.
+
+Chaque commune possède dans le cache ``posts`` la liste ordonnée (du plus
+récent au plus ancien) des IDs de ses posts. Cette liste est mise à jour de
+façon incrémentale à la création et à la suppression d'un post, et la lecture
+d'une page coûte une lecture de cache plus une requête bornée pour hydrater
+uniquement les posts de la page (voir ``KeysetCursorPagination.paginate_id_window``).
+"""
+import logging
+from django.conf import settings
+from django.core.cache import caches
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class CommuneFeed:
+    """
+    Fenêtre des IDs les plus récents d'une commune.
+
+    ``complete`` indique que la fenêtre contient tous les posts de la commune ;
+    sinon, les pages situées au-delà sont lues en base avec une requête keyset.
+    """
+
+    def __init__(self, commune_id, entry):
+        self.commune_id = commune_id
+        self.ids = entry['ids']
+        self.complete = entry['complete']
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class CommuneFeedService:
+    """Service de gestion des fils d'actualité par commune"""
+
+    CACHE_ALIAS = 'posts'
+
+    @staticmethod
+    def get_cache():
+        # Certains déploiements (Render) ne déclarent que le cache par défaut
+        if CommuneFeedService.CACHE_ALIAS in settings.CACHES:
+            return caches[CommuneFeedService.CACHE_ALIAS]
+        return caches['default']
+
+    @staticmethod
+    def get_feed_key(commune_id):
+        return f"commune_feed_{commune_id}"
+
+    @staticmethod
+    def get_generation_key(commune_id):
+        return f"commune_feed_gen_{commune_id}"
+
+    @staticmethod
+    def get_max_length():
+        return getattr(settings, 'FEED_MAX_LENGTH', 1000)
+
+    @staticmethod
+    def get_timeout():
+        return getattr(settings, 'CACHE_TIMEOUTS', {}).get('commune_feed', 3600)
+
+    @staticmethod
+    def get_feed(commune_id):
+        """Retourne le fil d'une commune, reconstruit depuis la base si absent du cache"""
+        entry = CommuneFeedService.get_cache().get(CommuneFeedService.get_feed_key(commune_id))
+        if entry is None:
+            entry = CommuneFeedService.rebuild_feed(commune_id)
+        return CommuneFeed(commune_id, entry)
+
+    @staticmethod
+    def rebuild_feed(commune_id):
+        """Reconstruit la fenêtre d'IDs d'une commune depuis la base de données"""
+        cache = CommuneFeedService.get_cache()
+        generation_key = CommuneFeedService.get_generation_key(commune_id)
+        generation = cache.get(generation_key, 0)
+        max_length = CommuneFeedService.get_max_length()
+
+        ids = list(
+            Post.objects.filter(quartier__commune_id=commune_id)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)[:max_length + 1]
+        )
+        entry = {'ids': ids[:max_length], 'complete': len(ids) <= max_length}
+
+        # Ne pas écraser le cache si une écriture a eu lieu pendant la reconstruction
+        if cache.get(generation_key, 0) == generation:
+            cache.set(CommuneFeedService.get_feed_key(commune_id), entry, CommuneFeedService.get_timeout())
+
+        logger.info(f"Fil de la commune {commune_id} reconstruit ({len(entry['ids'])} posts)")
+        return entry
+
+    @staticmethod
+    def add_post(post):
+        """Ajoute un nouveau post en tête du fil de sa commune"""
+        def mutate(entry):
+            if post.id not in entry['ids']:
+                entry['ids'].insert(0, post.id)
+                max_length = CommuneFeedService.get_max_length()
+                if len(entry['ids']) > max_length:
+                    del entry['ids'][max_length:]
+                    entry['complete'] = False
+
+        CommuneFeedService._update_feed(post.quartier.commune_id, mutate)
+
+    @staticmethod
+    def remove_post(post_id, commune_id):
+        """Retire un post du fil de sa commune"""
+        def mutate(entry):
+            if post_id in entry['ids']:
+                entry['ids'].remove(post_id)
+
+        CommuneFeedService._update_feed(commune_id, mutate)
+
+    @staticmethod
+    def invalidate_feed(commune_id):
+        """Supprime le fil d'une commune (il sera reconstruit à la prochaine lecture)"""
+        cache = CommuneFeedService.get_cache()
+        CommuneFeedService._bump_generation(cache, commune_id)
+        cache.delete(CommuneFeedService.get_feed_key(commune_id))
+
+    @staticmethod
+    def hydrate(post_ids, queryset=None):
+        """Charge en une requête les posts d'une page en conservant l'ordre du fil"""
+        if queryset is None:
+            queryset = Post.objects.all()
+        posts_by_id = {post.id: post for post in queryset.filter(id__in=post_ids)}
+        return [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+    @staticmethod
+    def _bump_generation(cache, commune_id):
+        generation_key = CommuneFeedService.get_generation_key(commune_id)
+        cache.add(generation_key, 0, None)
+        try:
+            return cache.incr(generation_key)
+        except ValueError:
+            cache.set(generation_key, 1, None)
+            return 1
+
+    @staticmethod
+    def _update_feed(commune_id, mutate):
+        """Applique une mutation au fil en cache sous verrou, ou l'invalide en cas de conflit"""
+        cache = CommuneFeedService.get_cache()
+        feed_key = CommuneFeedService.get_feed_key(commune_id)
+        lock_key = f"{feed_key}_lock"
+        generation = CommuneFeedService._bump_generation(cache, commune_id)
+
+        if not cache.add(lock_key, 1, 5):
+            # Écriture concurrente : le fil sera reconstruit à la prochaine lecture
+            cache.delete(feed_key)
+            return
+
+        try:
+            entry = cache.get(feed_key)
+            if entry is None:
+                return
+            mutate(entry)
+            if cache.get(CommuneFeedService.get_generation_key(commune_id)) == generation:
+                cache.set(feed_key, entry, CommuneFeedService.get_timeout())
+            else:
+                cache.delete(feed_key)
+        except Exception as e:
+            logger.error(f"Erreur mise à jour du fil de la commune {commune_id}: {str(e)}")
+            cache.delete(feed_key)
+        finally:
+            cache.delete(lock_key)
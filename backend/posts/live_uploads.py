@@ -0,0 +1,270 @@
+"""
+Envoi reprenable des enregistrements de live, par morceaux numérotés.
+
+Protocole (voir les vues ``LiveUpload*`` de posts.views) :
+
+1. ``POST live/<id>/uploads/`` ouvre une session et renvoie son
+   identifiant et la taille des morceaux (``LIVE_UPLOAD_CHUNK_SIZE``) ;
+2. ``PUT live/uploads/<session>/chunks/<n>/`` envoie le morceau ``n``
+   (corps brut, empreinte SHA-256 dans l'en-tête ``X-Chunk-SHA256``), ajouté
+   au fichier temporaire de la session ;
+3. ``GET live/uploads/<session>/`` indique le prochain morceau attendu
+   après une coupure ;
+4. ``POST live/uploads/<session>/complete/`` crée le média à partir du
+   fichier reçu et lance son traitement (posts.media_pipeline).
+
+Les morceaux sont acceptés dans l'ordre. Renvoyer un morceau déjà reçu
+avec la même empreinte est sans effet : un client qui n'a pas reçu la
+réponse peut le renvoyer sans risque. Une coupure ne coûte donc qu'un
+morceau, pas tout l'enregistrement.
+
+Les fichiers temporaires sont écrits dans ``LIVE_UPLOAD_DIR``, qui doit être
+partagé entre les processus du serveur. Les sessions inactives au-delà de
+``LIVE_UPLOAD_SESSION_TTL`` sont abandonnées par ``purge_expired``.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .media_pipeline import MediaPipeline
+from .models import Media, LiveUploadSession
+from .uploads import CHUNK_SIZE, SNIFF_BYTES, sniff_content_type
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+DEFAULT_SESSION_TTL = 24 * 60 * 60
+
+
+class LiveUploadError(Exception):
+    """Requête refusée : ``status_code`` et ``extra`` décrivent la réponse à renvoyer"""
+
+    def __init__(self, message, status_code=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.extra = extra
+
+
+class _ReceivedFile(File):
+    """Fichier reçu déplacé tel quel dans le stockage (sans copie sur disque local)"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_upload_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LiveUploadService:
+    """Sessions d'envoi par morceaux des enregistrements de live"""
+
+    @staticmethod
+    def temp_path(session):
+        """Fichier temporaire où sont ajoutés les morceaux d'une session"""
+        upload_dir = get_upload_setting(
+            'LIVE_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'communiconnect_live_uploads')
+        )
+        return os.path.join(upload_dir, f'{session.id}.part')
+
+    @staticmethod
+    def create_session(user, post, filename, content_type, total_size=None):
+        """Ouvre une session d'envoi pour l'enregistrement d'un live"""
+        session = LiveUploadSession.objects.create(
+            user=user,
+            live_post=post,
+            filename=os.path.basename(filename)[:255],
+            content_type=content_type,
+            total_size=total_size,
+            chunk_size=get_upload_setting('LIVE_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE),
+            expires_at=LiveUploadService._expiry()
+        )
+        path = LiveUploadService.temp_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        logger.info(f"Session d'envoi {session.id} ouverte pour le live {post.id}")
+        return session
+
+    @staticmethod
+    def append_chunk(session_id, index, stream, checksum):
+        """
+        Ajoute le morceau ``index`` lu depuis ``stream`` au fichier de la session.
+
+        Le morceau est écrit par blocs en calculant son empreinte ; il est
+        retiré du fichier si l'empreinte ne correspond pas à ``checksum``.
+        """
+        checksum = (checksum or '').strip().lower()
+        if not checksum:
+            raise LiveUploadError("Empreinte SHA-256 du morceau requise (en-tête X-Chunk-SHA256)")
+
+        with transaction.atomic():
+            # Verrou : deux envois du même morceau ne s'écrivent pas en même temps
+            session = LiveUploadSession.objects.select_for_update().get(id=session_id)
+            LiveUploadService._check_open(session)
+
+            if index < session.next_chunk:
+                if session.chunk_checksums[index] == checksum:
+                    # Morceau déjà reçu (réponse perdue) : rien à faire
+                    return session
+                raise LiveUploadError(
+                    "Morceau déjà reçu avec un contenu différent", 409, next_chunk=session.next_chunk
+                )
+            if index > session.next_chunk:
+                raise LiveUploadError("Morceau inattendu", 409, next_chunk=session.next_chunk)
+
+            max_size = get_upload_setting('LIVE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+            if session.total_size:
+                max_size = min(max_size, session.total_size)
+
+            hasher = hashlib.sha256()
+            size = 0
+            with open(LiveUploadService.temp_path(session), 'r+b') as part:
+                # Repartir de la fin du dernier morceau validé (écriture interrompue)
+                part.seek(session.received_bytes)
+                part.truncate()
+                try:
+                    while True:
+                        block = stream.read(min(CHUNK_SIZE, session.chunk_size + 1 - size))
+                        if not block:
+                            break
+                        size += len(block)
+                        if size > session.chunk_size:
+                            raise LiveUploadError(f"Morceau trop volumineux (max {session.chunk_size} octets)", 413)
+                        if session.received_bytes + size > max_size:
+                            raise LiveUploadError(f"Enregistrement trop volumineux (max {max_size} octets)", 413)
+                        hasher.update(block)
+                        part.write(block)
+
+                    if not size:
+                        raise LiveUploadError("Morceau vide")
+                    if hasher.hexdigest() != checksum:
+                        raise LiveUploadError(
+                            "Empreinte du morceau incorrecte", 400, next_chunk=session.next_chunk
+                        )
+                except LiveUploadError:
+                    part.seek(session.received_bytes)
+                    part.truncate()
+                    raise
+
+            session.next_chunk += 1
+            session.received_bytes += size
+            session.chunk_checksums.append(checksum)
+            session.expires_at = LiveUploadService._expiry()
+            session.save(update_fields=[
+                'next_chunk', 'received_bytes', 'chunk_checksums', 'expires_at', 'updated_at'
+            ])
+        return session
+
+    @staticmethod
+    def complete(session_id, checksum=None):
+        """
+        Crée le média à partir du fichier reçu, l'associe au live et lance
+        son traitement (transcodage, miniature, CDN).
+        """
+        with transaction.atomic():
+            session = LiveUploadSession.objects.select_for_update().select_related('live_post', 'user').get(id=session_id)
+            if session.status == 'completed':
+                return session
+            LiveUploadService._check_open(session)
+
+            if not session.next_chunk:
+                raise LiveUploadError("Aucun morceau reçu")
+            if session.total_size and session.received_bytes != session.total_size:
+                raise LiveUploadError(
+                    "Enregistrement incomplet", 400,
+                    received_bytes=session.received_bytes, next_chunk=session.next_chunk
+                )
+
+            path = LiveUploadService.temp_path(session)
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as part:
+                header = part.read(SNIFF_BYTES)
+                hasher.update(header)
+                for block in iter(lambda: part.read(CHUNK_SIZE), b''):
+                    hasher.update(block)
+            content_hash = hasher.hexdigest()
+
+            if checksum and checksum.strip().lower() != content_hash:
+                raise LiveUploadError("Empreinte de l'enregistrement incorrecte")
+            content_type = sniff_content_type(header)
+            if content_type not in getattr(settings, 'ALLOWED_VIDEO_TYPES', []):
+                raise LiveUploadError("Type de fichier non supporté")
+
+            post = session.live_post
+            media = Media(
+                title=f"Vidéo du live - {post.content}"[:200],
+                description=f"Vidéo enregistrée du live '{post.content}'",
+                media_type='video',
+                content_hash=content_hash,
+                is_live_recording=True,
+                live_post=post,
+                moderation_details={'pipeline': MediaPipeline.initial_state(session.user)}
+            )
+            extension = mimetypes.guess_extension(content_type) or os.path.splitext(session.filename)[1]
+            with open(path, 'rb') as received:
+                media.file.save(f'live_{post.id}_{session.id.hex[:8]}{extension}', _ReceivedFile(received), save=False)
+            media.save()
+            if os.path.exists(path):
+                # Stockage distant : le fichier a été copié, pas déplacé
+                os.remove(path)
+
+            post.media_files.add(media)
+            post.live_stream = media
+            post.content = f"{post.content}\n\n📹 Vidéo enregistrée disponible"
+            post.save()
+
+            session.status = 'completed'
+            session.media = media
+            session.save(update_fields=['status', 'media', 'updated_at'])
+
+            MediaPipeline.start(media, session.user)
+
+        logger.info(f"Enregistrement du live {post.id} reçu ({session.received_bytes} octets): média {media.id}")
+        return session
+
+    @staticmethod
+    def abort(session):
+        """Abandonne une session et supprime son fichier temporaire"""
+        if session.status != 'uploading':
+            return
+        session.status = 'aborted'
+        session.save(update_fields=['status', 'updated_at'])
+        LiveUploadService._remove_part(session)
+
+    @staticmethod
+    def purge_expired():
+        """Abandonne les sessions inactives au-delà du délai ; renvoie leur nombre"""
+        expired = LiveUploadSession.objects.filter(status='uploading', expires_at__lt=timezone.now())
+        count = 0
+        for session in expired.iterator():
+            LiveUploadService.abort(session)
+            count += 1
+        if count:
+            logger.info(f"{count} sessions d'envoi expirées abandonnées")
+        return count
+
+    @staticmethod
+    def _check_open(session):
+        if session.status != 'uploading':
+            raise LiveUploadError("Session d'envoi terminée", 409, status=session.status)
+        if session.expires_at < timezone.now():
+            raise LiveUploadError("Session d'envoi expirée", 410)
+
+    @staticmethod
+    def _expiry():
+        return timezone.now() + timedelta(seconds=get_upload_setting('LIVE_UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL))
+
+    @staticmethod
+    def _remove_part(session):
+        path = LiveUploadService.temp_path(session)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1 @@
+# Ce fichier permet à Django de reconnaître ce dossier comme un package Python 
\ No newline at end of file
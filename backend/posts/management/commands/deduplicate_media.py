@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from posts.dedup import MediaDeduplicationService
+
+
+class Command(BaseCommand):
+    help = "Calcule les empreintes manquantes des médias et rattache les doublons existants à leur original"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Médias traités par lot pour les empreintes")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Calcule les empreintes mais ne rattache aucun doublon (affiche seulement leur nombre)"
+        )
+
+    def handle(self, *args, **options):
+        hashed = MediaDeduplicationService.backfill_hashes(batch_size=options['batch_size'])
+        self.stdout.write(f'{hashed} empreintes calculées')
+
+        stats = MediaDeduplicationService.collapse(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{stats['collapsed']} doublons à rattacher")
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stats['collapsed']} doublons rattachés, {stats['files_deleted']} fichiers "
+                f"et {stats['cdn_deleted']} ressources CDN supprimés"
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from posts.counters import EngagementCounterService
+from posts.rollups import EngagementRollupService
+
+
+class Command(BaseCommand):
+    help = "Applique en base les compteurs d'engagement (likes, vues, partages) et les agrégats en attente dans le cache"
+
+    def handle(self, *args, **options):
+        flushed = EngagementCounterService.flush()
+        rollups = EngagementRollupService.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'{flushed} posts et {rollups} lignes d\'agrégats mises à jour')
+        )
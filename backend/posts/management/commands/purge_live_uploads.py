@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from posts.live_uploads import LiveUploadService
+
+
+class Command(BaseCommand):
+    help = "Abandonne les envois d'enregistrements de live expirés et supprime leurs fichiers temporaires"
+
+    def handle(self, *args, **options):
+        purged = LiveUploadService.purge_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f'{purged} sessions d\'envoi abandonnées')
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from posts.rollups import EngagementRollupService
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats d'engagement (utilisateur, quartier, commune) à partir des likes, commentaires et partages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Nombre de jours recalculés")
+
+    def handle(self, *args, **options):
+        rebuilt = EngagementRollupService.rebuild(days=options['days'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{rebuilt} lignes d\'agrégats recalculées')
+        )
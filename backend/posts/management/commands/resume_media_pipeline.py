@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from posts.media_pipeline import MediaPipeline
+
+
+class Command(BaseCommand):
+    help = "Relance le traitement des médias interrompu par un redémarrage des workers (à lancer périodiquement)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int, default=None,
+            help="Secondes sans avancement avant relance (par défaut : fenêtre des reprises + MEDIA_PIPELINE_STAGE_TIMEOUT)"
+        )
+
+    def handle(self, *args, **options):
+        resumed = MediaPipeline.resume_stalled(options['stale_after'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{resumed} médias relancés')
+        )
@@ -0,0 +1,134 @@
+"""
+Backends de modération et de CDN utilisés par le pipeline des médias.
+
+Les backends sont choisis par des réglages (chemins pointés) :
+
+- ``MEDIA_MODERATION_BACKEND`` : ``VisionModerationBackend`` (Google Cloud
+  Vision) ou ``LocalModerationBackend``, repli sans analyse : les médias
+  sont marqués ``unmoderated`` et non approuvés ;
+- ``MEDIA_CDN_BACKEND`` : ``CloudinaryCDNBackend`` ou ``LocalCDNBackend``,
+  repli sans envoi qui laisse le fichier servi par le stockage Django.
+
+Les replis locaux sont les défauts sans configuration Vision ou Cloudinary :
+ils ne conservent rien en mémoire.
+"""
+import logging
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .services import ModerationService, MediaCDNService
+from .uploads import local_file
+
+logger = logging.getLogger(__name__)
+
+
+class MediaBackendError(Exception):
+    """Échec transitoire d'un service externe : l'étape sera reprise"""
+
+
+class ModerationBackend:
+    """
+    Interface des backends de modération : ``analyze`` renvoie un dictionnaire
+    ``moderation_score``, ``is_appropriate``, ``moderation_details``.
+    """
+
+    def analyze(self, media):
+        raise NotImplementedError
+
+
+class LocalModerationBackend(ModerationBackend):
+    """
+    Repli sans Vision : aucune analyse. ``moderated`` à False signale au
+    pipeline que le média n'a pas été modéré (statut ``unmoderated``).
+    """
+
+    def analyze(self, media):
+        logger.info(f"Aucun backend de modération configuré, média {media.id} non modéré")
+        return {
+            'moderation_score': None,
+            'is_appropriate': True,
+            'moderated': False,
+            'moderation_details': {}
+        }
+
+
+class VisionModerationBackend(ModerationBackend):
+    """Modération des images avec Google Cloud Vision"""
+
+    def analyze(self, media):
+        if media.media_type != 'image':
+            # Pas de modération vidéo automatique pour l'instant
+            return {
+                'moderation_score': 0.2,
+                'is_appropriate': True,
+                'moderation_details': {}
+            }
+
+        with local_file(media) as path:
+            return ModerationService.analyze_image_with_vision_api(path)
+
+
+class CDNBackend:
+    """
+    Interface des backends CDN : ``upload`` renvoie le résultat de
+    ``MediaCDNService.upload_media_to_cdn`` (``success``, ``url``, ``public_id``...),
+    ``delete`` supprime une ressource par son identifiant public.
+    """
+
+    def upload(self, media, user):
+        raise NotImplementedError
+
+    def delete(self, public_id):
+        raise NotImplementedError
+
+
+class LocalCDNBackend(CDNBackend):
+    """Remplaçant local de Cloudinary : aucun envoi, le fichier reste en local"""
+
+    def upload(self, media, user):
+        logger.debug(f"Aucun CDN configuré, média {media.id} servi par le stockage local")
+        return {'success': True, 'url': None, 'public_id': None}
+
+    def delete(self, public_id):
+        logger.debug(f"Aucun CDN configuré, suppression de {public_id} ignorée")
+
+
+class CloudinaryCDNBackend(CDNBackend):
+    """Envoi vers Cloudinary"""
+
+    def upload(self, media, user):
+        content_type = f"{'image' if media.media_type == 'image' else 'video'}/*"
+        # Chemin du fichier plutôt que son contenu : envoi sans chargement en mémoire
+        with local_file(media) as path:
+            result = MediaCDNService.upload_media_to_cdn(
+                file=path,
+                title=media.title,
+                description=media.description,
+                user=user,
+                content_type=content_type
+            )
+        if not result['success']:
+            raise MediaBackendError(result.get('error', 'Erreur upload CDN'))
+        return result
+
+    def delete(self, public_id):
+        MediaCDNService.delete_from_cdn(public_id)
+
+
+_backends = {}
+
+
+def _get_backend(setting, default):
+    path = getattr(settings, setting, default)
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def get_moderation_backend():
+    """Instance partagée du backend de modération configuré"""
+    return _get_backend('MEDIA_MODERATION_BACKEND', 'posts.media_backends.LocalModerationBackend')
+
+
+def get_cdn_backend():
+    """Instance partagée du backend CDN configuré"""
+    return _get_backend('MEDIA_CDN_BACKEND', 'posts.media_backends.LocalCDNBackend')
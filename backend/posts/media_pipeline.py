@@ -0,0 +1,269 @@
+"""
+Traitement des médias en arrière-plan, par étapes.
+
+``MediaUploadView`` enregistre le fichier brut et répond aussitôt (202,
+statut ``pending``). Le média passe ensuite par des étapes indépendantes,
+chacune exécutée comme une tâche de la file ``media_queue`` :
+
+1. ``probe`` : dimensions des images, durée des vidéos (ffprobe) ;
+2. ``moderate`` : analyse par le backend de modération ;
+3. ``transcode`` : déclinaisons des images (voir posts.renditions),
+   qualités H.264 et flux HLS des vidéos (voir posts.transcoding) ;
+4. ``thumbnail`` : miniature des vidéos (ffmpeg) ;
+5. ``cdn`` : envoi vers le CDN.
+
+``approval_status`` passe de ``pending`` à ``processing``, puis à
+``approved``, ``unmoderated`` (traité sans backend de modération, voir
+posts.media_backends), ``rejected`` (contenu inapproprié, vidéo trop longue ou
+illisible) ou ``failed`` (étape encore en échec après
+``MEDIA_PIPELINE_MAX_RETRIES`` reprises). L'avancement de chaque étape est
+conservé dans ``moderation_details['pipeline']``.
+
+Une étape en échec est reprise seule, avec un délai exponentiel, sans
+rejouer les étapes déjà terminées. Les étapes qui dépendent de ffmpeg sont
+ignorées si l'outil n'est pas installé.
+
+La file et les reprises planifiées ne vivent que dans la mémoire des
+workers : un traitement interrompu (redémarrage, déploiement, plantage) est
+relancé depuis sa première étape non terminée par
+``MediaPipeline.resume_stalled`` (commande ``resume_media_pipeline``, à
+lancer périodiquement).
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from PIL import Image
+from notifications.jobs import JobQueue
+from .media_backends import get_moderation_backend, get_cdn_backend
+from .models import Media
+from .renditions import ImageRenditionService
+from .transcoding import VideoTranscodingService, ffmpeg_available
+from .services import VideoProcessingService
+from .uploads import local_file
+
+logger = logging.getLogger(__name__)
+
+
+STAGES = ('probe', 'moderate', 'transcode', 'thumbnail', 'cdn')
+
+# Champs du média que les étapes peuvent modifier
+PIPELINE_FIELDS = [
+    'duration', 'width', 'height', 'renditions', 'hls_playlist', 'thumbnail', 'is_appropriate', 'approval_status',
+    'moderation_score', 'moderation_details', 'cdn_url', 'cdn_public_id', 'updated_at'
+]
+
+# File partagée du traitement des médias
+media_queue = JobQueue(
+    'media-pipeline',
+    eager_setting='MEDIA_PIPELINE_EAGER',
+    workers_setting='MEDIA_PIPELINE_WORKERS'
+)
+
+
+class MediaRejected(Exception):
+    """Média refusé : le traitement s'arrête sans reprise"""
+
+    def __init__(self, reason, details=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.details = details or {}
+
+
+class MediaPipeline:
+    """Étapes du traitement d'un média et enchaînement sur la file"""
+
+    @staticmethod
+    def initial_state(user=None):
+        """État du pipeline à enregistrer avec le média"""
+        return {
+            'status': 'pending',
+            'user_id': user.id if user else None,
+            'stages': {stage: {'status': 'pending', 'attempts': 0} for stage in STAGES}
+        }
+
+    @staticmethod
+    def start(media, user=None):
+        """Lance le traitement après la validation de la transaction en cours"""
+        media_queue.enqueue_on_commit(
+            MediaPipeline.run_stage, media.id, STAGES[0], 1, user.id if user else None
+        )
+
+    @staticmethod
+    def stale_after():
+        """Secondes sans avancement (reprises comprises) au-delà desquelles un traitement est perdu"""
+        max_retries = getattr(settings, 'MEDIA_PIPELINE_MAX_RETRIES', 3)
+        retry_window = getattr(settings, 'MEDIA_PIPELINE_RETRY_BACKOFF', 5) * (2 ** max_retries - 1)
+        return retry_window + getattr(settings, 'MEDIA_PIPELINE_STAGE_TIMEOUT', 600)
+
+    @staticmethod
+    def resume_stalled(stale_after=None):
+        """
+        Relance les traitements sans avancement depuis ``stale_after`` secondes,
+        chacun depuis sa première étape non terminée ; renvoie leur nombre
+        """
+        if stale_after is None:
+            stale_after = MediaPipeline.stale_after()
+        stalled = Media.objects.filter(
+            approval_status__in=('pending', 'processing'),
+            duplicate_of__isnull=True,
+            updated_at__lt=timezone.now() - timedelta(seconds=stale_after)
+        ).only('id', 'moderation_details', 'updated_at')
+
+        resumed = 0
+        for media in stalled.iterator():
+            pipeline = media.moderation_details.get('pipeline') or MediaPipeline.initial_state()
+            stages = pipeline.get('stages', {})
+            stage = next(
+                (stage for stage in STAGES if stages.get(stage, {}).get('status') not in ('done', 'skipped')),
+                STAGES[-1]
+            )
+            # Un balayage concurrent ne relance pas le même média une seconde fois
+            if not Media.objects.filter(id=media.id, updated_at=media.updated_at).update(updated_at=timezone.now()):
+                continue
+            logger.warning(f"Traitement du média {media.id} interrompu, reprise à l'étape {stage}")
+            media_queue.enqueue(MediaPipeline.run_stage, media.id, stage, 1, pipeline.get('user_id'))
+            resumed += 1
+        return resumed
+
+    @staticmethod
+    def run_stage(media_id, stage, attempt=1, user_id=None):
+        """Exécute une étape puis enfile la suivante (ou une reprise en cas d'échec)"""
+        media = Media.objects.filter(id=media_id).first()
+        if media is None:
+            logger.warning(f"Média {media_id} supprimé avant l'étape {stage}")
+            return
+
+        pipeline = media.moderation_details.setdefault('pipeline', MediaPipeline.initial_state())
+        state = pipeline['stages'].setdefault(stage, {'status': 'pending', 'attempts': 0})
+        state['attempts'] = attempt
+        pipeline['status'] = 'processing'
+        media.approval_status = 'processing'
+
+        try:
+            ran = getattr(MediaPipeline, stage)(media, user_id)
+        except MediaRejected as e:
+            state['status'] = 'rejected'
+            pipeline['status'] = 'rejected'
+            pipeline['reason'] = e.reason
+            pipeline.update(e.details)
+            media.approval_status = 'rejected'
+            media.save(update_fields=PIPELINE_FIELDS)
+            logger.warning(f"Média {media.id} rejeté à l'étape {stage}: {e.reason}")
+            return
+        except Exception as e:
+            state['status'] = 'error'
+            state['error'] = str(e)
+            max_retries = getattr(settings, 'MEDIA_PIPELINE_MAX_RETRIES', 3)
+            if attempt <= max_retries:
+                delay = getattr(settings, 'MEDIA_PIPELINE_RETRY_BACKOFF', 5) * (2 ** (attempt - 1))
+                media.save(update_fields=PIPELINE_FIELDS)
+                logger.warning(f"Étape {stage} du média {media.id} en échec ({e}), reprise dans {delay:.0f}s")
+                media_queue.enqueue_later(delay, MediaPipeline.run_stage, media_id, stage, attempt + 1, user_id)
+            else:
+                pipeline['status'] = 'failed'
+                media.approval_status = 'failed'
+                media.save(update_fields=PIPELINE_FIELDS)
+                logger.error(f"Traitement du média {media.id} abandonné à l'étape {stage}: {e}")
+            return
+
+        state['status'] = 'skipped' if ran is False else 'done'
+        state.pop('error', None)
+
+        index = STAGES.index(stage)
+        if index == len(STAGES) - 1:
+            # Sans modération effective, le média n'est pas approuvé
+            moderated = pipeline['stages']['moderate']['status'] == 'done'
+            pipeline['status'] = 'approved' if moderated else 'unmoderated'
+            pipeline['completed_at'] = timezone.now().isoformat()
+            media.approval_status = pipeline['status']
+            media.save(update_fields=PIPELINE_FIELDS)
+            logger.info(f"Média {media.id} traité ({pipeline['status']})")
+        else:
+            media.save(update_fields=PIPELINE_FIELDS)
+            media_queue.enqueue(MediaPipeline.run_stage, media_id, STAGES[index + 1], 1, user_id)
+
+    @staticmethod
+    def probe(media, user_id=None):
+        """Lit les dimensions des images et vérifie la durée des vidéos"""
+        if media.media_type == 'image':
+            try:
+                with media.file.open('rb') as image_file, Image.open(image_file) as img:
+                    media.width, media.height = img.size
+            except Image.UnidentifiedImageError:
+                raise MediaRejected("Image illisible")
+            return
+
+        if media.is_live_recording:
+            max_duration = getattr(settings, 'LIVE_RECORDING_MAX_DURATION', 3600)
+        else:
+            max_duration = getattr(settings, 'MEDIA_MAX_VIDEO_DURATION', 60)
+        with local_file(media) as path:
+            validation_result = VideoProcessingService.validate_video_duration(path, max_duration=max_duration)
+
+        if not validation_result['is_valid']:
+            raise MediaRejected(
+                'Vidéo trop longue' if validation_result['duration'] else 'Durée de la vidéo illisible',
+                {
+                    'duration_seconds': validation_result['duration_seconds'],
+                    'max_duration': validation_result['max_duration']
+                }
+            )
+        media.duration = validation_result['duration']
+
+    @staticmethod
+    def moderate(media, user_id=None):
+        """Analyse le contenu avec le backend de modération (étape ignorée sans modération effective)"""
+        analysis_result = get_moderation_backend().analyze(media)
+        if analysis_result.get('moderated') is False:
+            media.moderation_score = None
+            return False
+
+        media.moderation_score = analysis_result['moderation_score']
+        media.is_appropriate = analysis_result['is_appropriate']
+        media.moderation_details = {
+            **analysis_result['moderation_details'],
+            'pipeline': media.moderation_details['pipeline']
+        }
+        if not media.is_appropriate:
+            raise MediaRejected('Contenu inapproprié')
+
+    @staticmethod
+    def transcode(media, user_id=None):
+        """Produit les déclinaisons des images ; les qualités HLS des vidéos (voir posts.transcoding)"""
+        if media.media_type == 'image':
+            media.renditions = ImageRenditionService.generate(media)
+            return
+        if not ffmpeg_available():
+            logger.info(f"ffmpeg absent, transcodage du média {media.id} ignoré")
+            return False
+
+        VideoTranscodingService.transcode(media)
+
+    @staticmethod
+    def thumbnail(media, user_id=None):
+        """Extrait la miniature des vidéos"""
+        if media.media_type == 'image':
+            return False
+        if not ffmpeg_available():
+            logger.info(f"ffmpeg absent, miniature du média {media.id} ignorée")
+            return False
+
+        VideoTranscodingService.extract_poster(media)
+
+    @staticmethod
+    def cdn(media, user_id=None):
+        """Envoie le média vers le CDN"""
+        user = get_user_model().objects.filter(id=user_id).first() if user_id else None
+        cdn_result = get_cdn_backend().upload(media, user)
+
+        if not cdn_result.get('url'):
+            # Backend local : le fichier reste servi par le stockage Django
+            return
+
+        media.cdn_url = cdn_result['url']
+        media.cdn_public_id = cdn_result.get('public_id')
+        media.width = cdn_result.get('width') or media.width
+        media.height = cdn_result.get('height') or media.height
+        logger.info(f"Média {media.id} uploadé vers CDN: {cdn_result['url']}")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='media',
+            name='approval_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('approved', 'Approuvé'), ('rejected', 'Rejeté'), ('inappropriate', 'Inapproprié'), ('failed', 'Échec du traitement')], default='pending', max_length=20, verbose_name="Statut d'approbation"),
+        ),
+    ]
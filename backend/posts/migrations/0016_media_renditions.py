@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_alter_media_approval_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='renditions',
+            field=models.JSONField(blank=True, default=list, verbose_name='Déclinaisons (images)'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_media_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='posts.media', verbose_name='Doublon de'),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, max_length=16, verbose_name='Empreinte perceptuelle (images)'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(django.db.models.functions.text.Substr('perceptual_hash', 1, 4), name='posts_media_phash_band_0'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(django.db.models.functions.text.Substr('perceptual_hash', 5, 4), name='posts_media_phash_band_1'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(django.db.models.functions.text.Substr('perceptual_hash', 9, 4), name='posts_media_phash_band_2'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(django.db.models.functions.text.Substr('perceptual_hash', 13, 4), name='posts_media_phash_band_3'),
+        ),
+    ]
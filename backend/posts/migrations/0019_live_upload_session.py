@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_media_duplicate_of_media_perceptual_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveUploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=50)),
+                ('total_size', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Taille annoncée')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='Taille des morceaux')),
+                ('next_chunk', models.PositiveIntegerField(default=0, verbose_name='Prochain morceau attendu')),
+                ('received_bytes', models.PositiveBigIntegerField(default=0, verbose_name='Octets reçus')),
+                ('chunk_checksums', models.JSONField(blank=True, default=list, verbose_name='Empreintes des morceaux')),
+                ('status', models.CharField(choices=[('uploading', 'En cours'), ('completed', 'Terminé'), ('aborted', 'Abandonné')], default='uploading', max_length=20)),
+                ('expires_at', models.DateTimeField(verbose_name='Expiration')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('live_post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='posts.post')),
+                ('media', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='posts.media', verbose_name='Média créé')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='live_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Envoi d'enregistrement de live",
+                'verbose_name_plural': "Envois d'enregistrements de live",
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='posts_liveu_status_f108fc_idx')],
+            },
+        ),
+    ]
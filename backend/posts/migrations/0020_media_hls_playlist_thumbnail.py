@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_live_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='hls_playlist',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Liste de lecture HLS (vidéos)'),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='thumbnail',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Miniature (vidéos)'),
+        ),
+        migrations.AlterField(
+            model_name='media',
+            name='renditions',
+            field=models.JSONField(blank=True, default=list, verbose_name='Déclinaisons (images) ou qualités HLS (vidéos)'),
+        ),
+    ]
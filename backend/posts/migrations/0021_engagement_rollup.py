@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_media_hls_playlist_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngagementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('user', 'Utilisateur'), ('quartier', 'Quartier'), ('commune', 'Commune')], max_length=10)),
+                ('scope_id', models.PositiveIntegerField(verbose_name="Identifiant de l'utilisateur, du quartier ou de la commune")),
+                ('granularity', models.CharField(choices=[('hour', 'Heure'), ('day', 'Jour')], max_length=4)),
+                ('period_start', models.DateTimeField(verbose_name='Début de la période')),
+                ('posts_count', models.IntegerField(default=0)),
+                ('views_count', models.IntegerField(default=0)),
+                ('likes_count', models.IntegerField(default=0)),
+                ('comments_count', models.IntegerField(default=0)),
+                ('shares_count', models.IntegerField(default=0)),
+                ('external_shares_count', models.IntegerField(default=0)),
+                ('whatsapp_shares', models.IntegerField(default=0)),
+                ('facebook_shares', models.IntegerField(default=0)),
+                ('twitter_shares', models.IntegerField(default=0)),
+                ('telegram_shares', models.IntegerField(default=0)),
+                ('email_shares', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Agrégat d'engagement",
+                'verbose_name_plural': "Agrégats d'engagement",
+                'ordering': ['period_start'],
+                'unique_together': {('scope', 'scope_id', 'granularity', 'period_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_engagement_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='media',
+            name='approval_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('approved', 'Approuvé'), ('unmoderated', 'Non modéré'), ('rejected', 'Rejeté'), ('inappropriate', 'Inapproprié'), ('failed', 'Échec du traitement')], default='pending', max_length=20, verbose_name="Statut d'approbation"),
+        ),
+    ]
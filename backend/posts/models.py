@@ -1,9 +1,12 @@
+import uuid
 from django.db import models
+from django.db.models.functions import Substr
 from django.contrib.auth import get_user_model
 from geography.models import Quartier
 import os
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
+from django.conf import settings
 
 User = get_user_model()
 
@@ -29,26 +32,26 @@ def validate_file_size(value):
         raise ValidationError("Le fichier est trop volumineux (max 100MB)")
 
 def validate_file_type(value):
-    """Valide le type de fichier pour la sécurité"""
-    import magic
+    """
+    Valide le type de fichier pour la sécurité et renvoie le type réel
     
-    # Lire les premiers octets pour détecter le type réel
-    file_content = value.read(1024)
-    value.seek(0)  # Remettre le curseur au début
+    Le type est détecté à partir des premiers octets, pendant l'envoi si le
+    fichier a été reçu par posts.uploads.StreamingUploadHandler.
+    """
+    from .uploads import detect_content_type
     
-    # Détecter le type MIME réel
-    mime_type = magic.from_buffer(file_content, mime=True)
+    mime_type = detect_content_type(value)
     
     # Types autorisés
-    allowed_types = [
-        'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp',
-        'video/mp4', 'video/webm', 'video/quicktime', 'video/avi'
-    ]
+    allowed_types = (
+        getattr(settings, 'ALLOWED_IMAGE_TYPES', ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']) +
+        getattr(settings, 'ALLOWED_VIDEO_TYPES', ['video/mp4', 'video/webm', 'video/quicktime', 'video/avi'])
+    )
     
     if mime_type not in allowed_types:
         raise ValidationError(f"Type de fichier non autorisé: {mime_type}")
     
-    return value
+    return mime_type
 
 class Media(models.Model):
     """Modèle pour les fichiers médias (images et vidéos)"""
@@ -61,9 +64,12 @@ class Media(models.Model):
     
     APPROVAL_STATUS = [
         ('pending', 'En attente'),
+        ('processing', 'En traitement'),
         ('approved', 'Approuvé'),
+        ('unmoderated', 'Non modéré'),
         ('rejected', 'Rejeté'),
         ('inappropriate', 'Inapproprié'),
+        ('failed', 'Échec du traitement'),
     ]
     
     # Informations de base
@@ -81,6 +87,19 @@ class Media(models.Model):
     file_size = models.PositiveIntegerField(null=True, blank=True, verbose_name="Taille du fichier")
     width = models.PositiveIntegerField(null=True, blank=True, verbose_name="Largeur")
     height = models.PositiveIntegerField(null=True, blank=True, verbose_name="Hauteur")
+    renditions = models.JSONField(default=list, blank=True, verbose_name="Déclinaisons (images) ou qualités HLS (vidéos)")
+    hls_playlist = models.CharField(max_length=255, blank=True, verbose_name="Liste de lecture HLS (vidéos)")
+    thumbnail = models.CharField(max_length=255, blank=True, verbose_name="Miniature (vidéos)")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Empreinte SHA-256")
+    perceptual_hash = models.CharField(max_length=16, blank=True, verbose_name="Empreinte perceptuelle (images)")
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates',
+        verbose_name="Doublon de"
+    )
     
     # CDN Cloudinary
     cdn_url = models.URLField(blank=True, null=True, verbose_name="URL CDN")
@@ -114,6 +133,14 @@ class Media(models.Model):
         verbose_name = "Média"
         verbose_name_plural = "Médias"
         ordering = ['-created_at']
+        indexes = [
+            # Recherche des images proches : une empreinte à moins de 4 bits
+            # partage au moins un de ses quatre quarts (voir posts.dedup)
+            models.Index(Substr('perceptual_hash', 1, 4), name='posts_media_phash_band_0'),
+            models.Index(Substr('perceptual_hash', 5, 4), name='posts_media_phash_band_1'),
+            models.Index(Substr('perceptual_hash', 9, 4), name='posts_media_phash_band_2'),
+            models.Index(Substr('perceptual_hash', 13, 4), name='posts_media_phash_band_3'),
+        ]
     
     def __str__(self):
         return f"{self.get_media_type_display()} - {self.title or self.file.name}"
@@ -134,16 +161,29 @@ class Media(models.Model):
     
     @property
     def thumbnail_url(self):
-        """Retourne l'URL de la miniature (pour vidéos)"""
-        if self.media_type == 'video' and self.file:
-            # Logique pour générer/retourner la miniature
-            return self.file.url.replace('.mp4', '_thumb.jpg')
+        """Retourne l'URL de la miniature (pour vidéos, None tant qu'elle n'est pas extraite)"""
+        if self.media_type == 'video':
+            return self.file.storage.url(self.thumbnail) if self.thumbnail else None
         return self.file_url
     
+    @property
+    def stream_url(self):
+        """Retourne l'URL du flux adaptatif HLS (pour vidéos transcodées)"""
+        if self.hls_playlist:
+            return self.file.storage.url(self.hls_playlist)
+        return None
+    
+    @staticmethod
+    def publishable_statuses():
+        """Statuts publiables : ``unmoderated`` seulement si la modération n'est pas exigée"""
+        if getattr(settings, 'MEDIA_REQUIRE_MODERATION', False):
+            return ('approved',)
+        return ('approved', 'unmoderated')
+    
     def is_approved_for_publication(self):
         """Vérifie si le média peut être publié"""
         return (
-            self.approval_status == 'approved' and 
+            self.approval_status in self.publishable_statuses() and 
             self.is_appropriate and 
             not self.is_live
         )
@@ -199,22 +239,29 @@ class Post(models.Model):
         ordering = ['-created_at']
         verbose_name = "Post"
         verbose_name_plural = "Posts"
+        indexes = [
+            # Pagination par curseur sur (created_at, id)
+            models.Index(fields=['quartier', '-created_at', '-id']),
+            models.Index(fields=['author', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"Post de {self.author.username} - {self.created_at.strftime('%d/%m/%Y')}"
     
+    def increment_counter(self, field, delta=1):
+        """Incrémente un compteur d'engagement sans écrire la ligne (voir posts.counters)"""
+        from .counters import EngagementCounterService
+        EngagementCounterService.increment(self.pk, field, delta)
+        setattr(self, field, max(0, getattr(self, field) + delta))
+    
     def increment_views(self):
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+        self.increment_counter('views_count')
     
     def increment_likes(self):
-        self.likes_count += 1
-        self.save(update_fields=['likes_count'])
+        self.increment_counter('likes_count')
     
     def decrement_likes(self):
-        if self.likes_count > 0:
-            self.likes_count -= 1
-            self.save(update_fields=['likes_count'])
+        self.increment_counter('likes_count', -1)
     
     @property
     def has_media(self):
@@ -267,6 +314,9 @@ class PostComment(models.Model):
         ordering = ['created_at']
         verbose_name = "Commentaire"
         verbose_name_plural = "Commentaires"
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Commentaire de {self.author.username} sur {self.post}"
@@ -325,17 +375,16 @@ class PostShare(models.Model):
         return f"Partage de {self.user.username} sur {self.post}"
     
     def save(self, *args, **kwargs):
-        # Incrémenter le compteur de partages du post
-        if not self.pk:  # Nouveau partage
-            self.post.shares_count = getattr(self.post, 'shares_count', 0) + 1
-            self.post.save(update_fields=['shares_count'])
+        is_new = self.pk is None
         super().save(*args, **kwargs)
+        # Incrémenter le compteur de partages du post
+        if is_new:
+            self.post.increment_counter('shares_count')
     
     def delete(self, *args, **kwargs):
+        super().delete(*args, **kwargs)
         # Décrémenter le compteur de partages du post
-        self.post.shares_count = max(0, getattr(self.post, 'shares_count', 0) - 1)
-        self.post.save(update_fields=['shares_count'])
-        super().delete(*args, **kwargs) 
+        self.post.increment_counter('shares_count', -1)
 
 class ExternalShare(models.Model):
     """Modèle pour les partages externes (réseaux sociaux)"""
@@ -433,16 +482,17 @@ class PostAnalytics(models.Model):
         self.total_views = self.post.views_count
         self.total_shares = self.post.shares_count
         
-        # Compter les partages externes
-        external_shares = self.post.external_shares.all()
-        self.total_external_shares = external_shares.count()
-        
-        # Compter par plateforme
-        self.whatsapp_shares = external_shares.filter(platform='whatsapp').count()
-        self.facebook_shares = external_shares.filter(platform='facebook').count()
-        self.twitter_shares = external_shares.filter(platform='twitter').count()
-        self.telegram_shares = external_shares.filter(platform='telegram').count()
-        self.email_shares = external_shares.filter(platform='email').count()
+        # Compter les partages externes par plateforme, en une requête
+        platforms = dict(
+            self.post.external_shares.values('platform').annotate(total=models.Count('id'))
+            .values_list('platform', 'total')
+        )
+        self.total_external_shares = sum(platforms.values())
+        self.whatsapp_shares = platforms.get('whatsapp', 0)
+        self.facebook_shares = platforms.get('facebook', 0)
+        self.twitter_shares = platforms.get('twitter', 0)
+        self.telegram_shares = platforms.get('telegram', 0)
+        self.email_shares = platforms.get('email', 0)
         
         # Calculer les scores
         self.calculate_viral_score()
@@ -450,6 +500,51 @@ class PostAnalytics(models.Model):
         
         self.save() 
 
+
+class EngagementRollup(models.Model):
+    """Engagement agrégé par heure ou par jour pour un utilisateur, un quartier ou une commune"""
+    
+    SCOPE_CHOICES = [
+        ('user', 'Utilisateur'),
+        ('quartier', 'Quartier'),
+        ('commune', 'Commune'),
+    ]
+    
+    GRANULARITY_CHOICES = [
+        ('hour', 'Heure'),
+        ('day', 'Jour'),
+    ]
+    
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    scope_id = models.PositiveIntegerField(verbose_name="Identifiant de l'utilisateur, du quartier ou de la commune")
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField(verbose_name="Début de la période")
+    
+    # Deltas cumulés sur la période (un retrait de like peut rendre une période négative)
+    posts_count = models.IntegerField(default=0)
+    views_count = models.IntegerField(default=0)
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    shares_count = models.IntegerField(default=0)
+    external_shares_count = models.IntegerField(default=0)
+    whatsapp_shares = models.IntegerField(default=0)
+    facebook_shares = models.IntegerField(default=0)
+    twitter_shares = models.IntegerField(default=0)
+    telegram_shares = models.IntegerField(default=0)
+    email_shares = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        # L'unicité sert aussi d'index aux lectures par période
+        unique_together = ['scope', 'scope_id', 'granularity', 'period_start']
+        ordering = ['period_start']
+        verbose_name = "Agrégat d'engagement"
+        verbose_name_plural = "Agrégats d'engagement"
+    
+    def __str__(self):
+        return f"{self.get_scope_display()} {self.scope_id} - {self.granularity} {self.period_start}"
+
 class LiveChatMessage(models.Model):
     """Modèle pour les messages de chat pendant les lives"""
     
@@ -483,4 +578,51 @@ class LiveChatMessage(models.Model):
     @property
     def formatted_time(self):
         """Retourne l'heure formatée"""
-        return self.timestamp.strftime('%H:%M') 
\ No newline at end of file
+        return self.timestamp.strftime('%H:%M')
+
+
+class LiveUploadSession(models.Model):
+    """Envoi reprenable, par morceaux numérotés, de l'enregistrement d'un live"""
+    
+    STATUS_CHOICES = [
+        ('uploading', 'En cours'),
+        ('completed', 'Terminé'),
+        ('aborted', 'Abandonné'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='live_upload_sessions')
+    live_post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    total_size = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Taille annoncée")
+    chunk_size = models.PositiveIntegerField(verbose_name="Taille des morceaux")
+    
+    # Avancement : morceaux reçus dans l'ordre et leurs empreintes SHA-256
+    next_chunk = models.PositiveIntegerField(default=0, verbose_name="Prochain morceau attendu")
+    received_bytes = models.PositiveBigIntegerField(default=0, verbose_name="Octets reçus")
+    chunk_checksums = models.JSONField(default=list, blank=True, verbose_name="Empreintes des morceaux")
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    media = models.OneToOneField(
+        Media,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session',
+        verbose_name="Média créé"
+    )
+    expires_at = models.DateTimeField(verbose_name="Expiration")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Envoi d'enregistrement de live"
+        verbose_name_plural = "Envois d'enregistrements de live"
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Envoi {self.id} - live {self.live_post_id} ({self.next_chunk} morceaux)"
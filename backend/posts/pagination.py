@@ -0,0 +1,224 @@
+"""
+Pagination par curseur (keyset) pour les listes de posts et de commentaires.
+
+Contrairement à la pagination par numéro de page, aucune requête n'utilise
+OFFSET ni COUNT(*) : chaque page filtre sur la clé de tri du dernier élément
+reçu, par exemple ``(created_at, id)``. Le coût d'une page est donc constant,
+quelle que soit la profondeur de défilement, et les curseurs restent stables
+lorsque de nouveaux posts sont insérés.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Pagination keyset sur un tri composé se terminant par une clé unique.
+
+    Les vues peuvent fournir ``get_keyset_ordering(request)`` pour adapter le
+    tri (ex. ``('-likes_count', '-created_at', '-id')``) ; sinon ``ordering``
+    est utilisé.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = getattr(settings, 'PAGINATION_PAGE_SIZE', 20)
+    max_page_size = getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 100)
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Curseur invalide'
+
+    # Pagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._setup(request, view)
+
+        if self.reverse:
+            queryset = queryset.order_by(*self._invert(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.position is not None:
+            queryset = queryset.filter(self._keyset_filter(self.position, self.reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self._set_page_state(results, has_more)
+        return results
+
+    def paginate_id_window(self, ids, complete, request, view=None, hydrate=None):
+        """
+        Pagine une fenêtre d'IDs précalculée triée selon ``ordering``.
+
+        Retourne None si la page demandée ne peut pas être servie depuis la
+        fenêtre (curseur inconnu, retour arrière, fin de fenêtre tronquée) :
+        l'appelant doit alors paginer le queryset.
+        """
+        self._setup(request, view)
+        if self.reverse:
+            return None
+
+        start = 0
+        if self.position is not None:
+            try:
+                start = ids.index(self.position[-1]) + 1
+            except ValueError:
+                return None
+
+        page_ids = ids[start:start + self.page_size + 1]
+        if len(page_ids) <= self.page_size and not complete:
+            return None
+
+        has_more = len(page_ids) > self.page_size
+        page_ids = page_ids[:self.page_size]
+        results = hydrate(page_ids) if hydrate else page_ids
+
+        self._set_page_state(results, has_more)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._build_link(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.previous_position is None:
+            # Retour à la première page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._build_link(self.previous_position, reverse=True)
+
+    # Curseurs
+
+    def encode_cursor(self, position, reverse=False):
+        """Encode une position (valeurs de la clé de tri) en curseur opaque"""
+        payload = {
+            'o': list(self.ordering),
+            'p': [self._serialize_value(value) for value in position],
+        }
+        if reverse:
+            payload['r'] = 1
+        data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['o'] != list(self.ordering) or len(payload['p']) != len(self.ordering):
+                raise ValueError('ordering mismatch')
+            position = tuple(
+                self._deserialize_value(field, value)
+                for field, value in zip(self.ordering, payload['p'])
+            )
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, instance):
+        return tuple(getattr(instance, field.lstrip('-')) for field in self.ordering)
+
+    # Interne
+
+    def _setup(self, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+        self.position, self.reverse = self.decode_cursor(request)
+
+    def _set_page_state(self, results, has_more):
+        if self.reverse:
+            self.has_previous = has_more
+            self.has_next = self.position is not None
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.next_position = self.get_position(results[-1]) if results else self.position
+        if results and (not self.reverse or has_more):
+            self.previous_position = self.get_position(results[0])
+        else:
+            self.previous_position = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering(request))
+        return tuple(self.ordering)
+
+    def _keyset_filter(self, position, reverse):
+        """Construit le filtre « après la position » pour un tri composé"""
+        keyset = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            keyset |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return keyset
+
+    def _build_link(self, position, reverse):
+        if position is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(position, reverse)
+        )
+
+    @staticmethod
+    def _invert(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _serialize_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _deserialize_value(field, value):
+        if field.lstrip('-').endswith('_at'):
+            return datetime.fromisoformat(value)
+        if not isinstance(value, (int, float, str)):
+            raise ValueError('invalid cursor value')
+        return value
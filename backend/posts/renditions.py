@@ -0,0 +1,171 @@
+"""
+Déclinaisons (renditions) des images publiées.
+
+Chaque image est décodée une seule fois puis réduite en cascade vers une
+échelle fixe de largeurs (``MEDIA_OPTIMIZATION['rendition_widths']``,
+150/300/600/1080/1920 par défaut), chaque taille étant encodée en JPEG et en
+WebP (``rendition_formats``). Les déclinaisons sont stockées à côté du
+fichier original (``<fichier>_<largeur>w.<ext>``) et décrites dans
+``Media.renditions`` avec leurs dimensions, ce qui permet à
+``MediaSerializer`` de fournir un ``srcset`` sans requête supplémentaire.
+
+Les formats que Pillow ne sait pas encoder (AVIF sans greffon) sont ignorés.
+Les fonctions ``load_image``, ``fit_image`` et ``encode_image`` sont aussi
+utilisées par les services d'optimisation de posts.services.
+"""
+import io
+import logging
+import math
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RENDITION_WIDTHS = (150, 300, 600, 1080, 1920)
+DEFAULT_RENDITION_FORMATS = ('jpeg', 'webp')
+
+# Format Pillow, extension et type MIME de chaque format de sortie
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'avif': ('AVIF', 'avif', 'image/avif'),
+}
+
+
+def get_optimization_setting(name, default):
+    return getattr(settings, 'MEDIA_OPTIMIZATION', {}).get(name, default)
+
+
+def load_image(source, max_width=None, max_height=None):
+    """
+    Décode une image en RGB, orientée selon ses données EXIF.
+
+    Avec ``max_width``/``max_height``, le décodeur JPEG réduit directement
+    l'image (``draft``) sans descendre sous la taille demandée.
+    """
+    with Image.open(source) as img:
+        width, height = img.size
+        ratio = min((max_width or width) / width, (max_height or height) / height)
+        if ratio < 1:
+            img.draft('RGB', (math.ceil(width * ratio), math.ceil(height * ratio)))
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Fond blanc plutôt que noir pour les zones transparentes
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            return background
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        img.load()
+        return img
+
+
+def fit_image(img, max_width=None, max_height=None):
+    """Réduit l'image pour tenir dans les dimensions données, sans l'agrandir"""
+    width, height = img.size
+    ratio = min((max_width or width) / width, (max_height or height) / height)
+    if ratio >= 1:
+        return img
+    return img.resize((max(1, round(width * ratio)), max(1, round(height * ratio))), Image.Resampling.LANCZOS)
+
+
+def encode_image(img, image_format='jpeg', quality=None):
+    """Encode une image dans le format demandé et renvoie un buffer en début de lecture"""
+    if quality is None:
+        quality = get_optimization_setting('image_quality', 85)
+
+    output = io.BytesIO()
+    if image_format == 'jpeg':
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=img.width > 600)
+    elif image_format == 'webp':
+        img.save(output, format='WEBP', quality=quality, method=4)
+    else:
+        img.save(output, format=IMAGE_FORMATS[image_format][0], quality=quality)
+    output.seek(0)
+    return output
+
+
+def supported_formats(formats):
+    """Formats demandés que Pillow sait encoder"""
+    Image.init()
+    available = []
+    for image_format in formats:
+        if image_format in IMAGE_FORMATS and IMAGE_FORMATS[image_format][0] in Image.SAVE:
+            available.append(image_format)
+        else:
+            logger.warning(f"Format de déclinaison non supporté: {image_format}")
+    return available
+
+
+class ImageRenditionService:
+    """Production et description des déclinaisons d'images"""
+
+    @staticmethod
+    def ladder(width, widths=None):
+        """Largeurs à produire pour une image de largeur ``width``"""
+        widths = sorted(widths or get_optimization_setting('rendition_widths', DEFAULT_RENDITION_WIDTHS))
+        ladder = [size for size in widths if size < width]
+        # L'image d'origine (plafonnée à la plus grande largeur) complète l'échelle
+        ladder.append(min(width, widths[-1]))
+        return sorted(set(ladder))
+
+    @staticmethod
+    def build_renditions(source, widths=None, formats=None):
+        """
+        Décode ``source`` une fois et renvoie les déclinaisons
+        ``(largeur, hauteur, format, buffer)``, de la plus grande à la plus petite.
+        """
+        formats = supported_formats(formats or get_optimization_setting('rendition_formats', DEFAULT_RENDITION_FORMATS))
+        max_width = max(widths or get_optimization_setting('rendition_widths', DEFAULT_RENDITION_WIDTHS))
+        img = load_image(source, max_width=max_width)
+
+        renditions = []
+        for width in reversed(ImageRenditionService.ladder(img.width, widths)):
+            # Chaque taille est réduite depuis la précédente, plus petite que l'original
+            img = fit_image(img, max_width=width)
+            for image_format in formats:
+                renditions.append((img.width, img.height, image_format, encode_image(img, image_format)))
+        return renditions
+
+    @staticmethod
+    def generate(media):
+        """Produit et stocke les déclinaisons d'une image ; renvoie leur description"""
+        storage = media.file.storage
+        base_name = os.path.splitext(media.file.name)[0]
+
+        with media.file.open('rb') as source:
+            renditions = ImageRenditionService.build_renditions(source)
+
+        descriptions = []
+        for width, height, image_format, buffer in renditions:
+            name = f"{base_name}_{width}w.{IMAGE_FORMATS[image_format][1]}"
+            if storage.exists(name):
+                storage.delete(name)
+            content = buffer.getvalue()
+            name = storage.save(name, ContentFile(content))
+            descriptions.append({
+                'name': name,
+                'width': width,
+                'height': height,
+                'format': image_format,
+                'size': len(content)
+            })
+
+        descriptions.sort(key=lambda rendition: (rendition['format'], rendition['width']))
+        logger.info(f"{len(descriptions)} déclinaisons créées pour le média {media.id}")
+        return descriptions
+
+    @staticmethod
+    def srcset(media, image_format='jpeg'):
+        """Attribut ``srcset`` des déclinaisons d'un format (chaîne vide si aucune)"""
+        storage = media.file.storage
+        return ', '.join(
+            f"{storage.url(rendition['name'])} {rendition['width']}w"
+            for rendition in media.renditions
+            if rendition['format'] == image_format
+        )
@@ -0,0 +1,291 @@
+"""
+Agrégats d'engagement par heure et par jour (utilisateur, quartier, commune).
+
+Chaque événement d'engagement (post publié, like, commentaire, partage,
+partage externe, vues) est inscrit dans un journal du cache sans écriture en
+base. Le vidage, au plus une fois par ``ENGAGEMENT_ROLLUP_FLUSH_INTERVAL``,
+résout l'auteur, le quartier et la commune des posts concernés en une
+requête, additionne les deltas par période puis les applique aux lignes
+``EngagementRollup`` par ``UPDATE ... SET field = field + delta``.
+
+Les résumés (posts.services.AnalyticsService) lisent ainsi une ligne par jour
+de la période au lieu de parcourir les posts. Les vues proviennent du vidage
+des compteurs (posts.counters) ; les autres événements, des signaux.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from .counters import EngagementCounterService
+from .models import Post, PostLike, PostComment, PostShare, ExternalShare, EngagementRollup
+
+logger = logging.getLogger(__name__)
+
+
+class EngagementRollupService:
+    """Service de mise à jour incrémentale et de lecture des agrégats d'engagement"""
+
+    FIELDS = (
+        'posts_count', 'views_count', 'likes_count', 'comments_count', 'shares_count',
+        'external_shares_count', 'whatsapp_shares', 'facebook_shares', 'twitter_shares',
+        'telegram_shares', 'email_shares',
+    )
+    PLATFORM_FIELDS = {
+        'whatsapp': 'whatsapp_shares',
+        'facebook': 'facebook_shares',
+        'twitter': 'twitter_shares',
+        'telegram': 'telegram_shares',
+        'email': 'email_shares',
+    }
+    SCOPES = ('user', 'quartier', 'commune')
+    LOG_SEQUENCE_KEY = 'engagement_rollup_log_seq'
+    LOG_CURSOR_KEY = 'engagement_rollup_log_cursor'
+    FLUSH_MARKER_KEY = 'engagement_rollup_flush'
+    FLUSH_BATCH_SIZE = 5000
+
+    @staticmethod
+    def get_cache():
+        return EngagementCounterService.get_cache()
+
+    @staticmethod
+    def get_log_key(position):
+        return f"engagement_rollup_log_{position}"
+
+    @staticmethod
+    def get_flush_interval():
+        return getattr(settings, 'ENGAGEMENT_ROLLUP_FLUSH_INTERVAL', 30)
+
+    @staticmethod
+    def get_entry_timeout():
+        return getattr(settings, 'CACHE_TIMEOUTS', {}).get('engagement_counter', 86400)
+
+    @staticmethod
+    def hour_start(when):
+        return timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def day_start(when):
+        return timezone.localtime(when).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def record(post_id, field, delta=1, when=None, dimensions=None):
+        """
+        Inscrit un événement d'engagement dans le journal.
+
+        ``dimensions`` (auteur, quartier, commune) n'est nécessaire que pour
+        un post supprimé, que le vidage ne pourrait plus résoudre.
+        """
+        EngagementRollupService.record_many([(post_id, field, delta, when, dimensions)])
+
+    @staticmethod
+    def record_many(entries, flush=True):
+        """
+        Inscrit des événements ``(post_id, field, delta, when, dimensions)`` en
+        une écriture de cache. Avec ``flush=False``, ils attendent le prochain
+        vidage (événement suivant ou commande ``flush_engagement_counters``).
+        """
+        if not entries:
+            return
+
+        now = timezone.now()
+        rows = []
+        for post_id, field, delta, when, dimensions in entries:
+            if field not in EngagementRollupService.FIELDS:
+                raise ValueError(f"Agrégat inconnu: {field}")
+            if delta:
+                rows.append((post_id, field, delta, EngagementRollupService.hour_start(when or now), dimensions))
+        if not rows:
+            return
+
+        cache = EngagementRollupService.get_cache()
+        cache.add(EngagementRollupService.LOG_SEQUENCE_KEY, 0, None)
+        last = cache.incr(EngagementRollupService.LOG_SEQUENCE_KEY, len(rows))
+        cache.set_many(
+            {EngagementRollupService.get_log_key(last - len(rows) + index + 1): row for index, row in enumerate(rows)},
+            EngagementRollupService.get_entry_timeout()
+        )
+        if flush:
+            EngagementRollupService.maybe_flush()
+
+    @staticmethod
+    def maybe_flush():
+        """Vide le journal au plus une fois par intervalle"""
+        cache = EngagementRollupService.get_cache()
+        if cache.add(EngagementRollupService.FLUSH_MARKER_KEY, 1, EngagementRollupService.get_flush_interval()):
+            EngagementRollupService.flush()
+
+    @staticmethod
+    def flush():
+        """Applique en base les événements du journal ; renvoie le nombre de lignes d'agrégats modifiées"""
+        cache = EngagementRollupService.get_cache()
+        lock_key = f"{EngagementRollupService.LOG_CURSOR_KEY}_lock"
+        if not cache.add(lock_key, 1, 60):
+            return 0
+
+        try:
+            entries = EngagementRollupService._drain_log(cache)
+            if not entries:
+                return 0
+
+            post_ids = {post_id for post_id, _, _, _, dimensions in entries if dimensions is None}
+            resolved = {
+                post['id']: (post['author_id'], post['quartier_id'], post['quartier__commune_id'])
+                for post in Post.objects.filter(id__in=post_ids).values(
+                    'id', 'author_id', 'quartier_id', 'quartier__commune_id'
+                )
+            }
+
+            deltas = defaultdict(lambda: defaultdict(int))
+            for post_id, field, delta, hour, dimensions in entries:
+                # Post supprimé depuis (suppression en cascade) : l'événement est ignoré
+                dimensions = dimensions or resolved.get(post_id)
+                if dimensions:
+                    EngagementRollupService._add(deltas, dimensions, hour, {field: delta})
+
+            try:
+                with transaction.atomic():
+                    EngagementRollupService._apply(deltas)
+            except Exception as e:
+                logger.error(f"Erreur lors du vidage des agrégats d'engagement: {str(e)}")
+                # Remettre les événements en attente pour le prochain vidage
+                EngagementRollupService.record_many([
+                    (post_id, field, delta, hour, dimensions or resolved.get(post_id))
+                    for post_id, field, delta, hour, dimensions in entries
+                ], flush=False)
+                return 0
+
+            logger.info(f"Agrégats d'engagement vidés: {len(entries)} événements, {len(deltas)} lignes")
+            return len(deltas)
+        finally:
+            cache.delete(lock_key)
+
+    @staticmethod
+    def get_rollups(scope, scope_id, start, granularity='day'):
+        """Lignes d'agrégats d'un périmètre depuis ``start`` (séries pour les graphiques)"""
+        if granularity == 'day':
+            start = EngagementRollupService.day_start(start)
+        else:
+            start = EngagementRollupService.hour_start(start)
+        return EngagementRollup.objects.filter(
+            scope=scope, scope_id=scope_id, granularity=granularity, period_start__gte=start
+        )
+
+    @staticmethod
+    def get_totals(scope, scope_id, start):
+        """Totaux d'un périmètre depuis le jour de ``start``, sommés sur les lignes journalières"""
+        totals = EngagementRollupService.get_rollups(scope, scope_id, start).aggregate(
+            **{field: Sum(field) for field in EngagementRollupService.FIELDS}
+        )
+        return {field: max(0, value or 0) for field, value in totals.items()}
+
+    @staticmethod
+    def rebuild(days=30):
+        """
+        Recalcule les agrégats des ``days`` derniers jours à partir des posts,
+        likes, commentaires et partages. Les vues, qui n'ont pas d'historique
+        en base, sont conservées telles quelles.
+        """
+        EngagementRollupService.flush()
+        start = EngagementRollupService.day_start(timezone.now() - timedelta(days=days))
+
+        deltas = defaultdict(lambda: defaultdict(int))
+        sources = [
+            (Post.objects.filter(created_at__gte=start), 'created_at', '', None),
+            (PostLike.objects.filter(created_at__gte=start), 'created_at', 'post__', None),
+            (PostComment.objects.filter(created_at__gte=start), 'created_at', 'post__', None),
+            (PostShare.objects.filter(created_at__gte=start), 'created_at', 'post__', None),
+            (ExternalShare.objects.filter(shared_at__gte=start), 'shared_at', 'post__', 'platform'),
+        ]
+        fields = ['posts_count', 'likes_count', 'comments_count', 'shares_count', 'external_shares_count']
+        for (queryset, date_field, prefix, extra), field in zip(sources, fields):
+            columns = [f'{prefix}author_id', f'{prefix}quartier_id', f'{prefix}quartier__commune_id', 'hour']
+            if extra:
+                columns.append(extra)
+            rows = queryset.annotate(hour=TruncHour(date_field)).values(*columns).annotate(total=Count('id'))
+            for row in rows:
+                counts = {field: row['total']}
+                platform_field = EngagementRollupService.PLATFORM_FIELDS.get(row.get(extra))
+                if platform_field:
+                    counts[platform_field] = row['total']
+                EngagementRollupService._add(deltas, tuple(row[column] for column in columns[:3]), row['hour'], counts)
+
+        rebuilt = [field for field in EngagementRollupService.FIELDS if field != 'views_count']
+        with transaction.atomic():
+            existing = {
+                (rollup.scope, rollup.scope_id, rollup.granularity, rollup.period_start): rollup
+                for rollup in EngagementRollup.objects.select_for_update().filter(period_start__gte=start)
+            }
+            for rollup in existing.values():
+                for field in rebuilt:
+                    setattr(rollup, field, 0)
+
+            created = []
+            for key, counts in deltas.items():
+                rollup = existing.get(key)
+                if rollup is None:
+                    scope, scope_id, granularity, period_start = key
+                    rollup = EngagementRollup(
+                        scope=scope, scope_id=scope_id, granularity=granularity, period_start=period_start
+                    )
+                    created.append(rollup)
+                for field, value in counts.items():
+                    setattr(rollup, field, value)
+
+            EngagementRollup.objects.bulk_update(list(existing.values()), rebuilt, batch_size=500)
+            EngagementRollup.objects.bulk_create(created, batch_size=500)
+
+        logger.info(f"Agrégats d'engagement recalculés depuis {start:%Y-%m-%d}: {len(deltas)} lignes")
+        return len(deltas)
+
+    @staticmethod
+    def _add(deltas, dimensions, hour, counts):
+        """Ajoute des deltas aux lignes horaires et journalières de chaque périmètre"""
+        hour = EngagementRollupService.hour_start(hour)
+        periods = (('hour', hour), ('day', EngagementRollupService.day_start(hour)))
+        for scope, scope_id in zip(EngagementRollupService.SCOPES, dimensions):
+            if scope_id is None:
+                continue
+            for granularity, period_start in periods:
+                target = deltas[(scope, scope_id, granularity, period_start)]
+                for field, delta in counts.items():
+                    target[field] += delta
+
+    @staticmethod
+    def _apply(deltas):
+        """Un UPDATE par ligne d'agrégats ; création de la ligne à son premier événement"""
+        for (scope, scope_id, granularity, period_start), fields in deltas.items():
+            rollups = EngagementRollup.objects.filter(
+                scope=scope, scope_id=scope_id, granularity=granularity, period_start=period_start
+            )
+            updates = {field: F(field) + delta for field, delta in fields.items()}
+            if rollups.update(**updates, updated_at=timezone.now()):
+                continue
+            try:
+                with transaction.atomic():
+                    EngagementRollup.objects.create(
+                        scope=scope, scope_id=scope_id, granularity=granularity,
+                        period_start=period_start, **fields
+                    )
+            except IntegrityError:
+                # Ligne créée entre-temps (recalcul concurrent)
+                rollups.update(**updates, updated_at=timezone.now())
+
+    @staticmethod
+    def _drain_log(cache):
+        """Lit et supprime les entrées du journal non encore traitées"""
+        sequence = cache.get(EngagementRollupService.LOG_SEQUENCE_KEY, 0)
+        cursor = cache.get(EngagementRollupService.LOG_CURSOR_KEY, 0)
+        if sequence <= cursor:
+            return []
+
+        # Borner le travail d'un vidage ; le reste sera traité au suivant
+        last = min(sequence, cursor + EngagementRollupService.FLUSH_BATCH_SIZE)
+        log_keys = [EngagementRollupService.get_log_key(position) for position in range(cursor + 1, last + 1)]
+        entries = list(cache.get_many(log_keys).values())
+        cache.delete_many(log_keys)
+        cache.set(EngagementRollupService.LOG_CURSOR_KEY, last, None)
+        return entries
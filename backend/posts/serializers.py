@@ -1,7 +1,16 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Manager, Prefetch
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
-from .models import Post, PostLike, PostComment, Media, PostShare, ExternalShare, PostAnalytics
+from .models import (
+    Post, PostLike, PostComment, Media, PostShare, ExternalShare, PostAnalytics, LiveUploadSession,
+    validate_file_type
+)
+from .counters import EngagementCounterService
+from .renditions import ImageRenditionService
+from .dedup import MediaDeduplicationService
 from users.serializers import UserSerializer
 from geography.serializers import QuartierSerializer
 import logging
@@ -22,6 +31,10 @@ class MediaSerializer(serializers.ModelSerializer):
     cdn_public_id = serializers.ReadOnlyField(help_text="ID public du CDN")
     width = serializers.ReadOnlyField(help_text="Largeur de l'image/vidéo")
     height = serializers.ReadOnlyField(help_text="Hauteur de l'image/vidéo")
+    srcset = serializers.SerializerMethodField(help_text="Déclinaisons JPEG de l'image (attribut srcset)")
+    srcset_webp = serializers.SerializerMethodField(help_text="Déclinaisons WebP de l'image (attribut srcset)")
+    renditions = serializers.SerializerMethodField(help_text="Déclinaisons de l'image ou qualités HLS de la vidéo avec URL, dimensions et format")
+    stream_url = serializers.SerializerMethodField(help_text="URL de la liste de lecture HLS adaptative (vidéos transcodées)")
     
     class Meta:
         model = Media
@@ -30,13 +43,13 @@ class MediaSerializer(serializers.ModelSerializer):
             'file_size', 'width', 'height', 'is_appropriate', 'approval_status', 
             'moderation_score', 'is_live', 'live_viewers_count', 'file_url', 
             'thumbnail_url', 'is_approved_for_publication', 'cdn_url', 
-            'cdn_public_id', 'created_at'
+            'cdn_public_id', 'srcset', 'srcset_webp', 'renditions', 'stream_url', 'created_at'
         ]
         read_only_fields = [
             'file_size', 'width', 'height', 'is_appropriate', 'approval_status', 
             'moderation_score', 'is_live', 'live_viewers_count', 'file_url', 
             'thumbnail_url', 'is_approved_for_publication', 'cdn_url', 
-            'cdn_public_id', 'created_at'
+            'cdn_public_id', 'srcset', 'srcset_webp', 'renditions', 'stream_url', 'created_at'
         ]
     
     @extend_schema_field(OpenApiTypes.STR)
@@ -49,14 +62,44 @@ class MediaSerializer(serializers.ModelSerializer):
     @extend_schema_field(OpenApiTypes.STR)
     def get_thumbnail_url(self, obj):
         """Retourne l'URL de la miniature"""
-        if obj.media_type == 'video' and hasattr(obj, 'thumbnail_url'):
+        if obj.media_type == 'video':
             return obj.thumbnail_url
         return None
     
+    @extend_schema_field(OpenApiTypes.STR)
+    def get_stream_url(self, obj):
+        """URL du flux adaptatif, None tant que la vidéo n'est pas transcodée"""
+        return obj.stream_url
+    
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_is_approved_for_publication(self, obj):
         """Indique si le média peut être publié"""
-        return obj.approval_status == 'approved' and obj.is_appropriate
+        return obj.approval_status in Media.publishable_statuses() and obj.is_appropriate
+    
+    @extend_schema_field(OpenApiTypes.STR)
+    def get_srcset(self, obj):
+        """srcset JPEG, vide tant que les déclinaisons ne sont pas prêtes"""
+        return ImageRenditionService.srcset(obj, 'jpeg')
+    
+    @extend_schema_field(OpenApiTypes.STR)
+    def get_srcset_webp(self, obj):
+        """srcset WebP, vide tant que les déclinaisons ne sont pas prêtes"""
+        return ImageRenditionService.srcset(obj, 'webp')
+    
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_renditions(self, obj):
+        """Déclinaisons disponibles, de la plus petite à la plus grande par format"""
+        storage = obj.file.storage
+        return [
+            {
+                'url': storage.url(rendition['name']),
+                'width': rendition['width'],
+                'height': rendition['height'],
+                'format': rendition['format'],
+                'size': rendition['size']
+            }
+            for rendition in obj.renditions
+        ]
 
 
 class MediaCreateSerializer(serializers.ModelSerializer):
@@ -64,20 +107,22 @@ class MediaCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Media
-        fields = ['id', 'file', 'title', 'description']
-        read_only_fields = ['id']
+        fields = ['id', 'file', 'title', 'description', 'approval_status']
+        read_only_fields = ['id', 'approval_status']
     
     def validate_file(self, value):
         """Validation personnalisée du fichier"""
-        # Vérifier le type de fichier
-        content_type = value.content_type
-        if 'image' not in content_type and 'video' not in content_type:
+        # Vérifier le type réel du fichier (premiers octets), pas celui annoncé par le client
+        try:
+            content_type = validate_file_type(value)
+        except DjangoValidationError:
             raise serializers.ValidationError("Seuls les fichiers image et vidéo sont autorisés")
         
         # Vérifier la taille
         if value.size > 50 * 1024 * 1024:  # 50MB max
             raise serializers.ValidationError("Le fichier ne peut pas dépasser 50MB")
         
+        value.content_type = content_type
         return value
     
     def create(self, validated_data):
@@ -88,9 +133,99 @@ class MediaCreateSerializer(serializers.ModelSerializer):
         elif 'video' in file.content_type:
             validated_data['media_type'] = 'video'
         
+        # Empreintes (SHA-256 calculée pendant la réception, perceptuelle pour les images)
+        content_hash, perceptual_hash = MediaDeduplicationService.fingerprint(file, validated_data.get('media_type'))
+        validated_data['content_hash'] = content_hash
+        validated_data['perceptual_hash'] = perceptual_hash
+        
+        # Un doublon d'un média déjà traité reprend son fichier et son résultat
+        original = MediaDeduplicationService.find_original(
+            content_hash, perceptual_hash, validated_data.get('media_type')
+        )
+        if original is not None:
+            validated_data.update(MediaDeduplicationService.reused_fields(original))
+            logger.info(f"Média doublon de {original.id}, fichier et traitement réutilisés")
+        
         return super().create(validated_data)
 
 
+class LiveUploadSessionSerializer(serializers.ModelSerializer):
+    """Sérialiseur de l'avancement d'un envoi d'enregistrement de live"""
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    media = MediaSerializer(read_only=True)
+    
+    class Meta:
+        model = LiveUploadSession
+        fields = [
+            'upload_id', 'live_post', 'filename', 'content_type', 'total_size', 'chunk_size',
+            'next_chunk', 'received_bytes', 'status', 'media', 'expires_at'
+        ]
+        read_only_fields = fields
+
+
+class LiveUploadSessionCreateSerializer(serializers.Serializer):
+    """Sérialiseur pour ouvrir un envoi d'enregistrement de live"""
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=50)
+    total_size = serializers.IntegerField(required=False, min_value=1, help_text="Taille totale si connue (octets)")
+    
+    def validate_content_type(self, value):
+        # Les paramètres de codec (video/webm;codecs=vp9) sont ignorés
+        content_type = value.split(';')[0].strip().lower()
+        if content_type not in getattr(settings, 'ALLOWED_VIDEO_TYPES', []):
+            raise serializers.ValidationError("Type de fichier non supporté")
+        return content_type
+    
+    def validate_total_size(self, value):
+        max_size = getattr(settings, 'LIVE_UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+        if value > max_size:
+            raise serializers.ValidationError(f"L'enregistrement ne peut pas dépasser {max_size // (1024 * 1024)}MB")
+        return value
+
+
+def build_comment_tree(comments):
+    """
+    Construit en mémoire l'arbre des commentaires : réponses directes et
+    niveau de profondeur de chaque commentaire, sans requête supplémentaire.
+    """
+    by_id = {comment.id: comment for comment in comments}
+    tree = {comment.id: {'replies': [], 'level': 0} for comment in comments}
+    for comment in comments:
+        if comment.parent_comment_id in tree:
+            tree[comment.parent_comment_id]['replies'].append(comment)
+    
+    for comment in comments:
+        level = 0
+        parent_id = comment.parent_comment_id
+        while parent_id is not None and parent_id in by_id:
+            level += 1
+            parent_id = by_id[parent_id].parent_comment_id
+        tree[comment.id]['level'] = level
+    return tree
+
+
+class PostCommentListSerializer(serializers.ListSerializer):
+    """
+    Sérialise une liste de commentaires en chargeant en une requête tous les
+    commentaires des posts concernés, pour résoudre réponses et niveaux en mémoire.
+    """
+    
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, Manager) else data)
+        tree = self.context.setdefault('comment_tree', {})
+        
+        missing_post_ids = {comment.post_id for comment in comments if comment.id not in tree}
+        if missing_post_ids:
+            thread = list(
+                PostComment.objects.filter(post_id__in=missing_post_ids)
+                .select_related('author__quartier__commune')
+            )
+            tree.update(build_comment_tree(thread))
+            UserSerializer.prefetch_follow_stats([comment.author for comment in thread], self.context)
+        
+        return super().to_representation(comments)
+
+
 class PostCommentSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
@@ -100,6 +235,7 @@ class PostCommentSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PostComment
+        list_serializer_class = PostCommentListSerializer
         fields = [
             'id', 'author', 'content', 'is_anonymous', 'parent_comment', 
             'replies', 'replies_count', 'is_reply', 'level',
@@ -110,25 +246,36 @@ class PostCommentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
     
+    def _get_tree_node(self, obj):
+        """Retourne le nœud préchargé du commentaire dans l'arbre, ou None"""
+        return self.context.get('comment_tree', {}).get(obj.id)
+    
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_replies(self, obj):
         """Retourne les réponses directes (pas récursif pour éviter les boucles infinies)"""
-        replies = obj.replies.all()
+        node = self._get_tree_node(obj)
+        replies = node['replies'] if node is not None else obj.replies.all()
         return PostCommentSerializer(replies, many=True, context=self.context).data
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_replies_count(self, obj):
         """Retourne le nombre de réponses"""
+        node = self._get_tree_node(obj)
+        if node is not None:
+            return len(node['replies'])
         return obj.replies.count()
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_is_reply(self, obj):
         """Indique si c'est une réponse à un commentaire"""
-        return obj.parent_comment is not None
+        return obj.parent_comment_id is not None
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_level(self, obj):
         """Retourne le niveau de profondeur du commentaire"""
+        node = self._get_tree_node(obj)
+        if node is not None:
+            return node['level']
         level = 0
         current = obj
         while current.parent_comment:
@@ -146,6 +293,20 @@ class PostLikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at']
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Sérialise une page de posts en résolvant les champs calculés en lot :
+    une lecture de cache pour les compteurs d'engagement en attente, une
+    requête pour les likes du lecteur, une pour l'arbre des commentaires
+    (si non préchargé) et trois pour les compteurs de suivi des utilisateurs.
+    """
+    
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, Manager) else data)
+        PostSerializer.prefetch_page(posts, self.context)
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     quartier = QuartierSerializer(read_only=True)
@@ -159,6 +320,7 @@ class PostSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = [
             'id', 'author', 'quartier', 'title', 'content', 'post_type',
             'media_files', 'live_stream', 'is_live_post', 'is_pinned', 'is_anonymous', 
@@ -171,21 +333,72 @@ class PostSerializer(serializers.ModelSerializer):
             'comments', 'likes', 'is_liked_by_user', 'has_media', 'media_count'
         ]
     
+    @staticmethod
+    def optimize_queryset(queryset):
+        """Charge en lot les relations et compteurs utilisés par le sérialiseur"""
+        return queryset.select_related(
+            'author__quartier__commune',
+            'quartier__commune__prefecture__region',
+            'live_stream'
+        ).prefetch_related(
+            Prefetch('comments', queryset=PostComment.objects.select_related('author__quartier__commune')),
+            Prefetch('likes', queryset=PostLike.objects.select_related('user__quartier__commune')),
+            'media_files'
+        ).annotate(
+            media_files_total=Count('media_files', distinct=True)
+        )
+    
+    @staticmethod
+    def prefetch_page(posts, context):
+        """Précharge dans le contexte les données calculées d'une page de posts"""
+        if not posts:
+            return
+        post_ids = [post.id for post in posts]
+        EngagementCounterService.apply_pending(posts)
+        
+        request = context.get('request')
+        if request and request.user.is_authenticated:
+            liked = set(
+                PostLike.objects.filter(user=request.user, post_id__in=post_ids)
+                .values_list('post_id', flat=True)
+            )
+            likes_by_viewer = context.setdefault('liked_by_viewer', {})
+            likes_by_viewer.update({post_id: post_id in liked for post_id in post_ids})
+        
+        users = [post.author for post in posts]
+        tree = context.setdefault('comment_tree', {})
+        for post in posts:
+            prefetched = getattr(post, '_prefetched_objects_cache', {})
+            if 'comments' in prefetched:
+                comments = list(post.comments.all())
+                tree.update(build_comment_tree(comments))
+                users.extend(comment.author for comment in comments)
+            if 'likes' in prefetched:
+                users.extend(like.user for like in post.likes.all())
+        
+        UserSerializer.prefetch_follow_stats(users, context)
+    
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_is_liked_by_user(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            likes_by_viewer = self.context.get('liked_by_viewer', {})
+            if obj.id in likes_by_viewer:
+                return likes_by_viewer[obj.id]
             return obj.likes.filter(user=request.user).exists()
         return False
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_has_media(self, obj):
         """Indique si le post contient des médias"""
-        return obj.media_files.exists()
+        return self.get_media_count(obj) > 0
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_media_count(self, obj):
         """Retourne le nombre de médias dans le post"""
+        total = getattr(obj, 'media_files_total', None)
+        if total is not None:
+            return total
         return obj.media_files.count()
 
 
@@ -227,14 +440,42 @@ class PostCreateSerializer(serializers.ModelSerializer):
         if len(media_files) > 5:
             raise serializers.ValidationError("Vous ne pouvez pas ajouter plus de 5 fichiers à une publication")
         
+        if media_files:
+            data['media_files'] = self.validate_publishable_media(media_files)
+        
         return data
     
+    def validate_publishable_media(self, media_ids):
+        """Médias à associer ; erreur pour ceux introuvables, en cours de traitement ou non publiables"""
+        media_by_id = Media.objects.in_bulk(media_ids)
+        missing = [media_id for media_id in media_ids if media_id not in media_by_id]
+        if missing:
+            raise serializers.ValidationError({'media_files': f"Médias introuvables: {missing}"})
+        
+        # Le traitement est asynchrone : le client réessaie une fois le média traité
+        processing = [
+            media_id for media_id in media_ids
+            if media_by_id[media_id].approval_status in ('pending', 'processing')
+        ]
+        if processing:
+            raise serializers.ValidationError({
+                'media_files': f"Médias en cours de traitement, réessayez dans quelques instants: {processing}"
+            })
+        
+        refused = [
+            media_id for media_id in media_ids
+            if media_by_id[media_id].approval_status not in Media.publishable_statuses()
+            or not media_by_id[media_id].is_appropriate
+        ]
+        if refused:
+            raise serializers.ValidationError({'media_files': f"Médias non publiables: {refused}"})
+        
+        return [media_by_id[media_id] for media_id in media_ids]
+    
     def create(self, validated_data):
-        media_files_ids = validated_data.pop('media_files', [])
+        media_files = validated_data.pop('media_files', [])
         request = self.context.get('request')
         
-        logger.info(f"Création post - Médias IDs: {media_files_ids}")
-        
         # Créer le post
         validated_data['author'] = request.user
         validated_data['quartier'] = request.user.quartier
@@ -249,21 +490,10 @@ class PostCreateSerializer(serializers.ModelSerializer):
             
         post = super().create(validated_data)
         
-        # Associer les médias
-        if media_files_ids:
-            media_files = Media.objects.filter(
-                id__in=media_files_ids,
-                approval_status='approved',
-                is_appropriate=True
-            )
-            logger.info(f"Médias trouvés: {media_files.count()}")
-            logger.info(f"Médias IDs recherchés: {media_files_ids}")
-            logger.info(f"Médias trouvés: {[m.id for m in media_files]}")
-            
+        # Associer les médias (validés dans validate)
+        if media_files:
             post.media_files.set(media_files)
-            logger.info(f"Médias associés au post {post.id}: {post.media_files.count()}")
-        else:
-            logger.info("Aucun média à associer")
+            logger.info(f"Médias associés au post {post.id}: {[media.id for media in media_files]}")
         
         return post
 
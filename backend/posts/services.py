@@ -1,16 +1,24 @@
+import base64
 import logging
 import os
 import requests
 import io
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.core.files import File
 from django.core.files.base import ContentFile
 import subprocess
+import tempfile
 from datetime import timedelta
 from PIL import Image, ImageOps
 from django.core.cache import cache
 from django.db.models import Q, Count
-from .models import Post, PostLike, PostComment, Media
+from .models import Post, PostLike, PostComment, PostShare, Media
+from .caching import TaggedCacheService
+from .rollups import EngagementRollupService
+from .renditions import load_image, fit_image, encode_image, get_optimization_setting
+from .transcoding import DEFAULT_VIDEO_LADDER, ffmpeg_available, frame_command, h264_arguments, run_ffmpeg
+from geography.models import Quartier
 
 # Import conditionnel de Cloudinary
 try:
@@ -26,11 +34,18 @@ logger = logging.getLogger(__name__)
 class ModerationService:
     """Service pour la modération automatique des médias"""
     
+    # Plus grand côté de l'image envoyée à Vision (recommandation Google : 640x480 minimum)
+    VISION_MAX_IMAGE_SIZE = 1024
+    
     @staticmethod
     def analyze_image_with_vision_api(image_file):
         """
         Analyse une image avec Google Cloud Vision API
         Retourne un score de modération et des détails
+        
+        ``image_file`` peut être un chemin ou un fichier. L'image est envoyée
+        réduite (SafeSearch n'a pas besoin de la pleine résolution), ce qui
+        borne la taille de la requête quelle que soit celle du fichier.
         """
         try:
             # Si pas de clé API, simulation
@@ -38,8 +53,11 @@ class ModerationService:
                 return ModerationService._simulate_vision_analysis()
             
             # Préparer l'image pour l'API
-            image_content = image_file.read()
-            image_file.seek(0)  # Reset file pointer
+            max_size = ModerationService.VISION_MAX_IMAGE_SIZE
+            image = fit_image(load_image(image_file, max_size, max_size), max_size, max_size)
+            image_content = base64.b64encode(encode_image(image, 'jpeg', 85).getvalue()).decode('ascii')
+            if hasattr(image_file, 'seek'):
+                image_file.seek(0)  # Reset file pointer
             
             # Appel à l'API Google Cloud Vision
             url = f"https://vision.googleapis.com/v1/images:annotate?key={settings.GOOGLE_CLOUD_VISION_API_KEY}"
@@ -48,7 +66,7 @@ class ModerationService:
                 "requests": [
                     {
                         "image": {
-                            "content": image_content.decode('latin-1')
+                            "content": image_content
                         },
                         "features": [
                             {
@@ -150,21 +168,11 @@ class VideoProcessingService:
             return None
     
     @staticmethod
-    def create_video_thumbnail(video_path, output_path, time_position='00:00:01'):
+    def create_video_thumbnail(video_path, output_path, time_position='00:00:01', max_height=None):
         """Crée une miniature pour une vidéo"""
         try:
-            cmd = [
-                'ffmpeg', '-i', video_path, '-ss', time_position,
-                '-vframes', '1', '-q:v', '2', output_path, '-y'
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True)
-            
-            if result.returncode == 0:
-                return True
-            else:
-                logger.error(f"Erreur création thumbnail: {result.stderr}")
-                return False
+            run_ffmpeg(frame_command(video_path, output_path, time_position, max_height))
+            return True
                 
         except Exception as e:
             logger.error(f"Erreur lors de la création de la miniature: {str(e)}")
@@ -230,17 +238,8 @@ class MediaCompressionService:
     def compress_image(image_file, max_width=1920, max_height=1080, quality=85):
         """Compresse une image"""
         try:
-            # Ouvrir l'image
-            img = Image.open(image_file)
-            
-            # Redimensionner si nécessaire
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Sauvegarder en JPEG
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            output.seek(0)
+            img = fit_image(load_image(image_file, max_width, max_height), max_width, max_height)
+            output = encode_image(img, 'jpeg', quality)
             
             return ContentFile(output.getvalue(), name=image_file.name)
             
@@ -249,22 +248,16 @@ class MediaCompressionService:
             return image_file
     
     @staticmethod
-    def compress_video(video_path, output_path, target_bitrate='1M'):
-        """Compresse une vidéo"""
+    def compress_video(video_path, output_path, target_bitrate=1000, max_height=None):
+        """Compresse une vidéo en H.264/AAC (débit en kbit/s, hauteur plafonnée sans agrandissement)"""
         try:
-            cmd = [
-                'ffmpeg', '-i', video_path, '-c:v', 'libx264',
-                '-b:v', target_bitrate, '-c:a', 'aac', '-b:a', '128k',
-                output_path, '-y'
-            ]
+            cmd = ['ffmpeg', '-v', 'error', '-y', '-i', video_path]
+            if max_height:
+                cmd += ['-vf', f"scale=-2:'min({max_height},ih)'"]
+            cmd += h264_arguments(target_bitrate) + ['-movflags', '+faststart', output_path]
             
-            result = subprocess.run(cmd, capture_output=True)
-            
-            if result.returncode == 0:
-                return True
-            else:
-                logger.error(f"Erreur compression vidéo: {result.stderr}")
-                return False
+            run_ffmpeg(cmd)
+            return True
                 
         except Exception as e:
             logger.error(f"Erreur lors de la compression: {str(e)}")
@@ -277,11 +270,20 @@ class MediaCDNService:
     """
     
     @staticmethod
-    def upload_media_to_cdn(file, title, description, user):
+    def upload_media_to_cdn(file, title, description, user, content_type=None):
         """
         Upload un média vers Cloudinary avec optimisation automatique
+        
+        ``file`` peut être un chemin local, transmis tel quel à Cloudinary :
+        les vidéos sont alors envoyées par morceaux (``upload_large``) sans
+        être chargées en mémoire. ``content_type`` est requis pour les
+        fichiers déjà stockés, qui n'ont pas l'attribut ``content_type`` des
+        fichiers reçus.
         """
         try:
+            content_type = content_type or getattr(file, 'content_type', '') or ''
+            file_name = file if isinstance(file, str) else file.name
+            
             # Configuration Cloudinary
             cloudinary.config(
                 cloud_name=settings.CLOUDINARY_STORAGE['CLOUD_NAME'],
@@ -293,7 +295,7 @@ class MediaCDNService:
             upload_options = {
                 'resource_type': 'auto',
                 'folder': f'communiconnect/{user.id}',
-                'public_id': f'{title}_{user.id}_{os.path.splitext(file.name)[0]}',
+                'public_id': f'{title}_{user.id}_{os.path.splitext(os.path.basename(file_name))[0]}',
                 'tags': ['communiconnect', 'media', f'user_{user.id}'],
                 'context': {
                     'title': title,
@@ -303,14 +305,14 @@ class MediaCDNService:
             }
             
             # Optimisation selon le type de fichier
-            if file.content_type.startswith('image/'):
+            if content_type.startswith('image/'):
                 upload_options.update({
                     'transformation': [
                         {'quality': 'auto:good', 'fetch_format': 'auto'},
                         {'width': 1920, 'height': 1080, 'crop': 'limit'}
                     ]
                 })
-            elif file.content_type.startswith('video/'):
+            elif content_type.startswith('video/'):
                 upload_options.update({
                     'resource_type': 'video',
                     'transformation': [
@@ -320,7 +322,12 @@ class MediaCDNService:
                 })
             
             # Upload vers Cloudinary
-            result = cloudinary.uploader.upload(file, **upload_options)
+            if isinstance(file, str) and content_type.startswith('video/'):
+                result = cloudinary.uploader.upload_large(
+                    file, chunk_size=getattr(settings, 'CDN_UPLOAD_CHUNK_SIZE', 6 * 1024 * 1024), **upload_options
+                )
+            else:
+                result = cloudinary.uploader.upload(file, **upload_options)
             
             logger.info(f"Média uploadé vers CDN: {result['public_id']}")
             
@@ -348,22 +355,14 @@ class MediaCDNService:
         Optimise une image avant upload vers CDN
         """
         try:
-            with Image.open(image_file) as img:
-                # Convertir en RGB si nécessaire
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Redimensionner si trop grande
-                if img.width > max_width:
-                    ratio = max_width / img.width
-                    new_height = int(img.height * ratio)
-                    img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Sauvegarder optimisé
-                optimized_path = f"optimized_{image_file.name}"
-                img.save(optimized_path, 'JPEG', quality=quality, optimize=True)
-                
-                return optimized_path
+            img = fit_image(load_image(image_file, max_width=max_width), max_width=max_width)
+            
+            # Sauvegarder optimisé
+            optimized_path = f"optimized_{image_file.name}"
+            with open(optimized_path, 'wb') as output:
+                output.write(encode_image(img, 'jpeg', quality).getvalue())
+            
+            return optimized_path
                 
         except Exception as e:
             logger.error(f"Erreur optimisation image: {str(e)}")
@@ -421,22 +420,15 @@ class MediaOptimizationService:
         Compresse une image pour réduire sa taille
         """
         try:
-            with Image.open(image_file) as img:
-                # Convertir en RGB si nécessaire
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Redimensionner si trop grande
-                if img.width > max_width:
-                    ratio = max_width / img.width
-                    new_height = int(img.height * ratio)
-                    img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Sauvegarder compressé
-                compressed_path = f"compressed_{image_file.name}"
-                img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
-                
-                return compressed_path
+            img = fit_image(load_image(image_file, max_width=max_width), max_width=max_width)
+            
+            # Sauvegarder compressé dans un fichier temporaire (à supprimer par l'appelant),
+            # jamais dans le répertoire courant
+            descriptor, compressed_path = tempfile.mkstemp(prefix='compressed_', suffix='.jpg')
+            with os.fdopen(descriptor, 'wb') as output:
+                output.write(encode_image(img, 'jpeg', quality).getvalue())
+            
+            return compressed_path
                 
         except Exception as e:
             logger.error(f"Erreur compression image: {str(e)}")
@@ -451,9 +443,11 @@ class MediaOptimizationService:
             # Utiliser ffprobe pour obtenir la durée
             import subprocess
             
+            # Fichier reçu sur disque : ffprobe lit directement le chemin
+            video_path = video_file.temporary_file_path() if hasattr(video_file, 'temporary_file_path') else video_file.name
             cmd = [
                 'ffprobe', '-v', 'quiet', '-show_entries', 
-                'format=duration', '-of', 'csv=p=0', video_file.name
+                'format=duration', '-of', 'csv=p=0', video_path
             ]
             
             result = subprocess.run(cmd, capture_output=True, text=True)
@@ -494,7 +488,13 @@ class AnalyticsService:
     
     @staticmethod
     def get_user_analytics_summary(user, days=30):
-        """Récupère le résumé des analytics d'un utilisateur"""
+        """
+        Récupère le résumé des analytics d'un utilisateur.
+        
+        Les totaux proviennent des agrégats journaliers (posts.rollups) : une
+        ligne par jour de la période, sans parcourir les posts. Ils comptent
+        l'engagement reçu pendant la période.
+        """
         from django.utils import timezone
         from datetime import timedelta
         from .models import PostAnalytics
@@ -503,71 +503,16 @@ class AnalyticsService:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        # Posts de l'utilisateur dans la période
-        user_posts = user.posts.filter(created_at__range=(start_date, end_date))
-        analytics = PostAnalytics.objects.filter(post__in=user_posts)
-        
-        if not analytics.exists():
-            return {
-                'total_posts': 0,
-                'total_views': 0,
-                'total_likes': 0,
-                'total_comments': 0,
-                'total_shares': 0,
-                'total_external_shares': 0,
-                'average_viral_score': 0.0,
-                'average_engagement_rate': 0.0,
-                'top_performing_posts': [],
-                'platform_breakdown': {},
-                'viral_posts_count': 0,
-                'popular_posts_count': 0
-            }
-        
-        # Calculs
-        total_posts = analytics.count()
-        total_views = sum(a.total_views for a in analytics)
-        total_likes = sum(a.total_likes for a in analytics)
-        total_comments = sum(a.total_comments for a in analytics)
-        total_shares = sum(a.total_shares for a in analytics)
-        total_external_shares = sum(a.total_external_shares for a in analytics)
-        
-        average_viral_score = sum(a.viral_score for a in analytics) / total_posts
-        average_engagement_rate = sum(a.engagement_rate for a in analytics) / total_posts
-        
-        # Posts performants
-        top_performing_posts = analytics.order_by('-viral_score')[:5]
-        
-        # Répartition des plateformes
-        platform_breakdown = {
-            'whatsapp': sum(a.whatsapp_shares for a in analytics),
-            'facebook': sum(a.facebook_shares for a in analytics),
-            'twitter': sum(a.twitter_shares for a in analytics),
-            'telegram': sum(a.telegram_shares for a in analytics),
-            'email': sum(a.email_shares for a in analytics)
-        }
-        
-        # Posts viraux et populaires
-        viral_posts_count = analytics.filter(viral_score__gte=80).count()
-        popular_posts_count = analytics.filter(viral_score__gte=50).count()
-        
-        return {
-            'total_posts': total_posts,
-            'total_views': total_views,
-            'total_likes': total_likes,
-            'total_comments': total_comments,
-            'total_shares': total_shares,
-            'total_external_shares': total_external_shares,
-            'average_viral_score': round(average_viral_score, 1),
-            'average_engagement_rate': round(average_engagement_rate, 1),
-            'top_performing_posts': top_performing_posts,
-            'platform_breakdown': platform_breakdown,
-            'viral_posts_count': viral_posts_count,
-            'popular_posts_count': popular_posts_count
-        }
+        analytics = PostAnalytics.objects.filter(
+            post__author=user, post__created_at__range=(start_date, end_date)
+        )
+        return AnalyticsService._build_summary(
+            EngagementRollupService.get_totals('user', user.id, start_date), analytics, 5
+        )
     
     @staticmethod
     def get_community_analytics(quartier, days=30):
-        """Récupère les analytics de la communauté"""
+        """Récupère les analytics de la communauté (agrégats journaliers du quartier)"""
         from django.utils import timezone
         from datetime import timedelta
         from .models import PostAnalytics
@@ -576,14 +521,29 @@ class AnalyticsService:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        # Posts de la communauté dans la période
-        community_posts = Post.objects.filter(
-            quartier=quartier,
-            created_at__range=(start_date, end_date)
+        analytics = PostAnalytics.objects.filter(
+            post__quartier=quartier, post__created_at__range=(start_date, end_date)
         )
-        analytics = PostAnalytics.objects.filter(post__in=community_posts)
+        summary = AnalyticsService._build_summary(
+            EngagementRollupService.get_totals('quartier', quartier.id, start_date), analytics, 10
+        )
+        
+        # Utilisateurs les plus actifs
+        summary['most_active_users'] = []
+        if summary['total_posts']:
+            summary['most_active_users'] = Post.objects.filter(
+                quartier=quartier,
+                created_at__range=(start_date, end_date)
+            ).values('author__username', 'author__first_name', 'author__last_name').annotate(
+                post_count=Count('id')
+            ).order_by('-post_count')[:5]
         
-        if not analytics.exists():
+        return summary
+    
+    @staticmethod
+    def _build_summary(totals, analytics, top_limit):
+        """Résumé à partir des totaux agrégés et des analytics des posts de la période"""
+        if not any(totals.values()):
             return {
                 'total_posts': 0,
                 'total_views': 0,
@@ -596,61 +556,39 @@ class AnalyticsService:
                 'top_performing_posts': [],
                 'platform_breakdown': {},
                 'viral_posts_count': 0,
-                'popular_posts_count': 0,
-                'most_active_users': []
+                'popular_posts_count': 0
             }
         
-        # Calculs similaires à get_user_analytics_summary
-        total_posts = analytics.count()
-        total_views = sum(a.total_views for a in analytics)
-        total_likes = sum(a.total_likes for a in analytics)
-        total_comments = sum(a.total_comments for a in analytics)
-        total_shares = sum(a.total_shares for a in analytics)
-        total_external_shares = sum(a.total_external_shares for a in analytics)
-        
-        average_viral_score = sum(a.viral_score for a in analytics) / total_posts
-        average_engagement_rate = sum(a.engagement_rate for a in analytics) / total_posts
-        
-        # Posts performants
-        top_performing_posts = analytics.order_by('-viral_score')[:10]
+        # Taux calculés sur les totaux de la période (même formule que PostAnalytics)
+        interactions = totals['likes_count'] + totals['comments_count'] + totals['shares_count']
+        engagement_rate = interactions / totals['views_count'] * 100 if totals['views_count'] else 0.0
         
-        # Répartition des plateformes
-        platform_breakdown = {
-            'whatsapp': sum(a.whatsapp_shares for a in analytics),
-            'facebook': sum(a.facebook_shares for a in analytics),
-            'twitter': sum(a.twitter_shares for a in analytics),
-            'telegram': sum(a.telegram_shares for a in analytics),
-            'email': sum(a.email_shares for a in analytics)
-        }
-        
-        # Posts viraux et populaires
-        viral_posts_count = analytics.filter(viral_score__gte=80).count()
-        popular_posts_count = analytics.filter(viral_score__gte=50).count()
-        
-        # Utilisateurs les plus actifs
-        from django.db.models import Count
-        most_active_users = Post.objects.filter(
-            quartier=quartier,
-            created_at__range=(start_date, end_date)
-        ).values('user__username', 'user__first_name', 'user__last_name').annotate(
-            post_count=Count('id')
-        ).order_by('-post_count')[:5]
+        # Posts viraux et populaires : un seul COUNT filtré
+        counts = analytics.aggregate(
+            viral=Count('id', filter=Q(viral_score__gte=80)),
+            popular=Count('id', filter=Q(viral_score__gte=50))
+        )
         
         return {
-            'total_posts': total_posts,
-            'total_views': total_views,
-            'total_likes': total_likes,
-            'total_comments': total_comments,
-            'total_shares': total_shares,
-            'total_external_shares': total_external_shares,
-            'average_viral_score': round(average_viral_score, 1),
-            'average_engagement_rate': round(average_engagement_rate, 1),
-            'top_performing_posts': top_performing_posts,
-            'platform_breakdown': platform_breakdown,
-            'viral_posts_count': viral_posts_count,
-            'popular_posts_count': popular_posts_count,
-            'most_active_users': most_active_users
-        } 
+            'total_posts': totals['posts_count'],
+            'total_views': totals['views_count'],
+            'total_likes': totals['likes_count'],
+            'total_comments': totals['comments_count'],
+            'total_shares': totals['shares_count'],
+            'total_external_shares': totals['external_shares_count'],
+            'average_viral_score': round(min(engagement_rate, 100.0), 1),
+            'average_engagement_rate': round(engagement_rate, 1),
+            'top_performing_posts': analytics.select_related('post').order_by('-viral_score')[:top_limit],
+            'platform_breakdown': {
+                'whatsapp': totals['whatsapp_shares'],
+                'facebook': totals['facebook_shares'],
+                'twitter': totals['twitter_shares'],
+                'telegram': totals['telegram_shares'],
+                'email': totals['email_shares']
+            },
+            'viral_posts_count': counts['viral'],
+            'popular_posts_count': counts['popular']
+        }
 
 class CacheService:
     """Service pour gérer le cache des posts et médias"""
@@ -673,70 +611,20 @@ class CacheService:
     @staticmethod
     def invalidate_user_posts_cache(user_id, quartier_id=None):
         """Invalide le cache des posts d'un utilisateur"""
-        cache_key = CacheService.get_posts_cache_key(user_id, quartier_id)
-        cache.delete(cache_key)
+        TaggedCacheService.invalidate(TaggedCacheService.user_tag(user_id))
         logger.info(f"Cache invalidé pour l'utilisateur {user_id}")
     
     @staticmethod
     def invalidate_post_cache(post_id):
         """Invalide le cache d'un post spécifique"""
-        cache_key = CacheService.get_post_detail_cache_key(post_id)
-        cache.delete(cache_key)
+        TaggedCacheService.invalidate(TaggedCacheService.post_tag(post_id))
         logger.info(f"Cache invalidé pour le post {post_id}")
     
-    @staticmethod
-    def get_cached_posts(user, filters=None):
-        """Récupère les posts depuis le cache ou la base de données"""
-        cache_key = CacheService.get_posts_cache_key(
-            user.id, 
-            user.quartier.id if user.quartier else None,
-            filters
-        )
-        
-        # Essayer de récupérer depuis le cache
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            logger.info(f"Posts récupérés depuis le cache pour l'utilisateur {user.id}")
-            return cached_data
-        
-        # Si pas en cache, récupérer depuis la base de données
-        queryset = Post.objects.filter(
-            quartier__commune=user.quartier.commune
-        ).select_related(
-            'author', 
-            'quartier', 
-            'quartier__commune'
-        ).prefetch_related(
-            'comments__author',
-            'likes__user',
-            'media_files'
-        ).annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments', filter=Q(comments__parent_comment__isnull=True)),
-            shares_count=Count('shares')
-        ).order_by('-created_at')
-        
-        # Appliquer les filtres
-        if filters:
-            if filters.get('post_type'):
-                queryset = queryset.filter(post_type=filters['post_type'])
-        
-        # Mettre en cache pour 5 minutes
-        cache.set(cache_key, queryset, 300)
-        logger.info(f"Posts mis en cache pour l'utilisateur {user.id}")
-        
-        return queryset
-    
     @staticmethod
     def get_cached_post_detail(post_id):
         """Récupère les détails d'un post depuis le cache"""
         cache_key = CacheService.get_post_detail_cache_key(post_id)
-        
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return cached_data
-        
-        return None
+        return TaggedCacheService.get(cache_key)
 
 
 class PerformanceOptimizer:
@@ -760,43 +648,41 @@ class PerformanceOptimizer:
         )
     
     @staticmethod
-    def batch_update_post_counts():
-        """Met à jour en lot les compteurs des posts"""
-        from django.db import connection
+    def batch_update_post_counts(post_ids=None):
+        """
+        Met à jour en lot les compteurs des posts.
         
-        with connection.cursor() as cursor:
-            # Mettre à jour les compteurs de likes
-            cursor.execute("""
-                UPDATE posts_post 
-                SET likes_count = (
-                    SELECT COUNT(*) 
-                    FROM posts_postlike 
-                    WHERE posts_postlike.post_id = posts_post.id
-                )
-            """)
-            
-            # Mettre à jour les compteurs de commentaires
-            cursor.execute("""
-                UPDATE posts_post 
-                SET comments_count = (
-                    SELECT COUNT(*) 
-                    FROM posts_postcomment 
-                    WHERE posts_postcomment.post_id = posts_post.id 
-                    AND posts_postcomment.parent_comment_id IS NULL
-                )
-            """)
-            
-            # Mettre à jour les compteurs de partages
-            cursor.execute("""
-                UPDATE posts_post 
-                SET shares_count = (
-                    SELECT COUNT(*) 
-                    FROM posts_postshare 
-                    WHERE posts_postshare.post_id = posts_post.id
-                )
-            """)
+        Les likes, vues et partages sont tamponnés par EngagementCounterService :
+        seuls les deltas en attente sont appliqués, sans réécrire la table. Pour
+        réconcilier des posts précis avec leurs lignes de likes, commentaires et
+        partages, passer ``post_ids``.
+        """
+        from .counters import EngagementCounterService
+        
+        flushed = EngagementCounterService.flush()
         
-        logger.info("Compteurs des posts mis à jour en lot")
+        if post_ids:
+            post_ids = list(post_ids)
+            likes = dict(
+                PostLike.objects.filter(post_id__in=post_ids)
+                .values('post_id').annotate(total=Count('id')).values_list('post_id', 'total')
+            )
+            comments = dict(
+                PostComment.objects.filter(post_id__in=post_ids, parent_comment__isnull=True)
+                .values('post_id').annotate(total=Count('id')).values_list('post_id', 'total')
+            )
+            shares = dict(
+                PostShare.objects.filter(post_id__in=post_ids)
+                .values('post_id').annotate(total=Count('id')).values_list('post_id', 'total')
+            )
+            posts = list(Post.objects.filter(id__in=post_ids).only('id'))
+            for post in posts:
+                post.likes_count = likes.get(post.id, 0)
+                post.comments_count = comments.get(post.id, 0)
+                post.shares_count = shares.get(post.id, 0)
+            Post.objects.bulk_update(posts, ['likes_count', 'comments_count', 'shares_count'])
+        
+        logger.info(f"Compteurs des posts mis à jour en lot ({flushed} posts vidés)")
 
 
 class DatabaseOptimizer:
@@ -852,44 +738,24 @@ class AdvancedMediaOptimizationService:
     def optimize_image(image_file, max_width=None, max_height=None, quality=None):
         """Optimise une image avec compression intelligente"""
         try:
-            # Ouvrir l'image
-            with Image.open(image_file) as img:
-                # Convertir en RGB si nécessaire
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Redimensionner si nécessaire
-                if max_width or max_height:
-                    img = AdvancedMediaOptimizationService._resize_image(
-                        img, max_width, max_height
-                    )
-                
-                # Optimiser la qualité
-                if quality is None:
-                    quality = settings.MEDIA_OPTIMIZATION.get('image_quality', 85)
-                
-                # Créer un buffer temporaire
-                output_buffer = io.BytesIO()
-                
-                # Sauvegarder avec optimisation
-                img.save(
-                    output_buffer, 
-                    format='JPEG', 
-                    quality=quality, 
-                    optimize=True,
-                    progressive=True
+            img = load_image(image_file, max_width, max_height)
+            
+            # Redimensionner si nécessaire
+            if max_width or max_height:
+                img = AdvancedMediaOptimizationService._resize_image(
+                    img, max_width, max_height
                 )
-                
-                output_buffer.seek(0)
-                
-                # Calculer la réduction de taille
-                original_size = image_file.size
-                optimized_size = output_buffer.tell()
-                reduction = ((original_size - optimized_size) / original_size) * 100
-                
-                logger.info(f"Image optimisée: {reduction:.1f}% de réduction")
-                
-                return output_buffer, reduction
+            
+            output_buffer = encode_image(img, 'jpeg', quality)
+            
+            # Calculer la réduction de taille
+            original_size = image_file.size
+            optimized_size = len(output_buffer.getvalue())
+            reduction = ((original_size - optimized_size) / original_size) * 100
+            
+            logger.info(f"Image optimisée: {reduction:.1f}% de réduction")
+            
+            return output_buffer, reduction
                 
         except Exception as e:
             logger.error(f"Erreur lors de l'optimisation d'image: {str(e)}")
@@ -903,16 +769,7 @@ class AdvancedMediaOptimizationService:
         if max_height is None:
             max_height = settings.MEDIA_OPTIMIZATION.get('max_height', 1080)
         
-        # Calculer les nouvelles dimensions
-        width, height = img.size
-        ratio = min(max_width / width, max_height / height)
-        
-        if ratio < 1:
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-        
-        return img
+        return fit_image(img, max_width, max_height)
     
     @staticmethod
     def create_thumbnails(image_file, sizes=None):
@@ -923,41 +780,22 @@ class AdvancedMediaOptimizationService:
         thumbnails = {}
         
         try:
-            with Image.open(image_file) as img:
-                for size in sizes:
-                    # Créer une copie pour la miniature
-                    thumb = img.copy()
-                    
-                    # Redimensionner en conservant les proportions
-                    thumb.thumbnail((size, size), Image.LANCZOS)
-                    
-                    # Sauvegarder la miniature
-                    thumb_buffer = io.BytesIO()
-                    thumb.save(thumb_buffer, format='JPEG', quality=85, optimize=True)
-                    thumb_buffer.seek(0)
-                    
-                    thumbnails[f"thumb_{size}"] = thumb_buffer
+            # Un seul décodage, chaque miniature étant réduite depuis la précédente
+            thumb = load_image(image_file, max(sizes), max(sizes))
+            for size in sorted(sizes, reverse=True):
+                thumb = fit_image(thumb, size, size)
+                thumbnails[f"thumb_{size}"] = encode_image(thumb, 'jpeg', 85)
                     
         except Exception as e:
             logger.error(f"Erreur lors de la création des miniatures: {str(e)}")
         
-        return thumbnails
+        return {f"thumb_{size}": thumbnails[f"thumb_{size}"] for size in sizes if f"thumb_{size}" in thumbnails}
     
     @staticmethod
     def convert_to_webp(image_file):
         """Convertit une image en format WebP pour une meilleure compression"""
         try:
-            with Image.open(image_file) as img:
-                # Convertir en RGB si nécessaire
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Créer le buffer WebP
-                webp_buffer = io.BytesIO()
-                img.save(webp_buffer, format='WEBP', quality=85, method=6)
-                webp_buffer.seek(0)
-                
-                return webp_buffer
+            return encode_image(load_image(image_file), 'webp', 85)
                 
         except Exception as e:
             logger.error(f"Erreur lors de la conversion WebP: {str(e)}")
@@ -979,9 +817,22 @@ class AdvancedMediaOptimizationService:
                 logger.warning(f"Vidéo trop volumineuse: {file_size:.1f}MB > {max_size_mb}MB")
                 return None, "Vidéo trop volumineuse"
             
-            # Pour l'instant, on retourne le fichier original
-            # En production, on utiliserait FFmpeg pour la compression
-            return video_file, "OK"
+            if not ffmpeg_available():
+                logger.info("ffmpeg absent, vidéo conservée telle quelle")
+                return video_file, "OK"
+            
+            # Qualité la plus haute de l'échelle HLS (voir posts.transcoding)
+            top = max(get_optimization_setting('video_ladder', DEFAULT_VIDEO_LADDER), key=lambda rung: rung['height'])
+            output = tempfile.NamedTemporaryFile(suffix='.mp4')
+            if not MediaCompressionService.compress_video(
+                video_file.temporary_file_path(), output.name,
+                target_bitrate=top['video_bitrate'], max_height=top['height']
+            ):
+                output.close()
+                return None, "Échec de la compression"
+            
+            # Fichier temporaire supprimé à sa fermeture
+            return File(output, name=os.path.splitext(video_file.name)[0] + '.mp4'), "OK"
             
         except Exception as e:
             logger.error(f"Erreur lors de l'optimisation vidéo: {str(e)}")
@@ -1125,9 +976,14 @@ class CacheOptimizationService:
                 'author', 'quartier'
             )[:50]  # Limiter à 50 posts
             
-            # Mettre en cache
-            cache_key = f"posts_list_{user_id}_{quartier_id}"
-            cache.set(cache_key, list(posts), 300)
+            # Mettre en cache, invalidé par toute écriture dans la commune
+            cache_key = CacheService.get_posts_cache_key(user_id, quartier_id)
+            commune_id = Quartier.objects.filter(id=quartier_id).values_list('commune_id', flat=True).first()
+            TaggedCacheService.set(
+                cache_key, list(posts),
+                [TaggedCacheService.commune_tag(commune_id), TaggedCacheService.user_tag(user_id)],
+                TaggedCacheService.get_timeout('posts_list', 300)
+            )
             
             logger.info(f"Cache préchauffé pour l'utilisateur {user_id}")
             
@@ -1136,16 +992,12 @@ class CacheOptimizationService:
     
     @staticmethod
     def invalidate_related_caches(post_id, user_id, quartier_id):
-        """Invalide tous les caches liés à un post"""
-        cache_keys_to_delete = [
-            f"post_detail_{post_id}",
-            f"posts_list_{user_id}_{quartier_id}",
-            f"user_posts_{user_id}",
-            f"analytics_posts_{quartier_id}"
-        ]
-        
-        for key in cache_keys_to_delete:
-            cache.delete(key)
+        """Invalide tous les caches liés à un post (post, auteur et commune)"""
+        tags = [TaggedCacheService.post_tag(post_id), TaggedCacheService.user_tag(user_id)]
+        commune_id = Quartier.objects.filter(id=quartier_id).values_list('commune_id', flat=True).first()
+        if commune_id is not None:
+            tags.append(TaggedCacheService.commune_tag(commune_id))
+        TaggedCacheService.invalidate(*tags)
         
         logger.info(f"Caches invalidés pour le post {post_id}")
     
@@ -1190,21 +1042,8 @@ class ImageCompressionService:
             BytesIO: Image compressée en mémoire
         """
         try:
-            # Ouvrir l'image avec PIL
-            img = Image.open(image_file)
-            
-            # Convertir en RGB si nécessaire
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensionner si nécessaire
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Compresser l'image
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            output.seek(0)
+            img = fit_image(load_image(image_file, max_width, max_height), max_width, max_height)
+            output = encode_image(img, 'jpeg', quality)
             
             logger.info(f"Image compressée: {image_file.name} -> {len(output.getvalue())} bytes")
             return output
@@ -1226,20 +1065,8 @@ class ImageCompressionService:
             BytesIO: Miniature en mémoire
         """
         try:
-            img = Image.open(image_file)
-            
-            # Convertir en RGB si nécessaire
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Créer la miniature
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            output.seek(0)
-            
-            return output
+            img = fit_image(load_image(image_file, *size), *size)
+            return encode_image(img, 'jpeg', 85)
             
         except Exception as e:
             logger.error(f"Erreur lors de la création de la miniature: {str(e)}")
@@ -1,6 +1,10 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import PostLike, PostComment, Post, Media
+from .models import PostLike, PostComment, Post, Media, PostShare, ExternalShare
+from .feed import CommuneFeedService
+from .caching import TaggedCacheService
+from .rollups import EngagementRollupService
 from notifications.services import NotificationService
 
 
@@ -31,4 +35,116 @@ def notify_live_started(sender, instance, created, **kwargs):
         NotificationService.notify_live_started(
             instance.posts.first().author if instance.posts.exists() else None,
             instance.title or "Live en cours"
-        ) 
\ No newline at end of file
+        )
+
+
+@receiver(post_save, sender=Post)
+def add_post_to_commune_feed(sender, instance, created, **kwargs):
+    """
+    Ajoute un nouveau post au fil précalculé de sa commune
+    """
+    if created:
+        transaction.on_commit(lambda: CommuneFeedService.add_post(instance))
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_commune_feed(sender, instance, **kwargs):
+    """
+    Retire un post supprimé du fil précalculé de sa commune
+    """
+    try:
+        commune_id = instance.quartier.commune_id
+    except Exception:
+        return
+    post_id = instance.id
+    transaction.on_commit(lambda: CommuneFeedService.remove_post(post_id, commune_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_caches(sender, instance, **kwargs):
+    """
+    Invalide les caches du post, de son auteur et de sa commune
+    """
+    TaggedCacheService.invalidate_on_commit(*TaggedCacheService.get_post_tags(instance))
+
+
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+@receiver(post_save, sender=PostComment)
+@receiver(post_delete, sender=PostComment)
+@receiver(post_save, sender=PostShare)
+@receiver(post_delete, sender=PostShare)
+@receiver(post_save, sender=ExternalShare)
+@receiver(post_delete, sender=ExternalShare)
+def invalidate_post_engagement_caches(sender, instance, **kwargs):
+    """
+    Invalide les caches du post liké, commenté ou partagé
+    """
+    TaggedCacheService.invalidate_on_commit(TaggedCacheService.post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Post)
+def record_post_rollup(sender, instance, created, **kwargs):
+    """
+    Compte un nouveau post dans les agrégats d'engagement
+    """
+    if created:
+        transaction.on_commit(
+            lambda: EngagementRollupService.record(instance.id, 'posts_count', when=instance.created_at)
+        )
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_rollup(sender, instance, **kwargs):
+    """
+    Retire un post supprimé des agrégats (période de sa publication)
+    """
+    try:
+        dimensions = (instance.author_id, instance.quartier_id, instance.quartier.commune_id)
+    except Exception:
+        return
+    transaction.on_commit(
+        lambda: EngagementRollupService.record(
+            instance.id, 'posts_count', -1, when=instance.created_at, dimensions=dimensions
+        )
+    )
+
+
+ROLLUP_FIELDS = {
+    PostLike: 'likes_count',
+    PostComment: 'comments_count',
+    PostShare: 'shares_count',
+}
+
+
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+@receiver(post_save, sender=PostComment)
+@receiver(post_delete, sender=PostComment)
+@receiver(post_save, sender=PostShare)
+@receiver(post_delete, sender=PostShare)
+def record_engagement_rollup(sender, instance, created=None, **kwargs):
+    """
+    Reporte un like, un commentaire ou un partage (ou leur retrait) dans les agrégats
+    """
+    if created is False:
+        return
+    delta = 1 if created else -1
+    transaction.on_commit(
+        lambda: EngagementRollupService.record(instance.post_id, ROLLUP_FIELDS[sender], delta)
+    )
+
+
+@receiver(post_save, sender=ExternalShare)
+def record_external_share_rollup(sender, instance, created, **kwargs):
+    """
+    Reporte un partage externe (et sa plateforme) dans les agrégats
+    """
+    if not created:
+        return
+    entries = [(instance.post_id, 'external_shares_count', 1, instance.shared_at, None)]
+    platform_field = EngagementRollupService.PLATFORM_FIELDS.get(instance.platform)
+    if platform_field:
+        entries.append((instance.post_id, platform_field, 1, instance.shared_at, None))
+    transaction.on_commit(lambda: EngagementRollupService.record_many(entries))
@@ -0,0 +1,312 @@
+"""
+Transcodage des vidéos en flux adaptatif HLS.
+
+Chaque vidéo est décodée une seule fois par ffmpeg puis encodée en H.264
+sur une échelle de qualités (``MEDIA_OPTIMIZATION['video_ladder']``,
+240p/360p/720p par défaut, sans agrandissement de la source). Chaque
+qualité est découpée en segments HLS de ``hls_segment_duration`` secondes,
+avec des images clés alignées pour que le lecteur change de qualité entre
+deux segments. La liste de lecture principale (``master.m3u8``) et les
+segments sont stockés à côté du fichier (``<fichier>_hls/``).
+
+La qualité la plus haute est aussi réassemblée sans réencodage en MP4, qui
+remplace le fichier d'origine pour les lecteurs sans HLS. Des images
+candidates sont extraites à plusieurs instants de la vidéo et la plus
+détaillée (la plus lourde en JPEG, ce qui écarte les images noires ou
+floues) devient la miniature.
+
+Les qualités sont décrites dans ``Media.renditions`` (format ``hls``), la
+liste principale dans ``Media.hls_playlist`` et la miniature dans
+``Media.thumbnail``. ``MediaCompressionService`` et
+``VideoProcessingService`` (posts.services) utilisent aussi ces fonctions.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from django.core.files import File
+from .renditions import get_optimization_setting
+from .uploads import local_file
+
+logger = logging.getLogger(__name__)
+
+
+# Hauteur (petit côté pour les vidéos verticales) et débits en kbit/s
+DEFAULT_VIDEO_LADDER = (
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2500, 'audio_bitrate': 128},
+)
+DEFAULT_HLS_SEGMENT_DURATION = 4
+# Instants des images candidates pour la miniature, en fraction de la durée
+DEFAULT_POSTER_POSITIONS = (0.1, 0.3, 0.5, 0.7)
+DEFAULT_TRANSCODE_TIMEOUT = 30 * 60
+
+MASTER_PLAYLIST = 'master.m3u8'
+VARIANT_PLAYLIST = 'index.m3u8'
+
+
+def ffmpeg_available():
+    """ffmpeg et ffprobe sont installés"""
+    return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+
+def run_ffmpeg(cmd, timeout=None):
+    """Exécute ffmpeg ; lève RuntimeError avec la fin de sa sortie d'erreur en cas d'échec"""
+    if timeout is None:
+        timeout = get_optimization_setting('video_transcode_timeout', DEFAULT_TRANSCODE_TIMEOUT)
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} a échoué: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+def probe_video(path):
+    """Dimensions affichées, durée, cadence et présence d'audio d'une vidéo (ffprobe)"""
+    output = run_ffmpeg([
+        'ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path
+    ])
+    data = json.loads(output)
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    if video is None:
+        raise RuntimeError('Aucune piste vidéo')
+
+    width, height = int(video['width']), int(video['height'])
+    # Vidéos de téléphone tournées : ffmpeg applique la rotation à l'encodage
+    rotation = int(video.get('tags', {}).get('rotate', 0))
+    for side_data in video.get('side_data_list', []):
+        rotation = int(side_data.get('rotation', rotation))
+    if rotation % 180:
+        width, height = height, width
+
+    numerator, _, denominator = video.get('avg_frame_rate', '0/0').partition('/')
+    frame_rate = float(numerator) / float(denominator) if denominator and float(denominator) else 0
+    return {
+        'width': width,
+        'height': height,
+        'duration': float(data.get('format', {}).get('duration') or video.get('duration') or 0),
+        'frame_rate': frame_rate or 30,
+        'has_audio': any(stream.get('codec_type') == 'audio' for stream in streams),
+    }
+
+
+def h264_arguments(video_bitrate, audio_bitrate=128):
+    """Paramètres d'encodage H.264/AAC lisibles sur tous les navigateurs et mobiles"""
+    return [
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_bitrate}k', '-maxrate', f'{int(video_bitrate * 1.07)}k', '-bufsize', f'{video_bitrate * 2}k',
+        '-c:a', 'aac', '-ac', '2', '-b:a', f'{audio_bitrate}k',
+    ]
+
+
+def frame_command(source, output_path, position=1.0, max_height=None):
+    """Commande d'extraction d'une image à ``position`` (secondes ou ``HH:MM:SS``)"""
+    if isinstance(position, (int, float)):
+        position = f'{position:.3f}'
+    # -ss avant -i : recherche directe de l'image clé, sans décoder le début
+    cmd = ['ffmpeg', '-v', 'error', '-y', '-ss', position, '-i', source, '-frames:v', '1', '-q:v', '2']
+    if max_height:
+        cmd += ['-vf', f"scale=-2:'min({max_height},ih)'"]
+    return cmd + [output_path]
+
+
+def even(value):
+    """Dimension paire (exigée par H.264 en 4:2:0)"""
+    return max(2, int(value) - int(value) % 2)
+
+
+class VideoTranscodingService:
+    """Production et stockage des qualités HLS et des miniatures des vidéos"""
+
+    @staticmethod
+    def ladder(width, height, rungs=None):
+        """Qualités à produire pour une source ``width`` x ``height``, sans agrandissement"""
+        rungs = sorted(
+            rungs or get_optimization_setting('video_ladder', DEFAULT_VIDEO_LADDER),
+            key=lambda rung: rung['height']
+        )
+        short_side = min(width, height)
+        selected = [rung for rung in rungs if rung['height'] <= short_side] or rungs[:1]
+
+        ladder = []
+        for rung in selected:
+            scale = min(1, rung['height'] / short_side)
+            ladder.append({**rung, 'width': even(round(width * scale)), 'height': even(round(height * scale))})
+        return ladder
+
+    @staticmethod
+    def build_command(source, output_dir, ladder, has_audio=True, frame_rate=30, segment_duration=None):
+        """Commande ffmpeg unique : un décodage, une sortie HLS par qualité"""
+        if segment_duration is None:
+            segment_duration = get_optimization_setting('hls_segment_duration', DEFAULT_HLS_SEGMENT_DURATION)
+        # Images clés alignées sur les segments dans toutes les qualités
+        gop = max(1, round(frame_rate * segment_duration))
+
+        outputs = ''.join(f'[s{index}]' for index in range(len(ladder)))
+        graph = [f'[0:v]split={len(ladder)}{outputs}']
+        graph += [f"[s{index}]scale={rung['width']}:{rung['height']}[v{index}]" for index, rung in enumerate(ladder)]
+
+        cmd = ['ffmpeg', '-v', 'error', '-y', '-i', source, '-filter_complex', ';'.join(graph)]
+        for index in range(len(ladder)):
+            cmd += ['-map', f'[v{index}]']
+            if has_audio:
+                cmd += ['-map', '0:a:0']
+
+        cmd += [
+            '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        ]
+        stream_map = []
+        for index, rung in enumerate(ladder):
+            bitrate = rung['video_bitrate']
+            cmd += [
+                f'-b:v:{index}', f'{bitrate}k',
+                f'-maxrate:v:{index}', f'{int(bitrate * 1.07)}k',
+                f'-bufsize:v:{index}', f'{bitrate * 2}k',
+            ]
+            if has_audio:
+                cmd += [f'-b:a:{index}', f"{rung['audio_bitrate']}k"]
+                stream_map.append(f"v:{index},a:{index},name:{rung['name']}")
+            else:
+                stream_map.append(f"v:{index},name:{rung['name']}")
+        if has_audio:
+            cmd += ['-c:a', 'aac', '-ac', '2']
+
+        return cmd + [
+            '-f', 'hls',
+            '-hls_time', str(segment_duration),
+            '-hls_playlist_type', 'vod',
+            '-hls_flags', 'independent_segments',
+            '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%03d.ts'),
+            '-master_pl_name', MASTER_PLAYLIST,
+            '-var_stream_map', ' '.join(stream_map),
+            os.path.join(output_dir, '%v', VARIANT_PLAYLIST),
+        ]
+
+    @staticmethod
+    def remux_command(playlist_path, output_path):
+        """Réassemble les segments d'une qualité en MP4, sans réencodage"""
+        return [
+            'ffmpeg', '-v', 'error', '-y', '-i', playlist_path,
+            '-c', 'copy', '-bsf:a', 'aac_adtstoasc', '-movflags', '+faststart', output_path
+        ]
+
+    @staticmethod
+    def transcode(media):
+        """
+        Produit et stocke les qualités HLS d'une vidéo, remplace son fichier
+        par le MP4 de la meilleure qualité et enregistre leur description.
+        """
+        storage = media.file.storage
+        original_name = media.file.name
+        prefix = f'{os.path.splitext(original_name)[0]}_hls'
+
+        with local_file(media) as path, tempfile.TemporaryDirectory() as work_dir:
+            info = probe_video(path)
+            ladder = VideoTranscodingService.ladder(info['width'], info['height'])
+            hls_dir = os.path.join(work_dir, 'hls')
+            os.makedirs(hls_dir)
+            run_ffmpeg(VideoTranscodingService.build_command(
+                path, hls_dir, ladder, has_audio=info['has_audio'], frame_rate=info['frame_rate']
+            ))
+
+            fallback_path = os.path.join(work_dir, 'video.mp4')
+            run_ffmpeg(VideoTranscodingService.remux_command(
+                os.path.join(hls_dir, ladder[-1]['name'], VARIANT_PLAYLIST), fallback_path
+            ))
+
+            VideoTranscodingService.delete_stream(storage, prefix)
+            for directory, _, filenames in os.walk(hls_dir):
+                for filename in sorted(filenames):
+                    local_path = os.path.join(directory, filename)
+                    name = f"{prefix}/{os.path.relpath(local_path, hls_dir).replace(os.sep, '/')}"
+                    with open(local_path, 'rb') as content:
+                        saved_name = storage.save(name, File(content))
+                    if saved_name != name:
+                        # Les listes de lecture référencent les segments par leur nom
+                        raise RuntimeError(f"Nom de segment modifié par le stockage: {saved_name}")
+
+            renditions = []
+            for rung in ladder:
+                variant_dir = os.path.join(hls_dir, rung['name'])
+                renditions.append({
+                    'name': f"{prefix}/{rung['name']}/{VARIANT_PLAYLIST}",
+                    'width': rung['width'],
+                    'height': rung['height'],
+                    'format': 'hls',
+                    'bandwidth': (rung['video_bitrate'] + (rung['audio_bitrate'] if info['has_audio'] else 0)) * 1000,
+                    'size': sum(os.path.getsize(os.path.join(variant_dir, name)) for name in os.listdir(variant_dir)),
+                })
+
+            with open(fallback_path, 'rb') as fallback:
+                name = os.path.splitext(os.path.basename(original_name))[0] + '.mp4'
+                media.file.save(name, File(fallback), save=False)
+
+        media.hls_playlist = f'{prefix}/{MASTER_PLAYLIST}'
+        media.renditions = renditions
+        media.width, media.height = ladder[-1]['width'], ladder[-1]['height']
+        media.file_size = media.file.size
+        media.save(update_fields=['file', 'file_size', 'hls_playlist', 'renditions', 'width', 'height'])
+        if media.file.name != original_name:
+            storage.delete(original_name)
+        logger.info(f"{len(ladder)} qualités HLS créées pour le média {media.id}")
+
+    @staticmethod
+    def extract_poster(media, positions=None):
+        """Extrait les images candidates et stocke la plus détaillée comme miniature"""
+        positions = positions or get_optimization_setting('poster_positions', DEFAULT_POSTER_POSITIONS)
+        max_height = max(rung['height'] for rung in get_optimization_setting('video_ladder', DEFAULT_VIDEO_LADDER))
+        storage = media.file.storage
+
+        with local_file(media) as path, tempfile.TemporaryDirectory() as work_dir:
+            duration = media.duration.total_seconds() if media.duration else probe_video(path)['duration']
+            candidates = []
+            for index, position in enumerate(positions):
+                output_path = os.path.join(work_dir, f'poster_{index}.jpg')
+                try:
+                    run_ffmpeg(frame_command(path, output_path, duration * position, max_height))
+                except RuntimeError as e:
+                    logger.warning(f"Image {index} du média {media.id} non extraite: {e}")
+                    continue
+                if os.path.exists(output_path):
+                    candidates.append((os.path.getsize(output_path), output_path))
+            if not candidates:
+                raise RuntimeError('Aucune image extraite')
+
+            thumbnail_name = os.path.splitext(media.file.name)[0] + '_thumb.jpg'
+            if storage.exists(thumbnail_name):
+                storage.delete(thumbnail_name)
+            with open(max(candidates)[1], 'rb') as poster:
+                media.thumbnail = storage.save(thumbnail_name, File(poster))
+
+    @staticmethod
+    def stream_files(media):
+        """Fichiers stockés du flux HLS et de la miniature d'une vidéo"""
+        names = [media.thumbnail] if media.thumbnail else []
+        if media.hls_playlist:
+            names += VideoTranscodingService.stored_files(media.file.storage, os.path.dirname(media.hls_playlist))
+        return names
+
+    @staticmethod
+    def delete_stream(storage, prefix):
+        """Supprime un flux HLS déjà stocké (nouveau transcodage)"""
+        for name in VideoTranscodingService.stored_files(storage, prefix):
+            storage.delete(name)
+
+    @staticmethod
+    def stored_files(storage, prefix):
+        """Noms de tous les fichiers stockés sous ``prefix``"""
+        names = []
+        pending = [prefix]
+        while pending:
+            directory = pending.pop()
+            try:
+                directories, filenames = storage.listdir(directory)
+            except (FileNotFoundError, NotImplementedError):
+                continue
+            names += [f'{directory}/{filename}' for filename in filenames]
+            pending += [f'{directory}/{subdirectory}' for subdirectory in directories]
+        return names
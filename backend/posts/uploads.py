@@ -0,0 +1,128 @@
+"""
+Réception des fichiers envoyés en flux, à mémoire bornée.
+
+``StreamingUploadHandler`` (voir ``FILE_UPLOAD_HANDLERS``) écrit chaque
+fichier sur disque par blocs de taille fixe, quelle que soit sa taille :
+la mémoire utilisée par un envoi ne dépend pas du fichier. Pendant la
+réception, il calcule l'empreinte SHA-256 du contenu (dédoublonnage) et
+conserve les premiers octets pour détecter le type réel du fichier, sans
+relire le fichier ensuite.
+
+Les fichiers reçus par un autre gestionnaire (réglages sans ce
+gestionnaire, fichiers créés par code) sont traités par ``content_digest``
+et ``detect_content_type``, qui lisent le fichier par blocs.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+# Détection par libmagic si disponible, sinon par signatures connues
+try:
+    import magic
+    MAGIC_AVAILABLE = True
+except ImportError:
+    MAGIC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Octets conservés pour la détection du type
+SNIFF_BYTES = 2048
+# Taille des blocs écrits sur disque et lus pour l'empreinte
+CHUNK_SIZE = 64 * 1024
+
+
+def sniff_content_type(header):
+    """Type MIME déduit des premiers octets (None si inconnu)"""
+    if MAGIC_AVAILABLE:
+        return magic.from_buffer(header, mime=True)
+
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'video/avi'
+    if header.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm'
+    if header[4:8] == b'ftyp':
+        # Conteneur ISO : QuickTime ou MP4 selon la marque
+        return 'video/quicktime' if header[8:12] == b'qt  ' else 'video/mp4'
+    return None
+
+
+def detect_content_type(file):
+    """Type réel d'un fichier, détecté pendant l'envoi ou depuis ses premiers octets"""
+    content_type = getattr(file, 'sniffed_content_type', None)
+    if content_type:
+        return content_type
+
+    file.seek(0)
+    header = file.read(SNIFF_BYTES)
+    file.seek(0)
+    return sniff_content_type(header)
+
+
+def content_digest(file):
+    """Empreinte SHA-256 du contenu, calculée pendant l'envoi ou par blocs"""
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def local_file(media):
+    """Chemin local du fichier d'un média (copie temporaire si le stockage est distant)"""
+    try:
+        path = media.file.path
+    except NotImplementedError:
+        path = None
+
+    if path:
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(media.file.name)[1]) as copy:
+        with media.file.open('rb') as source:
+            shutil.copyfileobj(source, copy, CHUNK_SIZE)
+        copy.flush()
+        yield copy.name
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """Écrit les fichiers sur disque par blocs en calculant empreinte et type"""
+
+    chunk_size = CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if len(self.header) < SNIFF_BYTES:
+            self.header += raw_data[:SNIFF_BYTES - len(self.header)]
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        file.sniffed_content_type = sniff_content_type(self.header)
+        logger.debug(f"Fichier reçu: {file.name} ({file_size} octets, {file.sniffed_content_type})")
+        return file
@@ -4,7 +4,7 @@ from .views import (
     PostCommentDetailView, PostCommentReplyView, UserPostsView, PostIncrementViewsView,
     MediaUploadView, MediaListView, MediaDetailView, LiveStreamView, PostShareView, PostSharesListView,
     ExternalShareView, ExternalSharesListView, PostAnalyticsView, UserAnalyticsView, CommunityAnalyticsView,
-    LiveChatView, LiveVideoUploadView
+    LiveChatView, LiveUploadSessionView, LiveUploadDetailView, LiveUploadChunkView, LiveUploadCompleteView
 )
 
 app_name = 'posts'
@@ -13,7 +13,10 @@ urlpatterns = [
     # Live streaming et chat (doit être avant les URLs génériques)
     path('live/start/', LiveStreamView.as_view(), name='live-start'),
     path('live/<int:live_id>/stop/', LiveStreamView.as_view(), name='live-stop'),
-    path('live/<int:live_id>/upload-video/', LiveVideoUploadView.as_view(), name='live-upload-video'),
+    path('live/<int:live_id>/uploads/', LiveUploadSessionView.as_view(), name='live-upload-create'),
+    path('live/uploads/<uuid:upload_id>/', LiveUploadDetailView.as_view(), name='live-upload-detail'),
+    path('live/uploads/<uuid:upload_id>/chunks/<int:index>/', LiveUploadChunkView.as_view(), name='live-upload-chunk'),
+    path('live/uploads/<uuid:upload_id>/complete/', LiveUploadCompleteView.as_view(), name='live-upload-complete'),
     path('live/<int:post_id>/chat/', LiveChatView.as_view(), name='live-chat'),
     path('live/<int:post_id>/chat/messages/', LiveChatView.as_view(), name='live-chat-messages'),
     
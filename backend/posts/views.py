@@ -5,6 +5,7 @@ from datetime import timedelta
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
@@ -14,19 +15,25 @@ from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.utils import timezone
-from django.core.cache import cache
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 import time
-from .models import Post, PostLike, PostComment, Media, PostShare, PostAnalytics, ExternalShare, LiveChatMessage
+from .models import (
+    Post, PostLike, PostComment, Media, PostShare, PostAnalytics, ExternalShare, LiveChatMessage, LiveUploadSession
+)
 from .serializers import (
     PostSerializer, PostCreateSerializer, PostCommentSerializer,
     PostCommentCreateSerializer, PostLikeSerializer,
     MediaSerializer, MediaCreateSerializer, PostShareCreateSerializer, PostShareSerializer,
     ExternalShareSerializer, ExternalShareCreateSerializer,
-    PostAnalyticsSerializer, PostAnalyticsSummarySerializer
+    PostAnalyticsSerializer, PostAnalyticsSummarySerializer,
+    LiveUploadSessionSerializer, LiveUploadSessionCreateSerializer
 )
-from .services import ModerationService, VideoProcessingService, LiveStreamingService, MediaCDNService
+from .services import LiveStreamingService, CacheService
+from .feed import CommuneFeedService
+from .counters import EngagementCounterService
+from .caching import TaggedCacheService
+from .pagination import KeysetCursorPagination
+from .media_pipeline import MediaPipeline
+from .live_uploads import LiveUploadService, LiveUploadError
 
 logger = logging.getLogger(__name__)
 
@@ -35,12 +42,20 @@ logger = logging.getLogger(__name__)
     post=extend_schema(
         summary="Uploader un média",
         description="""
-        Upload un fichier média (image ou vidéo) avec :
-        - Validation automatique du type et de la taille
+        Upload un fichier média (image ou vidéo). Le fichier est enregistré tel
+        quel et la réponse est immédiate (202, statut `pending`) ; le traitement
+        se fait ensuite en arrière-plan, par étapes reprises en cas d'échec :
+        - Lecture des dimensions et de la durée
         - Modération automatique avec Google Cloud Vision
-        - Optimisation et compression automatique
+        - Transcodage des vidéos et création des miniatures
         - Upload vers CDN Cloudinary si configuré
         
+        Le champ `approval_status` du média indique l'avancement :
+        `pending`, `processing`, puis `approved`, `unmoderated` (aucun backend
+        de modération configuré, publiable sauf si `MEDIA_REQUIRE_MODERATION`),
+        `rejected` ou `failed`. Une publication qui référence un média pas
+        encore traité ou non publiable est refusée (400).
+        
         **Types de fichiers supportés :**
         - Images : JPEG, PNG, GIF, WebP (max 10MB)
         - Vidéos : MP4, WebM, QuickTime, AVI (max 50MB, 60s)
@@ -69,112 +84,24 @@ logger = logging.getLogger(__name__)
     )
 )
 class MediaUploadView(generics.CreateAPIView):
-    """Vue pour uploader des médias avec modération automatique"""
+    """Vue pour uploader des médias, traités ensuite en arrière-plan"""
     serializer_class = MediaCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
     throttle_scope = 'media'  # Rate limiting spécifique
     
-    def perform_create(self, serializer):
-        media = serializer.save()
-        
-        # Upload vers CDN si configuré
-        if settings.CLOUDINARY_STORAGE.get('CLOUD_NAME'):
-            self.upload_to_cdn(media)
-        
-        # Analyser le contenu pour la modération
-        self.analyze_content(media)
-        
-        # Si c'est une vidéo, vérifier la durée
-        if media.media_type == 'video':
-            self.check_video_duration(media)
-    
-    def analyze_content(self, media):
-        """Analyse le contenu pour la modération"""
-        try:
-            if media.media_type == 'image':
-                # Analyser l'image avec Google Cloud Vision
-                analysis_result = ModerationService.analyze_image_with_vision_api(media.file)
-                
-                media.moderation_score = analysis_result['moderation_score']
-                media.is_appropriate = analysis_result['is_appropriate']
-                media.moderation_details = analysis_result['moderation_details']
-                
-                if media.is_appropriate:
-                    media.approval_status = 'approved'
-                else:
-                    media.approval_status = 'rejected'
-                    logger.warning(f"Contenu inapproprié détecté pour le média {media.id}")
-                
-            elif media.media_type == 'video':
-                # Pour les vidéos, on simule l'analyse pour l'instant
-                # Dans un vrai projet, vous utiliseriez une API de modération vidéo
-                media.moderation_score = 0.2
-                media.is_appropriate = True
-                media.approval_status = 'approved'
-            
-            media.save()
-            logger.info(f"Contenu analysé pour le média {media.id}")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'analyse du contenu: {str(e)}")
-            # En cas d'erreur, marquer comme en attente
-            media.approval_status = 'pending'
-            media.save()
-    
-    def check_video_duration(self, media):
-        """Vérifie la durée de la vidéo"""
-        try:
-            file_path = media.file.path
-            validation_result = VideoProcessingService.validate_video_duration(file_path, max_duration=60)
-            
-            if validation_result['is_valid']:
-                media.duration = validation_result['duration']
-                logger.info(f"Durée vidéo validée: {validation_result['duration_seconds']}s")
-            else:
-                media.approval_status = 'rejected'
-                media.moderation_details = {
-                    'reason': 'Vidéo trop longue',
-                    'duration_seconds': validation_result['duration_seconds'],
-                    'max_duration': validation_result['max_duration']
-                }
-                logger.warning(f"Vidéo rejetée: durée {validation_result['duration_seconds']}s > 60s")
-            
-            media.save()
-                
-        except Exception as e:
-            logger.error(f"Erreur lors de la vérification de la durée: {str(e)}")
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # Le média est accepté mais pas encore traité
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
     
-    def upload_to_cdn(self, media):
-        """Upload le média vers le CDN Cloudinary"""
-        try:
-            if not settings.CLOUDINARY_STORAGE.get('CLOUD_NAME'):
-                logger.warning("Cloudinary non disponible, upload CDN ignoré")
-                return
-            
-            # Upload vers CDN
-            cdn_result = MediaCDNService.upload_media_to_cdn(
-                file=media.file,
-                title=media.title,
-                description=media.description,
-                user=media.user
-            )
-            
-            if cdn_result['success']:
-                # Mettre à jour le média avec l'URL CDN
-                media.cdn_url = cdn_result['url']
-                media.cdn_public_id = cdn_result['public_id']
-                media.file_size = cdn_result.get('bytes', 0)
-                media.width = cdn_result.get('width')
-                media.height = cdn_result.get('height')
-                media.duration = cdn_result.get('duration')
-                media.save()
-                
-                logger.info(f"Média {media.id} uploadé vers CDN: {cdn_result['url']}")
-            else:
-                logger.error(f"Erreur upload CDN pour média {media.id}: {cdn_result.get('error')}")
-                
-        except Exception as e:
-            logger.error(f"Erreur lors de l'upload CDN: {str(e)}")
+    def perform_create(self, serializer):
+        # Un seul enregistrement : le traitement (sonde, modération, transcodage,
+        # miniature, CDN) est confié à la file des médias
+        media = serializer.save(moderation_details={'pipeline': MediaPipeline.initial_state(self.request.user)})
+        # Un doublon reprend le traitement de son original
+        if media.duplicate_of_id is None:
+            MediaPipeline.start(media, self.request.user)
 
 
 class MediaListView(generics.ListAPIView):
@@ -184,7 +111,7 @@ class MediaListView(generics.ListAPIView):
     
     def get_queryset(self):
         return Media.objects.filter(
-            approval_status='approved',
+            approval_status__in=Media.publishable_statuses(),
             is_appropriate=True
         ).order_by('-created_at')
 
@@ -285,96 +212,19 @@ class LiveStreamView(generics.GenericAPIView):
             stream_key = f"live_{post.author.id}_"  # Utiliser author au lieu de user
             LiveStreamingService.stop_stream(stream_key)
             
-            # Récupérer les données de la vidéo enregistrée
-            video_data = request.data.get('video_data', {})
-            video_url = video_data.get('url')
-            video_duration = video_data.get('duration', 0)
-            video_size = video_data.get('size', 0)
-            
-            # Si une vidéo a été enregistrée, la sauvegarder
-            media = None
-            if video_url:
-                logger.info(f"Sauvegarde de la vidéo enregistrée pour le live {live_id}")
-                
-                try:
-                    # Convertir la durée en secondes en timedelta
-                    # S'assurer que video_duration est un nombre
-                    if isinstance(video_duration, (int, float)):
-                        duration_timedelta = timedelta(seconds=int(video_duration))
-                    else:
-                        # Valeur par défaut si la durée n'est pas valide
-                        duration_timedelta = timedelta(seconds=1)
-                        logger.warning(f"Durée vidéo invalide: {video_duration}, utilisation de la valeur par défaut")
-                    
-                    # Si c'est une URL blob, on va la convertir en fichier
-                    if video_url.startswith('blob:'):
-                        logger.info("Conversion de l'URL blob en fichier...")
-                        
-                        # Créer un nom de fichier unique
-                        import uuid
-                        import base64
-                        from django.core.files.base import ContentFile
-                        
-                        # Extraire les données base64 de l'URL blob
-                        # Note: En production, il faudrait recevoir les données directement
-                        video_filename = f"live_video_{live_id}_{uuid.uuid4().hex[:8]}.webm"
-                        
-                        # Créer un objet Media avec un fichier temporaire
-                        media = Media.objects.create(
-                            title=f"Vidéo du live - {post.content}",
-                            description=f"Vidéo enregistrée du live '{post.content}'",
-                            media_type='video',
-                            file_size=video_size,
-                            duration=duration_timedelta,
-                            is_live_recording=True,
-                            live_post=post
-                        )
-                        
-                        # Pour l'instant, on sauvegarde l'URL blob comme cdn_url
-                        # En production, on ferait un vrai upload de fichier
-                        media.cdn_url = video_url
-                        media.save()
-                        
-                        logger.info(f"Vidéo sauvegardée avec ID: {media.id} (URL blob temporaire)")
-                    else:
-                        # Si c'est déjà une URL permanente
-                        media = Media.objects.create(
-                            title=f"Vidéo du live - {post.content}",
-                            description=f"Vidéo enregistrée du live '{post.content}'",
-                            media_type='video',
-                            cdn_url=video_url,
-                            file_size=video_size,
-                            duration=duration_timedelta,
-                            is_live_recording=True,
-                            live_post=post
-                        )
-                        logger.info(f"Vidéo sauvegardée avec ID: {media.id}")
-                    
-                    # Associer la vidéo au post
-                    post.media_files.add(media)
-                    
-                    # Mettre à jour le contenu du post
-                    post.content = f"{post.content}\n\n📹 Vidéo enregistrée disponible"
-                    
-                except Exception as video_error:
-                    logger.error(f"Erreur lors de la sauvegarde de la vidéo: {str(video_error)}")
-                    # Continuer sans la vidéo plutôt que d'échouer complètement
+            # L'enregistrement est envoyé séparément, par morceaux (voir LiveUploadSessionView)
             
             # Marquer le post comme non-live
             post.is_live_post = False
+            # La sauvegarde invalide les caches du post (voir posts.signals)
+            # pour que la vidéo apparaisse immédiatement
             post.save()
             
-            # Invalider le cache des posts pour que la vidéo apparaisse immédiatement
-            from django.core.cache import cache
-            user = request.user
-            cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-            cache.delete(cache_key)
-            
             logger.info(f"Live {live_id} arrêté avec succès")
             return Response({
                 'message': 'Live arrêté',
-                'video_saved': bool(video_url),
-                'video_id': media.id if media else None
+                'video_saved': post.live_stream_id is not None,
+                'video_id': post.live_stream_id
             })
             
         except Exception as e:
@@ -390,7 +240,7 @@ class LiveStreamView(generics.GenericAPIView):
         summary="Lister les posts",
         description="""
         Récupère la liste des posts avec :
-        - Pagination automatique (20 posts par page)
+        - Pagination par curseur (20 posts par page, paramètre `cursor`)
         - Filtrage par quartier de l'utilisateur
         - Tri par date de création (plus récent en premier)
         - Inclut les médias, likes et commentaires
@@ -398,10 +248,16 @@ class LiveStreamView(generics.GenericAPIView):
         tags=['posts'],
         parameters=[
             OpenApiParameter(
-                name='page',
-                type=OpenApiTypes.INT,
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Curseur opaque retourné dans les liens next/previous'
+            ),
+            OpenApiParameter(
+                name='sort',
+                type=OpenApiTypes.STR,
                 location=OpenApiParameter.QUERY,
-                description='Numéro de page'
+                description='Tri : -created_at (défaut), created_at, -likes_count, likes_count'
             ),
             OpenApiParameter(
                 name='post_type',
@@ -444,10 +300,10 @@ class LiveStreamView(generics.GenericAPIView):
         ]
     )
 )
-@method_decorator(cache_page(60 * 5), name='dispatch')  # Cache 5 minutes
 class PostListView(generics.ListCreateAPIView):
     """Vue pour lister et créer des posts"""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
     throttle_scope = 'posts'  # Rate limiting spécifique
     
     def get_serializer_class(self):
@@ -456,64 +312,56 @@ class PostListView(generics.ListCreateAPIView):
         return PostSerializer
     
     def get_queryset(self):
-        try:
-            user = self.request.user
-            
-            # Clé de cache unique par utilisateur et paramètres
-            cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-            
-            # Essayer de récupérer depuis le cache
-            cached_queryset = cache.get(cache_key)
-            if cached_queryset is not None:
-                return cached_queryset
-            
-            # Vérifier si l'utilisateur a un quartier
-            if not user.quartier:
-                # Si pas de quartier, retourner tous les posts
-                queryset = Post.objects.all()
-            else:
-                # Requête optimisée avec prefetch intelligent
-                queryset = Post.objects.filter(
-                    quartier__commune=user.quartier.commune
-                )
-            
-            # Appliquer les optimisations communes avec gestion d'erreur
-            queryset = queryset.select_related(
-                'author', 
-                'quartier', 
-                'quartier__commune'
-            ).prefetch_related(
-                Prefetch(
-                    'comments',
-                    queryset=PostComment.objects.select_related('author').filter(
-                        parent_comment__isnull=True
-                    ).order_by('-created_at')[:10],  # Limiter à 10 commentaires récents
-                    to_attr='recent_comments'
-                ),
-                Prefetch(
-                    'likes',
-                    queryset=PostLike.objects.select_related('user').order_by('-created_at')[:20],
-                    to_attr='recent_likes'
-                ),
-                'media_files'
-            ).annotate(
-                likes_count_annotated=Count('likes'),
-                comments_count_annotated=Count('comments', filter=Q(comments__parent_comment__isnull=True)),
-                shares_count_annotated=Count('shares')
-            ).order_by('-created_at')
-            
-            # Mettre en cache pour 5 minutes
-            cache.set(cache_key, queryset, 300)
-            
-            return queryset
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération du queryset: {str(e)}")
-            # Fallback vers une requête simple en cas d'erreur
-            return Post.objects.select_related('author', 'quartier').order_by('-created_at')[:20]
+        user = self.request.user
+        
+        # Vérifier si l'utilisateur a un quartier
+        if not user.quartier:
+            # Si pas de quartier, retourner tous les posts
+            queryset = Post.objects.all()
+        else:
+            queryset = Post.objects.filter(
+                quartier__commune=user.quartier.commune
+            )
+        
+        return self.optimize_queryset(queryset).order_by('-created_at')
+    
+    def optimize_queryset(self, queryset):
+        """Charge en lot les relations utilisées par le sérialiseur"""
+        return PostSerializer.optimize_queryset(queryset)
+    
+    def get_keyset_ordering(self, request):
+        """Clé de tri composée utilisée par la pagination par curseur"""
+        sort_by = request.GET.get('sort', '-created_at')
+        if sort_by == 'created_at':
+            return ('created_at', 'id')
+        if sort_by == 'likes_count':
+            return ('likes_count', 'created_at', 'id')
+        if sort_by == '-likes_count':
+            return ('-likes_count', '-created_at', '-id')
+        return ('-created_at', '-id')
+    
+    def use_commune_feed(self, request):
+        """Le fil précalculé sert l'ordre par défaut, sans filtre, pour les utilisateurs rattachés à un quartier"""
+        if not request.user.quartier:
+            return False
+        if request.GET.get('type'):
+            return False
+        return self.get_keyset_ordering(request) == ('-created_at', '-id')
     
     def list(self, request, *args, **kwargs):
         try:
+            if self.use_commune_feed(request):
+                # Fil précalculé : une lecture de cache + une requête bornée pour la page
+                feed = CommuneFeedService.get_feed(request.user.quartier.commune_id)
+                hydrate_queryset = self.optimize_queryset(Post.objects.all())
+                posts = self.paginator.paginate_id_window(
+                    feed.ids, feed.complete, request, view=self,
+                    hydrate=lambda ids: CommuneFeedService.hydrate(ids, hydrate_queryset)
+                )
+                if posts is not None:
+                    serializer = self.get_serializer(posts, many=True)
+                    return self.get_paginated_response(serializer.data)
+            
             queryset = self.get_queryset()
             
             # Filtres
@@ -526,20 +374,13 @@ class PostListView(generics.ListCreateAPIView):
                     # Pour les autres types, filtrer par post_type
                     queryset = queryset.filter(post_type=post_type)
             
-            # Tri
-            sort_by = request.GET.get('sort', '-created_at')
-            if sort_by in ['created_at', '-created_at', 'likes_count', '-likes_count']:
-                queryset = queryset.order_by(sort_by)
-            
-            # Pagination
+            # Pagination par curseur (le tri est appliqué par le paginateur)
             page = self.paginate_queryset(queryset)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
             
+        except NotFound:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des posts: {str(e)}")
             return Response(
@@ -550,13 +391,9 @@ class PostListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         try:
             logger.info(f"Tentative de création de post par l'utilisateur {self.request.user.username}")
+            # Le fil de la commune est mis à jour par le signal post_save
             post = serializer.save()
             
-            # Invalider le cache des posts
-            user = self.request.user
-            cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-            cache.delete(cache_key)
-            
             logger.info(f"Post créé avec succès: {post.id}")
             return post
         except Exception as e:
@@ -600,20 +437,25 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
         )
     
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        
-        # Cache pour les détails du post
-        cache_key = f"post_detail_{instance.id}"
-        cached_data = cache.get(cache_key)
+        # Cache par lecteur (is_liked_by_user, is_following), invalidé par tags :
+        # un succès de cache ne touche pas la base de données
+        post_id = self.kwargs.get('pk')
+        cache_key = f"{CacheService.get_post_detail_cache_key(post_id)}_{request.user.id}"
+        cached_data = TaggedCacheService.get(cache_key)
         
         if cached_data is None:
-            # Incrémenter le compteur de vues
-            instance.increment_views()
+            instance = self.get_object()
+            EngagementCounterService.apply_pending([instance])
             serializer = self.get_serializer(instance)
             cached_data = serializer.data
-            # Mettre en cache pour 2 minutes
-            cache.set(cache_key, cached_data, 120)
+            TaggedCacheService.set(
+                cache_key, cached_data,
+                TaggedCacheService.get_post_detail_tags(instance),
+                TaggedCacheService.get_timeout('post_detail', 120)
+            )
         
+        # Incrémenter le compteur de vues (tamponné, sans écriture de la ligne)
+        EngagementCounterService.increment(cached_data['id'], 'views_count')
         return Response(cached_data)
     
     def perform_update(self, serializer):
@@ -631,28 +473,16 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
                 "Vous ne pouvez plus modifier ce post. La limite de 30 minutes est dépassée."
             )
         
-        post = serializer.save()
-        
-        # Invalider les caches
-        cache.delete(f"post_detail_{post.id}")
-        user = self.request.user
-        cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-        cache.delete(cache_key)
+        # Les caches du post sont invalidés par tags (voir posts.signals)
+        serializer.save()
     
     def perform_destroy(self, instance):
         # Vérifier que l'utilisateur est l'auteur du post
         if instance.author != self.request.user:
             raise permissions.PermissionDenied("Vous ne pouvez supprimer que vos propres posts")
         
-        post_id = instance.id
-        user = self.request.user
-        
+        # Les caches du post sont invalidés par tags (voir posts.signals)
         instance.delete()
-        
-        # Invalider les caches
-        cache.delete(f"post_detail_{post_id}")
-        cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-        cache.delete(cache_key)
 
 
 class PostLikeView(generics.CreateAPIView, generics.DestroyAPIView):
@@ -680,12 +510,6 @@ class PostLikeView(generics.CreateAPIView, generics.DestroyAPIView):
         like = PostLike.objects.create(post=post, user=request.user)
         post.increment_likes()
         
-        # Invalider les caches
-        cache.delete(f"post_detail_{post_id}")
-        user = request.user
-        cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-        cache.delete(cache_key)
-        
         serializer = self.get_serializer(like)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -699,12 +523,6 @@ class PostLikeView(generics.CreateAPIView, generics.DestroyAPIView):
             like.delete()
             post.decrement_likes()
             
-            # Invalider les caches
-            cache.delete(f"post_detail_{post_id}")
-            user = request.user
-            cache_key = f"posts_list_{user.id}_{user.quartier.id if user.quartier else 'none'}"
-            cache.delete(cache_key)
-            
             return Response(status=status.HTTP_204_NO_CONTENT)
         except PostLike.DoesNotExist:
             return Response(
@@ -717,14 +535,20 @@ class PostCommentView(generics.ListCreateAPIView):
     """Vue pour lister et créer des commentaires sur un post"""
     serializer_class = PostCommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    
+    def get_keyset_ordering(self, request):
+        """Les fils de discussion se lisent du plus ancien au plus récent"""
+        return ('created_at', 'id')
     
     def get_queryset(self):
         post_id = self.kwargs.get('pk')
         # Retourner seulement les commentaires de premier niveau (pas de parent)
+        # Les réponses sont chargées en une requête par PostCommentListSerializer
         return PostComment.objects.filter(
             post_id=post_id, 
             parent_comment__isnull=True
-        ).select_related('author').prefetch_related('replies__author')
+        ).select_related('author__quartier__commune')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -825,12 +649,11 @@ class UserPostsView(generics.ListAPIView):
     """Vue pour lister les posts d'un utilisateur"""
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
     
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Post.objects.filter(author_id=user_id).select_related('author', 'quartier').prefetch_related(
-            'media_files', 'live_stream'
-        )
+        return PostSerializer.optimize_queryset(Post.objects.filter(author_id=user_id))
 
 
 class PostIncrementViewsView(generics.GenericAPIView):
@@ -840,8 +663,7 @@ class PostIncrementViewsView(generics.GenericAPIView):
     
     def post(self, request, pk):
         post = get_object_or_404(Post, pk=pk)
-        post.views_count += 1
-        post.save()
+        post.increment_views()
         return Response({'message': 'Vue incrémentée'}, status=status.HTTP_200_OK)
 
 
@@ -1182,77 +1004,111 @@ class LiveChatView(generics.GenericAPIView):
             return Response(
                 {'error': 'Erreur lors de la récupération des messages'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
+            )
 
 
-class LiveVideoUploadView(generics.GenericAPIView):
-    """Vue pour uploader les vidéos de live enregistrées"""
+class LiveUploadBaseView(generics.GenericAPIView):
+    """Base des vues d'envoi par morceaux des enregistrements de live"""
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = MediaSerializer
+    serializer_class = LiveUploadSessionSerializer
+    
+    def get_queryset(self):
+        return LiveUploadSession.objects.filter(user=self.request.user)
+    
+    def get_session(self, upload_id):
+        return get_object_or_404(self.get_queryset(), id=upload_id)
+    
+    def error_response(self, error):
+        return Response({'error': error.message, **error.extra}, status=error.status_code)
+
+
+@extend_schema_view(
+    post=extend_schema(
+        summary="Ouvrir l'envoi d'un enregistrement de live",
+        description="""
+        Ouvre une session d'envoi reprenable de la vidéo enregistrée pendant un
+        live. Le fichier est ensuite envoyé par morceaux numérotés de
+        `chunk_size` octets (voir `live/uploads/{upload_id}/chunks/{index}/`),
+        puis finalisé par `live/uploads/{upload_id}/complete/`.
+        """,
+        tags=['live']
+    )
+)
+class LiveUploadSessionView(LiveUploadBaseView):
+    """Ouverture d'une session d'envoi"""
     
     def post(self, request, live_id):
-        """Uploader une vidéo de live enregistrée"""
+        post = get_object_or_404(Post, id=live_id, author=request.user)
+        serializer = LiveUploadSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        session = LiveUploadService.create_session(request.user, post, **serializer.validated_data)
+        return Response(LiveUploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class LiveUploadDetailView(LiveUploadBaseView):
+    """Avancement d'une session (reprise après coupure) et abandon"""
+    
+    def get(self, request, upload_id):
+        return Response(self.get_serializer(self.get_session(upload_id)).data)
+    
+    def delete(self, request, upload_id):
+        LiveUploadService.abort(self.get_session(upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema_view(
+    put=extend_schema(
+        summary="Envoyer un morceau d'enregistrement",
+        description="""
+        Corps brut (`application/octet-stream`) du morceau `index`, numéroté à
+        partir de 0, avec son empreinte SHA-256 hexadécimale dans l'en-tête
+        `X-Chunk-SHA256`. Les morceaux sont acceptés dans l'ordre ; un morceau
+        déjà reçu peut être renvoyé sans effet. En cas de refus (409), la
+        réponse indique `next_chunk`, le morceau à envoyer.
+        """,
+        tags=['live']
+    )
+)
+class LiveUploadChunkView(LiveUploadBaseView):
+    """Réception d'un morceau"""
+    
+    def put(self, request, upload_id, index):
+        session = self.get_session(upload_id)
         try:
-            logger.info(f"Tentative d'upload vidéo pour le live {live_id}")
-            
-            # Chercher le post live
-            try:
-                post = Post.objects.get(id=live_id, is_live_post=True)
-            except Post.DoesNotExist:
-                return Response(
-                    {'error': 'Post live non trouvé'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Récupérer le fichier vidéo
-            video_file = request.FILES.get('video')
-            if not video_file:
-                return Response(
-                    {'error': 'Fichier vidéo requis'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Vérifier le type de fichier
-            allowed_types = ['video/webm', 'video/mp4', 'video/quicktime']
-            if video_file.content_type not in allowed_types:
-                return Response(
-                    {'error': 'Type de fichier non supporté'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Créer le média
-            media = Media.objects.create(
-                title=f"Vidéo du live - {post.content}",
-                description=f"Vidéo enregistrée du live '{post.content}'",
-                media_type='video',
-                file=video_file,  # Django gère automatiquement l'upload
-                file_size=video_file.size,
-                is_live_recording=True,
-                live_post=post,
-                duration=timedelta(seconds=5)  # Durée par défaut plus réaliste pour les lives
+            session = LiveUploadService.append_chunk(
+                session.id, index, request.stream or ContentFile(b''), request.headers.get('X-Chunk-SHA256')
             )
-            
-            # Associer la vidéo au post
-            post.media_files.add(media)
-            
-            # Associer la vidéo au champ live_stream du post
-            post.live_stream = media
-            post.save()
-            
-            # Mettre à jour le contenu du post
-            post.content = f"{post.content}\n\n📹 Vidéo enregistrée disponible"
-            post.save()
-            
-            logger.info(f"Vidéo uploadée avec succès: {media.id}")
-            return Response({
-                'message': 'Vidéo uploadée avec succès',
-                'media_id': media.id,
-                'file_url': media.file.url if media.file else None
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'upload vidéo: {str(e)}")
-            return Response(
-                {'error': 'Erreur lors de l\'upload de la vidéo'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
\ No newline at end of file
+        except LiveUploadError as e:
+            return self.error_response(e)
+        return Response({'next_chunk': session.next_chunk, 'received_bytes': session.received_bytes})
+
+
+@extend_schema_view(
+    post=extend_schema(
+        summary="Finaliser l'envoi d'un enregistrement",
+        description="""
+        Crée le média à partir des morceaux reçus, l'associe au live et lance
+        son traitement en arrière-plan (transcodage, miniature, CDN). Le
+        paramètre optionnel `sha256` vérifie l'empreinte du fichier complet.
+        """,
+        tags=['live']
+    )
+)
+class LiveUploadCompleteView(LiveUploadBaseView):
+    """Finalisation d'une session"""
+    
+    def post(self, request, upload_id):
+        session = self.get_session(upload_id)
+        try:
+            session = LiveUploadService.complete(session.id, request.data.get('sha256'))
+        except LiveUploadError as e:
+            return self.error_response(e)
+        
+        media = session.media
+        return Response({
+            'message': 'Vidéo reçue, traitement en cours',
+            'media_id': media.id if media else None,
+            'file_url': media.file_url if media else None,
+            'approval_status': media.approval_status if media else None
+        }, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,302 @@
+"""
+Moteurs de l'index plein texte.
+
+Les documents (``SearchDocument``) contiennent déjà des termes normalisés
+(search.text) ; chaque moteur se contente de les indexer et de les classer :
+
+- ``SQLiteFTSBackend`` : table virtuelle FTS5 ``search_fts`` (rowid = id du
+  document), classement BM25 avec le titre pondéré ;
+- ``PostgresBackend`` : index GIN sur le ``tsvector`` des termes (titre
+  pondéré A, corps B), classement ``ts_rank`` ;
+- ``PythonBackend`` : index inversé en mémoire, pour les autres bases. Chaque
+  processus le charge au premier usage puis relit les documents modifiés
+  quand la version partagée dans le cache change.
+
+La table FTS5 et l'index GIN sont créés par la migration 0001 selon la base.
+"""
+import bisect
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from .models import SearchDocument
+from .text import stem
+
+logger = logging.getLogger(__name__)
+
+
+TITLE_WEIGHT = 3.0
+FTS_TABLE = 'search_fts'
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', title_terms), 'A') || "
+    "setweight(to_tsvector('simple', body_terms), 'B')"
+)
+
+
+class SearchBackend:
+    """Interface des moteurs de recherche"""
+
+    name = None
+
+    def index(self, document):
+        """Indexe un document (ou le retire s'il est vide)"""
+        raise NotImplementedError
+
+    def search(self, content_types, terms, prefix, offset, limit):
+        """Renvoie le nombre total de résultats et la page ``[(content_type, object_id, score)]``"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Reconstruit l'index à partir de tous les documents"""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Index FTS5 de SQLite"""
+
+    name = 'sqlite'
+
+    @staticmethod
+    def available():
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            return FTS_TABLE in connection.introspection.table_names(cursor)
+
+    def index(self, document):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [document.id])
+            if not document.is_deleted:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)",
+                    [document.id, document.title_terms, document.body_terms]
+                )
+
+    def search(self, content_types, terms, prefix, offset, limit):
+        # Termes entre guillemets : aucun n'est interprété comme opérateur FTS5
+        clauses = [f'"{term}"' for term in terms]
+        if prefix:
+            clauses.append(f'("{prefix}"* OR "{stem(prefix)}")')
+        match = ' AND '.join(clauses)
+        placeholders = ', '.join(['%s'] * len(content_types))
+        where = (
+            f"{FTS_TABLE} MATCH %s AND document.content_type IN ({placeholders})"
+        )
+        source = (
+            f"FROM {FTS_TABLE} JOIN search_searchdocument AS document "
+            f"ON document.id = {FTS_TABLE}.rowid"
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {source} WHERE {where}", [match, *content_types])
+            total = cursor.fetchone()[0]
+            if not total:
+                return 0, []
+            cursor.execute(
+                f"SELECT document.content_type, document.object_id, bm25({FTS_TABLE}, %s, 1.0) AS rank "
+                f"{source} WHERE {where} ORDER BY rank LIMIT %s OFFSET %s",
+                [TITLE_WEIGHT, match, *content_types, limit, offset]
+            )
+            # BM25 de FTS5 : plus petit = plus pertinent
+            return total, [(content_type, object_id, -rank) for content_type, object_id, rank in cursor.fetchall()]
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, title, body) "
+                f"SELECT id, title_terms, body_terms FROM search_searchdocument "
+                f"WHERE title_terms != '' OR body_terms != ''"
+            )
+
+
+class PostgresBackend(SearchBackend):
+    """Recherche ``tsvector`` de PostgreSQL (index GIN sur les termes des documents)"""
+
+    name = 'postgres'
+
+    @staticmethod
+    def available():
+        return connection.vendor == 'postgresql'
+
+    def index(self, document):
+        # La ligne du document porte l'index : rien à faire
+        pass
+
+    def search(self, content_types, terms, prefix, offset, limit):
+        clauses = list(terms)
+        if prefix:
+            clauses.append(f'({prefix}:* | {stem(prefix)})')
+        tsquery = ' & '.join(clauses)
+        placeholders = ', '.join(['%s'] * len(content_types))
+        where = (
+            f"({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s) AND content_type IN ({placeholders})"
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM search_searchdocument WHERE {where}", [tsquery, *content_types])
+            total = cursor.fetchone()[0]
+            if not total:
+                return 0, []
+            cursor.execute(
+                f"SELECT content_type, object_id, ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s)) AS rank "
+                f"FROM search_searchdocument WHERE {where} ORDER BY rank DESC LIMIT %s OFFSET %s",
+                [tsquery, tsquery, *content_types, limit, offset]
+            )
+            return total, cursor.fetchall()
+
+    def rebuild(self):
+        pass
+
+
+class PythonBackend(SearchBackend):
+    """Index inversé en mémoire (terme -> {document: poids})"""
+
+    name = 'python'
+    VERSION_KEY = 'search_index_version'
+    GENERATION_KEY = 'search_index_generation'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.vocabulary = []
+        self.vocabulary_dirty = False
+        self.version = None
+        self.generation = None
+        self.synced_at = None
+
+    @staticmethod
+    def available():
+        return True
+
+    def get_cache(self):
+        return caches['default']
+
+    def index(self, document):
+        with self.lock:
+            self._ensure_loaded()
+            self._index(document)
+        # Prévenir les autres processus
+        cache = self.get_cache()
+        cache.add(self.VERSION_KEY, 0, None)
+        version = cache.incr(self.VERSION_KEY)
+        with self.lock:
+            if self.version == version - 1:
+                self.version = version
+
+    def search(self, content_types, terms, prefix, offset, limit):
+        with self.lock:
+            self._ensure_loaded()
+            if not terms and not prefix:
+                return 0, []
+
+            # Intersection des documents contenant chaque terme
+            groups = [self.postings.get(term, {}) for term in terms]
+            if prefix:
+                groups.append(self._prefix_postings(prefix))
+
+            total_documents = max(len(self.documents), 1)
+            scores = None
+            for postings in sorted(groups, key=len):
+                idf = math.log(1 + total_documents / (len(postings) or 1))
+                if scores is None:
+                    scores = {key: weight * idf for key, weight in postings.items()}
+                else:
+                    scores = {
+                        key: score + postings[key] * idf
+                        for key, score in scores.items() if key in postings
+                    }
+                if not scores:
+                    return 0, []
+
+            types = set(content_types)
+            matches = [(key, score) for key, score in scores.items() if key[0] in types]
+
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        page = matches[offset:offset + limit]
+        return len(matches), [(content_type, object_id, score) for (content_type, object_id), score in page]
+
+    def rebuild(self):
+        # Les autres processus rechargent tout l'index (documents supprimés)
+        cache = self.get_cache()
+        cache.add(self.GENERATION_KEY, 0, None)
+        cache.incr(self.GENERATION_KEY)
+        with self.lock:
+            self.reset()
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        """Charge l'index, ou relit les documents modifiés si la version partagée a changé"""
+        cache = self.get_cache()
+        shared = cache.get_many([self.VERSION_KEY, self.GENERATION_KEY])
+        version = shared.get(self.VERSION_KEY, 0)
+        generation = shared.get(self.GENERATION_KEY, 0)
+        if generation != self.generation:
+            self.reset()
+            self.generation = generation
+        elif self.synced_at is not None and version == self.version:
+            return
+
+        started_at = timezone.now()
+        documents = SearchDocument.objects.all()
+        if self.synced_at is not None:
+            # Marge : documents enregistrés pendant la précédente relecture
+            documents = documents.filter(updated_at__gte=self.synced_at - timedelta(seconds=5))
+        for document in documents.iterator(chunk_size=2000):
+            self._index(document)
+        self.synced_at = started_at
+        self.version = version
+
+    def _index(self, document):
+        key = (document.content_type, document.object_id)
+        for term in self.documents.pop(key, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[term]
+                    self.vocabulary_dirty = True
+        if document.is_deleted:
+            return
+
+        weights = defaultdict(float)
+        for term in document.title_terms.split():
+            weights[term] += TITLE_WEIGHT
+        for term in document.body_terms.split():
+            weights[term] += 1.0
+        # Normalisation par la longueur du document
+        norm = 1 / math.sqrt(sum(weights.values()))
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self.vocabulary_dirty = True
+            self.postings[term][key] = weight * norm
+        self.documents[key] = tuple(weights)
+
+    def _prefix_postings(self, prefix):
+        """Documents contenant un terme commençant par ``prefix`` ou égal à sa racine"""
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+
+        merged = dict(self.postings.get(stem(prefix), {}))
+        position = bisect.bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            for key, weight in self.postings[self.vocabulary[position]].items():
+                merged[key] = max(weight, merged.get(key, 0))
+            position += 1
+        return merged
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgres': PostgresBackend,
+    'python': PythonBackend,
+}
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from search.services import SEARCH_TYPES, SearchService
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (posts, alertes, demandes d'aide, utilisateurs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', action='append', choices=list(SEARCH_TYPES), dest='types',
+            help="Type de contenu à réindexer (tous par défaut, option répétable)"
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Documents écrits par lot")
+
+    def handle(self, *args, **options):
+        count = SearchService.rebuild(options['types'], batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} documents indexés')
+        )
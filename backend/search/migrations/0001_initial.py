@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """Table FTS5 sous SQLite, index GIN sur le tsvector sous PostgreSQL"""
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts "
+                "USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compilé sans FTS5 : l'index en mémoire prend le relais
+            pass
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS search_document_vector ON search_searchdocument USING GIN (("
+            "setweight(to_tsvector('simple', title_terms), 'A') || "
+            "setweight(to_tsvector('simple', body_terms), 'B')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS search_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS search_document_vector")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_type', models.CharField(max_length=20, verbose_name='Type de contenu')),
+                ('object_id', models.CharField(max_length=64)),
+                ('title_terms', models.TextField(blank=True)),
+                ('body_terms', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Document indexé',
+                'verbose_name_plural': 'Documents indexés',
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
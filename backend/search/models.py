@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """Document de l'index plein texte : termes normalisés d'un objet indexé"""
+
+    content_type = models.CharField(max_length=20, verbose_name="Type de contenu")
+    object_id = models.CharField(max_length=64)
+
+    # Termes normalisés (search.text), séparés par des espaces ; vides pour
+    # un objet supprimé (les index en mémoire des autres processus s'alignent)
+    title_terms = models.TextField(blank=True)
+    body_terms = models.TextField(blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = ['content_type', 'object_id']
+        verbose_name = "Document indexé"
+        verbose_name_plural = "Documents indexés"
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id}"
+
+    @property
+    def is_deleted(self):
+        return not self.title_terms and not self.body_terms
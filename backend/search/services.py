@@ -0,0 +1,220 @@
+"""
+Recherche plein texte commune aux posts, alertes, demandes d'aide et utilisateurs.
+
+Chaque type de contenu (``SEARCH_TYPES``) déclare les champs de son titre et
+de son corps ; ``SearchService.index_object`` en tire un ``SearchDocument``
+de termes normalisés (search.text), tenu à jour par les signaux
+(search.signals) à chaque enregistrement. Le moteur (search.backends) est
+choisi selon ``SEARCH_BACKEND`` : FTS5 sous SQLite, ``tsvector`` sous
+PostgreSQL, index en mémoire sinon.
+"""
+import logging
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.module_loading import import_string
+from .backends import BACKENDS
+from .models import SearchDocument
+from .text import parse_query, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_TYPES = {
+    'post': {
+        'model': 'posts.Post',
+        'title': ('title',),
+        'body': ('content',),
+        'serializer': 'posts.serializers.PostSerializer',
+    },
+    'alert': {
+        'model': 'notifications.CommunityAlert',
+        'title': ('title',),
+        'body': ('description', 'address', 'neighborhood', 'city'),
+        'serializer': 'notifications.serializers.CommunityAlertListSerializer',
+    },
+    'help_request': {
+        'model': 'help_requests.HelpRequest',
+        'title': ('title',),
+        'body': ('description', 'address', 'neighborhood', 'city'),
+        'serializer': 'help_requests.serializers.HelpRequestListSerializer',
+    },
+    'user': {
+        'model': 'users.User',
+        'title': ('username', 'first_name', 'last_name'),
+        # Partie locale de l'adresse seulement : le domaine ne distingue personne
+        'body': ('email',),
+        'filter': {'is_active': True},
+        'serializer': 'users.serializers.UserSearchSerializer',
+    },
+}
+
+_backends = {}
+
+
+def get_search_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SearchService:
+    """Indexation et recherche classée et paginée"""
+
+    @staticmethod
+    def get_backend():
+        """Moteur configuré (``auto`` : le plus performant disponible pour la base)"""
+        name = get_search_setting('SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            name = next(
+                candidate for candidate in ('sqlite', 'postgres', 'python')
+                if BACKENDS[candidate].available()
+            )
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+            logger.info(f"Moteur de recherche: {name}")
+        return _backends[name]
+
+    @staticmethod
+    def get_model(content_type):
+        return apps.get_model(SEARCH_TYPES[content_type]['model'])
+
+    @staticmethod
+    def get_indexed_fields(content_type):
+        """Champs dont la modification impose de réindexer l'objet"""
+        config = SEARCH_TYPES[content_type]
+        return set(config['title']) | set(config['body']) | set(config.get('filter', {}))
+
+    @staticmethod
+    def get_queryset(content_type):
+        """Objets indexables (et visibles dans les résultats) d'un type"""
+        return SearchService.get_model(content_type).objects.filter(**SEARCH_TYPES[content_type].get('filter', {}))
+
+    @staticmethod
+    def document_terms(content_type, obj):
+        """Termes normalisés du titre et du corps d'un objet"""
+        config = SEARCH_TYPES[content_type]
+
+        def terms(fields):
+            values = []
+            for field in fields:
+                value = getattr(obj, field, '') or ''
+                if field == 'email':
+                    value = value.split('@')[0]
+                values.append(str(value))
+            return ' '.join(tokenize(' '.join(values)))
+
+        return terms(config['title']), terms(config['body'])
+
+    @staticmethod
+    def index_object(content_type, obj):
+        """Crée ou met à jour le document d'un objet (retiré s'il n'est plus indexable)"""
+        if any(getattr(obj, field) != value for field, value in SEARCH_TYPES[content_type].get('filter', {}).items()):
+            return SearchService.remove_object(content_type, obj.pk)
+
+        title_terms, body_terms = SearchService.document_terms(content_type, obj)
+        document, _ = SearchDocument.objects.update_or_create(
+            content_type=content_type,
+            object_id=str(obj.pk),
+            defaults={'title_terms': title_terms, 'body_terms': body_terms}
+        )
+        SearchService.get_backend().index(document)
+        return document
+
+    @staticmethod
+    def remove_object(content_type, object_id):
+        """Vide le document d'un objet supprimé (les index en mémoire le retirent à leur relecture)"""
+        document = SearchDocument.objects.filter(content_type=content_type, object_id=str(object_id)).first()
+        if document is None:
+            return None
+        document.title_terms = ''
+        document.body_terms = ''
+        document.save(update_fields=['title_terms', 'body_terms', 'updated_at'])
+        SearchService.get_backend().index(document)
+        return document
+
+    @staticmethod
+    def search(query, content_types=None, offset=0, limit=20):
+        """
+        Recherche ``query`` dans les types demandés (tous par défaut).
+        Renvoie le nombre total de résultats et la page ``[(content_type, object_id, score)]``.
+        """
+        content_types = [content_type for content_type in (content_types or SEARCH_TYPES) if content_type in SEARCH_TYPES]
+        terms, prefix = parse_query(query)
+        if not content_types or (not terms and not prefix):
+            return 0, []
+        return SearchService.get_backend().search(content_types, terms, prefix, offset, limit)
+
+    @staticmethod
+    def search_ids(content_type, query, limit=None):
+        """Identifiants des objets d'un type correspondant à ``query``, par pertinence"""
+        limit = limit or get_search_setting('SEARCH_MAX_MATCHES', 1000)
+        _, hits = SearchService.search(query, [content_type], 0, limit)
+        return [object_id for _, object_id, _ in hits]
+
+    @staticmethod
+    def filter_queryset(queryset, content_type, query):
+        """
+        Restreint un queryset aux objets correspondant à ``query`` et l'annote
+        de leur rang (``search_rank``, 0 = le plus pertinent).
+        """
+        ids = SearchService.search_ids(content_type, query)
+        if not ids:
+            return queryset.none()
+        pk_field = queryset.model._meta.pk
+        ids = [pk_field.to_python(object_id) for object_id in ids]
+        return queryset.filter(pk__in=ids).annotate(
+            search_rank=Case(
+                *[When(pk=object_id, then=Value(rank)) for rank, object_id in enumerate(ids)],
+                output_field=IntegerField()
+            )
+        )
+
+    @staticmethod
+    def hydrate(hits, context=None):
+        """Objets sérialisés d'une page de résultats, dans l'ordre du classement"""
+        by_type = {}
+        for content_type, object_id, _ in hits:
+            by_type.setdefault(content_type, []).append(object_id)
+
+        serialized = {}
+        for content_type, object_ids in by_type.items():
+            # Objets devenus invisibles depuis leur indexation : ignorés
+            objects = SearchService.get_queryset(content_type).in_bulk(object_ids)
+            serializer_class = import_string(SEARCH_TYPES[content_type]['serializer'])
+            for pk, obj in objects.items():
+                serialized[(content_type, str(pk))] = serializer_class(obj, context=context or {}).data
+
+        results = []
+        for content_type, object_id, score in hits:
+            data = serialized.get((content_type, object_id))
+            if data is not None:
+                results.append({
+                    'type': content_type,
+                    'id': object_id,
+                    'score': round(float(score), 4),
+                    'object': data,
+                })
+        return results
+
+    @staticmethod
+    def rebuild(content_types=None, batch_size=500):
+        """Réindexe tous les objets des types demandés ; renvoie le nombre de documents"""
+        count = 0
+        for content_type in content_types or SEARCH_TYPES:
+            SearchDocument.objects.filter(content_type=content_type).delete()
+            documents = []
+            for obj in SearchService.get_queryset(content_type).iterator(chunk_size=batch_size):
+                title_terms, body_terms = SearchService.document_terms(content_type, obj)
+                documents.append(SearchDocument(
+                    content_type=content_type, object_id=str(obj.pk),
+                    title_terms=title_terms, body_terms=body_terms
+                ))
+                if len(documents) >= batch_size:
+                    SearchDocument.objects.bulk_create(documents)
+                    count += len(documents)
+                    documents = []
+            SearchDocument.objects.bulk_create(documents)
+            count += len(documents)
+
+        SearchService.get_backend().rebuild()
+        logger.info(f"Index de recherche reconstruit: {count} documents")
+        return count
@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from .services import SEARCH_TYPES, SearchService
+from .typeahead import TypeaheadService
+
+
+def connect_content_type(content_type):
+    """
+    Réindexe les objets d'un type à chaque enregistrement (après validation
+    de la transaction) et vide leur document à la suppression
+    """
+    indexed_fields = SearchService.get_indexed_fields(content_type)
+
+    def index_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+        # Enregistrement partiel sans champ indexé (last_login, compteurs...) : rien à faire
+        if raw or (update_fields and not indexed_fields & set(update_fields)):
+            return
+        transaction.on_commit(lambda: SearchService.index_object(content_type, instance))
+
+    def remove_on_delete(sender, instance, **kwargs):
+        object_id = instance.pk
+        transaction.on_commit(lambda: SearchService.remove_object(content_type, object_id))
+
+    model = apps.get_model(SEARCH_TYPES[content_type]['model'])
+    post_save.connect(index_on_save, sender=model, weak=False, dispatch_uid=f'search_index_{content_type}')
+    post_delete.connect(remove_on_delete, sender=model, weak=False, dispatch_uid=f'search_remove_{content_type}')
+
+
+for content_type in SEARCH_TYPES:
+    connect_content_type(content_type)
+
+
+TYPEAHEAD_USER_FIELDS = {'username', 'first_name', 'last_name', 'is_active'}
+
+
+def typeahead_user_changed(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Journalise l'utilisateur modifié pour l'index de complétion"""
+    if raw or (update_fields and not TYPEAHEAD_USER_FIELDS & set(update_fields)):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: TypeaheadService.user_changed(user_id))
+
+
+def typeahead_places_changed(sender, raw=False, **kwargs):
+    """Les lieux changent rarement : l'index est rechargé entièrement"""
+    if not raw:
+        transaction.on_commit(TypeaheadService.invalidate)
+
+
+User = apps.get_model('users', 'User')
+post_save.connect(typeahead_user_changed, sender=User, dispatch_uid='typeahead_user_saved')
+post_delete.connect(typeahead_user_changed, sender=User, dispatch_uid='typeahead_user_deleted')
+for place_model in ('Region', 'Prefecture', 'Commune', 'Quartier'):
+    model = apps.get_model('geography', place_model)
+    post_save.connect(typeahead_places_changed, sender=model, dispatch_uid=f'typeahead_{place_model.lower()}_saved')
+    post_delete.connect(typeahead_places_changed, sender=model, dispatch_uid=f'typeahead_{place_model.lower()}_deleted')
@@ -0,0 +1,235 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+import io
+
+from .models import SearchDocument
+from .services import SearchService
+from .text import parse_query, tokenize
+from .typeahead import PLACE_TYPES, PrefixIndex, TypeaheadService
+from geography.models import Quartier, Commune, Prefecture, Region
+from help_requests.models import HelpRequest
+from notifications.models import CommunityAlert
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTextTest(TestCase):
+    """Tests pour la normalisation du texte indexé"""
+
+    def test_accents_stopwords_and_plurals(self):
+        """Accents, mots vides, élisions et pluriels sont normalisés"""
+        self.assertEqual(tokenize("L'École des Enfants"), tokenize("ecole enfant"))
+        self.assertEqual(tokenize("Inondations"), tokenize("inondation"))
+        self.assertEqual(tokenize("le la les de du et"), [])
+
+    def test_query_keeps_last_word_as_prefix(self):
+        """Le dernier mot de la requête reste entier pour la recherche par préfixe"""
+        terms, prefix = parse_query("Coupures d'électri")
+        self.assertEqual(terms, tokenize("coupures"))
+        self.assertEqual(prefix, 'electri')
+
+
+class SearchServiceTest(TestCase):
+    """Tests pour l'index plein texte (FTS5 sous SQLite)"""
+
+    def setUp(self):
+        cache.clear()
+        self.region = Region.objects.create(nom="Conakry")
+        self.prefecture = Prefecture.objects.create(region=self.region, nom="Conakry")
+        self.commune = Commune.objects.create(prefecture=self.prefecture, nom="Kaloum")
+        self.quartier = Quartier.objects.create(commune=self.commune, nom="Centre-ville")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(
+                username='mamadou', email='mamadou.diallo@example.com', password='testpass123',
+                first_name='Mamadou', last_name='Diallo', quartier=self.quartier
+            )
+            self.title_post = Post.objects.create(
+                author=self.user, quartier=self.quartier, title="Inondation à Kaloum",
+                content="La route principale est coupée"
+            )
+            self.body_post = Post.objects.create(
+                author=self.user, quartier=self.quartier,
+                content="Réunion du quartier après l'inondation de la semaine dernière"
+            )
+            self.alert = CommunityAlert.objects.create(
+                title="Inondations rue KA-020", description="L'eau monte près de l'école",
+                category='flood', author=self.user
+            )
+            self.help_request = HelpRequest.objects.create(
+                author=self.user, need_type='material', title="Besoin de sacs de sable",
+                description="Pour protéger la maison des inondations", city='Conakry'
+            )
+
+    def test_search_ranks_all_content_types(self):
+        """Une requête renvoie les quatre types, le titre pesant plus que le corps"""
+        total, hits = SearchService.search("inondation")
+        self.assertEqual(total, 4)
+        found = [(content_type, object_id) for content_type, object_id, _ in hits]
+        self.assertIn(('alert', str(self.alert.pk)), found)
+        self.assertIn(('help_request', str(self.help_request.pk)), found)
+        self.assertLess(
+            found.index(('post', str(self.title_post.pk))), found.index(('post', str(self.body_post.pk)))
+        )
+
+        total, hits = SearchService.search("diallo", ['user'])
+        self.assertEqual([object_id for _, object_id, _ in hits], [str(self.user.pk)])
+
+    def test_accent_insensitive_prefix_search(self):
+        """Les accents sont ignorés et le dernier mot est un préfixe"""
+        self.assertEqual(SearchService.search_ids('alert', "ECOLE"), [str(self.alert.pk)])
+        self.assertEqual(SearchService.search_ids('post', "réuni"), [str(self.body_post.pk)])
+        self.assertEqual(SearchService.search_ids('post', "inondation réunion quartier"), [str(self.body_post.pk)])
+
+    def test_index_updated_on_save_and_delete(self):
+        """L'index suit les modifications et les suppressions"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_post.content = "Les pompiers sont sur place"
+            self.title_post.save()
+        self.assertEqual(SearchService.search_ids('post', "pompiers"), [str(self.title_post.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_post.delete()
+        self.assertEqual(SearchService.search_ids('post', "pompiers"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(SearchService.search_ids('user', "mamadou"), [])
+
+    def test_partial_save_without_indexed_field_skips_reindex(self):
+        """Un enregistrement limité à des champs non indexés ne réindexe pas"""
+        document = SearchDocument.objects.get(content_type='user', object_id=str(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(SearchDocument.objects.get(pk=document.pk).updated_at, document.updated_at)
+
+    def test_search_endpoint_is_paginated(self):
+        """L'API renvoie les objets sérialisés, paginés, filtrables par type"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.get(reverse('search:search'), {'q': 'inondation', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_count'], 4)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertTrue(response.data['has_next'])
+
+        response = client.get(reverse('search:search'), {'q': 'inondation', 'type': 'alert,help_request'})
+        self.assertEqual({result['type'] for result in response.data['results']}, {'alert', 'help_request'})
+        self.assertEqual(response.data['results'][0]['object']['alert_id'], str(self.alert.alert_id))
+
+        response = client.get(reverse('search:search'), {'q': 'inondation', 'type': 'groupe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command(self):
+        """La reconstruction réindexe les objets existants"""
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 5)
+        self.assertEqual(SearchService.search_ids('help_request', "sable"), [str(self.help_request.pk)])
+
+
+@override_settings(SEARCH_BACKEND='python')
+class PythonSearchBackendTest(SearchServiceTest):
+    """Mêmes tests avec l'index inversé en mémoire"""
+
+    def setUp(self):
+        SearchService.get_backend().reset()
+        super().setUp()
+
+
+class TypeaheadTest(TestCase):
+    """Tests pour la complétion par préfixe des utilisateurs et des lieux"""
+
+    def setUp(self):
+        cache.clear()
+        TypeaheadService.reset()
+        self.region = Region.objects.create(nom="Conakry")
+        self.prefecture = Prefecture.objects.create(region=self.region, nom="Conakry")
+        self.commune = Commune.objects.create(prefecture=self.prefecture, nom="Matoto")
+        self.quartier = Quartier.objects.create(commune=self.commune, nom="Sangoyah Mosquée")
+        Quartier.objects.create(commune=self.commune, nom="Matoto Marché")
+
+        self.user = User.objects.create_user(
+            username='mamadou', email='mamadou@example.com', password='testpass123',
+            first_name='Mamadou', last_name='Diallo', quartier=self.quartier
+        )
+        User.objects.create_user(
+            username='fatoumata', email='fatoumata@example.com', password='testpass123',
+            first_name='Fatoumata', last_name='Mamady', quartier=self.quartier
+        )
+
+    def test_prefix_index_ranking(self):
+        """Libellé exact, puis libellé commençant par le préfixe, puis un de ses mots"""
+        index = PrefixIndex()
+        index.load([
+            (('quartier', 1), "Matoto Marché", 'marche'),
+            (('commune', 2), "Matoto", 'commune'),
+            (('quartier', 3), "Bonfi Matoto", 'bonfi'),
+        ])
+        self.assertEqual(index.complete("matoto"), ['commune', 'marche', 'bonfi'])
+        self.assertEqual(index.complete("MATOTO MAR"), ['marche'])
+
+        index.remove(('commune', 2))
+        index.add(('quartier', 3), "Bonfi", 'bonfi')
+        self.assertEqual(index.complete("mat"), ['marche'])
+
+    def test_places_carry_hierarchy(self):
+        """Un quartier se trouve sans accents et porte sa commune et sa préfecture"""
+        results = TypeaheadService.complete("mosquee", ['quartier'])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['id'], self.quartier.id)
+        self.assertEqual(results[0]['commune'], {'id': self.commune.id, 'nom': "Matoto"})
+        self.assertEqual(results[0]['prefecture'], "Conakry")
+
+        self.assertEqual(
+            [result['type'] for result in TypeaheadService.complete("matoto", PLACE_TYPES)], ['commune', 'quartier']
+        )
+
+    def test_index_updated_incrementally(self):
+        """Un utilisateur renommé est rechargé seul ; un nouveau lieu recharge l'index"""
+        self.assertEqual([result['username'] for result in TypeaheadService.complete("mamad", ['user'])],
+                         ['mamadou', 'fatoumata'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Alpha'
+            self.user.save()
+        with self.assertNumQueries(1):
+            results = TypeaheadService.complete("alph", ['user'])
+        self.assertEqual(results[0]['label'], "Alpha Diallo")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+        self.assertEqual(TypeaheadService.complete("alpha", ['user']), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Quartier.objects.create(commune=self.commune, nom="Yimbaya")
+        self.assertEqual(TypeaheadService.complete("yimb")[0]['type'], 'quartier')
+
+        with self.assertNumQueries(0):
+            TypeaheadService.complete("yimb")
+
+    def test_autocomplete_endpoint(self):
+        """Les anonymes ne complètent que les lieux"""
+        client = APIClient()
+        response = client.get(reverse('search:autocomplete'), {'q': 'mama'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+        response = client.get(reverse('search:autocomplete'), {'q': 'mama', 'type': 'user'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('search:autocomplete'), {'q': 'mama', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['type'], 'user')
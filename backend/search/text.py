@@ -0,0 +1,67 @@
+"""
+Normalisation du texte indexé et des requêtes (français).
+
+Le texte est mis en minuscules, débarrassé de ses accents, découpé en mots
+(les élisions « l' », « d' »... tombent avec les mots d'une lettre), filtré
+des mots vides puis réduit par une racinisation légère (pluriels, féminins,
+suffixes courants). Index et requêtes passant par les mêmes fonctions,
+« Inondations » trouve « inondation » et « école » trouve « ecoles ».
+"""
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+    au aux avec ce ces cet cette dans de des du elle elles en est et eux il ils
+    je la le les leur leurs lui ma mais me meme mes moi mon ne nos notre nous on
+    ou par pas pour qu que qui sa se ses son sont sur ta te tes toi ton tu un une
+    vos votre vous ete etre avoir ont sans sous tres plus
+""".split())
+
+# Suffixes retirés, du plus long au plus court (un seul par mot)
+FRENCH_SUFFIXES = (
+    'issements', 'issement', 'atrices', 'atrice', 'ateurs', 'ateur', 'ations', 'ation',
+    'ements', 'ement', 'ments', 'ment', 'euses', 'euse', 'eaux', 'eau', 'ees', 'ee',
+    'es', 'er', 'ez', 'e', 's', 'x',
+)
+MIN_STEM_LENGTH = 3
+
+
+def fold(text):
+    """Minuscules sans accents"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def stem(token):
+    """Racinisation légère d'un mot déjà replié"""
+    if token.isdigit():
+        return token
+    for suffix in FRENCH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Termes indexés d'un texte, dans l'ordre (doublons conservés pour la fréquence)"""
+    return [
+        stem(token)
+        for token in TOKEN_PATTERN.findall(fold(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def parse_query(query):
+    """
+    Termes d'une requête. Le dernier mot, en cours de saisie, est aussi
+    renvoyé replié mais non racinisé pour la recherche par préfixe.
+    """
+    words = [
+        token for token in TOKEN_PATTERN.findall(fold(query))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+    if not words:
+        return [], None
+    return [stem(word) for word in words[:-1]], words[-1]
@@ -0,0 +1,227 @@
+"""
+Complétion par préfixe (typeahead) des utilisateurs et des lieux.
+
+Chaque processus garde en mémoire un tableau trié de clés repliées (sans
+accents, minuscules) : le nom complet et chacun de ses mots, associés à
+l'entrée qu'ils désignent. Une complétion est une recherche dichotomique
+(``bisect``) du préfixe puis la lecture des clés suivantes, sans requête SQL.
+
+Les entrées de lieux portent leur hiérarchie (quartier -> commune ->
+préfecture -> région) : un quartier se trouve en une requête au lieu des
+trois appels des formulaires en cascade.
+
+Mise à jour incrémentale : un utilisateur modifié est inscrit dans un journal
+du cache (``typeahead_log_{n}``) que chaque processus relit avant de répondre
+pour recharger ces seuls utilisateurs. Les lieux, rarement modifiés,
+déclenchent un rechargement complet (génération partagée).
+"""
+import bisect
+import logging
+import threading
+from django.apps import apps
+from django.core.cache import caches
+from .text import TOKEN_PATTERN, fold
+
+logger = logging.getLogger(__name__)
+
+
+PLACE_TYPES = ('quartier', 'commune', 'prefecture')
+TYPEAHEAD_TYPES = ('user',) + PLACE_TYPES
+
+
+def typeahead_keys(label):
+    """Clés de complétion d'un libellé : le libellé entier et chacun de ses mots"""
+    folded = ' '.join(TOKEN_PATTERN.findall(fold(label)))
+    if not folded:
+        return set()
+    return {folded, *folded.split()}
+
+
+class PrefixIndex:
+    """Tableau trié de ``(clé, identifiant d'entrée)`` interrogé par préfixe"""
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry_id, label, entry):
+        """Ajoute ou remplace une entrée"""
+        self.remove(entry_id)
+        for key in typeahead_keys(label):
+            bisect.insort(self.keys, (key, entry_id))
+        self.entries[entry_id] = (label, entry)
+
+    def remove(self, entry_id):
+        previous = self.entries.pop(entry_id, None)
+        if previous is None:
+            return
+        for key in typeahead_keys(previous[0]):
+            position = bisect.bisect_left(self.keys, (key, entry_id))
+            if position < len(self.keys) and self.keys[position] == (key, entry_id):
+                del self.keys[position]
+
+    def load(self, items):
+        """Remplace le contenu par ``[(entry_id, label, entry)]`` (tri unique)"""
+        self.entries = {entry_id: (label, entry) for entry_id, label, entry in items}
+        self.keys = sorted(
+            (key, entry_id) for entry_id, (label, _) in self.entries.items() for key in typeahead_keys(label)
+        )
+
+    def complete(self, prefix, limit=10, accept=None):
+        """
+        Entrées dont une clé commence par ``prefix``, classées : libellé égal
+        au préfixe, puis libellé commençant par le préfixe, puis un de ses mots ;
+        à égalité, les libellés les plus courts d'abord.
+        """
+        prefix = ' '.join(TOKEN_PATTERN.findall(fold(prefix)))
+        if not prefix:
+            return []
+
+        matches = {}
+        position = bisect.bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+            entry_id = self.keys[position][1]
+            position += 1
+            if entry_id in matches or (accept and not accept(entry_id)):
+                continue
+            label = self.entries[entry_id][0]
+            folded = ' '.join(TOKEN_PATTERN.findall(fold(label)))
+            rank = 0 if folded == prefix else 1 if folded.startswith(prefix) else 2
+            matches[entry_id] = (rank, len(label), label)
+
+        best = sorted(matches, key=matches.get)[:limit]
+        return [self.entries[entry_id][1] for entry_id in best]
+
+
+class TypeaheadService:
+    """Index de complétion partagé par les requêtes d'un processus"""
+
+    LOG_SEQUENCE_KEY = 'typeahead_log_seq'
+    GENERATION_KEY = 'typeahead_generation'
+    MAX_LOG_REPLAY = 5000
+
+    index = PrefixIndex()
+    lock = threading.Lock()
+    cursor = None
+    generation = None
+
+    @staticmethod
+    def get_cache():
+        return caches['default']
+
+    @staticmethod
+    def get_log_key(position):
+        return f"typeahead_log_{position}"
+
+    @staticmethod
+    def complete(prefix, types=TYPEAHEAD_TYPES, limit=10):
+        """Complétions de ``prefix`` parmi les types demandés"""
+        types = set(types)
+        with TypeaheadService.lock:
+            TypeaheadService._sync()
+            return TypeaheadService.index.complete(prefix, limit, accept=lambda entry_id: entry_id[0] in types)
+
+    @staticmethod
+    def user_changed(user_id):
+        """Inscrit un utilisateur modifié ; chaque processus le rechargera"""
+        cache = TypeaheadService.get_cache()
+        cache.add(TypeaheadService.LOG_SEQUENCE_KEY, 0, None)
+        position = cache.incr(TypeaheadService.LOG_SEQUENCE_KEY)
+        cache.set(TypeaheadService.get_log_key(position), user_id, 86400)
+
+    @staticmethod
+    def invalidate():
+        """Force le rechargement complet de l'index dans tous les processus"""
+        cache = TypeaheadService.get_cache()
+        cache.add(TypeaheadService.GENERATION_KEY, 0, None)
+        cache.incr(TypeaheadService.GENERATION_KEY)
+
+    @staticmethod
+    def reset():
+        """Vide l'index local ; il sera rechargé à la prochaine complétion"""
+        with TypeaheadService.lock:
+            TypeaheadService.index = PrefixIndex()
+            TypeaheadService.cursor = None
+            TypeaheadService.generation = None
+
+    @staticmethod
+    def _sync():
+        cache = TypeaheadService.get_cache()
+        shared = cache.get_many([TypeaheadService.LOG_SEQUENCE_KEY, TypeaheadService.GENERATION_KEY])
+        sequence = shared.get(TypeaheadService.LOG_SEQUENCE_KEY, 0)
+        generation = shared.get(TypeaheadService.GENERATION_KEY, 0)
+
+        if (
+            generation != TypeaheadService.generation
+            or TypeaheadService.cursor is None
+            or sequence < TypeaheadService.cursor
+            or sequence - TypeaheadService.cursor > TypeaheadService.MAX_LOG_REPLAY
+        ):
+            TypeaheadService._load()
+            TypeaheadService.generation = generation
+            TypeaheadService.cursor = sequence
+            return
+        if sequence == TypeaheadService.cursor:
+            return
+
+        log_keys = [TypeaheadService.get_log_key(position) for position in range(TypeaheadService.cursor + 1, sequence + 1)]
+        user_ids = set(cache.get_many(log_keys).values())
+        TypeaheadService._refresh_users(user_ids)
+        TypeaheadService.cursor = sequence
+
+    @staticmethod
+    def _load():
+        """Charge tous les utilisateurs actifs et tous les lieux"""
+        User = apps.get_model('users', 'User')
+        Quartier = apps.get_model('geography', 'Quartier')
+        Commune = apps.get_model('geography', 'Commune')
+        Prefecture = apps.get_model('geography', 'Prefecture')
+
+        items = [
+            TypeaheadService._user_item(*row)
+            for row in User.objects.filter(is_active=True).values_list('id', 'username', 'first_name', 'last_name').iterator()
+        ]
+        for row in Prefecture.objects.values('id', 'nom', 'region_id', 'region__nom'):
+            items.append((('prefecture', row['id']), row['nom'], {
+                'type': 'prefecture', 'id': row['id'], 'label': row['nom'],
+                'region': {'id': row['region_id'], 'nom': row['region__nom']},
+            }))
+        for row in Commune.objects.values('id', 'nom', 'prefecture_id', 'prefecture__nom'):
+            items.append((('commune', row['id']), row['nom'], {
+                'type': 'commune', 'id': row['id'], 'label': row['nom'],
+                'prefecture': {'id': row['prefecture_id'], 'nom': row['prefecture__nom']},
+            }))
+        for row in Quartier.objects.values('id', 'nom', 'commune_id', 'commune__nom', 'commune__prefecture__nom'):
+            items.append((('quartier', row['id']), row['nom'], {
+                'type': 'quartier', 'id': row['id'], 'label': row['nom'],
+                'commune': {'id': row['commune_id'], 'nom': row['commune__nom']},
+                'prefecture': row['commune__prefecture__nom'],
+            }))
+
+        TypeaheadService.index.load(items)
+        logger.info(f"Index de complétion chargé: {len(items)} entrées")
+
+    @staticmethod
+    def _refresh_users(user_ids):
+        User = apps.get_model('users', 'User')
+        rows = {
+            row[0]: row for row in User.objects.filter(id__in=user_ids, is_active=True)
+            .values_list('id', 'username', 'first_name', 'last_name')
+        }
+        for user_id in user_ids:
+            if user_id in rows:
+                TypeaheadService.index.add(*TypeaheadService._user_item(*rows[user_id]))
+            else:
+                TypeaheadService.index.remove(('user', user_id))
+
+    @staticmethod
+    def _user_item(user_id, username, first_name, last_name):
+        full_name = f"{first_name} {last_name}".strip()
+        # Clés : nom d'utilisateur et nom affiché
+        label = f"{full_name} {username}" if full_name else username
+        return ('user', user_id), label, {
+            'type': 'user', 'id': user_id, 'label': full_name or username, 'username': username,
+        }
@@ -0,0 +1,88 @@
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .services import SEARCH_TYPES, SearchService, get_search_setting
+from .typeahead import PLACE_TYPES, TYPEAHEAD_TYPES, TypeaheadService
+
+
+class SearchView(APIView):
+    """
+    Recherche plein texte dans les posts, alertes, demandes d'aide et utilisateurs.
+
+    Paramètres : ``q`` (requête), ``type`` (types séparés par des virgules,
+    tous par défaut), ``page`` et ``page_size``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Paramètre q requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_types = [
+            content_type.strip() for content_type in request.query_params.get('type', '').split(',')
+            if content_type.strip()
+        ] or list(SEARCH_TYPES)
+        unknown = [content_type for content_type in content_types if content_type not in SEARCH_TYPES]
+        if unknown:
+            return Response(
+                {'error': f"Type inconnu: {', '.join(unknown)}", 'types': list(SEARCH_TYPES)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = int(request.query_params.get('page_size', get_search_setting('SEARCH_PAGE_SIZE', 20)))
+        except ValueError:
+            return Response({'error': 'Pagination invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = min(max(page_size, 1), get_search_setting('SEARCH_MAX_PAGE_SIZE', 50))
+
+        total, hits = SearchService.search(query, content_types, (page - 1) * page_size, page_size)
+        total_pages = (total + page_size - 1) // page_size
+
+        return Response({
+            'query': query,
+            'results': SearchService.hydrate(hits, context={'request': request}),
+            'total_count': total,
+            'total_pages': total_pages,
+            'current_page': page,
+            'has_next': page < total_pages,
+            'has_previous': page > 1,
+        })
+
+
+class AutocompleteView(APIView):
+    """
+    Complétion par préfixe des utilisateurs et des lieux (index en mémoire).
+
+    Paramètres : ``q`` (début du nom), ``type`` (``user``, ``quartier``,
+    ``commune``, ``prefecture``, séparés par des virgules) et ``limit``.
+    Les visiteurs anonymes (inscription) ne complètent que les lieux.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        allowed = TYPEAHEAD_TYPES if request.user.is_authenticated else PLACE_TYPES
+        types = [
+            content_type.strip() for content_type in request.query_params.get('type', '').split(',')
+            if content_type.strip()
+        ] or list(allowed)
+        unknown = [content_type for content_type in types if content_type not in allowed]
+        if unknown:
+            return Response(
+                {'error': f"Type inconnu: {', '.join(unknown)}", 'types': list(allowed)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', get_search_setting('TYPEAHEAD_DEFAULT_RESULTS', 10)))
+        except ValueError:
+            return Response({'error': 'Limite invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), get_search_setting('TYPEAHEAD_MAX_RESULTS', 25))
+
+        return Response({
+            'query': query,
+            'results': TypeaheadService.complete(query, types, limit) if query else [],
+        })
@@ -26,6 +26,8 @@ import geoip2.database
 import geoip2.errors
 from user_agents import parse
 import re
+from users.ratelimit import RateLimiter
+from users.geolocation import GeoIPResolver
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,7 @@ class SecurityService:
     
     def __init__(self):
         self.config = self._get_security_config()
+        self.geoip = None
         self.geoip_reader = None
         self._init_geoip()
     
@@ -70,8 +73,9 @@ class SecurityService:
     def _init_geoip(self):
         """Initialise la base de données GeoIP"""
         try:
-            # En production, utiliser une vraie base GeoIP
-            self.geoip_reader = None
+            # Résolveur partagé du processus : base MaxMind en mémoire + index CIDR + LRU
+            self.geoip = GeoIPResolver.get_instance()
+            self.geoip_reader = self.geoip.reader
         except Exception as e:
             logger.warning(f"GeoIP non disponible: {e}")
     
@@ -568,25 +572,16 @@ class SecurityService:
     def check_rate_limit(self, ip_address, action_type):
         """Vérifie les limites de taux"""
         try:
-            cache_key = f"rate_limit_{action_type}_{ip_address}"
-            current_count = cache.get(cache_key, 0)
-            
-            # Limites par type d'action
+            # Limites par type d'action, surchargeables via RATE_LIMITS
             limits = {
-                'login': 5,  # 5 tentatives par minute
-                'password_reset': 3,  # 3 demandes par heure
-                'mfa_setup': 10,  # 10 tentatives par heure
-                'api_call': 100,  # 100 appels par minute
+                'login': '5/minute',  # 5 tentatives par minute
+                'password_reset': '3/hour',  # 3 demandes par heure
+                'mfa_setup': '10/hour',  # 10 tentatives par heure
+                'api_call': '100/minute',  # 100 appels par minute
             }
             
-            limit = limits.get(action_type, 10)
-            
-            if current_count >= limit:
-                return False
-            
-            # Incrémenter le compteur
-            cache.set(cache_key, current_count + 1, 60)  # Expire en 1 minute
-            return True
+            limiter = RateLimiter.for_scope(action_type, default=limits.get(action_type, '10/minute'))
+            return limiter.hit(ip_address).allowed
             
         except Exception as e:
             logger.error(f"Erreur vérification limite taux: {e}")
@@ -618,11 +613,10 @@ class SecurityService:
     def _get_ip_location(self, ip_address):
         """Récupère la localisation d'une IP"""
         try:
-            if not self.geoip_reader:
+            if not self.geoip:
                 return None
             
-            response = self.geoip_reader.city(ip_address)
-            return response.country.iso_code
+            return self.geoip.get_country_code(ip_address)
             
         except Exception as e:
             logger.error(f"Erreur récupération localisation IP: {e}")
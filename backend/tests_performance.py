@@ -9,6 +9,7 @@ import threading
 import requests
 import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from unittest import mock
 from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -241,6 +242,354 @@ class PerformanceTestCase(TestCase):
         self.assertLess(read_time, 0.5, 
                        "Lecture cache trop lente")
 
+    def test_keyset_pagination_depth(self):
+        """Test du coût constant de la pagination par curseur, quelle que soit la profondeur"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from posts.pagination import KeysetCursorPagination
+        
+        author = self.users[0]
+        Post.objects.bulk_create([
+            Post(
+                author=author,
+                quartier=self.quartier,
+                content=f'Post pagination {i}',
+                post_type='info'
+            )
+            for i in range(10000)
+        ], batch_size=1000)
+        
+        self.client.force_authenticate(user=author)
+        url = reverse('posts:user-posts', args=[author.id])
+        page_size = 20
+        
+        # Curseur de la page 500 : position du dernier post de la page 499
+        paginator = KeysetCursorPagination()
+        last_of_previous_page = Post.objects.filter(author=author).order_by(
+            '-created_at', '-id'
+        )[499 * page_size - 1]
+        deep_cursor = paginator.encode_cursor(paginator.get_position(last_of_previous_page))
+        
+        def fetch(params):
+            with CaptureQueriesContext(connection) as context:
+                start_time = time.time()
+                response = self.client.get(url, params)
+                elapsed = time.time() - start_time
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+            return elapsed, context.captured_queries
+        
+        fetch({'page_size': page_size})  # préchauffage
+        first_time, first_queries = fetch({'page_size': page_size})
+        deep_time, deep_queries = fetch({'page_size': page_size, 'cursor': deep_cursor})
+        
+        print(f"✅ Pagination par curseur (10 000 posts):")
+        print(f"   - Page 1: {first_time:.3f}s, {len(first_queries)} requêtes")
+        print(f"   - Page 500: {deep_time:.3f}s, {len(deep_queries)} requêtes")
+        
+        # Vérifications : même nombre de requêtes, ni OFFSET ni COUNT
+        self.assertEqual(len(first_queries), len(deep_queries))
+        for query in deep_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+            self.assertFalse('COUNT(*)' in query['sql'] and 'FROM "posts_post"' in query['sql'])
+        self.assertLess(deep_time, max(first_time * 3, 0.5),
+                       "La page 500 est beaucoup plus lente que la page 1")
+
+    def test_nearby_alerts_geoindex(self):
+        """Benchmark de l'index geohash contre la boîte englobante + boucle Python"""
+        import gc
+        import math
+        import random
+        from notifications.models import CommunityAlert
+        from geography.geoindex import GeoIndexService, haversine_km
+        
+        rng = random.Random(7)
+        center_lat, center_lon = 9.5370, -13.6785
+        alerts = []
+        for i in range(100000):
+            latitude = round(center_lat + rng.uniform(-0.25, 0.25), 6)
+            longitude = round(center_lon + rng.uniform(-0.25, 0.25), 6)
+            alerts.append(CommunityAlert(
+                title=f'Alerte {i}',
+                description='Benchmark',
+                category='fire',
+                latitude=latitude,
+                longitude=longitude,
+                author=self.users[0]
+            ))
+        CommunityAlert.objects.bulk_create(alerts, batch_size=5000)
+        del alerts
+        
+        def legacy(radius_km):
+            # Ancienne implémentation : boîte en degrés sans correction de longitude
+            radius_degrees = radius_km / 111.0
+            results = []
+            for alert in CommunityAlert.objects.filter(
+                latitude__range=(center_lat - radius_degrees, center_lat + radius_degrees),
+                longitude__range=(center_lon - radius_degrees, center_lon + radius_degrees)
+            ):
+                distance = haversine_km(center_lat, center_lon, alert.latitude, alert.longitude)
+                if distance <= radius_km:
+                    alert.distance_km = distance
+                    results.append(alert)
+            results.sort(key=lambda alert: alert.distance_km)
+            return results
+        
+        def timed(function, repeat=3):
+            # Meilleur de plusieurs passages, ramasse-miettes suspendu (comme timeit) :
+            # le premier passage paie le cache de pages SQLite
+            best = None
+            gc.disable()
+            try:
+                for _ in range(repeat):
+                    start_time = time.time()
+                    result = function()
+                    elapsed = time.time() - start_time
+                    best = elapsed if best is None else min(best, elapsed)
+            finally:
+                gc.enable()
+            return best, result
+        
+        radius_km = 5.0
+        legacy_time, legacy_results = timed(lambda: legacy(radius_km))
+        index_time, index_results = timed(lambda: GeoIndexService.nearby(
+            CommunityAlert.objects.all(), center_lat, center_lon, radius_km
+        ))
+        knn_time, knn_results = timed(lambda: GeoIndexService.nearest(
+            CommunityAlert.objects.all(), center_lat, center_lon, radius_km, limit=50
+        ))
+        
+        print(f"✅ Alertes à proximité (100 000 alertes, rayon {radius_km} km):")
+        print(f"   - Boîte + boucle Python: {legacy_time:.3f}s, {len(legacy_results)} résultats")
+        print(f"   - Index geohash: {index_time:.3f}s, {len(index_results)} résultats")
+        print(f"   - 50 plus proches: {knn_time:.3f}s")
+        
+        # L'ancienne boîte tronque le cercle à l'est et à l'ouest ; l'index ne perd rien
+        legacy_ids = {alert.id for alert in legacy_results}
+        index_ids = [alert.id for alert in index_results]
+        self.assertTrue(legacy_ids.issubset(index_ids))
+        self.assertEqual([pk for pk, _ in knn_results], index_ids[:50])
+        self.assertLess(index_time, legacy_time,
+                       "La recherche dans le rayon est plus lente que l'ancienne implémentation")
+        self.assertLess(knn_time, legacy_time,
+                       "La recherche des k plus proches est plus lente que l'ancienne implémentation")
+        # Objectif : les k plus proches en quelques millisecondes, même sans NumPy
+        self.assertLess(knn_time, 0.1,
+                       "La recherche des 50 plus proches dépasse 100 ms sur 100 000 alertes")
+
+    def test_image_renditions(self):
+        """Benchmark des déclinaisons : un décodage en cascade contre un décodage par taille"""
+        import io
+        import random
+        from PIL import Image
+        from posts.renditions import ImageRenditionService
+        
+        # Photo de téléphone bruitée (les aplats se compressent trop bien pour être réalistes)
+        rng = random.Random(3)
+        noise = Image.frombytes('L', (160, 120), bytes(rng.getrandbits(8) for _ in range(160 * 120)))
+        photo = Image.merge('RGB', [noise, noise.rotate(90, expand=False), noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)])
+        photo = photo.resize((4000, 3000), Image.Resampling.BICUBIC)
+        source = io.BytesIO()
+        photo.save(source, format='JPEG', quality=92)
+        original_size = source.tell()
+        
+        def per_size():
+            # Ancienne approche : l'original est décodé et réduit pour chaque taille
+            outputs = []
+            for width in (150, 300, 600, 1080, 1920):
+                for image_format in ('JPEG', 'WEBP'):
+                    source.seek(0)
+                    with Image.open(source) as img:
+                        img = img.convert('RGB')
+                        img.thumbnail((width, width * 3), Image.LANCZOS)
+                        output = io.BytesIO()
+                        img.save(output, format=image_format, quality=85)
+                        outputs.append(output)
+            return outputs
+        
+        start_time = time.time()
+        per_size()
+        legacy_time = time.time() - start_time
+        
+        source.seek(0)
+        start_time = time.time()
+        renditions = ImageRenditionService.build_renditions(source)
+        ladder_time = time.time() - start_time
+        
+        sizes = {(width, image_format): len(buffer.getvalue()) for width, _, image_format, buffer in renditions}
+        print(f"✅ Déclinaisons d'une photo 4000x3000 ({original_size // 1024} Ko):")
+        print(f"   - Décodage par taille: {legacy_time:.3f}s")
+        print(f"   - Décodage unique en cascade: {ladder_time:.3f}s")
+        print(f"   - 600w JPEG: {sizes[(600, 'jpeg')] // 1024} Ko, WebP: {sizes[(600, 'webp')] // 1024} Ko")
+        
+        self.assertEqual(len(renditions), 10)
+        self.assertLess(sizes[(600, 'jpeg')] * 10, original_size)
+        self.assertLess(ladder_time, legacy_time,
+                       "Les déclinaisons en cascade sont plus lentes que le décodage par taille")
+
+    def test_cache_statistics_overhead(self):
+        """Benchmark des statistiques du cache intelligent : compteurs en mémoire contre écriture en base"""
+        from django.core.cache import cache
+        from django.utils import timezone
+        from monitoring.metrics import MetricsRegistry
+        from performance.cache_stats import CacheStatistics
+        from performance.models import CacheHitRate, CacheStrategy
+        
+        statistics = CacheStatistics(MetricsRegistry())
+        strategy = CacheStrategy.objects.create(name='benchmark', cache_type='redis', strategy_type='ttl')
+        cache.set('benchmark_hit', 'valeur', 300)
+        keys = ('benchmark_hit', 'benchmark_miss')
+        operations = 20000
+        database_operations = 500
+        
+        def per_operation(operation, count):
+            start_time = time.perf_counter()
+            for index in range(count):
+                operation(index)
+            return (time.perf_counter() - start_time) / count * 1_000_000
+        
+        def counted_get(index):
+            start_time = time.perf_counter()
+            value = cache.get(keys[index % 2])
+            statistics.record(1, value is not None, (time.perf_counter() - start_time) * 1000)
+        
+        def database_get(index):
+            # Ancien comportement : get_or_create + save de CacheHitRate à chaque lecture du cache
+            is_hit = cache.get(keys[index % 2]) is not None
+            cache_hit_rate, created = CacheHitRate.objects.get_or_create(
+                cache_level='l2',
+                cache_strategy=strategy,
+                timestamp__date=timezone.now().date(),
+                defaults={
+                    'hits': 1 if is_hit else 0,
+                    'misses': 0 if is_hit else 1,
+                    'hit_rate': 100.0 if is_hit else 0.0,
+                    'avg_response_time': 5.0,
+                    'total_requests': 1
+                }
+            )
+            if not created:
+                if is_hit:
+                    cache_hit_rate.hits += 1
+                else:
+                    cache_hit_rate.misses += 1
+                total_requests = cache_hit_rate.hits + cache_hit_rate.misses
+                cache_hit_rate.hit_rate = (cache_hit_rate.hits / total_requests) * 100
+                cache_hit_rate.total_requests = total_requests
+                cache_hit_rate.save()
+        
+        baseline = per_operation(lambda index: cache.get(keys[index % 2]), operations)
+        counted = per_operation(counted_get, operations)
+        database = per_operation(database_get, database_operations)
+        _, deltas = statistics.pending()
+        
+        print(f"✅ Statistiques du cache intelligent:")
+        print(f"   - cache.get seul: {baseline:.2f} µs/op")
+        print(f"   - cache.get + compteurs en mémoire: {counted:.2f} µs/op")
+        print(f"   - cache.get + écriture en base: {database:.2f} µs/op")
+        
+        self.assertEqual(deltas['1'][:2], [operations // 2, operations // 2])
+        self.assertEqual(CacheHitRate.objects.get().total_requests, database_operations)
+        self.assertLess(counted - baseline, (database - baseline) / 10,
+                       "Les compteurs en mémoire coûtent plus d'un dixième d'une écriture en base")
+
+
+class CacheStatisticsTest(TestCase):
+    """Tests pour les statistiques et la compression du cache intelligent"""
+    
+    def setUp(self):
+        from monitoring.metrics import MetricsRegistry
+        from performance.cache_stats import CacheStatistics
+        
+        self.statistics = CacheStatistics(MetricsRegistry())
+    
+    def test_compression_round_trip(self):
+        """Les textes longs sont compressés et restitués ; les autres valeurs sont inchangées"""
+        from django.core.cache import cache
+        from performance.cache_stats import CompressedValue, compress_value, decompress_value
+        
+        text = 'Alerte inondation à Kaloum. ' * 200
+        compressed = compress_value(text)
+        self.assertIsInstance(compressed, CompressedValue)
+        self.assertLess(len(compressed.data), len(text.encode('utf-8')))
+        
+        cache.set('compressed_value', compressed, 60)
+        self.assertEqual(decompress_value(cache.get('compressed_value')), text)
+        for value in ('court', b'\x1f\x8b octets', {'cle': 'valeur'}, None):
+            self.assertEqual(decompress_value(compress_value(value)), value)
+    
+    def test_pending_deltas_since_last_flush(self):
+        """record compte par stratégie ; pending renvoie les écarts depuis le dernier vidage"""
+        for is_hit in (True, True, False):
+            self.statistics.record(1, is_hit, 2.0)
+        self.statistics.record(2, False, 4.0)
+        
+        current, deltas = self.statistics.pending()
+        self.assertEqual(deltas, {'1': [2, 1, 6.0], '2': [0, 1, 4.0]})
+        
+        self.statistics.flushed = current
+        self.statistics.record(1, True, 1.0)
+        self.assertEqual(self.statistics.pending()[1], {'1': [1, 0, 1.0]})
+    
+    def test_flush_writes_deltas_once(self):
+        """flush transmet les écarts en un appel ; un échec les conserve pour le vidage suivant"""
+        self.statistics.record(1, True, 2.0)
+        
+        with mock.patch.object(self.statistics, '_upsert', side_effect=RuntimeError('base indisponible')):
+            self.assertEqual(self.statistics.flush(), 0)
+        self.assertEqual(self.statistics.pending()[1], {'1': [1, 0, 2.0]})
+        
+        with mock.patch.object(self.statistics, '_upsert') as upsert:
+            self.assertEqual(self.statistics.flush(), 1)
+            self.assertEqual(self.statistics.flush(), 0)
+        upsert.assert_called_once()
+        self.assertEqual(upsert.call_args[0][1], {'1': [1, 0, 2.0]})
+    
+    def create_strategies(self):
+        from performance.models import CacheStrategy
+        
+        return [
+            CacheStrategy.objects.create(name=name, cache_type='redis', strategy_type='ttl')
+            for name in ('posts', 'alertes')
+        ]
+    
+    def assert_daily_rows(self, expected):
+        from performance.models import CacheHitRate
+        
+        rows = CacheHitRate.objects.order_by('cache_strategy_id')
+        self.assertEqual([
+            (row.cache_strategy_id, row.hits, row.misses, row.total_requests,
+             round(row.hit_rate, 2), round(row.avg_response_time, 2))
+            for row in rows
+        ], expected)
+    
+    def test_flush_upserts_one_row_per_day_and_strategy(self):
+        """Les vidages successifs du jour cumulent sur une seule ligne par stratégie"""
+        posts, alerts = self.create_strategies()
+        for is_hit, duration_ms in ((True, 2.0), (True, 4.0), (False, 6.0)):
+            self.statistics.record(posts.pk, is_hit, duration_ms)
+        self.statistics.record(alerts.pk, False, 10.0)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(self.statistics.flush(), 2)
+        self.assert_daily_rows([(posts.pk, 2, 1, 3, 66.67, 4.0), (alerts.pk, 0, 1, 1, 0.0, 10.0)])
+        
+        self.statistics.record(posts.pk, True, 8.0)
+        self.assertEqual(self.statistics.flush(), 1)
+        self.assert_daily_rows([(posts.pk, 3, 1, 4, 75.0, 5.0), (alerts.pk, 0, 1, 1, 0.0, 10.0)])
+    
+    def test_update_rows_fallback(self):
+        """Le repli sans ON CONFLICT produit les mêmes cumuls"""
+        from django.utils import timezone
+        from performance.models import CacheHitRate
+        
+        posts, alerts = self.create_strategies()
+        day = timezone.localdate()
+        self.statistics._update_rows(CacheHitRate, day, {str(posts.pk): [2, 1, 12.0], str(alerts.pk): [0, 1, 10.0]})
+        self.statistics._update_rows(CacheHitRate, day, {str(posts.pk): [1, 0, 8.0]})
+        self.assert_daily_rows([(posts.pk, 3, 1, 4, 75.0, 5.0), (alerts.pk, 0, 1, 1, 0.0, 10.0)])
+
+
 class LoadTestSuite:
     """Suite de tests de charge pour simulation en production"""
     
@@ -0,0 +1,195 @@
+"""
+Géolocalisation IP locale, sans appel réseau sur le chemin des requêtes.
+
+La résolution consulte dans l'ordre :
+
+1. un LRU des adresses récemment résolues ;
+2. un index en mémoire de plages CIDR (``GUINEA_IP_RANGES`` et
+   ``GEOIP_CIDR_OVERRIDES``), interrogé par recherche dichotomique ;
+3. la base MaxMind (GeoLite2 City ou Country) chargée en mémoire depuis
+   ``GEOIP_DATABASE_PATH``.
+
+Si aucune source ne connaît l'adresse (IP privée, base absente), le résultat
+est ``None`` et l'appelant décide de la politique à appliquer.
+"""
+import bisect
+import ipaddress
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+import geoip2.database
+from geoip2.errors import AddressNotFoundError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+GeoLocation = namedtuple('GeoLocation', ['country_code', 'country_name', 'city', 'latitude', 'longitude'])
+
+
+class CIDRIndex:
+    """
+    Index de plages CIDR disjointes triées par adresse de début.
+
+    Une recherche coûte O(log n) : dichotomie sur les débuts de plage puis
+    comparaison avec la fin de la plage candidate.
+    """
+
+    def __init__(self, ranges=None):
+        self._entries = {4: [], 6: []}
+        for cidr, location in (ranges or []):
+            self.add(cidr, location)
+
+    def add(self, cidr, location):
+        network = ipaddress.ip_network(cidr, strict=False)
+        entries = self._entries[network.version]
+        entry = (int(network.network_address), int(network.broadcast_address), location)
+        bisect.insort(entries, entry, key=lambda item: item[0])
+
+    def lookup(self, ip_address):
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+        entries = self._entries[address.version]
+        value = int(address)
+        position = bisect.bisect_right(entries, value, key=lambda item: item[0]) - 1
+        if position >= 0:
+            start, end, location = entries[position]
+            if start <= value <= end:
+                return location
+        return None
+
+    def __len__(self):
+        return len(self._entries[4]) + len(self._entries[6])
+
+
+class LRUCache:
+    """Cache LRU borné et thread-safe"""
+
+    _MISSING = object()
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeoIPResolver:
+    """Résolveur IP -> pays/ville entièrement local"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, reader=None, ranges=None, cache_size=10000):
+        self.reader = reader
+        self.index = CIDRIndex(ranges)
+        self.cache = LRUCache(cache_size)
+        self.has_city = self._detect_city_database(reader)
+
+    @classmethod
+    def get_instance(cls):
+        """Retourne le résolveur partagé du processus (chargé une seule fois)"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls.from_settings()
+        return cls._instance
+
+    @classmethod
+    def reset_instance(cls):
+        with cls._instance_lock:
+            cls._instance = None
+
+    @classmethod
+    def from_settings(cls):
+        country_code = getattr(settings, 'GUINEA_COUNTRY_CODE', 'GN')
+        guinea = GeoLocation(country_code, 'Guinée', '', None, None)
+        ranges = [(cidr, guinea) for cidr in getattr(settings, 'GUINEA_IP_RANGES', [])]
+        for cidr, code in getattr(settings, 'GEOIP_CIDR_OVERRIDES', {}).items():
+            ranges.append((cidr, GeoLocation(code, '', '', None, None)))
+
+        return cls(
+            reader=cls.open_database(getattr(settings, 'GEOIP_DATABASE_PATH', None)),
+            ranges=ranges,
+            cache_size=getattr(settings, 'GEOIP_CACHE_SIZE', 10000),
+        )
+
+    @staticmethod
+    def open_database(path):
+        """Charge la base MaxMind en mémoire, ou None si indisponible"""
+        if not path:
+            return None
+        try:
+            return geoip2.database.Reader(str(path), mode=geoip2.database.MODE_MEMORY)
+        except (FileNotFoundError, ValueError, OSError) as e:
+            logger.warning(f"Base GeoIP non disponible ({path}): {e}")
+            return None
+
+    def resolve(self, ip_address):
+        """Retourne la GeoLocation de l'adresse, ou None si elle est inconnue"""
+        location = self.cache.get(ip_address, LRUCache._MISSING)
+        if location is not LRUCache._MISSING:
+            return location
+
+        location = self.index.lookup(ip_address)
+        if location is None:
+            location = self._lookup_database(ip_address)
+
+        self.cache.set(ip_address, location)
+        return location
+
+    def get_country_code(self, ip_address):
+        location = self.resolve(ip_address)
+        return location.country_code if location else None
+
+    def _lookup_database(self, ip_address):
+        if self.reader is None:
+            return None
+        try:
+            if self.has_city:
+                response = self.reader.city(ip_address)
+                return GeoLocation(
+                    response.country.iso_code or '',
+                    response.country.name or '',
+                    response.city.name or '',
+                    response.location.latitude,
+                    response.location.longitude,
+                )
+            response = self.reader.country(ip_address)
+            return GeoLocation(response.country.iso_code or '', response.country.name or '', '', None, None)
+        except (AddressNotFoundError, ValueError):
+            return None
+        except Exception as e:
+            logger.error(f"Erreur de géolocalisation IP {ip_address}: {e}")
+            return None
+
+    @staticmethod
+    def _detect_city_database(reader):
+        if reader is None:
+            return False
+        try:
+            return 'City' in reader.metadata().database_type
+        except Exception:
+            return True
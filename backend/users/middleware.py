@@ -1,12 +1,17 @@
-import requests
 import json
 import time
 import logging
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.db import connection
 from django.http import JsonResponse
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from monitoring.metrics import registry as metrics_registry
+from monitoring.performance import performance_monitor
+from monitoring.profiling import RequestProfile, activate_profile, deactivate_profile, instrument_cache, route_stats
 from .models import GeographicVerification
+from .geolocation import GeoIPResolver
+from .ratelimit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -63,49 +68,45 @@ class GeographicAccessMiddleware(MiddlewareMixin):
     def check_if_guinea(self, ip_address):
         """
         Vérifier si l'adresse IP est en Guinée
-        Utilise un service de géolocalisation IP
+        Résolution locale (index CIDR + base MaxMind en mémoire), sans appel réseau
         """
-        try:
-            # Utiliser un service gratuit de géolocalisation IP
-            response = requests.get(f'http://ip-api.com/json/{ip_address}', timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                country_code = data.get('countryCode', '')
-                return country_code == settings.GUINEA_COUNTRY_CODE
-        except Exception as e:
-            # En cas d'erreur, permettre l'accès mais logger
-            print(f"Erreur de géolocalisation IP: {e}")
-            return True  # Permettre l'accès par défaut
-        
-        return False
+        location = GeoIPResolver.get_instance().resolve(ip_address)
+        if location is None:
+            # IP non localisable (réseau privé, base absente) : politique configurable
+            return getattr(settings, 'GEOIP_ALLOW_UNKNOWN', True)
+        return location.country_code == settings.GUINEA_COUNTRY_CODE
     
     def record_verification(self, user, ip_address, is_guinea, method):
-        """Enregistrer la vérification géographique"""
+        """
+        Enregistrer la vérification géographique
+        Au plus une écriture par utilisateur et par période GEO_VERIFICATION_INTERVAL
+        """
+        interval = getattr(settings, 'GEO_VERIFICATION_INTERVAL', 3600)
+        if not cache.add(f"geo_verification_{user.id}", 1, interval):
+            return
+        
         try:
-            # Obtenir les informations de géolocalisation
-            response = requests.get(f'http://ip-api.com/json/{ip_address}', timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                
-                GeographicVerification.objects.create(
-                    user=user,
-                    ip_address=ip_address,
-                    country_code=data.get('countryCode', ''),
-                    country_name=data.get('country', ''),
-                    city=data.get('city', ''),
-                    latitude=data.get('lat'),
-                    longitude=data.get('lon'),
-                    is_guinea=is_guinea,
-                    verification_method=method
-                )
-                
-                # Mettre à jour le statut de l'utilisateur
-                if is_guinea:
-                    user.is_geographically_verified = True
-                    user.last_login_ip = ip_address
-                    user.save(update_fields=['is_geographically_verified', 'last_login_ip'])
+            location = GeoIPResolver.get_instance().resolve(ip_address)
+            
+            GeographicVerification.objects.create(
+                user=user,
+                ip_address=ip_address,
+                country_code=location.country_code if location else '',
+                country_name=location.country_name if location else '',
+                city=location.city if location else '',
+                latitude=location.latitude if location else None,
+                longitude=location.longitude if location else None,
+                is_guinea=is_guinea,
+                verification_method=method
+            )
+            
+            # Mettre à jour le statut de l'utilisateur seulement s'il a changé
+            if is_guinea and (not user.is_geographically_verified or user.last_login_ip != ip_address):
+                user.is_geographically_verified = True
+                user.last_login_ip = ip_address
+                user.save(update_fields=['is_geographically_verified', 'last_login_ip'])
         except Exception as e:
-            print(f"Erreur lors de l'enregistrement de la vérification: {e}")
+            logger.error(f"Erreur lors de l'enregistrement de la vérification: {e}")
 
 
 class GuineaOnlyMiddleware(MiddlewareMixin):
@@ -148,14 +149,16 @@ class SecurityMiddleware(MiddlewareMixin):
     def process_request(self, request):
         # Rate limiting par IP
         client_ip = self.get_client_ip(request)
-        rate_limit_key = f"rate_limit_{client_ip}"
         
-        # Vérifier le rate limiting
-        if not self.check_rate_limit(rate_limit_key):
-            return JsonResponse(
+        # Vérifier le rate limiting (fenêtre glissante, limite selon la route)
+        result = self.check_rate_limit(request.path, client_ip)
+        if result is not None and not result.allowed:
+            response = JsonResponse(
                 {'error': 'Trop de requêtes. Veuillez patienter.'},
                 status=429
             )
+            response['Retry-After'] = str(result.retry_after)
+            return response
         
         # Headers de sécurité
         request.META['HTTP_X_FRAME_OPTIONS'] = 'DENY'
@@ -183,46 +186,86 @@ class SecurityMiddleware(MiddlewareMixin):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
-    def check_rate_limit(self, key, max_requests=100, window=60):
-        """Vérifie le rate limiting"""
-        current_time = int(time.time())
-        window_start = current_time - window
+    def get_rate_limit_scope(self, path):
+        """Retourne le scope de limitation de la route (préfixe le plus long), ou 'global'"""
+        routes = getattr(settings, 'RATE_LIMIT_ROUTE_SCOPES', {})
+        matches = [prefix for prefix in routes if path.startswith(prefix)]
+        if matches:
+            return routes[max(matches, key=len)]
+        return 'global'
+    
+    def check_rate_limit(self, path, client_ip):
+        """Vérifie le rate limiting de la route pour l'IP du client"""
+        limiter = RateLimiter.for_scope(self.get_rate_limit_scope(path), default='100/minute')
+        if limiter is None:
+            return None
+        return limiter.hit(client_ip)
+
+class PerformanceMiddleware:
+    """
+    Middleware pour le monitoring des performances : profile chaque requête
+    (requêtes SQL, cache, latence par route) via monitoring.profiling
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', True):
+            start_time = time.time()
+            response = self.get_response(request)
+            response['X-Response-Time'] = f"{time.time() - start_time:.3f}s"
+            return response
         
-        # Récupérer les requêtes récentes
-        requests = cache.get(key, [])
+        for alias in settings.CACHES:
+            instrument_cache(caches[alias])
         
-        # Filtrer les requêtes dans la fenêtre
-        recent_requests = [req for req in requests if req > window_start]
+        profile = RequestProfile()
+        request.profile = profile
+        token = activate_profile(profile)
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            deactivate_profile(token)
+        profile.finish()
         
-        # Vérifier la limite
-        if len(recent_requests) >= max_requests:
-            return False
+        request.db_query_count = profile.query_count
+        request.db_query_time = profile.query_time
+        self.record(request, response, profile)
         
-        # Ajouter la requête actuelle
-        recent_requests.append(current_time)
-        cache.set(key, recent_requests, window)
+        # Ajouter les headers de durée
+        response['X-Response-Time'] = f"{profile.duration:.3f}s"
+        if getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG):
+            response['Server-Timing'] = profile.server_timing()
         
-        return True
-
-class PerformanceMiddleware(MiddlewareMixin):
-    """Middleware pour le monitoring des performances"""
-    
-    def process_request(self, request):
-        request.start_time = time.time()
-        return None
+        return response
     
-    def process_response(self, request, response):
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            
-            # Logger les requêtes lentes
-            if duration > 1.0:  # Plus d'1 seconde
-                logger.warning(f"Requête lente: {request.path} - {duration:.2f}s")
-            
-            # Ajouter le header de durée
-            response['X-Response-Time'] = f"{duration:.3f}s"
+    def record(self, request, response, profile):
+        """Transmet le profil aux histogrammes par route et au moniteur de performance"""
+        duplicates = profile.duplicated_queries()
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = f"{request.method} /{resolver_match.route}" if resolver_match else f"{request.method} (non résolue)"
+        route_stats.observe(route, profile, n_plus_one=bool(duplicates))
         
-        return response
+        performance_monitor.record_request(request.path, request.method, profile.duration, response.status_code)
+        performance_monitor.record_db_queries(profile.query_count, profile.query_time)
+        if profile.cache_hits:
+            performance_monitor.record_cache_hit(profile.cache_hits)
+        if profile.cache_misses:
+            performance_monitor.record_cache_miss(profile.cache_misses)
+        
+        # Logger les requêtes lentes
+        if profile.duration > 1.0:  # Plus d'1 seconde
+            logger.warning(f"Requête lente: {request.path} - {profile.duration:.2f}s")
+        
+        for sql, count, total in duplicates:
+            performance_monitor.record_n_plus_one(request.path, sql, count)
+            logger.warning(f"N+1 probable: {count} exécutions ({total * 1000:.1f}ms) pour {request.path}: {sql[:200]}")
+        
+        # Instantané de ce worker pour l'agrégation entre processus, et séries temporelles
+        metrics_registry.maybe_publish()
+        performance_monitor.maybe_sample()
 
 
 class DatabaseOptimizationMiddleware(MiddlewareMixin):
@@ -230,19 +273,20 @@ class DatabaseOptimizationMiddleware(MiddlewareMixin):
     
     def process_request(self, request):
         """Prépare les optimisations de base de données"""
-        # Marquer le début de la requête pour le monitoring
-        request.db_query_count = 0
-        request.db_query_time = 0
-        
+        # Les compteurs sont tenus par le profil de PerformanceMiddleware
         return None
     
     def process_response(self, request, response):
         """Analyse et optimise les performances de base de données"""
-        if hasattr(request, 'db_query_count') and request.db_query_count > 10:
-            logger.warning(f"Nombre élevé de requêtes DB: {request.db_query_count} pour {request.path}")
+        profile = getattr(request, 'profile', None)
+        if profile is None:
+            return response
+        
+        if profile.query_count > 10:
+            logger.warning(f"Nombre élevé de requêtes DB: {profile.query_count} pour {request.path}")
         
-        if hasattr(request, 'db_query_time') and request.db_query_time > 0.5:
-            logger.warning(f"Temps DB élevé: {request.db_query_time:.3f}s pour {request.path}")
+        if profile.query_time > 0.5:
+            logger.warning(f"Temps DB élevé: {profile.query_time:.3f}s pour {request.path}")
         
         return response
 
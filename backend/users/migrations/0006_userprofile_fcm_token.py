@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_userprofile_geohash_userprofile_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='fcm_token',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
 from geography.models import Quartier
+from geography.geoindex import GeohashQuerySet, encode_geohash
 
 
 class User(AbstractUser):
@@ -212,6 +213,14 @@ class UserProfile(models.Model):
     show_email = models.BooleanField(default=False)
     show_location = models.BooleanField(default=True)
     
+    # Localisation (recherches de proximité, voir geography.geoindex)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+    
+    # Notifications push (Firebase Cloud Messaging)
+    fcm_token = models.CharField(max_length=255, blank=True)
+    
     # Statistiques
     posts_count = models.PositiveIntegerField(default=0)
     connections_count = models.PositiveIntegerField(default=0)
@@ -219,6 +228,9 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Les écritures en masse recalculent aussi le geohash
+    objects = GeohashQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Profil Utilisateur"
         verbose_name_plural = "Profils Utilisateurs"
@@ -226,6 +238,17 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Profil de {self.user.username}"
     
+    def save(self, *args, **kwargs):
+        # Tenir le geohash à jour avec les coordonnées
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
     def increment_posts_count(self):
         self.posts_count += 1
         self.save(update_fields=['posts_count'])
@@ -0,0 +1,169 @@
+"""
+Limitation de débit à mémoire fixe (compteur à fenêtre glissante).
+
+Chaque couple (scope, identifiant) occupe deux entiers dans le cache : le
+compteur de la fenêtre courante et celui de la fenêtre précédente. Une
+requête coûte une lecture groupée et un ``incr`` atomique, quel que soit le
+nombre de requêtes déjà reçues, et les workers gunicorn partagent les mêmes
+compteurs sans se marcher dessus.
+
+Le nombre de requêtes sur la dernière fenêtre glissante est estimé par :
+
+    précédent * (1 - fraction écoulée de la fenêtre courante) + courant
+
+Les limites sont définies par scope dans ``RATE_LIMITS`` (format DRF,
+ex. ``'100/minute'``) avec repli sur ``DEFAULT_THROTTLE_RATES`` : le
+middleware de sécurité, ``SecurityService`` et les throttles DRF partagent
+ainsi la même configuration et le même moteur.
+"""
+import logging
+import math
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle, ScopedRateThrottle
+
+logger = logging.getLogger(__name__)
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+class RateLimiter:
+    """Limiteur à fenêtre glissante pour un scope donné"""
+
+    DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self, scope, limit, window, cache_alias='default'):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.cache = caches[cache_alias]
+
+    @classmethod
+    def for_scope(cls, scope, default=None):
+        """Construit le limiteur d'un scope à partir des réglages, ou None s'il n'est pas limité"""
+        rate = cls.get_rate(scope) or default
+        if rate is None:
+            return None
+        limit, window = cls.parse_rate(rate)
+        return cls(scope, limit, window)
+
+    @staticmethod
+    def get_rate(scope):
+        rates = getattr(settings, 'RATE_LIMITS', {})
+        if scope in rates:
+            return rates[scope]
+        return getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_THROTTLE_RATES', {}).get(scope)
+
+    @classmethod
+    def parse_rate(cls, rate):
+        """Convertit '100/minute' en (100, 60)"""
+        num, period = rate.split('/')
+        return int(num), cls.DURATIONS[period[0]]
+
+    def get_keys(self, identifier, now):
+        index = int(now // self.window)
+        prefix = f"ratelimit_{self.scope}_{identifier}"
+        return f"{prefix}_{index}", f"{prefix}_{index - 1}", index
+
+    def hit(self, identifier):
+        """Comptabilise une requête et indique si elle est autorisée"""
+        now = time.time()
+        current_key, previous_key, index = self.get_keys(identifier, now)
+
+        try:
+            previous = self.cache.get(previous_key, 0)
+            # Le compteur courant doit survivre à la fenêtre suivante, où il sert de « précédent »
+            self.cache.add(current_key, 0, self.window * 2)
+            try:
+                current = self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, self.window * 2)
+                current = 1
+        except Exception as e:
+            # Ne jamais bloquer le trafic si le cache est indisponible
+            logger.error(f"Erreur limitation de débit ({self.scope}): {str(e)}")
+            return RateLimitResult(True, self.limit, self.limit, 0)
+
+        elapsed = (now - index * self.window) / self.window
+        estimated = previous * (1 - elapsed) + current
+
+        if estimated > self.limit:
+            # Une requête refusée ne consomme pas de quota
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return RateLimitResult(False, self.limit, 0, self.get_retry_after(previous, current - 1, elapsed))
+
+        return RateLimitResult(True, self.limit, max(0, int(self.limit - estimated)), 0)
+
+    def get_retry_after(self, previous, current, elapsed):
+        """Délai (secondes) avant que l'estimation repasse sous la limite"""
+        if previous > 0:
+            # previous * (1 - t) + current < limit  =>  t > 1 - (limit - current) / previous
+            target = 1 - (self.limit - current) / previous
+            if elapsed < target <= 1:
+                return max(1, math.ceil((target - elapsed) * self.window))
+        # Sinon, attendre que le compteur courant devienne le précédent
+        return max(1, math.ceil((1 - elapsed) * self.window))
+
+
+class SlidingWindowThrottleMixin:
+    """Remplace le stockage par liste d'horodatages des throttles DRF par RateLimiter"""
+
+    def get_rate(self):
+        """Limite du scope lue comme RateLimiter : RATE_LIMITS, puis DEFAULT_THROTTLE_RATES"""
+        if not getattr(self, 'scope', None):
+            raise ImproperlyConfigured(f"Aucun scope de limitation défini pour '{self.__class__.__name__}'")
+
+        rate = RateLimiter.get_rate(self.scope)
+        if rate is None:
+            raise ImproperlyConfigured(f"Aucune limite définie pour le scope '{self.scope}'")
+        return rate
+
+    def allow_sliding_window(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        limiter = RateLimiter(self.scope, self.num_requests, self.duration)
+        self.result = limiter.hit(self.key)
+        return self.result.allowed
+
+    def wait(self):
+        result = getattr(self, 'result', None)
+        return result.retry_after if result is not None else None
+
+
+class AnonRateLimitThrottle(SlidingWindowThrottleMixin, AnonRateThrottle):
+    """Limite les utilisateurs anonymes (scope 'anon')"""
+
+    def allow_request(self, request, view):
+        return self.allow_sliding_window(request, view)
+
+
+class UserRateLimitThrottle(SlidingWindowThrottleMixin, UserRateThrottle):
+    """Limite les utilisateurs authentifiés (scope 'user')"""
+
+    def allow_request(self, request, view):
+        return self.allow_sliding_window(request, view)
+
+
+class ScopedRateLimitThrottle(SlidingWindowThrottleMixin, ScopedRateThrottle):
+    """Limite les vues déclarant un ``throttle_scope``"""
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return self.allow_sliding_window(request, view)
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from .models import User, UserProfile, GeographicVerification, UserRelationship, CommunityGroup, GroupMembership, CommunityEvent, EventAttendance, UserAchievement, UserSocialScore
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
 
 User = get_user_model()
@@ -56,14 +57,62 @@ class UserSerializer(serializers.ModelSerializer):
         """Indique si l'utilisateur est administrateur"""
         return obj.role == 'admin'
     
+    @staticmethod
+    def prefetch_follow_stats(users, context):
+        """
+        Précharge en lot les compteurs de suivi d'un ensemble d'utilisateurs.
+        
+        Trois requêtes au plus, quel que soit le nombre d'utilisateurs ; les
+        résultats sont stockés dans le contexte partagé du sérialiseur.
+        """
+        stats = context.setdefault('user_follow_stats', {})
+        user_ids = {user.id for user in users if user is not None} - stats.keys()
+        if not user_ids:
+            return
+        
+        followers = dict(
+            UserRelationship.objects.filter(followed_id__in=user_ids)
+            .values('followed_id').annotate(total=Count('id'))
+            .values_list('followed_id', 'total')
+        )
+        following = dict(
+            UserRelationship.objects.filter(follower_id__in=user_ids)
+            .values('follower_id').annotate(total=Count('id'))
+            .values_list('follower_id', 'total')
+        )
+        followed_by_viewer = set()
+        request = context.get('request')
+        if request and request.user.is_authenticated:
+            followed_by_viewer = set(
+                request.user.following.filter(followed_id__in=user_ids)
+                .values_list('followed_id', flat=True)
+            )
+        
+        for user_id in user_ids:
+            stats[user_id] = {
+                'followers_count': followers.get(user_id, 0),
+                'following_count': following.get(user_id, 0),
+                'is_following': user_id in followed_by_viewer,
+            }
+    
+    def _get_follow_stats(self, obj):
+        """Retourne les compteurs préchargés de l'utilisateur, ou None"""
+        return self.context.get('user_follow_stats', {}).get(obj.id)
+    
     @extend_schema_field(OpenApiTypes.INT)
     def get_followers_count(self, obj):
         """Retourne le nombre de followers"""
+        stats = self._get_follow_stats(obj)
+        if stats is not None:
+            return stats['followers_count']
         return obj.followers.count()
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_following_count(self, obj):
         """Retourne le nombre d'utilisateurs suivis"""
+        stats = self._get_follow_stats(obj)
+        if stats is not None:
+            return stats['following_count']
         return obj.following.count()
     
     @extend_schema_field(OpenApiTypes.BOOL)
@@ -71,6 +120,9 @@ class UserSerializer(serializers.ModelSerializer):
         """Vérifie si l'utilisateur connecté suit cet utilisateur"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            stats = self._get_follow_stats(obj)
+            if stats is not None:
+                return stats['is_following']
             return request.user.is_following(obj)
         return False
     
@@ -79,7 +131,7 @@ class UserSerializer(serializers.ModelSerializer):
         """Vérifie si l'utilisateur connecté peut suivre cet utilisateur"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return request.user != obj and not request.user.is_following(obj)
+            return request.user != obj and not self.get_is_following(obj)
         return False
 
 
@@ -135,7 +187,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = [
             'id', 'user', 'profession', 'company', 'interests', 'skills',
-            'show_phone', 'show_email', 'show_location',
+            'show_phone', 'show_email', 'show_location', 'latitude', 'longitude',
             'posts_count', 'connections_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
@@ -0,0 +1,312 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .geolocation import CIDRIndex, GeoIPResolver, GeoLocation
+from .middleware import GeographicAccessMiddleware, PerformanceMiddleware, SecurityMiddleware
+from .models import GeographicVerification
+from .ratelimit import AnonRateLimitThrottle, RateLimiter, ScopedRateLimitThrottle
+from monitoring.metrics import Histogram, histogram_percentile
+from monitoring.profiling import LATENCY_BUCKETS_MS, route_stats
+
+User = get_user_model()
+
+
+class RateLimiterTest(TestCase):
+    """Tests pour le limiteur de débit à fenêtre glissante"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_enforced_within_window(self):
+        """Les requêtes au-delà de la limite sont refusées avec un délai d'attente"""
+        limiter = RateLimiter('test', limit=3, window=60)
+        with mock.patch('users.ratelimit.time.time', return_value=6000.0):
+            results = [limiter.hit('1.2.3.4') for _ in range(4)]
+
+        self.assertEqual([result.allowed for result in results], [True, True, True, False])
+        self.assertEqual(results[2].remaining, 0)
+        self.assertGreater(results[3].retry_after, 0)
+
+    def test_identifiers_are_isolated(self):
+        """Chaque identifiant dispose de son propre quota"""
+        limiter = RateLimiter('test', limit=1, window=60)
+        with mock.patch('users.ratelimit.time.time', return_value=6000.0):
+            self.assertTrue(limiter.hit('1.1.1.1').allowed)
+            self.assertTrue(limiter.hit('2.2.2.2').allowed)
+            self.assertFalse(limiter.hit('1.1.1.1').allowed)
+
+    def test_previous_window_weighted(self):
+        """La fenêtre précédente compte au prorata du temps restant"""
+        limiter = RateLimiter('test', limit=10, window=60)
+        with mock.patch('users.ratelimit.time.time', return_value=6000.0):
+            for _ in range(10):
+                limiter.hit('1.2.3.4')
+
+        # Début de la fenêtre suivante : la précédente compte presque entièrement
+        with mock.patch('users.ratelimit.time.time', return_value=6061.0):
+            self.assertFalse(limiter.hit('1.2.3.4').allowed)
+
+        # Milieu de la fenêtre suivante : la moitié du quota est libérée
+        with mock.patch('users.ratelimit.time.time', return_value=6090.0):
+            allowed = [limiter.hit('1.2.3.4').allowed for _ in range(6)]
+        self.assertEqual(allowed, [True] * 5 + [False])
+
+    def test_fixed_memory(self):
+        """Le stockage ne dépend pas du nombre de requêtes"""
+        limiter = RateLimiter('test', limit=1000, window=60)
+        with mock.patch('users.ratelimit.time.time', return_value=6000.0):
+            for _ in range(500):
+                limiter.hit('1.2.3.4')
+
+            current_key, _, _ = limiter.get_keys('1.2.3.4', 6000.0)
+            self.assertEqual(cache.get(current_key), 500)
+
+    @override_settings(RATE_LIMITS={'test_scope': '5/hour'})
+    def test_for_scope_reads_settings(self):
+        """Les limites sont lues dans RATE_LIMITS puis dans DEFAULT_THROTTLE_RATES"""
+        limiter = RateLimiter.for_scope('test_scope')
+        self.assertEqual((limiter.limit, limiter.window), (5, 3600))
+
+        limiter = RateLimiter.for_scope('posts')
+        self.assertEqual(limiter.limit, RateLimiter.parse_rate('50/minute')[0])
+
+        self.assertIsNone(RateLimiter.for_scope('inconnu'))
+
+
+@override_settings(
+    RATE_LIMITS={'global': '100/minute', 'auth': '2/minute'},
+    RATE_LIMIT_ROUTE_SCOPES={'/api/users/login/': 'auth'},
+)
+class SecurityMiddlewareRateLimitTest(TestCase):
+    """Tests pour la limitation de débit par route du middleware de sécurité"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = SecurityMiddleware(lambda request: None)
+
+    def test_route_scope_applied(self):
+        """Les routes sensibles ont leur propre limite, avec Retry-After"""
+        responses = [
+            self.middleware.process_request(self.factory.post('/api/users/login/'))
+            for _ in range(3)
+        ]
+
+        self.assertIsNone(responses[0])
+        self.assertIsNone(responses[1])
+        self.assertEqual(responses[2].status_code, 429)
+        self.assertIn('Retry-After', responses[2])
+
+        # Les autres routes utilisent le scope global
+        self.assertIsNone(self.middleware.process_request(self.factory.get('/api/posts/')))
+
+
+class ScopedRateLimitThrottleTest(TestCase):
+    """Tests pour les throttles DRF adossés au limiteur partagé"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    @override_settings(RATE_LIMITS={'uploads': '2/minute'})
+    def test_scope_from_view(self):
+        """Le scope de la vue détermine la limite ; un refus indique le délai d'attente"""
+        view = mock.Mock(throttle_scope='uploads')
+        request = self.factory.get('/api/posts/media/upload/')
+        request.user = mock.Mock(is_authenticated=False)
+
+        allowed = []
+        for _ in range(3):
+            throttle = ScopedRateLimitThrottle()
+            allowed.append(throttle.allow_request(request, view))
+
+        self.assertEqual(allowed, [True, True, False])
+        self.assertGreater(throttle.wait(), 0)
+
+    @override_settings(RATE_LIMITS={'anon': '1/minute'})
+    def test_rate_from_rate_limits(self):
+        """Un scope défini seulement dans RATE_LIMITS s'applique aussi aux throttles DRF"""
+        request = self.factory.get('/api/posts/')
+        request.user = mock.Mock(is_authenticated=False)
+
+        throttle = AnonRateLimitThrottle()
+        self.assertEqual((throttle.num_requests, throttle.duration), (1, 60))
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(AnonRateLimitThrottle().allow_request(request, None))
+
+        with override_settings(RATE_LIMITS={}):
+            with self.assertRaises(ImproperlyConfigured):
+                ScopedRateLimitThrottle().allow_request(request, mock.Mock(throttle_scope='inconnu'))
+
+
+class GeoIPResolverTest(TestCase):
+    """Tests pour la géolocalisation IP locale"""
+
+    GUINEA = GeoLocation('GN', 'Guinée', 'Conakry', None, None)
+    FRANCE = GeoLocation('FR', 'France', 'Paris', None, None)
+
+    def test_cidr_index_lookup(self):
+        """Les plages IPv4 et IPv6 sont trouvées par dichotomie, bornes incluses"""
+        index = CIDRIndex([
+            ('41.223.48.0/22', self.GUINEA),
+            ('10.0.0.0/8', self.FRANCE),
+            ('2c0f:f5c0::/32', self.GUINEA),
+        ])
+
+        self.assertEqual(index.lookup('41.223.48.0'), self.GUINEA)
+        self.assertEqual(index.lookup('41.223.51.255'), self.GUINEA)
+        self.assertIsNone(index.lookup('41.223.52.0'))
+        self.assertEqual(index.lookup('10.20.30.40'), self.FRANCE)
+        self.assertEqual(index.lookup('2c0f:f5c0::1'), self.GUINEA)
+        self.assertIsNone(index.lookup('pas-une-ip'))
+
+    def test_recent_ips_served_from_lru(self):
+        """Une IP déjà résolue ne consulte plus la base"""
+        reader = mock.Mock()
+        reader.metadata.return_value.database_type = 'GeoLite2-Country'
+        reader.country.return_value = mock.Mock(country=mock.Mock(iso_code='FR', name='France'))
+        resolver = GeoIPResolver(reader=reader, cache_size=2)
+
+        for _ in range(3):
+            self.assertEqual(resolver.get_country_code('8.8.8.8'), 'FR')
+        self.assertEqual(reader.country.call_count, 1)
+
+        # La capacité est bornée : l'entrée la plus ancienne est évincée
+        resolver.resolve('1.1.1.1')
+        resolver.resolve('9.9.9.9')
+        self.assertEqual(len(resolver.cache), 2)
+        resolver.resolve('8.8.8.8')
+        self.assertEqual(reader.country.call_count, 4)
+
+    def test_unknown_ip_without_database(self):
+        """Sans base ni plage correspondante, l'IP est inconnue"""
+        resolver = GeoIPResolver(ranges=[('41.223.48.0/22', self.GUINEA)])
+        self.assertIsNone(resolver.resolve('192.168.1.1'))
+        self.assertEqual(resolver.get_country_code('41.223.49.1'), 'GN')
+
+
+@override_settings(GUINEA_IP_RANGES=['41.223.48.0/22'], GEOIP_DATABASE_PATH=None, GEOIP_ALLOW_UNKNOWN=False)
+class GeographicAccessMiddlewareTest(TestCase):
+    """Tests pour le contrôle d'accès géographique du middleware"""
+
+    def setUp(self):
+        cache.clear()
+        GeoIPResolver.reset_instance()
+        self.addCleanup(GeoIPResolver.reset_instance)
+        self.factory = RequestFactory()
+        self.middleware = GeographicAccessMiddleware(lambda request: None)
+        self.user = get_user_model().objects.create_user(
+            username='geo_user', email='geo@example.com', password='testpass123'
+        )
+
+    def get_request(self, ip_address, user=None):
+        request = self.factory.get('/api/posts/', REMOTE_ADDR=ip_address)
+        request.user = user or mock.Mock(is_authenticated=False)
+        return request
+
+    @mock.patch('requests.get', side_effect=AssertionError("Aucun appel réseau attendu"))
+    def test_access_decided_locally(self, mocked_get):
+        """L'accès est décidé sans appel réseau"""
+        self.assertIsNone(self.middleware.process_request(self.get_request('41.223.49.10')))
+
+        response = self.middleware.process_request(self.get_request('8.8.8.8'))
+        self.assertEqual(response.status_code, 403)
+        mocked_get.assert_not_called()
+
+    def test_verification_recorded_once_per_period(self):
+        """Une seule vérification est écrite par utilisateur et par période"""
+        for _ in range(5):
+            self.assertIsNone(self.middleware.process_request(self.get_request('41.223.49.10', self.user)))
+
+        self.assertEqual(GeographicVerification.objects.filter(user=self.user).count(), 1)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_geographically_verified)
+        self.assertEqual(self.user.last_login_ip, '41.223.49.10')
+
+        # Période écoulée : une nouvelle vérification est enregistrée
+        cache.delete(f"geo_verification_{self.user.id}")
+        self.middleware.process_request(self.get_request('41.223.49.10', self.user))
+        self.assertEqual(GeographicVerification.objects.filter(user=self.user).count(), 2)
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+class PerformanceMiddlewareProfilingTest(TestCase):
+    """Tests pour le profilage des requêtes (SQL, cache, latence par route)"""
+
+    def setUp(self):
+        cache.clear()
+        route_stats.reset()
+        self.factory = RequestFactory()
+        self.users = [
+            User.objects.create_user(username=f'profil{index}', email=f'profil{index}@example.com', password='pass12345')
+            for index in range(6)
+        ]
+
+    def test_queries_counted_and_n_plus_one_flagged(self):
+        """Chaque requête SQL est comptée ; la même requête répétée est signalée"""
+        def view(request):
+            for user in User.objects.all():
+                User.objects.filter(pk=user.pk).exists()
+            return HttpResponse('ok')
+
+        request = self.factory.get('/api/users/')
+        with self.assertLogs('users.middleware', level='WARNING') as logs:
+            response = PerformanceMiddleware(view)(request)
+
+        self.assertEqual(request.db_query_count, 7)
+        self.assertEqual(request.profile.duplicated_queries()[0][1], 6)
+        self.assertIn('N+1 probable: 6 exécutions', logs.output[0])
+        self.assertIn('db;desc="7 requetes"', response['Server-Timing'])
+        self.assertIn('X-Response-Time', response)
+        self.assertEqual(route_stats.summary()['GET (non résolue)']['n_plus_one_requests'], 1)
+
+    def test_cache_hits_and_misses_counted(self):
+        """Les lectures du cache sont comptées sans changer leur résultat"""
+        cache.set('profil_present', 'valeur')
+
+        def view(request):
+            self.assertEqual(cache.get('profil_present'), 'valeur')
+            self.assertEqual(cache.get('profil_absent', 'défaut'), 'défaut')
+            self.assertEqual(cache.get_many(['profil_present', 'profil_absent']), {'profil_present': 'valeur'})
+            return HttpResponse('ok')
+
+        request = self.factory.get('/api/posts/')
+        response = PerformanceMiddleware(view)(request)
+        self.assertEqual((request.profile.cache_hits, request.profile.cache_misses), (2, 2))
+        self.assertIn('cache;desc="2 hits 2 miss"', response['Server-Timing'])
+
+    def test_latency_histogram_percentiles(self):
+        """Les percentiles sont estimés à la classe près (25 %)"""
+        histogram = Histogram('latence_test', 'Latence (ms)', buckets=LATENCY_BUCKETS_MS)
+        for duration_ms in range(1, 101):
+            histogram.observe(duration_ms)
+        series = histogram.samples()[()]
+        self.assertEqual(series[2], 100)
+        self.assertTrue(50 <= histogram_percentile(histogram.buckets, series, 0.50) <= 62.5)
+        self.assertTrue(95 <= histogram_percentile(histogram.buckets, series, 0.95) <= 95 * 1.25)
+        self.assertTrue(99 <= histogram_percentile(histogram.buckets, series, 0.99) <= 99 * 1.25)
+
+    def test_routes_exposed_in_performance_metrics(self):
+        """Les routes mesurées apparaissent dans les métriques de monitoring"""
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        client = APIClient()
+        response = client.get('/api/health/')
+        self.assertIn('Server-Timing', response)
+
+        client.force_authenticate(user=admin)
+        response = client.get(reverse('monitoring:metrics'), {'type': 'routes'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['routes']['GET /api/health/']['count'], 1)
+
+        for limit in ('abc', '0', '-1'):
+            response = client.get(reverse('monitoring:metrics'), {'type': 'routes', 'limit': limit})
+            self.assertEqual(response.status_code, 400)
+        response = client.get(reverse('monitoring:metrics'), {'type': 'routes', 'limit': '1'})
+        self.assertEqual(len(response.data['routes']), 1)
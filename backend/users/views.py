@@ -21,6 +21,7 @@ from django.shortcuts import get_object_or_404
 from django.core.cache import cache
 from .models import User, UserProfile, GeographicVerification, UserRelationship
 from geography.models import Region, Prefecture, Commune, Quartier
+from search.services import SearchService
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, UserProfileSerializer,
     UserRelationshipSerializer, FollowUserSerializer, UnfollowUserSerializer,
@@ -449,13 +450,10 @@ class UserSearchView(generics.ListAPIView):
         if not query:
             return User.objects.none()
         
-        return User.objects.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(email__icontains=query),
-            is_active=True
-        ).select_related('quartier')[:20]
+        # Index plein texte : nom d'utilisateur, prénom, nom et partie locale de l'email
+        return SearchService.filter_queryset(
+            User.objects.filter(is_active=True), 'user', query
+        ).select_related('quartier').order_by('search_rank')[:20]
 
 
 class SuggestedFriendsView(generics.ListAPIView):
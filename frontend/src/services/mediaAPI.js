@@ -55,47 +55,75 @@ export const mediaAPI = {
   },
 
   // Arrêter un live
-  stopLive: async (liveId, videoData = null) => {
-    const requestData = videoData ? { video_data: videoData } : {};
-    const response = await api.put(`/posts/live/${liveId}/stop/`, requestData);
+  stopLive: async (liveId) => {
+    const response = await api.put(`/posts/live/${liveId}/stop/`, {});
     return response.data;
   },
 
-  // Uploader une vidéo de live enregistrée
-  uploadLiveVideo: async (liveId, videoBlob, onProgress) => {
-    const formData = new FormData();
-    formData.append('video', videoBlob, `live_video_${liveId}.webm`);
-    
-    // Récupérer le token d'authentification
-    const token = localStorage.getItem('access_token');
-    
-    const config = {
-      headers: {
-        'Content-Type': 'multipart/form-data',
-        'Authorization': `Bearer ${token}`,
-      },
-      onUploadProgress: (progressEvent) => {
+  // Uploader une vidéo de live enregistrée, par morceaux (reprise après coupure)
+  uploadLiveVideo: async (liveId, videoBlob, onProgress, maxRetries = 5) => {
+    const mimeType = videoBlob.type || 'video/webm';
+    const { data: session } = await api.post(`/posts/live/${liveId}/uploads/`, {
+      filename: `live_video_${liveId}.webm`,
+      content_type: mimeType,
+      total_size: videoBlob.size,
+    });
+
+    const sha256 = async (buffer) => {
+      const digest = await crypto.subtle.digest('SHA-256', buffer);
+      return Array.from(new Uint8Array(digest))
+        .map((byte) => byte.toString(16).padStart(2, '0'))
+        .join('');
+    };
+
+    const totalChunks = Math.ceil(videoBlob.size / session.chunk_size);
+    let index = session.next_chunk;
+    let failures = 0;
+
+    while (index < totalChunks) {
+      const start = index * session.chunk_size;
+      const buffer = await videoBlob.slice(start, start + session.chunk_size).arrayBuffer();
+      try {
+        const { data } = await api.put(
+          `/posts/live/uploads/${session.upload_id}/chunks/${index}/`,
+          buffer,
+          {
+            headers: {
+              'Content-Type': 'application/octet-stream',
+              'X-Chunk-SHA256': await sha256(buffer),
+            },
+          }
+        );
+        index = data.next_chunk;
+        failures = 0;
         if (onProgress) {
-          const percentCompleted = Math.round(
-            (progressEvent.loaded * 100) / progressEvent.total
-          );
-          onProgress(percentCompleted);
+          onProgress(Math.round((data.received_bytes * 100) / videoBlob.size));
         }
-      },
-    };
-    
-    console.log('Uploading live video with formData:', formData);
-    console.log('Auth token:', token ? 'Present' : 'Missing');
-    const response = await api.post(`/posts/live/${liveId}/upload-video/`, formData, config);
-    console.log('Live video upload response:', response.data);
-    return response.data;
-  },
+      } catch (error) {
+        failures += 1;
+        if (failures > maxRetries) {
+          throw error;
+        }
+        // Le serveur indique le morceau attendu ; sinon on redemande l'avancement
+        const nextChunk = error.response?.data?.next_chunk;
+        if (nextChunk !== undefined) {
+          index = nextChunk;
+        } else {
+          await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** (failures - 1)));
+          try {
+            const { data } = await api.get(`/posts/live/uploads/${session.upload_id}/`);
+            index = data.next_chunk;
+          } catch (statusError) {
+            // Toujours hors ligne : nouvel essai du même morceau
+          }
+        }
+      }
+    }
 
-  // Sauvegarder une vidéo enregistrée pendant un live
-  saveLiveVideo: async (liveId, videoData) => {
-    const response = await api.put(`/posts/live/${liveId}/stop/`, {
-      video_data: videoData
+    const response = await api.post(`/posts/live/uploads/${session.upload_id}/complete/`, {
+      sha256: await sha256(await videoBlob.arrayBuffer()),
     });
+    console.log('Live video upload response:', response.data);
     return response.data;
   },
 